@@ -0,0 +1,113 @@
+"""
+Compare the assembly of the phenopacket interpretations from standalone messages, which are copied
+at each nesting level (variant -> genomic interpretation -> diagnosis -> interpretation -> phenopacket),
+with the in-place assembly of `add_variant_interpretations` and of the `targets` of `to_ga4gh_batch`.
+
+Usage:
+    python benchmarks/bench_assembly.py --n-subjects 200 --n-variants 500
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import phenopackets as pp
+
+from bench_factories import make_mutation_df
+from oncopacket.cda import CdaMutationFactory
+from oncopacket.cda.cda_mutation_factory import add_variant_interpretations
+from oncopacket.cda.mapper.term_registry import NEOPLASM
+
+
+def assemble_by_copy(subject_ids, variants, n_variants: int):
+    phenopackets = []
+    for i, subject_id in enumerate(subject_ids):
+        phenopacket = pp.Phenopacket(id=subject_id)
+        diagnosis = pp.Diagnosis()
+        NEOPLASM.copy_into(diagnosis.disease)
+        for variant in variants[i * n_variants:(i + 1) * n_variants]:
+            genomic_interpretation = pp.GenomicInterpretation()
+            genomic_interpretation.subject_or_biosample_id = subject_id
+            genomic_interpretation.interpretation_status = pp.GenomicInterpretation.InterpretationStatus.UNKNOWN_STATUS
+            genomic_interpretation.variant_interpretation.CopyFrom(variant)
+            diagnosis.genomic_interpretations.append(genomic_interpretation)
+        interpretation = pp.Interpretation()
+        interpretation.id = f'{subject_id}-RS'
+        interpretation.progress_status = pp.Interpretation.ProgressStatus.IN_PROGRESS
+        interpretation.diagnosis.CopyFrom(diagnosis)
+        phenopacket.interpretations.append(interpretation)
+        phenopackets.append(phenopacket)
+    return phenopackets
+
+
+def assemble_from_messages(subject_ids, variants, n_variants: int):
+    # The variants are standalone messages, e.g. from `MafMutationSource`, and they are copied once.
+    phenopackets = []
+    for i, subject_id in enumerate(subject_ids):
+        phenopacket = pp.Phenopacket(id=subject_id)
+        add_variant_interpretations(phenopacket, f'{subject_id}-RS', subject_id,
+                                    variants[i * n_variants:(i + 1) * n_variants])
+        phenopackets.append(phenopacket)
+    return phenopackets
+
+
+def assemble_in_place(subject_ids, df, n_variants: int):
+    # The variants are converted directly into the genomic interpretations.
+    phenopackets = []
+    targets = []
+    for subject_id in subject_ids:
+        phenopacket = pp.Phenopacket(id=subject_id)
+        interpretation = add_variant_interpretations(phenopacket, f'{subject_id}-RS', subject_id, ())
+        genomic_interpretations = interpretation.diagnosis.genomic_interpretations
+        for _ in range(n_variants):
+            genomic_interpretation = genomic_interpretations.add()
+            genomic_interpretation.subject_or_biosample_id = subject_id
+            targets.append(genomic_interpretation.variant_interpretation)
+        phenopackets.append(phenopacket)
+    CdaMutationFactory().to_ga4gh_batch(df, targets=targets)
+    return phenopackets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-subjects', type=int, default=200)
+    parser.add_argument('--n-variants', type=int, default=500, help='the number of variants per subject')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    df = make_mutation_df(args.n_subjects * args.n_variants, np.random.default_rng(args.seed))
+    subject_ids = [f'TCGA.BENCH-{i:06d}' for i in range(args.n_subjects)]
+
+    start = time.perf_counter()
+    variants = CdaMutationFactory().to_ga4gh_batch(df)
+    conversion = time.perf_counter() - start
+
+    # The time of the assembly (unknown for the in-place assembly), and of the conversion and the assembly.
+    results = {}
+    expected = None
+    for name, assemble, data in (('copy', assemble_by_copy, variants),
+                                 ('messages', assemble_from_messages, variants),
+                                 ('in place', assemble_in_place, df)):
+        start = time.perf_counter()
+        phenopackets = assemble(subject_ids, data, args.n_variants)
+        elapsed = time.perf_counter() - start
+        results[name] = (None, elapsed) if data is df else (elapsed, conversion + elapsed)
+        if expected is None:
+            expected = phenopackets
+        elif phenopackets != expected:
+            raise RuntimeError(f'The {name} assembly does not match the copy assembly')
+
+    if args.json:
+        print(json.dumps({name: dict(zip(('assembly_s', 'total_s'), r)) for name, r in results.items()}))
+        return
+    print(f'{args.n_subjects} subjects with {args.n_variants} variants each, conversion {conversion:.2f}s')
+    print(f'{"assembly":<12}{"assembly s":>12}{"total s":>10}{"speedup":>10}')
+    copy_total = results['copy'][1]
+    for name, (assembly, total) in results.items():
+        assembly = '-' if assembly is None else f'{assembly:.3f}'
+        print(f'{name:<12}{assembly:>12}{total:>10.3f}{copy_total / total:>9.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Compare the encode and decode throughput and the size on disk of the phenopacket output formats.
+
+Usage:
+    python benchmarks/bench_encodings.py --n-phenopackets 2000 --n-variants 50
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import phenopackets as pp
+from google.protobuf.json_format import Parse
+
+from synthetic_cda import make_phenopacket
+from oncopacket.export import ShardedPhenopacketWriter, read_stream, write_stream
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def bench_json_files(phenopackets, tmp_dir: str):
+    out_dir = os.path.join(tmp_dir, 'json')
+    start = time.perf_counter()
+    manifest = ShardedPhenopacketWriter(out_dir, n_workers=1).write(phenopackets)
+    encode = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for entry in manifest['files']:
+        with open(os.path.join(out_dir, entry['path'])) as fh:
+            Parse(fh.read(), pp.Phenopacket())
+    decode = time.perf_counter() - start
+    return encode, decode, directory_size(out_dir)
+
+
+def bench_stream(phenopackets, path: str):
+    start = time.perf_counter()
+    write_stream(phenopackets, path)
+    encode = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in read_stream(path):
+        pass
+    decode = time.perf_counter() - start
+    return encode, decode, os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-phenopackets', type=int, default=1000)
+    parser.add_argument('--n-variants', type=int, default=30, help='the number of variants per phenopacket')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    phenopackets = [make_phenopacket(i, args.n_variants) for i in range(args.n_phenopackets)]
+    stream_formats = ['pb', 'pb.gz', 'ndjson', 'ndjson.gz']
+    try:
+        import zstandard  # noqa: F401
+        stream_formats += ['pb.zst', 'ndjson.zst']
+    except ImportError:
+        pass
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results['json files'] = bench_json_files(phenopackets, tmp_dir)
+        for fmt in stream_formats:
+            results[fmt] = bench_stream(phenopackets, os.path.join(tmp_dir, f'cohort.{fmt}'))
+
+    if args.json:
+        print(json.dumps({fmt: dict(zip(('encode_s', 'decode_s', 'bytes'), r)) for fmt, r in results.items()}))
+        return
+    n = len(phenopackets)
+    print(f'{n} phenopackets with {args.n_variants} variants each')
+    print(f'{"format":<12}{"encode/s":>12}{"decode/s":>12}{"MiB":>10}')
+    for fmt, (encode, decode, size) in results.items():
+        print(f'{fmt:<12}{n / encode:>12.0f}{n / decode:>12.0f}{size / 2 ** 20:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
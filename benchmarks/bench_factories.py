@@ -0,0 +1,132 @@
+"""
+Compare the row-by-row conversion of the CDA tables (`df.iterrows()` and `to_ga4gh`)
+with the batch conversion of `to_ga4gh_batch`.
+
+The disease factory uses the default batch implementation of `CdaFactory`, which passes a `dict` per row,
+and the individual, biosample, and mutation factories use their column-wise fast paths.
+
+Usage:
+    python benchmarks/bench_factories.py --n-rows 5000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from oncopacket.cda import CdaBiosampleFactory, CdaDiseaseFactory, CdaIndividualFactory, CdaMutationFactory
+from oncopacket.cda.mapper import OpDiagnosisMapper
+
+
+def make_subject_df(n: int, rng: np.random.Generator) -> pd.DataFrame:
+    dead = rng.random(n) < .3
+    return pd.DataFrame({
+        'subject_id': [f'TCGA.BENCH-{i:06d}' for i in range(n)],
+        'species': 'human',
+        'sex': rng.choice(['female', 'male', None], size=n),
+        'race': 'not reported',
+        'ethnicity': 'not reported',
+        'days_to_birth': -rng.integers(8_000, 30_000, size=n).astype(float),
+        'vital_status': np.where(dead, 'Dead', 'Alive'),
+        'days_to_death': pd.Series(rng.integers(10, 3_000, size=n), dtype='Int64').where(dead, pd.NA),
+        'cause_of_death': np.where(dead & (rng.random(n) < .5), 'Cancer Related', None),
+    })
+
+
+def make_diagnosis_df(n: int, rng: np.random.Generator) -> pd.DataFrame:
+    return pd.DataFrame({
+        'subject_id': [f'TCGA.BENCH-{i:06d}' for i in range(n)],
+        'primary_diagnosis': 'Adenocarcinoma, NOS',
+        'primary_diagnosis_condition': 'Adenomas and Adenocarcinomas',
+        'primary_diagnosis_site': 'lung',
+        'age_at_diagnosis': rng.integers(8_000, 30_000, size=n).astype(float),
+        'stage': rng.choice(['Stage I', 'Stage IIA', 'Stage IV', ''], size=n),
+    })
+
+
+def make_specimen_df(n: int, rng: np.random.Generator) -> pd.DataFrame:
+    return pd.DataFrame({
+        'specimen_id': [f'BENCH-S{i:06d}' for i in range(n)],
+        'derived_from_subject': [f'TCGA.BENCH-{i // 4:06d}' for i in range(n)],
+        'derived_from_specimen': ['initial specimen' if i % 4 == 0 else f'BENCH-S{i - i % 4:06d}' for i in range(n)],
+        'days_to_collection': rng.integers(0, 500, size=n).astype(float),
+        'primary_disease_type': 'Adenomas and Adenocarcinomas',
+        'anatomical_site': rng.choice(['Lung', 'Upper lobe, lung', None], size=n),
+        'source_material_type': rng.choice(['Primary Tumor', 'Blood Derived Normal'], size=n),
+        'specimen_type': rng.choice(['sample', 'portion', 'analyte', 'aliquot'], size=n),
+    })
+
+
+def make_mutation_df(n: int, rng: np.random.Generator) -> pd.DataFrame:
+    # About one in four variants is recurrent.
+    variant = rng.integers(0, max(1, 3 * n // 4), size=n)
+    return pd.DataFrame({
+        'cda_subject_id': [f'TCGA.BENCH-{i // 20:06d}' for i in range(n)],
+        'Entrez_Gene_Id': 1000 + variant % 500,
+        'Hugo_Symbol': [f'GENE{v % 500}' for v in variant],
+        'NCBI_Build': 'GRCh38',
+        'Chromosome': [f'chr{1 + v % 22}' for v in variant],
+        'Start_Position': 1_000_000 + 37 * variant,
+        'End_Position': 1_000_000 + 37 * variant,
+        'Reference_Allele': 'G',
+        'Tumor_Seq_Allele2': 'A',
+        'dbSNP_RS': None,
+        'Transcript_ID': [f'ENST{v % 500:011d}' for v in variant],
+        'HGVSc': [f'c.{100 + v}G>A' for v in variant],
+        'ENSP': [f'ENSP{v % 500:011d}' for v in variant],
+        'HGVSp_Short': [f'p.G{30 + v}D' for v in variant],
+        'Mutation_Status': 'Somatic',
+        't_depth': rng.integers(10, 200, size=n),
+        't_ref_count': rng.integers(5, 100, size=n),
+        't_alt_count': rng.integers(5, 100, size=n),
+        'n_depth': rng.integers(10, 200, size=n),
+        'n_ref_count': rng.integers(5, 100, size=n),
+        'n_alt_count': 0,
+    })
+
+
+def bench(factory, df: pd.DataFrame, make_factory=None):
+    start = time.perf_counter()
+    by_row = [factory.to_ga4gh(row) for _, row in df.iterrows()]
+    series = time.perf_counter() - start
+
+    if make_factory is not None:
+        # Start the batch with an empty variant cache, like the row-by-row conversion.
+        factory = make_factory()
+    start = time.perf_counter()
+    batch = factory.to_ga4gh_batch(df)
+    batched = time.perf_counter() - start
+
+    if batch != by_row:
+        raise RuntimeError(f'The batch conversion of {type(factory).__name__} does not match the rows')
+    return series, batched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-rows', type=int, default=5000, help='the number of rows per table')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    n = args.n_rows
+    results = {
+        'individual': bench(CdaIndividualFactory(), make_subject_df(n, rng)),
+        'disease': bench(CdaDiseaseFactory(OpDiagnosisMapper.multitissue_mapper()), make_diagnosis_df(n, rng)),
+        'biosample': bench(CdaBiosampleFactory(), make_specimen_df(n, rng)),
+        'mutation': bench(CdaMutationFactory(), make_mutation_df(n, rng), make_factory=CdaMutationFactory),
+    }
+
+    if args.json:
+        print(json.dumps({name: dict(zip(('series_s', 'batch_s'), r)) for name, r in results.items()}))
+        return
+    print(f'{n} rows per table')
+    print(f'{"factory":<12}{"series rows/s":>16}{"batch rows/s":>16}{"speedup":>10}')
+    for name, (series, batched) in results.items():
+        print(f'{name:<12}{n / series:>16.0f}{n / batched:>16.0f}{series / batched:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
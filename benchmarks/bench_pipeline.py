@@ -0,0 +1,145 @@
+"""
+Measure the time and the peak memory of each stage of `CdaTableImporter.get_ga4gh_phenopackets`
+on synthetic cohorts of 1k to 1M subjects, without network.
+
+The CDA tables and the GDC stage mapping are replayed from a cassette and the variants are read from a MAF file,
+both written by `synthetic_cda.py` into `--data-dir/<scale>` (generated if missing).
+The stages are:
+
+    - fetch: the replay of the CDA tables,
+    - individuals: the conversion of the subject table,
+    - diseases, variants, biosamples, treatments: the `stages` of `get_ga4gh_phenopackets`,
+    - other: the merges and the bookkeeping in between.
+
+The peak memory is the peak of the Python allocations (`tracemalloc`) above the memory at the start of the stage,
+tracing slows the run down, use `--no-memory` for the timings only.
+
+Usage:
+    python benchmarks/bench_pipeline.py --scale 1k 10k --data-dir synthetic
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import time
+import tracemalloc
+import typing
+
+from synthetic_cda import SCALES, SYNTHETIC_COHORT, SYNTHETIC_QUERY, generate_tables, write_synthetic_data
+from oncopacket.cda import Cassette, configure_cda_table_importer
+
+STAGES = ('diseases', 'variants', 'biosamples', 'treatments')
+
+
+class StageProfiler:
+    """
+    Accumulate the time and the peak memory of the wrapped methods by stage.
+    The wrapped methods must not call each other.
+    """
+
+    def __init__(self, trace_memory: bool):
+        self._trace_memory = trace_memory
+        self.seconds: typing.Dict[str, float] = {}
+        self.peaks: typing.Dict[str, int] = {}
+        self.max_traced = 0
+
+    def wrap(self, obj, name: str, stage: str):
+        method = getattr(obj, name)
+
+        def wrapper(*args, **kwargs):
+            if self._trace_memory:
+                self.max_traced = max(self.max_traced, tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+                start_memory = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.seconds[stage] = self.seconds.get(stage, 0.) + time.perf_counter() - start
+                if self._trace_memory:
+                    peak = tracemalloc.get_traced_memory()[1]
+                    self.max_traced = max(self.max_traced, peak)
+                    self.peaks[stage] = max(self.peaks.get(stage, 0), peak - start_memory)
+
+        # The instance attribute shadows the method of the class.
+        setattr(obj, name, wrapper)
+
+
+def run(data_dir: str, stages: typing.Sequence[str], trace_memory: bool, latency: float) -> typing.Dict[str, typing.Any]:
+    importer = configure_cda_table_importer(cache_dir=data_dir, use_cache=False,
+                                            maf_paths=[os.path.join(data_dir, 'maf')],
+                                            cassette=Cassette(os.path.join(data_dir, 'cassette'), latency=latency))
+    profiler = StageProfiler(trace_memory)
+    for name in ('get_subject_df', 'get_researchsubject_df', 'get_diagnosis_df', 'get_specimen_df',
+                 'get_treatment_df'):
+        profiler.wrap(importer, name, 'fetch')
+    profiler.wrap(importer._individual_factory, 'to_ga4gh_batch', 'individuals')
+    for name, stage in (('_add_diseases', 'diseases'), ('_add_variants', 'variants'),
+                        ('_add_biosamples', 'biosamples'), ('_add_medical_actions', 'treatments')):
+        profiler.wrap(importer, name, stage)
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    # The importer reports its progress, which is not of interest here.
+    with contextlib.redirect_stdout(io.StringIO()):
+        phenopackets = importer.get_ga4gh_phenopackets(SYNTHETIC_QUERY, cohort_name=SYNTHETIC_COHORT, stages=stages)
+    total = time.perf_counter() - start
+    if trace_memory:
+        profiler.max_traced = max(profiler.max_traced, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    seconds = dict(profiler.seconds, other=total - sum(profiler.seconds.values()), total=total)
+    return {
+        'n_phenopackets': len(phenopackets),
+        'seconds': seconds,
+        'peak_mb': {stage: peak / 2 ** 20 for stage, peak in profiler.peaks.items()},
+        'max_traced_mb': profiler.max_traced / 2 ** 20 if trace_memory else None,
+        'n_issues': len(importer.get_diagnostics()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', nargs='+', choices=SCALES, default=['1k', '10k'])
+    parser.add_argument('--data-dir', default='synthetic',
+                        help='the directory with the synthetic data of each scale (default: %(default)s)')
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help='the comma-separated stages to run (default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=0., help='the delay of each replayed call in seconds')
+    parser.add_argument('--no-memory', action='store_true', help='do not trace the memory')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+    stages = tuple(s.strip() for s in args.stages.split(',') if s.strip())
+
+    results = {}
+    for scale in args.scale:
+        data_dir = os.path.abspath(os.path.join(args.data_dir, scale))
+        if not os.path.isdir(os.path.join(data_dir, 'cassette')):
+            print(f'Generating {scale} subjects into {data_dir}')
+            write_synthetic_data(generate_tables(SCALES[scale], seed=args.seed), data_dir)
+        results[scale] = run(data_dir, stages, not args.no_memory, args.latency)
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    rows = ('fetch', 'individuals') + tuple(s for s in STAGES if s in stages) + ('other', 'total')
+    for scale, result in results.items():
+        print(f'\n{scale}: {result["n_phenopackets"]} phenopackets, {result["n_issues"]} conversion issues')
+        print(f'{"stage":<14}{"seconds":>10}{"peak MB":>10}{"subjects/s":>12}')
+        for stage in rows:
+            seconds = result['seconds'].get(stage, 0.)
+            peak = result['peak_mb'].get(stage)
+            peak = '-' if peak is None else f'{peak:.1f}'
+            rate = f'{result["n_phenopackets"] / seconds:.0f}' if seconds > 0 else '-'
+            print(f'{stage:<14}{seconds:>10.2f}{peak:>10}{rate:>12}')
+        if result['max_traced_mb'] is not None:
+            print(f'max traced {result["max_traced_mb"]:.0f} MB')
+    print(f'\nmax RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10:.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""
+Measure the throughput (rows per second) and the allocations (the `tracemalloc` peak) of the factories
+and the mappers, row by row and in batch, on fixed synthetic tables (see `synthetic_cda.py`), without network.
+
+The same cases run from pytest with small tables, see `test_microbench.py`:
+
+    python -m pytest benchmarks/test_microbench.py
+
+Save the results of a run with `--json` and compare a later run with `--baseline`:
+
+    python benchmarks/microbench.py --json before.json
+    python benchmarks/microbench.py --baseline before.json
+
+Usage:
+    python benchmarks/microbench.py --n-subjects 2000 --repeat 5 [--component disease]
+"""
+import argparse
+import functools
+import json
+import math
+import os
+import time
+import tracemalloc
+import typing
+
+import pandas as pd
+
+from synthetic_cda import TEST_DATA_DIR, generate_tables
+from oncopacket.cda import (CdaBiosampleFactory, CdaDiseaseFactory, CdaIndividualFactory, CdaMutationFactory,
+                            make_cda_medicalaction, make_cda_medicalactions)
+from oncopacket.cda.cda_medicalaction_factory import default_treatment_mappings
+from oncopacket.cda.mapper import OpDiagnosisMapper, OpICDOMapper, OpRuleTableMapper
+from oncopacket.cda.mapper.op_cause_of_death_mapper import OpCauseOfDeathMapper
+from oncopacket.cda.mapper.op_diagnosis_mapper import read_tissue_mapping_tables
+from oncopacket.cda.mapper.op_disease_stage_mapper import OpDiseaseStageMapper
+from oncopacket.cda.mapper.op_icdo_mapper import load_icdo_to_ncit_tsv
+from oncopacket.cda.mapper.op_uberon_mapper import OpUberonMapper
+
+MODES = ('row', 'batch')
+
+
+class Case(typing.NamedTuple):
+    """
+    A component in a mode. `prepare` gets the table and does the setup, e.g. creates the factory
+    and extracts the rows, and returns the function to measure.
+    """
+    component: str
+    mode: str
+    table: str
+    prepare: typing.Callable[[pd.DataFrame], typing.Callable[[], typing.Any]]
+
+    @property
+    def name(self) -> str:
+        return f'{self.component}-{self.mode}'
+
+
+class Measurement(typing.NamedTuple):
+    component: str
+    mode: str
+    n_rows: int
+    seconds: float
+    peak_kib: typing.Optional[float]
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.n_rows / self.seconds if self.seconds > 0 else math.inf
+
+
+def make_tables(n_subjects: int, seed: int = 42) -> typing.Dict[str, pd.DataFrame]:
+    """
+    Make the fixed tables: the synthetic CDA tables and the `merged` subject, researchsubject, and diagnosis table
+    used by the disease factory.
+    """
+    tables = generate_tables(n_subjects, seed=seed, variants_per_subject=3.)
+    tables['merged'] = tables['subject'] \
+        .merge(tables['researchsubject'], on='subject_id', how='outer') \
+        .merge(tables['diagnosis'], on='subject_id', how='outer')
+    return tables
+
+
+def _rows(df: pd.DataFrame) -> typing.List[pd.Series]:
+    # The per-row mode gets the rows as `pd.Series`, like the callers iterating over `df.iterrows()`.
+    return [row for _, row in df.iterrows()]
+
+
+@functools.lru_cache(maxsize=None)
+def _diagnosis_mapper() -> OpDiagnosisMapper:
+    return OpDiagnosisMapper.multitissue_mapper()
+
+
+@functools.lru_cache(maxsize=None)
+def _rule_table_mapper() -> OpRuleTableMapper:
+    rules = read_tissue_mapping_tables().drop(columns=['tissue'])
+    return OpRuleTableMapper.from_dataframe(rules, id_column='ncit_id', label_column='ncit_label')
+
+
+@functools.lru_cache(maxsize=None)
+def _icdo_mapper() -> OpICDOMapper:
+    return OpICDOMapper(load_icdo_to_ncit_tsv(os.path.join(TEST_DATA_DIR, 'icdo_to_ncit_excerpt.tsv')))
+
+
+def _factory_cases(component: str, table: str, make_factory) -> typing.List[Case]:
+    def per_row(df):
+        factory, rows = make_factory(), _rows(df)
+        return lambda: [factory.to_ga4gh(row) for row in rows]
+
+    def batch(df):
+        factory = make_factory()
+        return lambda: factory.to_ga4gh_batch(df)
+
+    return [Case(component, 'row', table, per_row), Case(component, 'batch', table, batch)]
+
+
+def _mapper_cases(component: str, table: str, get_mapper, batch: bool = False) -> typing.List[Case]:
+    def per_row(df):
+        mapper, rows = get_mapper(), _rows(df)
+        return lambda: [mapper.get_term(row) for row in rows]
+
+    def in_batch(df):
+        mapper = get_mapper()
+        return lambda: mapper.get_terms(df).tolist()
+
+    cases = [Case(component, 'row', table, per_row)]
+    if batch:
+        cases.append(Case(component, 'batch', table, in_batch))
+    return cases
+
+
+def _stage_mapper_case() -> Case:
+    # The stage mapper gets the stage value instead of the row.
+    def per_row(df):
+        mapper, stages = OpDiseaseStageMapper(), df['stage'].tolist()
+        return lambda: [mapper.get_term(stage) for stage in stages]
+
+    return Case('OpDiseaseStageMapper', 'row', 'diagnosis', per_row)
+
+
+def _medicalaction_cases() -> typing.List[Case]:
+    def per_row(df):
+        mappings, rows = default_treatment_mappings(), _rows(df)
+        return lambda: [make_cda_medicalaction(row, mappings) for row in rows]
+
+    def batch(df):
+        mappings = default_treatment_mappings()
+        return lambda: make_cda_medicalactions(df, mappings)
+
+    return [Case('make_cda_medicalaction', 'row', 'treatment', per_row),
+            Case('make_cda_medicalaction', 'batch', 'treatment', batch)]
+
+
+CASES: typing.Sequence[Case] = (
+    _factory_cases('CdaIndividualFactory', 'subject', CdaIndividualFactory)
+    + _factory_cases('CdaDiseaseFactory', 'merged', lambda: CdaDiseaseFactory(_diagnosis_mapper()))
+    + _factory_cases('CdaBiosampleFactory', 'specimen', CdaBiosampleFactory)
+    # A new factory per run, hence the variant cache starts empty.
+    + _factory_cases('CdaMutationFactory', 'mutation', CdaMutationFactory)
+    + _medicalaction_cases()
+    + _mapper_cases('OpDiagnosisMapper', 'merged', _diagnosis_mapper)
+    + _mapper_cases('OpUberonMapper', 'merged', OpUberonMapper)
+    + _mapper_cases('OpCauseOfDeathMapper', 'subject', OpCauseOfDeathMapper)
+    + _mapper_cases('OpICDOMapper', 'diagnosis', _icdo_mapper, batch=True)
+    + _mapper_cases('OpRuleTableMapper', 'merged', _rule_table_mapper, batch=True)
+    + [_stage_mapper_case()]
+)
+
+
+def measure(case: Case, tables: typing.Mapping[str, pd.DataFrame], repeat: int = 3,
+            trace_memory: bool = True) -> Measurement:
+    """
+    Measure the best time of `repeat` runs, and the allocation peak of an extra run if `trace_memory`.
+    Each run is prepared anew, e.g. with a new factory.
+    """
+    df = tables[case.table]
+    best = math.inf
+    for _ in range(repeat):
+        run = case.prepare(df)
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+
+    peak_kib = None
+    if trace_memory:
+        run = case.prepare(df)
+        tracemalloc.start()
+        try:
+            result = run()
+            peak_kib = tracemalloc.get_traced_memory()[1] / 2 ** 10
+        finally:
+            tracemalloc.stop()
+        del result
+    return Measurement(case.component, case.mode, len(df), best, peak_kib)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-subjects', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5, help='the number of runs, the best is reported')
+    parser.add_argument('--component', action='append', default=None,
+                        help='measure only this component, e.g. `CdaDiseaseFactory` (may be repeated)')
+    parser.add_argument('--mode', choices=MODES, default=None, help='measure only this mode')
+    parser.add_argument('--no-memory', action='store_true', help='do not trace the allocations')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', default=None, metavar='PATH', help='save the results as JSON')
+    parser.add_argument('--baseline', default=None, metavar='PATH', help='compare with the results saved by `--json`')
+    args = parser.parse_args()
+
+    cases = [case for case in CASES
+             if (args.component is None or case.component in args.component)
+             and (args.mode is None or case.mode == args.mode)]
+    tables = make_tables(args.n_subjects, seed=args.seed)
+    measurements = [measure(case, tables, repeat=args.repeat, trace_memory=not args.no_memory) for case in cases]
+
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline) as fh:
+            baseline = {(m['component'], m['mode']): m for m in json.load(fh)}
+    print(f'{"component":<26}{"mode":<7}{"rows":>8}{"rows/s":>12}{"peak KiB":>11}{"KiB/1k rows":>13}'
+          + (f'{"speedup":>9}' if baseline else ''))
+    for m in measurements:
+        peak = '-' if m.peak_kib is None else f'{m.peak_kib:.0f}'
+        per_1k = '-' if m.peak_kib is None else f'{1000 * m.peak_kib / m.n_rows:.1f}'
+        line = f'{m.component:<26}{m.mode:<7}{m.n_rows:>8}{m.rows_per_s:>12.0f}{peak:>11}{per_1k:>13}'
+        if baseline:
+            previous = baseline.get((m.component, m.mode))
+            line += f'{previous["seconds"] / m.seconds:>8.2f}x' if previous is not None else f'{"-":>9}'
+        print(line)
+
+    if args.json is not None:
+        with open(args.json, 'w') as fh:
+            json.dump([dict(m._asdict(), rows_per_s=m.rows_per_s) for m in measurements], fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
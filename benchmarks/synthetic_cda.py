@@ -0,0 +1,357 @@
+"""
+Generate synthetic CDA tables (subject, researchsubject, diagnosis, specimen, treatment) and GDC mutations
+at the scale of the production cohorts, and store them as a replayable cassette and a MAF file.
+
+The values are drawn from the fixtures in `tests/data` and the tables bundled in `oncopacket.ncit_mapping_files`:
+
+    - the diagnosis combinations, from the tissue-wise NCIT mapping tables and the fixtures,
+    - the race, ethnicity, vital status, grade, morphology and research projects, from the fixtures,
+    - the stages, from the fixtures and the stage labels of `OpDiseaseStageMapper`,
+    - the therapeutic agents and the treatment outcomes, from `cda_treatment_to_ncit.csv`,
+    - the variants, from `tests/data/mutation_excerpt.tsv`, with shifted positions.
+
+The output directory has a `cassette` for `Cassette` (the CDA tables and the GDC stage mapping)
+and a `maf` directory for `MafMutationSource`, see `bench_pipeline.py`.
+`make_phenopacket` makes the phenopackets for measuring the output formats, see `bench_encodings.py`.
+
+Usage:
+    python benchmarks/synthetic_cda.py --scale 10k --out-dir synthetic/10k
+"""
+import argparse
+import glob
+import os
+import time
+import typing
+
+import numpy as np
+import pandas as pd
+import phenopackets as pp
+import requests
+
+from oncopacket.cda import Cassette, CdaMutationFactory, GdcService
+from oncopacket.cda.mapper.op_disease_stage_mapper import STAGE_LABELS
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATA_DIR = os.path.join(REPO_DIR, 'tests', 'data')
+MAPPING_DIR = os.path.join(REPO_DIR, 'src', 'oncopacket', 'ncit_mapping_files')
+
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1M': 1_000_000}
+
+SYNTHETIC_COHORT = 'Synthetic'
+SYNTHETIC_QUERY = {'match_any': ['primary_diagnosis_site = *'], 'data_source': 'GDC'}
+
+# The fixtures with the merged subject, researchsubject, and diagnosis columns.
+_MERGED_FIXTURES = ('merged_diagnosis_researchsubject_tiny.tsv',
+                    'merged_diagnosis_researchsubject_unique_stages_lung_cervix.tsv',
+                    'sub_rsub_diag_df_test.txt')
+_COMBINATION_COLUMNS = ['primary_diagnosis', 'primary_diagnosis_condition', 'primary_diagnosis_site']
+
+
+class ValuePool(typing.NamedTuple):
+    """
+    The values of a column and their frequencies, `None` stands for a missing value.
+    """
+    values: typing.List[typing.Any]
+    weights: np.ndarray
+
+    @staticmethod
+    def of(values: typing.Iterable[typing.Any]) -> 'ValuePool':
+        counts = pd.Series([None if pd.isna(v) else v for v in values], dtype=object).value_counts(dropna=False)
+        return ValuePool([None if pd.isna(v) else v for v in counts.index], counts.to_numpy() / counts.sum())
+
+    def sample(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        values = np.empty(len(self.values), dtype=object)
+        values[:] = self.values
+        return values[rng.choice(len(self.values), size=n, p=self.weights)]
+
+
+class Vocabulary(typing.NamedTuple):
+    diagnoses: pd.DataFrame
+    pools: typing.Mapping[str, ValuePool]
+    agents: typing.List[str]
+    outcomes: typing.List[str]
+    mutations: pd.DataFrame
+
+
+def load_vocabulary() -> Vocabulary:
+    merged = pd.concat([pd.read_csv(os.path.join(TEST_DATA_DIR, name), sep='\t', dtype=str)
+                        for name in _MERGED_FIXTURES], ignore_index=True)
+    mapped = pd.concat([pd.read_csv(path, dtype=str) for path in
+                        sorted(glob.glob(os.path.join(MAPPING_DIR, 'cda_to_ncit_tissue_wise_mappings', '*.csv')))],
+                       ignore_index=True)
+    diagnoses = pd.concat([mapped[_COMBINATION_COLUMNS], merged[_COMBINATION_COLUMNS]], ignore_index=True) \
+        .dropna().drop_duplicates(ignore_index=True)
+
+    pools = {column: ValuePool.of(merged[column])
+             for column in ('race', 'ethnicity', 'vital_status', 'grade', 'morphology', 'method_of_diagnosis',
+                            'member_of_research_project')}
+    # The fixtures are female cohorts (cervix, uterus), hence the sex is balanced here.
+    pools['sex'] = ValuePool(['female', 'male', 'Female', 'Male', None], np.array([.47, .47, .02, .02, .02]))
+    pools['cause_of_death'] = ValuePool(['Cancer Related', 'Not Cancer Related', 'Unknown', None],
+                                        np.array([.5, .15, .15, .2]))
+    # Most CDA diagnoses have no stage, the rest use the fixture values and the known stage labels.
+    staged = merged['stage'].dropna().tolist() + list(STAGE_LABELS)
+    pools['stage'] = ValuePool([None] + sorted(set(staged)),
+                               np.array([.6] + [.4 / len(set(staged))] * len(set(staged))))
+
+    treatments = pd.read_csv(os.path.join(MAPPING_DIR, 'cda_treatment_to_ncit.csv'), dtype=str)
+    # CDA capitalizes the agents, e.g. `Carboplatin`, the mapping is case-insensitive.
+    agents = [v.capitalize() for v in treatments.loc[treatments['cda_column'] == 'therapeutic_agent', 'cda_value']]
+    outcomes = [v.title() for v in treatments.loc[treatments['cda_column'] == 'treatment_outcome', 'cda_value']]
+
+    columns = ['cda_subject_id'] + list(CdaMutationFactory().get_column_names())
+    mutations = pd.read_csv(os.path.join(TEST_DATA_DIR, 'mutation_excerpt.tsv'), sep='\t', usecols=columns,
+                            dtype=str)[columns]
+    return Vocabulary(diagnoses, pools, agents, outcomes, mutations)
+
+
+def _to_int64(values: np.ndarray, missing: np.ndarray) -> pd.Series:
+    return pd.Series(values, dtype='Int64').mask(missing)
+
+
+def make_subject_tables(n: int, rng: np.random.Generator, vocabulary: Vocabulary) -> typing.Dict[str, pd.DataFrame]:
+    """
+    Make the subject, researchsubject, and diagnosis tables, with a research subject and a diagnosis per subject.
+    """
+    pools = vocabulary.pools
+    short_ids = pd.Series(np.arange(n)).map('SYN-{:07d}'.format)
+    subject_ids = 'TCGA.' + short_ids
+    age = rng.integers(7_000, 32_000, size=n)
+    vital_status = pools['vital_status'].sample(rng, n)
+    dead = vital_status == 'Dead'
+    subject = pd.DataFrame({
+        'subject_id': subject_ids,
+        'subject_data_source_id': short_ids,
+        'species': 'Homo sapiens',
+        'sex': pools['sex'].sample(rng, n),
+        'race': pools['race'].sample(rng, n),
+        'ethnicity': pools['ethnicity'].sample(rng, n),
+        'days_to_birth': _to_int64(-age, rng.random(n) < .02),
+        'vital_status': vital_status,
+        'days_to_death': _to_int64(rng.integers(10, 4_000, size=n), ~dead),
+        'cause_of_death': np.where(dead, pools['cause_of_death'].sample(rng, n), None),
+        'subject_data_source': 'GDC',
+    })
+
+    combinations = vocabulary.diagnoses.iloc[rng.integers(0, len(vocabulary.diagnoses), size=n)] \
+        .reset_index(drop=True)
+    projects = pools['member_of_research_project'].sample(rng, n)
+    researchsubject = pd.DataFrame({
+        'researchsubject_id': projects + '.' + short_ids,
+        'member_of_research_project': projects,
+        'primary_diagnosis_condition': combinations['primary_diagnosis_condition'],
+        # CDA reports the sites in lower case since January 2025, see `OpUberonMapper`.
+        'primary_diagnosis_site': combinations['primary_diagnosis_site'].str.lower(),
+        'subject_id': subject_ids,
+    })
+    diagnosis = pd.DataFrame({
+        'diagnosis_id': researchsubject['researchsubject_id'] + '.' + short_ids + '-DIAG',
+        'primary_diagnosis': combinations['primary_diagnosis'],
+        'age_at_diagnosis': _to_int64(age, rng.random(n) < .05),
+        'morphology': pools['morphology'].sample(rng, n),
+        'stage': pools['stage'].sample(rng, n),
+        'grade': pools['grade'].sample(rng, n),
+        'method_of_diagnosis': pools['method_of_diagnosis'].sample(rng, n),
+        'subject_id': subject_ids,
+    })
+    return {'subject': subject, 'researchsubject': researchsubject, 'diagnosis': diagnosis}
+
+
+def make_specimen_table(researchsubject: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Make the GDC specimen lineage, one to three samples per subject, each with a portion, an analyte,
+    one or two aliquots, and a slide for a third of the portions.
+    """
+    n_samples = 1 + rng.binomial(2, .3, size=len(researchsubject))
+    subject_index = np.repeat(np.arange(len(researchsubject)), n_samples)
+    n = len(subject_index)
+    sample_ids = pd.Series(np.arange(n)).map('SYN-S{:08d}'.format).to_numpy(dtype=object)
+    source_material = np.array(['Primary Tumor', 'Solid Tissue Normal', 'Blood Derived Normal',
+                                'Metastatic'], dtype=object)[rng.choice(4, size=n, p=[.6, .2, .17, .03])]
+
+    levels = [('sample', sample_ids, np.full(n, 'initial specimen', dtype=object), np.arange(n))]
+    portions = sample_ids + '-P'
+    levels.append(('portion', portions, sample_ids, np.arange(n)))
+    with_slide = np.flatnonzero(rng.random(n) < 1 / 3)
+    levels.append(('slide', portions[with_slide] + '-SL', portions[with_slide], with_slide))
+    analytes = portions + '-A'
+    levels.append(('analyte', analytes, portions, np.arange(n)))
+    levels.append(('aliquot', analytes + '-1', analytes, np.arange(n)))
+    with_second = np.flatnonzero(rng.random(n) < .4)
+    levels.append(('aliquot', analytes[with_second] + '-2', analytes[with_second], with_second))
+
+    frames = []
+    for specimen_type, ids, parents, sample_index in levels:
+        rows = subject_index[sample_index]
+        frames.append(pd.DataFrame({
+            'specimen_id': ids,
+            'specimen_associated_project': researchsubject['member_of_research_project'].to_numpy()[rows],
+            'days_to_collection': rng.integers(0, 400, size=len(ids)).astype(float),
+            'primary_disease_type': researchsubject['primary_diagnosis_condition'].to_numpy()[rows],
+            'anatomical_site': researchsubject['primary_diagnosis_site'].to_numpy()[rows],
+            'source_material_type': source_material[sample_index],
+            'specimen_type': specimen_type,
+            'derived_from_specimen': parents,
+            'derived_from_subject': researchsubject['subject_id'].to_numpy()[rows],
+            'subject_id': researchsubject['subject_id'].to_numpy()[rows],
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def make_treatment_table(subject_ids: pd.Series, rng: np.random.Generator, vocabulary: Vocabulary) -> pd.DataFrame:
+    """
+    Make about 1.5 treatments per subject, mostly chemotherapies.
+    """
+    counts = rng.poisson(1.5, size=len(subject_ids))
+    n = int(counts.sum())
+    treatment_type = np.array(['Chemotherapy', 'Radiation Therapy, NOS', 'Surgery', 'Hormone Therapy'],
+                              dtype=object)[rng.choice(4, size=n, p=[.6, .25, .1, .05])]
+    agents = np.array(vocabulary.agents, dtype=object)[rng.integers(0, len(vocabulary.agents), size=n)]
+    return pd.DataFrame({
+        'treatment_id': pd.Series(np.arange(n)).map('SYN-T{:08d}'.format),
+        'treatment_type': treatment_type,
+        'therapeutic_agent': np.where(treatment_type == 'Chemotherapy', agents, None),
+        'treatment_outcome': np.array(vocabulary.outcomes + [None], dtype=object)[
+            rng.integers(0, len(vocabulary.outcomes) + 1, size=n)],
+        'days_to_treatment_start': rng.integers(0, 1_000, size=n).astype(float),
+        'subject_id': np.repeat(subject_ids.to_numpy(dtype=object), counts),
+    })
+
+
+def make_mutation_table(subject_ids: pd.Series, rng: np.random.Generator, vocabulary: Vocabulary,
+                        variants_per_subject: float) -> pd.DataFrame:
+    """
+    Make the MAF rows, about `variants_per_subject` per subject and a fourth of the variants recurrent.
+    """
+    counts = rng.poisson(variants_per_subject, size=len(subject_ids))
+    n = int(counts.sum())
+    templates = vocabulary.mutations
+    variant = rng.integers(0, max(1, 3 * n // 4), size=n)
+    mutations = templates.iloc[variant % len(templates)].reset_index(drop=True)
+    offset = 101 * (variant // len(templates))
+    mutations['Start_Position'] = mutations['Start_Position'].astype(np.int64).to_numpy() + offset
+    mutations['End_Position'] = mutations['End_Position'].astype(np.int64).to_numpy() + offset
+    mutations['cda_subject_id'] = np.repeat(subject_ids.to_numpy(dtype=object), counts)
+    return mutations
+
+
+def generate_tables(n_subjects: int, seed: int = 42,
+                    variants_per_subject: float = 5.,
+                    vocabulary: typing.Optional[Vocabulary] = None) -> typing.Dict[str, pd.DataFrame]:
+    """
+    Generate the synthetic CDA tables and the mutations of `n_subjects` subjects.
+
+    :returns: the `subject`, `researchsubject`, `diagnosis`, `specimen`, `treatment`, and `mutation` tables.
+    """
+    vocabulary = load_vocabulary() if vocabulary is None else vocabulary
+    rng = np.random.default_rng(seed)
+    tables = make_subject_tables(n_subjects, rng, vocabulary)
+    subject_ids = tables['subject']['subject_id']
+    tables['specimen'] = make_specimen_table(tables['researchsubject'], rng)
+    tables['treatment'] = make_treatment_table(subject_ids, rng, vocabulary)
+    tables['mutation'] = make_mutation_table(subject_ids, rng, vocabulary, variants_per_subject)
+    return tables
+
+
+def make_phenopacket(i: int, n_variants: int) -> pp.Phenopacket:
+    """
+    Make the `i`-th synthetic phenopacket with `n_variants` variants, for measuring the output formats.
+    """
+    phenopacket = pp.Phenopacket(id=f'BENCH-{i:06d}')
+    phenopacket.subject.id = f'TCGA.BENCH-{i:06d}'
+    phenopacket.subject.sex = pp.Sex.FEMALE if i % 2 else pp.Sex.MALE
+    phenopacket.subject.time_at_last_encounter.age.iso8601duration = f'P{40 + i % 40}Y'
+    disease = phenopacket.diseases.add()
+    disease.term.id = 'NCIT:C3512'
+    disease.term.label = 'Lung Adenocarcinoma'
+    disease.primary_site.id = 'UBERON:0002048'
+    disease.primary_site.label = 'lung'
+    genomic_interpretations = phenopacket.interpretations.add(id=f'BENCH-{i:06d}').diagnosis.genomic_interpretations
+    for j in range(n_variants):
+        vd = genomic_interpretations.add(subject_or_biosample_id=phenopacket.subject.id) \
+            .variant_interpretation.variation_descriptor
+        vd.id = f'{i:06d}-{j:04d}'
+        vd.gene_context.value_id = f'HGNC:{1000 + j}'
+        vd.gene_context.symbol = f'GENE{j}'
+        vd.expressions.add(syntax='hgvs.c', value=f'ENST{j:011d}.1:c.{100 + j}G>A')
+        vd.expressions.add(syntax='hgvs.p', value=f'ENSP{j:011d}.1:p.G{30 + j}D')
+        vd.vcf_record.genome_assembly = 'GRCh38'
+        vd.vcf_record.chrom = f'chr{1 + j % 22}'
+        vd.vcf_record.pos = 1_000_000 + 37 * j
+        vd.vcf_record.ref = 'G'
+        vd.vcf_record.alt = 'A'
+        vd.molecule_context = pp.MoleculeContext.genomic
+    return phenopacket
+
+
+def cda_table_requests(query: typing.Mapping[str, typing.Any]) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+    # Keep in sync with the `fetch_rows` calls of `CdaTableImporter.get_<table>_df`.
+    return {
+        'subject': dict(table='subject', **query, provenance=True),
+        'researchsubject': dict(table='researchsubject', **query, add_columns=['subject_id']),
+        'diagnosis': dict(table='diagnosis', **query, add_columns=['subject_id']),
+        'specimen': dict(table='specimen', **query, add_columns=['subject_id']),
+        'treatment': dict(table='treatment', **query, add_columns=['subject_id']),
+    }
+
+
+class _StageServer:
+    """
+    Answer the GDC `cases` request of :func:`GdcService.fetch_stage_dict` with the stages of the diagnosis table.
+    """
+
+    def __init__(self, diagnosis: pd.DataFrame):
+        staged = diagnosis[diagnosis['stage'].notna()]
+        tsv = pd.DataFrame({
+            'diagnoses.0.ajcc_pathologic_stage': staged['stage'].to_numpy(),
+            'diagnoses.1.ajcc_pathologic_stage': None,
+            'diagnoses.2.ajcc_pathologic_stage': None,
+            'id': staged['diagnosis_id'].to_numpy(),
+            'submitter_id': staged['subject_id'].str.replace(r'^[^.]+\.', '', regex=True).to_numpy(),
+        }).to_csv(sep='\t', index=False)
+        self._content = tsv.encode('utf-8')
+
+    def request(self, method, url, **kwargs) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = url
+        response.encoding = 'utf-8'
+        response.headers['Content-Type'] = 'text/tab-separated-values'
+        response._content = self._content
+        return response
+
+
+def write_synthetic_data(tables: typing.Mapping[str, pd.DataFrame], out_dir: str,
+                         query: typing.Mapping[str, typing.Any] = SYNTHETIC_QUERY):
+    """
+    Record the CDA tables and the GDC stage mapping into `out_dir/cassette` and write the mutations
+    into `out_dir/maf/synthetic.maf`.
+    """
+    cassette = Cassette(os.path.join(out_dir, 'cassette'), mode='record', session=_StageServer(tables['diagnosis']))
+    for name, kwargs in cda_table_requests(query).items():
+        cassette.fetch_rows(lambda **_: tables[name], **kwargs)
+    GdcService(session=cassette).fetch_stage_dict()
+
+    maf_dir = os.path.join(out_dir, 'maf')
+    os.makedirs(maf_dir, exist_ok=True)
+    tables['mutation'].to_csv(os.path.join(maf_dir, 'synthetic.maf'), sep='\t', index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=SCALES, default='1k', help='the number of subjects (default: %(default)s)')
+    parser.add_argument('--out-dir', required=True, help='the directory for the cassette and the MAF file')
+    parser.add_argument('--variants-per-subject', type=float, default=5.)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    tables = generate_tables(SCALES[args.scale], seed=args.seed, variants_per_subject=args.variants_per_subject)
+    write_synthetic_data(tables, args.out_dir)
+    sizes = ', '.join(f'{len(df)} {name}' for name, df in tables.items())
+    print(f'Wrote {sizes} rows to {args.out_dir} in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
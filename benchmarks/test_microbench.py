@@ -0,0 +1,41 @@
+import pytest
+import requests
+
+from microbench import CASES, Case, make_tables, measure
+
+# Small tables, the runs check that the cases work, use `microbench.py` for the measurements.
+N_SUBJECTS = 100
+
+
+@pytest.fixture(scope='module')
+def tables():
+    return make_tables(N_SUBJECTS)
+
+
+@pytest.fixture(autouse=True)
+def no_network(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('The microbenchmarks must not use the network')
+
+    monkeypatch.setattr(requests.sessions.Session, 'request', fail)
+
+
+@pytest.mark.parametrize('case', CASES, ids=[case.name for case in CASES])
+def test_microbenchmark(case: Case, tables, record_property):
+    measurement = measure(case, tables, repeat=1)
+
+    record_property('rows_per_s', round(measurement.rows_per_s))
+    record_property('peak_kib', round(measurement.peak_kib))
+    assert measurement.n_rows == len(tables[case.table]) > 0
+    assert measurement.peak_kib > 0
+
+
+BATCHED = sorted({case.component for case in CASES if case.mode == 'batch'})
+
+
+@pytest.mark.parametrize('component', BATCHED)
+def test_modes_do_the_same_work(component: str, tables):
+    row, batch = (next(c for c in CASES if c.component == component and c.mode == mode) for mode in ('row', 'batch'))
+    df = tables[row.table]
+
+    assert list(batch.prepare(df)()) == list(row.prepare(df)())
@@ -1,13 +1,26 @@
 """
 oncoexporter is a library for transforming National Cancer Institute (NCI) data into phenopackets.
 """
+import typing
+
+from ._lazy import attach_lazy_loader
 
 __version__ = '0.0.4'
 
-from .cda.cda_individual_factory import CdaIndividualFactory
-from .cda.cda_biosample_factory import CdaBiosampleFactory
+if typing.TYPE_CHECKING:
+    from .cda.cda_individual_factory import CdaIndividualFactory
+    from .cda.cda_biosample_factory import CdaBiosampleFactory
+
+# The factories pull in pandas, phenopackets, and protobuf, so we only import them on first access.
+__getattr__, __dir__ = attach_lazy_loader(
+    __name__,
+    {
+        'CdaIndividualFactory': '.cda.cda_individual_factory',
+        'CdaBiosampleFactory': '.cda.cda_biosample_factory',
+    },
+    submodules=('cda', 'cohort', 'export', 'model'),
+)
 
 __all__ = [
     'CdaIndividualFactory'
 ]
-
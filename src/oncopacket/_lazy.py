@@ -0,0 +1,48 @@
+"""
+Module-level lazy loading of the public API (PEP 562).
+
+The package `__init__` modules declare *what* they export and *where* it lives,
+and the heavy imports (pandas, phenopackets/protobuf, cdapython, ...) are deferred
+until the first access of the exported name.
+"""
+import importlib
+import sys
+import typing
+
+
+def attach_lazy_loader(
+        package_name: str,
+        exports: typing.Mapping[str, str],
+        submodules: typing.Iterable[str] = (),
+) -> typing.Tuple[typing.Callable[[str], typing.Any], typing.Callable[[], typing.List[str]]]:
+    """
+    Create the module-level `__getattr__` and `__dir__` functions for a package.
+
+    The value of an exported name is cached in the package namespace after the first access,
+    hence the subsequent lookups do not go through `__getattr__` anymore.
+
+    :param package_name: the name of the package, usually `__name__`.
+    :param exports: a mapping from an exported name to the relative name of the module that defines it,
+      e.g. `{'CdaFactory': '.cda_factory'}`.
+    :param submodules: names of the subpackages/submodules that should be importable through attribute access,
+      e.g. `oncopacket.cda` after `import oncopacket`.
+    :returns: a tuple with the `__getattr__` and `__dir__` functions.
+    """
+    exports = dict(exports)
+    submodules = frozenset(submodules)
+
+    def __getattr__(name: str) -> typing.Any:
+        if name in exports:
+            module = importlib.import_module(exports[name], package_name)
+            value = getattr(module, name)
+        elif name in submodules:
+            value = importlib.import_module(f'.{name}', package_name)
+        else:
+            raise AttributeError(f'module {package_name!r} has no attribute {name!r}')
+        setattr(sys.modules[package_name], name, value)
+        return value
+
+    def __dir__() -> typing.List[str]:
+        return sorted(set(vars(sys.modules[package_name])).union(exports, submodules))
+
+    return __getattr__, __dir__
@@ -1,16 +1,55 @@
-from ._configure import configure_cda_table_importer
-from .cda_biosample_factory import CdaBiosampleFactory
-from .cda_disease_factory import CdaDiseaseFactory
-from .cda_factory import CdaFactory
-from .cda_individual_factory import CdaIndividualFactory
-from .cda_mutation_factory import CdaMutationFactory
-from .cda_table_importer import CdaTableImporter
-from .cda_medicalaction_factory import make_cda_medicalaction
-from ._gdc import GdcService
+import typing
+
+from .._lazy import attach_lazy_loader
+
+if typing.TYPE_CHECKING:
+    from ._configure import configure_cda_table_importer
+    from .cassette import Cassette
+    from .cda_biosample_factory import CdaBiosampleFactory
+    from .cda_disease_factory import CdaDiseaseFactory
+    from .cda_factory import CdaFactory
+    from .cda_individual_factory import CdaIndividualFactory
+    from .cda_mutation_factory import CdaMutationFactory
+    from .cda_resources import CdaResource, CdaResourceManager
+    from .cda_variant_cache import VariantDescriptorCache
+    from .diagnosis_catalog import cached_diagnosis_combinations, diagnosis_combinations
+    from .diagnostics import Diagnostics
+    from .cda_table_importer import CdaTableImporter
+    from .cda_medicalaction_factory import make_cda_medicalaction, make_cda_medicalactions
+    from ._gdc import GdcService
+    from ._maf import MafMutationSource
+
+# `CdaTableImporter` imports cdapython and tqdm, and the factories import pandas and phenopackets.
+# We defer the imports until the first access to keep `import oncopacket.cda` cheap.
+__getattr__, __dir__ = attach_lazy_loader(
+    __name__,
+    {
+        'configure_cda_table_importer': '._configure',
+        'Cassette': '.cassette',
+        'CdaBiosampleFactory': '.cda_biosample_factory',
+        'CdaDiseaseFactory': '.cda_disease_factory',
+        'CdaFactory': '.cda_factory',
+        'CdaIndividualFactory': '.cda_individual_factory',
+        'CdaMutationFactory': '.cda_mutation_factory',
+        'CdaResource': '.cda_resources',
+        'CdaResourceManager': '.cda_resources',
+        'VariantDescriptorCache': '.cda_variant_cache',
+        'cached_diagnosis_combinations': '.diagnosis_catalog',
+        'diagnosis_combinations': '.diagnosis_catalog',
+        'Diagnostics': '.diagnostics',
+        'CdaTableImporter': '.cda_table_importer',
+        'make_cda_medicalaction': '.cda_medicalaction_factory',
+        'make_cda_medicalactions': '.cda_medicalaction_factory',
+        'GdcService': '._gdc',
+        'MafMutationSource': '._maf',
+    },
+    submodules=('mapper',),
+)
 
 __all__ = [
     "CdaFactory",
     "CdaDiseaseFactory", "CdaIndividualFactory", "CdaBiosampleFactory", "CdaMutationFactory",
-    "CdaTableImporter", "make_cda_medicalaction", "configure_cda_table_importer",
-    'GdcService',
+    "CdaTableImporter", "make_cda_medicalaction", "make_cda_medicalactions", "configure_cda_table_importer",
+    'GdcService', 'MafMutationSource', 'CdaResource', 'CdaResourceManager', 'VariantDescriptorCache',
+    'diagnosis_combinations', 'cached_diagnosis_combinations', 'Diagnostics', 'Cassette',
 ]
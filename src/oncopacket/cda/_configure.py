@@ -1,18 +1,38 @@
 import typing
 
+from ._maf import MafMutationSource
+from .cassette import Cassette
 from .cda_table_importer import CdaTableImporter
 from .cda_disease_factory import CdaDiseaseFactory
+from .diagnostics import Diagnostics
 from .mapper import OpDiagnosisMapper
 
 
 def configure_cda_table_importer(
         cache_dir: typing.Optional[str] = None,
-        use_cache: bool = False
+        use_cache: bool = False,
         #page_size: int = 10000,
+        maf_paths: typing.Optional[typing.Union[str, typing.Iterable[str]]] = None,
+        collapse_specimen_levels: typing.Iterable[str] = (),
+        cassette: typing.Optional[Cassette] = None,
 ) -> CdaTableImporter:
-    disease_stage_mapper = OpDiagnosisMapper.multitissue_mapper()
-    disease_factory = CdaDiseaseFactory(disease_stage_mapper)
+    """
+    Configure the importer with the default mappers.
+
+    :param maf_paths: path(s) to MAF files or directories with MAF files to read the variants from.
+      The variants are fetched from the GDC API if `None`.
+    :param collapse_specimen_levels: the specimen levels to leave out of the biosamples, e.g. `('aliquot', 'portion')`.
+    :param cassette: the :class:`Cassette` to record or replay the CDA and GDC calls.
+    """
+    # A single collector for the conversion issues of all components, see `CdaTableImporter.get_diagnostics`.
+    diagnostics = Diagnostics()
+    disease_stage_mapper = OpDiagnosisMapper.multitissue_mapper(diagnostics=diagnostics)
+    disease_factory = CdaDiseaseFactory(disease_stage_mapper, diagnostics=diagnostics)
+    mutation_source = None if maf_paths is None else MafMutationSource(maf_paths, diagnostics=diagnostics)
     return CdaTableImporter(disease_factory,
                             cache_dir=cache_dir,
-                            use_cache=use_cache)
+                            use_cache=use_cache,
+                            mutation_source=mutation_source,
+                            collapse_specimen_levels=collapse_specimen_levels,
+                            cassette=cassette)
                             #page_size=page_size)
@@ -1,15 +1,22 @@
 import json
 import logging
 import os
-import tempfile
 import typing
-import urllib
+import urllib.parse
 
 import pandas as pd
 import phenopackets as pp
 import requests
 from io import StringIO
 
+from .cda_resources import CdaResource, CdaResourceManager, default_resource_manager
+from .cda_variant_cache import VariantDescriptorCache
+
+
+def _read_tx_to_prot(path: str) -> typing.Mapping[str, str]:
+    tx2prot = pd.read_csv(path, sep='\t', usecols=['transcript_stable_id', 'protein_stable_id'])
+    return dict(zip(tx2prot.transcript_stable_id, tx2prot.protein_stable_id))
+
 
 class GdcService:
     """
@@ -20,6 +27,14 @@ class GdcService:
         stage
 
     Changed the name from GdcMutationService since we are using it to get things in addition to variants
+
+    The Ensembl transcript to protein table (`transcript_to_protein_url`) is downloaded into the cache
+    of the `resources` manager when the first variant is mapped.
+
+    The descriptors of the recurrent variants are built once, see :class:`VariantDescriptorCache`.
+
+    The requests are sent with the `session`, e.g. a :class:`requests.Session`, or a :class:`Cassette`
+    to record or replay the responses. The :mod:`requests` functions are used if `None`.
     """
 
     def __init__(
@@ -27,7 +42,10 @@ class GdcService:
             page_size=100,
             page=1,
             timeout=30,
-            transcript_to_protein_url='https://ftp.ensembl.org/pub/current_tsv/homo_sapiens/Homo_sapiens.GRCh38.114.ena.tsv.gz'
+            transcript_to_protein_url='https://ftp.ensembl.org/pub/current_tsv/homo_sapiens/Homo_sapiens.GRCh38.114.ena.tsv.gz',
+            resources: typing.Optional[CdaResourceManager] = None,
+            variant_cache: typing.Optional[VariantDescriptorCache] = None,
+            session: typing.Optional[typing.Any] = None,
     ):
         self._logger = logging.getLogger(__name__)
         self._variants_url = 'https://api.gdc.cancer.gov/ssms'
@@ -36,6 +54,7 @@ class GdcService:
         self._page_size = page_size
         self._page = page
         self._timeout = timeout
+        self._session = requests if session is None else session
         self._variant_fields = ','.join((
             # "mutation_type",
             # "mutation_subtype",
@@ -58,26 +77,37 @@ class GdcService:
             "diagnoses.ajcc_pathologic_stage",
         ))
 
-        # Use a temporary directory to download the file
-        with tempfile.TemporaryDirectory() as tmpdir:
-            local_transcript_file = os.path.join(tmpdir,
-                                                 'Homo_sapiens.GRCh38.113.ena.tsv.gz')
-
-            self._logger.info(
-                f"Downloading {local_transcript_file} from {transcript_to_protein_url}...")
-            urllib.request.urlretrieve(transcript_to_protein_url,
-                                       local_transcript_file)
-            self._logger.info(f"Downloaded and saved {local_transcript_file}.")
-
-            # Load the Ensembl transcript to protein mappings
-            self._ensembl_tx2prot = pd.read_csv(local_transcript_file, sep="\t")
-            self._tx_to_prot_dict = dict(
-                zip(self._ensembl_tx2prot.transcript_stable_id,
-                    self._ensembl_tx2prot.protein_stable_id))
+        # The Ensembl transcript to protein mappings are only needed to map the variants,
+        # hence we load them lazily, on the first use, from the local cache.
+        self._resources = default_resource_manager() if resources is None else resources
+        self._tx_to_prot_resource = os.path.basename(urllib.parse.urlparse(transcript_to_protein_url).path)
+        if self._tx_to_prot_resource not in self._resources:
+            self._resources.register(CdaResource(self._tx_to_prot_resource, self._tx_to_prot_resource,
+                                                 url=transcript_to_protein_url, parser=_read_tx_to_prot))
+        self._tx_to_prot = None
+        self._variant_cache = VariantDescriptorCache() if variant_cache is None else variant_cache
+
+    @property
+    def _tx_to_prot_dict(self) -> typing.Mapping[str, str]:
+        if self._tx_to_prot is None:
+            self._tx_to_prot = self._resources.get(self._tx_to_prot_resource)
+        return self._tx_to_prot
+
+    def get_variant_cache(self) -> VariantDescriptorCache:
+        return self._variant_cache
+
+    def prefetch(self) -> str:
+        """
+        Download the transcript to protein table into the local cache, if it is not there yet,
+        e.g. before starting several processes that would download the same file.
+
+        :returns: the path to the local copy.
+        """
+        return self._resources.get_path(self._tx_to_prot_resource)
 
     def _fetch_data_from_gdc(self, url: str, subject_id: str, fields: typing.List[str]=None) -> typing.Any:
         params = self._prepare_query_params(subject_id, fields)
-        response = requests.get(url, params=params, timeout=self._timeout)
+        response = self._session.get(url, params=params, timeout=self._timeout)
         #response_b = requests.post(url, headers = {"Content-Type": "application/json"}, json = params)
 
         if response.status_code == 200:
@@ -209,7 +239,7 @@ class GdcService:
              }
 
         # The parameters are passed to 'json' rather than 'params' in this case
-        response = requests.post(self._cases_url, headers = {"Content-Type": "application/json"}, json = params)
+        response = self._session.post(self._cases_url, headers = {"Content-Type": "application/json"}, json = params)
         stage_df = pd.read_csv(StringIO(response.content.decode("utf-8")), sep='\t')
         # this must be altered if including other stages in the fields:
         stage_df.columns = ['ajcc0', 'ajcc1', 'ajcc2','id','submitter_id'] # submitter_id is the subject ID
@@ -225,6 +255,25 @@ class GdcService:
         # TODO: mutation status
         # "gene_aa_change": ["KRAS G12D"]
 
+        # The descriptor of a recurrent variant is built once and copied for the other subjects.
+        variant_key = (
+            mutation['id'], mutation['ncbi_build'], mutation['chromosome'], mutation['start_position'],
+            mutation['reference_allele'], mutation['tumor_allele'],
+            tuple(GdcService._transcript_key(csq) for csq in mutation['consequence']),
+        )
+        prototype = self._variant_cache.get(variant_key, lambda: self._create_variation_descriptor(mutation))
+
+        vi = pp.VariantInterpretation()
+        vi.variation_descriptor.CopyFrom(prototype)
+        return vi
+
+    @staticmethod
+    def _transcript_key(csq) -> tuple:
+        tx = csq['transcript']
+        return (tx['transcript_id'], tx['annotation']['hgvsc'], tx.get('aa_change'),
+                tx['gene']['gene_id'], tx['gene']['symbol'])
+
+    def _create_variation_descriptor(self, mutation) -> pp.VariationDescriptor:
         vd = pp.VariationDescriptor()
         vd.id = mutation['id']
 
@@ -244,10 +293,7 @@ class GdcService:
                 vd.gene_context.CopyFrom(gene_descriptor)
 
         vd.molecule_context = pp.MoleculeContext.genomic
-
-        vi = pp.VariantInterpretation()
-        vi.variation_descriptor.CopyFrom(vd)
-        return vi
+        return vd
 
     def _parse_vcf_record(self, mutation) -> typing.Optional[pp.VcfRecord]:
         if mutation['reference_allele'] == '-' or mutation['tumor_allele'] == '-':
@@ -0,0 +1,234 @@
+import glob
+import gzip
+import os
+import typing
+
+import numpy as np
+import pandas as pd
+import phenopackets as pp
+
+from .cda_mutation_factory import CdaMutationFactory
+from .cda_variant_cache import VariantDescriptorCache
+from .diagnostics import Diagnostics
+
+# The columns with the subject ID, in order of preference.
+# The barcode columns are trimmed to the TCGA participant barcode, e.g. `TCGA-C5-A1MI-01A-11D-A14W-08` -> `TCGA-C5-A1MI`.
+SUBJECT_COLUMNS = ('cda_subject_id', 'case_barcode', 'Tumor_Sample_Barcode', 'Tumor_Aliquot_Barcode')
+BARCODE_COLUMNS = ('Tumor_Sample_Barcode', 'Tumor_Aliquot_Barcode')
+PARTICIPANT_BARCODE_LENGTH = 12
+
+MAF_PATTERNS = ('*.maf', '*.maf.gz', '*.maf.tsv', '*.maf.tsv.gz')
+
+# Positions are parsed as (nullable) integers and the other columns are kept verbatim,
+# so that the dtypes (and the values written to the phenopackets) do not depend on the chunk.
+_INT_COLUMNS = ('Start_Position', 'End_Position')
+# The rows without a valid value in this column are skipped, the VCF record needs the position.
+_POSITION_COLUMN = 'Start_Position'
+
+
+def _open_text(path: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt')
+    return open(path, 'r')
+
+
+def _read_header(path: str) -> typing.Tuple[int, typing.List[str]]:
+    """
+    Get the number of the `#` comment lines at the top of the MAF file (e.g. `#version gdc-1.0.0`)
+    and the column names.
+    """
+    with _open_text(path) as fh:
+        n_comments = 0
+        for line in fh:
+            if line.startswith('#'):
+                n_comments += 1
+            else:
+                return n_comments, line.rstrip('\r\n').split('\t')
+    raise ValueError(f'No header line in MAF file {path}')
+
+
+def _find_maf_files(paths: typing.Iterable[str]) -> typing.List[str]:
+    maf_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = set()
+            for pattern in MAF_PATTERNS:
+                found.update(glob.glob(os.path.join(path, '**', pattern), recursive=True))
+            maf_files.extend(sorted(found))
+        elif os.path.isfile(path):
+            maf_files.append(path)
+        else:
+            raise ValueError(f'MAF file or directory does not exist: {path}')
+    return maf_files
+
+
+class MafMutationSource:
+    """
+    `MafMutationSource` reads the variants from MAF files on a local disk, e.g. from a mirror
+    of the open-access project-level MAF files published by GDC, as an alternative to fetching the variants
+    of each subject from the GDC API with :class:`GdcService`.
+
+    The files are streamed in chunks, and only the columns used by :class:`CdaMutationFactory`
+    and the subject ID columns are parsed. The rows are kept as columns, with the repeated strings
+    (e.g. the genes and the builds) stored as categories, and the row positions of each subject are indexed.
+    The VariantInterpretation messages of a subject are built by :func:`fetch_variants`
+    with :func:`CdaMutationFactory.to_ga4gh_batch`, hence the messages of the other subjects are never held in memory.
+    The subject ID is taken from the first available column of `cda_subject_id` (without the leading data
+    source label, `TCGA.TCGA-C5-A1MI` -> `TCGA-C5-A1MI`), `case_barcode`, or the first 12 characters
+    of `Tumor_Sample_Barcode`/`Tumor_Aliquot_Barcode`.
+
+    The positions are parsed as nullable integers. The rows with a blank or an invalid `Start_Position`
+    are skipped and counted by the `diagnostics` as `invalid_maf_position`.
+
+    The source has the same :func:`fetch_variants` method as :class:`GdcService`. The files are read
+    on the first call, and only once.
+
+    :param paths: a path or paths to MAF files (optionally gzipped) or to directories with MAF files.
+    :param chunksize: the number of rows to read at once.
+    :param subject_ids: read the variants of these subjects only, all subjects are read if `None`.
+    :param mutation_factory: the factory for mapping the MAF rows into VariantInterpretation messages.
+    :param diagnostics: the collector of the skipped rows, a new collector is created if `None`.
+    """
+
+    def __init__(self, paths: typing.Union[str, typing.Iterable[str]],
+                 chunksize: int = 50_000,
+                 subject_ids: typing.Optional[typing.Iterable[str]] = None,
+                 mutation_factory: typing.Optional[CdaMutationFactory] = None,
+                 diagnostics: typing.Optional[Diagnostics] = None):
+        if isinstance(paths, str):
+            paths = (paths,)
+        self._maf_files = _find_maf_files(paths)
+        if chunksize < 1:
+            raise ValueError(f'`chunksize` must be positive but was {chunksize}')
+        self._chunksize = chunksize
+        self._subject_ids = None if subject_ids is None else frozenset(subject_ids)
+        self._mutation_factory = CdaMutationFactory() if mutation_factory is None else mutation_factory
+        self._diagnostics = Diagnostics() if diagnostics is None else diagnostics
+        # The rows of all files and the row positions of each subject, see `_load`.
+        self._rows: typing.Optional[pd.DataFrame] = None
+        self._subject_rows: typing.Optional[typing.Dict[str, np.ndarray]] = None
+
+    def get_maf_files(self) -> typing.Sequence[str]:
+        return self._maf_files
+
+    def get_diagnostics(self) -> Diagnostics:
+        return self._diagnostics
+
+    def get_variant_cache(self) -> VariantDescriptorCache:
+        return self._mutation_factory.get_variant_cache()
+
+    def iter_chunks(self) -> typing.Iterator[pd.DataFrame]:
+        """
+        Stream the MAF files in chunks.
+
+        :returns: an iterator of DataFrames with the mutation columns and the `subject_id` column.
+        """
+        required = self._mutation_factory.get_column_names()
+        for path in self._maf_files:
+            n_comments, header = _read_header(path)
+            missing = set(required).difference(header)
+            if missing:
+                raise ValueError(f'Missing column(s) {sorted(missing)} in MAF file {path}')
+            subject_column = next((c for c in SUBJECT_COLUMNS if c in header), None)
+            if subject_column is None:
+                raise ValueError(f'Could not find a subject ID column {SUBJECT_COLUMNS} in MAF file {path}')
+
+            usecols = list(required) + [subject_column]
+            reader = pd.read_csv(path, sep='\t', skiprows=n_comments, usecols=usecols, dtype=str,
+                                 chunksize=self._chunksize, low_memory=False)
+            with reader:
+                for chunk in reader:
+                    chunk = self._parse_positions(chunk, path)
+                    subject_ids = chunk.pop(subject_column)
+                    if subject_column == 'cda_subject_id':
+                        subject_ids = subject_ids.str.replace(r'^[^.]+\.', '', regex=True)
+                    elif subject_column in BARCODE_COLUMNS:
+                        subject_ids = subject_ids.str.slice(0, PARTICIPANT_BARCODE_LENGTH)
+                    chunk['subject_id'] = subject_ids
+                    if self._subject_ids is not None:
+                        chunk = chunk[chunk['subject_id'].isin(self._subject_ids)]
+                    if len(chunk) > 0:
+                        yield chunk
+
+    def _parse_positions(self, chunk: pd.DataFrame, path: str) -> pd.DataFrame:
+        values = chunk[_POSITION_COLUMN]
+        for column in _INT_COLUMNS:
+            parsed = pd.to_numeric(chunk[column], errors='coerce')
+            # The non-integer numbers, e.g. `12.5`, are invalid too.
+            chunk[column] = parsed.where(parsed == parsed.round()).astype('Int64')
+        invalid = chunk[_POSITION_COLUMN].isna()
+        if invalid.any():
+            for value, n in values[invalid].fillna('').value_counts().items():
+                self._diagnostics.record('invalid_maf_position', value, example=path, n=n)
+            chunk = chunk[~invalid]
+        return chunk
+
+    def _load(self):
+        if self._rows is not None:
+            return
+        chunks = list(self.iter_chunks())
+        if chunks:
+            rows = pd.concat(chunks, ignore_index=True)
+        else:
+            columns = list(self._mutation_factory.get_column_names()) + ['subject_id']
+            rows = pd.DataFrame({column: pd.Series(dtype=object) for column in columns})
+        for column in rows.columns:
+            if column != 'subject_id' and rows[column].dtype == object:
+                rows[column] = rows[column].astype('category')
+        # `groupby(...).indices` gives the row positions of each subject, in the file order.
+        self._subject_rows = rows.groupby('subject_id', sort=False).indices
+        self._rows = rows.drop(columns='subject_id')
+
+    def get_subject_ids(self) -> typing.Sequence[str]:
+        """
+        Get the IDs of the subjects with variants in the MAF files, e.g. `TCGA-C5-A1MI`.
+        """
+        self._load()
+        return tuple(self._subject_rows)
+
+    def get_variants(self) -> typing.Mapping[str, typing.Sequence[pp.VariantInterpretation]]:
+        """
+        Get the variants of all subjects in the MAF files.
+
+        The mapping builds the variants of a subject on access, see :func:`fetch_variants`.
+
+        :returns: a mapping from the subject ID (e.g. `TCGA-C5-A1MI`) to the variants of the subject.
+        """
+        self._load()
+        return _SubjectVariants(self)
+
+    def fetch_variants(self, subject_id: str) -> typing.Sequence[pp.VariantInterpretation]:
+        """
+        Get the variants of a subject.
+
+        :param subject_id: the subject ID without the leading data source label, e.g. `TCGA-C5-A1MI`.
+        :returns: the variants or an empty list if the subject has no variants in the MAF files.
+        """
+        self._load()
+        positions = self._subject_rows.get(subject_id)
+        if positions is None:
+            return []
+        return self._mutation_factory.to_ga4gh_batch(self._rows.iloc[positions])
+
+
+class _SubjectVariants(typing.Mapping[str, typing.Sequence[pp.VariantInterpretation]]):
+    """
+    A read-only mapping from the subject ID to the variants of the subject, built on access.
+    """
+
+    def __init__(self, source: MafMutationSource):
+        self._source = source
+
+    def __getitem__(self, subject_id: str) -> typing.Sequence[pp.VariantInterpretation]:
+        if subject_id not in self._source._subject_rows:
+            raise KeyError(subject_id)
+        return self._source.fetch_variants(subject_id)
+
+    def __contains__(self, subject_id) -> bool:
+        return subject_id in self._source._subject_rows
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self._source._subject_rows)
+
+    def __len__(self) -> int:
+        return len(self._source._subject_rows)
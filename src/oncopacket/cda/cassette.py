@@ -0,0 +1,222 @@
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+import typing
+
+import pandas as pd
+import requests
+
+from .cda_resources import CdaResourceManager
+
+CASSETTE_MODES = ('record', 'replay')
+
+# The fastest compression, the higher levels take seconds for the large tables, and gain little.
+_COMPRESS_LEVEL = 1
+
+# The headers that change the response, e.g. to `304 Not Modified`, hence they are a part of the request key.
+_CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since')
+
+
+def _key(request: typing.Mapping[str, typing.Any]) -> str:
+    # The arguments are serialized with sorted keys, hence the key does not depend on the order of the arguments.
+    payload = json.dumps(request, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def _write_atomic(path: str, data: bytes):
+    # The entries are written into a temporary file first, so that several processes can record
+    # into the same cassette and a reader never sees a partial entry.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class Cassette:
+    """
+    `Cassette` records the CDA table fetches and the GDC HTTP responses into a directory and replays them,
+    to run the pipeline on fixed inputs and without network, e.g. in the benchmarks and in the regression runs.
+
+    Each call is stored under the hash of its arguments, as a JSON file with the request and the timing,
+    and a gzip-compressed payload: the pickled DataFrame for `tables/` and the response body for `http/`.
+
+    ```python
+    cassette = Cassette('cassettes/lung', mode='record')
+    importer = configure_cda_table_importer(cassette=cassette)
+    ```
+
+    The cassette is passed to :class:`CdaTableImporter`, which fetches the CDA tables with :func:`fetch_rows`,
+    and to :class:`GdcService` as the HTTP `session`. The resources downloaded by :class:`GdcService`,
+    i.e. the Ensembl transcript to protein table, are recorded too, see :func:`resource_manager`.
+
+    :param path: the cassette directory, created if it does not exist.
+    :param mode: `record` to perform the calls and store the results, `replay` to return the stored results.
+    :param latency: the seconds to wait before returning a replayed result, to mimic the network,
+      or `recorded` to wait as long as the recorded call took.
+    :param session: the HTTP client for the recording, e.g. a :class:`requests.Session`, :mod:`requests` if `None`.
+    """
+
+    def __init__(self, path: str,
+                 mode: str = 'replay',
+                 latency: typing.Union[float, str] = 0.,
+                 session: typing.Optional[typing.Any] = None):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f'`mode` must be one of {CASSETTE_MODES} but was {mode}')
+        if latency != 'recorded' and (isinstance(latency, str) or latency < 0):
+            raise ValueError(f'`latency` must be a non-negative number of seconds or `recorded` but was {latency}')
+        self._path = path
+        self._mode = mode
+        self._latency = latency
+        self._session = requests if session is None else session
+        for folder in ('tables', 'http'):
+            os.makedirs(os.path.join(path, folder), exist_ok=True)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    def fetch_rows(self, fetch: typing.Callable[..., pd.DataFrame], **kwargs) -> pd.DataFrame:
+        """
+        Fetch a CDA table with `fetch(**kwargs)`, e.g. :func:`cdapython.fetch_rows`, or replay the recorded table.
+
+        :raises ValueError: if the table was not recorded, in the `replay` mode.
+        """
+        request = {'kind': 'table', 'kwargs': kwargs}
+        key = _key(request)
+        payload_path = os.path.join(self._path, 'tables', f'{key}.pkl.gz')
+        if self._mode == 'replay':
+            meta = self._load_meta('tables', key, request)
+            self._wait(meta)
+            with open(payload_path, 'rb') as fh:
+                return pickle.loads(gzip.decompress(fh.read()))
+
+        start = time.perf_counter()
+        df = fetch(**kwargs)
+        elapsed = time.perf_counter() - start
+        # Pickle keeps the dtypes and the missing values, like the DataFrame cache of `CdaTableImporter`.
+        _write_atomic(payload_path, gzip.compress(pickle.dumps(df), compresslevel=_COMPRESS_LEVEL))
+        self._store_meta('tables', key, dict(request, elapsed_s=elapsed, n_rows=len(df)))
+        return df
+
+    def get(self, url: str, params: typing.Optional[typing.Mapping] = None, **kwargs) -> requests.Response:
+        """
+        Perform or replay a GET request, like :func:`requests.get`.
+        """
+        return self.request('GET', url, params=params, **kwargs)
+
+    def post(self, url: str, json: typing.Optional[typing.Any] = None, **kwargs) -> requests.Response:
+        """
+        Perform or replay a POST request, like :func:`requests.post`.
+        """
+        return self.request('POST', url, json=json, **kwargs)
+
+    def request(self, method: str, url: str,
+                params: typing.Optional[typing.Mapping] = None,
+                json: typing.Optional[typing.Any] = None,
+                **kwargs) -> requests.Response:
+        """
+        Perform or replay an HTTP request, like :func:`requests.request`.
+
+        The request is identified by the method, the URL, the query parameters, the JSON body,
+        and the conditional headers (`If-None-Match`, `If-Modified-Since`), hence a conditional request
+        does not replace the recording of the full response. The other arguments, such as the other headers
+        and the timeout, are only used for the recording.
+
+        :raises ValueError: if the request was not recorded, in the `replay` mode.
+        """
+        request = {'kind': 'http', 'method': method.upper(), 'url': url, 'params': params, 'json': json}
+        headers = kwargs.get('headers') or {}
+        conditions = {name: headers[name] for name in _CONDITIONAL_HEADERS if name in headers}
+        if conditions:
+            # Only added if present, to keep the keys of the unconditional requests.
+            request['conditions'] = conditions
+        key = _key(request)
+        body_path = os.path.join(self._path, 'http', f'{key}.body.gz')
+        if self._mode == 'replay':
+            meta = self._load_meta('http', key, request)
+            self._wait(meta)
+            response = requests.Response()
+            response.status_code = meta['status_code']
+            response.reason = meta['reason']
+            response.url = meta['response_url']
+            response.encoding = meta['encoding']
+            response.headers.update(meta['headers'])
+            with open(body_path, 'rb') as fh:
+                response._content = gzip.decompress(fh.read())
+            # There is no connection to read from, e.g. for `iter_content` and `close`.
+            response._content_consumed = True
+            return response
+
+        start = time.perf_counter()
+        response = self._session.request(method, url, params=params, json=json, **kwargs)
+        elapsed = time.perf_counter() - start
+        _write_atomic(body_path, gzip.compress(response.content, compresslevel=_COMPRESS_LEVEL))
+        self._store_meta('http', key, dict(request, elapsed_s=elapsed,
+                                           status_code=response.status_code,
+                                           reason=response.reason,
+                                           response_url=response.url,
+                                           encoding=response.encoding,
+                                           headers={k: v for k, v in response.headers.items()
+                                                    if k.lower() == 'content-type'}))
+        return response
+
+    def resource_manager(self, **kwargs) -> CdaResourceManager:
+        """
+        Get a :class:`CdaResourceManager` that downloads the resources through the cassette,
+        into the `resources` folder of the cassette.
+
+        The folder is only a cache of the recorded downloads, the downloads are replayed if it is deleted.
+
+        :param kwargs: the other arguments of :class:`CdaResourceManager`, e.g. the `resources`.
+        """
+        return CdaResourceManager(local_dir=os.path.join(self._path, 'resources'), session=self, **kwargs)
+
+    def entries(self) -> pd.DataFrame:
+        """
+        Get the recorded calls.
+
+        :returns: a DataFrame with a row per call and the `kind` (`table` or `http`), `key`, `request`,
+          and `elapsed_s` columns.
+        """
+        rows = []
+        for folder in ('tables', 'http'):
+            directory = os.path.join(self._path, folder)
+            for filename in sorted(os.listdir(directory)):
+                if filename.endswith('.json') and not filename.startswith('.'):
+                    with open(os.path.join(directory, filename)) as fh:
+                        meta = json.load(fh)
+                    request = meta['kwargs'] if meta['kind'] == 'table' \
+                        else f'{meta["method"]} {meta["url"]}'
+                    rows.append((meta['kind'], filename[:-len('.json')], request, meta['elapsed_s']))
+        return pd.DataFrame(rows, columns=['kind', 'key', 'request', 'elapsed_s'])
+
+    def _load_meta(self, folder: str, key: str, request: typing.Mapping[str, typing.Any]) -> typing.Mapping:
+        meta_path = os.path.join(self._path, folder, f'{key}.json')
+        if not os.path.isfile(meta_path):
+            raise ValueError(f'No recording of {json.dumps(request, sort_keys=True, default=str)} in {self._path}')
+        with open(meta_path) as fh:
+            return json.load(fh)
+
+    def _store_meta(self, folder: str, key: str, meta: typing.Mapping[str, typing.Any]):
+        payload = json.dumps(meta, sort_keys=True, indent=2, default=str)
+        _write_atomic(os.path.join(self._path, folder, f'{key}.json'), payload.encode('utf-8'))
+
+    def _wait(self, meta: typing.Mapping[str, typing.Any]):
+        delay = meta['elapsed_s'] if self._latency == 'recorded' else self._latency
+        if delay > 0:
+            time.sleep(delay)
+
+    def __repr__(self) -> str:
+        return f'Cassette(path={self._path!r}, mode={self._mode!r}, latency={self._latency!r})'
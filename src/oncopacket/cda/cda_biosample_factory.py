@@ -1,28 +1,42 @@
+import collections
 import typing
 
+import numpy as np
 import phenopackets as PPKt
 import pandas as pd
 
 from .cda_factory import CdaFactory
+from .diagnostics import Diagnostics
+from .mapper.iso8601_mapper import days_to_iso8601
+from .mapper.term_registry import HOMO_SAPIENS, OntologyTerm, ontology_term
 
-HOMO_SAPIENS = PPKt.OntologyClass(id='NCBITaxon:9606', label='Homo sapiens')
-LUNG = PPKt.OntologyClass(id='UBERON:0002048', label='lung')
+LUNG = ontology_term('UBERON:0002048', 'lung')
 
-LUNG_ADENOCARCINOMA = PPKt.OntologyClass(id='NCIT:C3512', label='Lung Adenocarcinoma')
-LUNG_SQUAMOUS_CELL_CARCINOMA = PPKt.OntologyClass(id='NCIT:C3493', label='Lung Squamous Cell Carcinoma')
+LUNG_ADENOCARCINOMA = ontology_term('NCIT:C3512', 'Lung Adenocarcinoma')
+LUNG_SQUAMOUS_CELL_CARCINOMA = ontology_term('NCIT:C3493', 'Lung Squamous Cell Carcinoma')
 
-BLOOD_DERIVED_NORMAL = PPKt.OntologyClass(id='NCIT:C17610', label='Blood Derived Sample')
-NORMAL_ADJACENT_TISSUE = PPKt.OntologyClass(id='NCIT:C164032', label='Tumor-Adjacent Normal Specimen')
-PRIMARY_SOLID_TUMOR = PPKt.OntologyClass(id='NCIT:C162622', label='Tumor Segment')
-PRIMARY_TUMOR = PPKt.OntologyClass(id='NCIT:C162622', label='Tumor Segment')
-SOLID_TISSUE_NORMAL = PPKt.OntologyClass(id='NCIT:C164014', label='Solid Tissue Specimen')
-TUMOR = PPKt.OntologyClass(id='NCIT:C18009', label='Tumor Tissue')
+BLOOD_DERIVED_NORMAL = ontology_term('NCIT:C17610', 'Blood Derived Sample')
+NORMAL_ADJACENT_TISSUE = ontology_term('NCIT:C164032', 'Tumor-Adjacent Normal Specimen')
+PRIMARY_SOLID_TUMOR = ontology_term('NCIT:C162622', 'Tumor Segment')
+PRIMARY_TUMOR = ontology_term('NCIT:C162622', 'Tumor Segment')
+SOLID_TISSUE_NORMAL = ontology_term('NCIT:C164014', 'Solid Tissue Specimen')
+TUMOR = ontology_term('NCIT:C18009', 'Tumor Tissue')
 
-ANALYTE = PPKt.OntologyClass(id='NCIT:C128639', label='Analyte')
-ALIQUOT = PPKt.OntologyClass(id='NCIT:C25414', label='Aliquot')
-PORTION = PPKt.OntologyClass(id='NCIT:C103166', label='Portion or Totality')
-SAMPLE = PPKt.OntologyClass(id='NCIT:C70699', label='Sample')
-SLIDE = PPKt.OntologyClass(id='NCIT:C165218', label='Diagnostic Slide')
+ANALYTE = ontology_term('NCIT:C128639', 'Analyte')
+ALIQUOT = ontology_term('NCIT:C25414', 'Aliquot')
+PORTION = ontology_term('NCIT:C103166', 'Portion or Totality')
+SAMPLE = ontology_term('NCIT:C70699', 'Sample')
+SLIDE = ontology_term('NCIT:C165218', 'Diagnostic Slide')
+
+# The `derived_from_specimen` value of the specimens that are not derived from another specimen.
+INITIAL_SPECIMEN = 'initial specimen'
+
+# The GDC specimen levels: a sample is split into portions, a portion into analytes (and slides),
+# and an analyte into aliquots.
+SPECIMEN_LEVELS = ('sample', 'portion', 'slide', 'analyte', 'aliquot')
+
+# The longest chain of the GDC specimen levels, sample -> portion -> analyte -> aliquot.
+_MAX_LINEAGE_DEPTH = len(SPECIMEN_LEVELS)
 
 
 class CdaBiosampleFactory(CdaFactory):
@@ -44,8 +58,17 @@ class CdaBiosampleFactory(CdaFactory):
         - derived_from_subject: todo
         - subject_id: todo
         - researchsubject_id: todo
+
+    The values without an ontology term are counted by the `diagnostics` in :func:`to_ga4gh_batch`,
+    a new collector is created if `None`.
     """
 
+    def __init__(self, diagnostics: typing.Optional[Diagnostics] = None):
+        self._diagnostics = Diagnostics() if diagnostics is None else diagnostics
+
+    def get_diagnostics(self) -> Diagnostics:
+        return self._diagnostics
+
     def to_ga4gh(self, row) -> PPKt.Biosample:
         biosample = PPKt.Biosample()
 
@@ -55,16 +78,7 @@ class CdaBiosampleFactory(CdaFactory):
         if derived_from_subj is not None:
             biosample.individual_id = derived_from_subj
 
-        # TODO: Biosample time_of_collection: Age at time sample was collected
-        #  -> need subject age + days to collection 
-        #     perform this in cda_table_importer.py under "Retrieve GA4GH Biospecimen messages"
-        days_to_collection = row['days_to_collection'] # number of days from index date to sample collection date
-        if days_to_collection is not None:
-            pass
-            # need PPKt.iso8601duration where PPKt.OpIndividual.id = biosample.individual_id
-            # days_to_coll_td = pd.Timedelta(days=days_to_collection)
-            # time_of_coll = PPkt.iso8601duration + days_to_coll_td
-            # biosample.time_of_collection = time_of_coll.isoformat()
+        # The time_of_collection needs the age of the subject, see `to_ga4gh_batch`.
 
         # derived_from_specimen -> derived_from_id 
         '''
@@ -83,27 +97,201 @@ class CdaBiosampleFactory(CdaFactory):
         # anatomical_site -> sampled_tissue
         sampled_tissue = _map_anatomical_site(row['anatomical_site'])
         if sampled_tissue is not None:
-            biosample.sampled_tissue.CopyFrom(sampled_tissue)
+            sampled_tissue.copy_into(biosample.sampled_tissue)
 
         sample_type = _map_specimen_type(row['specimen_type'])
         if sample_type is not None:
-            biosample.sample_type.CopyFrom(sample_type)
+            sample_type.copy_into(biosample.sample_type)
 
-        biosample.taxonomy.CopyFrom(HOMO_SAPIENS)
+        HOMO_SAPIENS.copy_into(biosample.taxonomy)
 
         # primary_disease_type -> histological_diagnosis
         histological_diagnosis = _map_primary_disease_type(row['primary_disease_type'])
         if histological_diagnosis is not None:
-            biosample.histological_diagnosis.CopyFrom(histological_diagnosis)
+            histological_diagnosis.copy_into(biosample.histological_diagnosis)
 
         material_sample = _map_source_material_type(row['source_material_type'])
         if material_sample is not None:
-            biosample.material_sample.CopyFrom(material_sample)
+            material_sample.copy_into(biosample.material_sample)
 
         return biosample
 
+    def to_ga4gh_batch(self, df: pd.DataFrame,
+                       days_to_birth: typing.Optional[typing.Mapping[str, float]] = None,
+                       targets: typing.Optional[typing.Sequence[PPKt.Biosample]] = None) -> typing.List[PPKt.Biosample]:
+        """
+        Convert all rows of the CDA specimen table into Biosample messages.
+
+        The result is the same as calling :func:`to_ga4gh` for each row, but the ontology terms are looked up
+        once per distinct value, and the `time_of_collection` is set if `days_to_birth` is provided.
+
+        :param df: a :class:`pd.DataFrame` with the CDA specimen table, optionally collapsed by :func:`collapse_specimens`.
+        :param days_to_birth: the `days_to_birth` of the subjects (negative numbers, e.g. the column of the CDA subject
+          table indexed by `subject_id`). The age at the collection is the age at the index date
+          plus the `days_to_collection`, as an ISO 8601 duration with the days, like the age of the subject.
+        :param targets: an empty Biosample for each row of `df` to populate in place,
+          e.g. from `phenopacket.biosamples.add()`, new messages are created if `None`.
+        :returns: a list with a Biosample for each row of `df`, in the same order.
+        """
+        if not isinstance(df, pd.DataFrame):
+            raise ValueError(f"Invalid argument. Expected pandas DataFrame but got {type(df)}")
+        if targets is not None and len(targets) != len(df):
+            raise ValueError(f'Expected {len(df)} targets but got {len(targets)}')
+
+        def column(name: str) -> typing.List:
+            return df[name].astype(object).where(df[name].notna(), None).tolist()
+
+        def terms(name: str, mapper) -> typing.List[typing.Optional[OntologyTerm]]:
+            values = column(name)
+            lookup = {value: mapper(value) for value in set(values)}
+            unmapped = {value for value, term in lookup.items() if term is None and value is not None}
+            if unmapped:
+                counts = collections.Counter(value for value in values if value in unmapped)
+                for value, n in counts.items():
+                    self._diagnostics.record(f'unmapped_{name}', value, n=n)
+            return [lookup[value] for value in values]
+
+        ids = column('specimen_id')
+        subjects = column('derived_from_subject')
+        parents = column('derived_from_specimen')
+        sampled_tissues = terms('anatomical_site', _map_anatomical_site)
+        sample_types = terms('specimen_type', _map_specimen_type)
+        diagnoses = terms('primary_disease_type', _map_primary_disease_type)
+        materials = terms('source_material_type', _map_source_material_type)
+        if days_to_birth is None:
+            collection_ages = [None] * len(df)
+        else:
+            collection_ages = collection_age_iso(df, days_to_birth).tolist()
+
+        biosamples = []
+        for i in range(len(df)):
+            biosample = PPKt.Biosample() if targets is None else targets[i]
+            biosample.id = ids[i]
+            if subjects[i] is not None:
+                biosample.individual_id = subjects[i]
+            if parents[i] is not None and parents[i] != INITIAL_SPECIMEN:
+                biosample.derived_from_id = parents[i]
+            if sampled_tissues[i] is not None:
+                sampled_tissues[i].copy_into(biosample.sampled_tissue)
+            if sample_types[i] is not None:
+                sample_types[i].copy_into(biosample.sample_type)
+            if collection_ages[i] is not None:
+                biosample.time_of_collection.age.iso8601duration = collection_ages[i]
+            HOMO_SAPIENS.copy_into(biosample.taxonomy)
+            if diagnoses[i] is not None:
+                diagnoses[i].copy_into(biosample.histological_diagnosis)
+            if materials[i] is not None:
+                materials[i].copy_into(biosample.material_sample)
+            biosamples.append(biosample)
+        return biosamples
+
+
+def add_biosamples(factory: CdaBiosampleFactory, phenopackets: typing.Mapping[str, PPKt.Phenopacket],
+                   df: pd.DataFrame,
+                   days_to_birth: typing.Optional[typing.Mapping[str, float]] = None) -> typing.List[PPKt.Biosample]:
+    """
+    Add a biosample for each row of the CDA specimen table to the phenopacket of its `subject_id`.
+
+    The biosamples are populated in place by :func:`CdaBiosampleFactory.to_ga4gh_batch`. If the conversion fails,
+    the biosamples added so far are removed, hence the phenopackets are left as they were.
+
+    :param factory: the factory that converts the specimens.
+    :param phenopackets: the phenopackets by `subject_id`, with an entry for each subject of `df`.
+    :param df: a :class:`pd.DataFrame` with the CDA specimen table.
+    :param days_to_birth: the `days_to_birth` of the subjects, see :func:`CdaBiosampleFactory.to_ga4gh_batch`.
+    :returns: the new biosamples, in the order of the rows of `df`.
+    """
+    subject_ids = df['subject_id'].tolist()
+    n_before = {subject_id: len(phenopackets[subject_id].biosamples) for subject_id in set(subject_ids)}
+    targets = [phenopackets[subject_id].biosamples.add() for subject_id in subject_ids]
+    try:
+        return factory.to_ga4gh_batch(df, days_to_birth=days_to_birth, targets=targets)
+    except BaseException:
+        for subject_id, n in n_before.items():
+            del phenopackets[subject_id].biosamples[n:]
+        raise
+
+
+def collection_age_iso(df: pd.DataFrame, days_to_birth: typing.Mapping[str, float]) -> pd.Series:
+    """
+    Compute the age of the subjects at the collection of the specimens, as ISO 8601 durations.
+
+    :param df: the CDA specimen table with the `subject_id` and `days_to_collection` columns.
+    :param days_to_birth: the (negative) `days_to_birth` of the subjects by the subject ID.
+    :returns: the durations, e.g. `P22142D`, indexed like `df`, `None` if any of the numbers is missing.
+    """
+    if not isinstance(days_to_birth, pd.Series):
+        days_to_birth = pd.Series(days_to_birth, dtype=object)
+    days_to_birth = pd.to_numeric(days_to_birth, errors='coerce')
+    days_to_birth = days_to_birth[~days_to_birth.index.duplicated()]
+    age_at_index = -df['subject_id'].map(days_to_birth).to_numpy(dtype=np.float64)
+    days_to_collection = pd.to_numeric(df['days_to_collection'], errors='coerce').to_numpy(dtype=np.float64)
+    # The age is the length of the duration, also for the (inconsistent) negative sums.
+    return days_to_iso8601(pd.Series(np.abs(age_at_index + days_to_collection), index=df.index))
+
+
+def specimen_lineage(df: pd.DataFrame) -> pd.Series:
+    """
+    Build the parent index of the specimens from the `derived_from_specimen` column.
+
+    :param df: the CDA specimen table.
+    :returns: a Series with the parent specimen ID indexed by the specimen ID, `None` for the initial specimens.
+    """
+    parents = df['derived_from_specimen'].astype(object)
+    parents = parents.where(parents.notna() & (parents != INITIAL_SPECIMEN), None)
+    lineage = pd.Series(parents.to_numpy(), index=pd.Index(df['specimen_id'], name='specimen_id'), dtype=object)
+    return lineage[~lineage.index.duplicated()]
+
+
+def _check_levels(levels: typing.Iterable[str]) -> typing.FrozenSet[str]:
+    levels = frozenset(level.lower() for level in levels)
+    unknown = levels.difference(SPECIMEN_LEVELS)
+    if unknown:
+        raise ValueError(f'Unknown specimen level(s) {sorted(unknown)}. Use any of {SPECIMEN_LEVELS}')
+    if 'sample' in levels:
+        raise ValueError('The samples are the roots of the specimen lineage and cannot be collapsed')
+    return levels
+
+
+def collapse_specimens(df: pd.DataFrame, levels: typing.Iterable[str] = ('aliquot', 'portion')) -> pd.DataFrame:
+    """
+    Remove the specimens of the given levels (`specimen_type`) and point the `derived_from_specimen`
+    of the remaining specimens to their nearest remaining ancestor, e.g. an analyte is derived from the sample
+    if the portions are collapsed.
+
+    The aliquots are the most numerous specimens of the GDC specimen table, hence collapsing them
+    reduces the size of the phenopackets considerably.
+
+    :param df: the CDA specimen table.
+    :param levels: the levels to remove, any of :data:`SPECIMEN_LEVELS` except `sample`.
+    :returns: a new DataFrame with the remaining rows, the index is preserved.
+    """
+    levels = _check_levels(levels)
+    if not levels:
+        return df.copy()
+
+    collapsed = df['specimen_type'].astype(str).str.lower().isin(levels).to_numpy()
+    lineage = specimen_lineage(df)
+    collapsed_ids = pd.Series(collapsed, index=df['specimen_id'].to_numpy())
+    collapsed_ids = collapsed_ids[~collapsed_ids.index.duplicated()]
+
+    kept = df[~collapsed].copy()
+    ancestors = kept['specimen_id'].map(lineage)
+    # Replace the collapsed ancestors by their parents, one level at a time.
+    for _ in range(_MAX_LINEAGE_DEPTH):
+        is_collapsed = ancestors.map(collapsed_ids).eq(True)
+        if not is_collapsed.any():
+            break
+        ancestors = ancestors.where(~is_collapsed, ancestors.map(lineage))
+    # The initial specimens stay as they are, and a specimen whose collapsed ancestors lead to no remaining
+    # specimen loses its parent.
+    original = kept['derived_from_specimen'].astype(object)
+    is_root = original.isna() | (original == INITIAL_SPECIMEN)
+    kept['derived_from_specimen'] = ancestors.where(ancestors.notna(), original.where(is_root, None))
+    return kept
+
 
-def _map_anatomical_site(val: typing.Optional[str]) -> typing.Optional[PPKt.OntologyClass]:
+def _map_anatomical_site(val: typing.Optional[str]) -> typing.Optional[OntologyTerm]:
     # not clear if we need a mapping from NCIt -> UBERON ?
     if val is None:
         return None
@@ -113,7 +301,7 @@ def _map_anatomical_site(val: typing.Optional[str]) -> typing.Optional[PPKt.Onto
         return None
 
 
-def _map_primary_disease_type(val: typing.Optional[str]) -> typing.Optional[PPKt.OntologyClass]:
+def _map_primary_disease_type(val: typing.Optional[str]) -> typing.Optional[OntologyTerm]:
     if val is not None:
         val = val.lower()
         if val == 'lung adenocarcinoma':
@@ -125,7 +313,7 @@ def _map_primary_disease_type(val: typing.Optional[str]) -> typing.Optional[PPKt
     else:
         return None
 
-def _map_specimen_type(val: typing.Optional[str]) -> typing.Optional[PPKt.OntologyClass]:
+def _map_specimen_type(val: typing.Optional[str]) -> typing.Optional[OntologyTerm]:
     if val is not None:
         val = val.lower()
         if val == "analyte":
@@ -144,7 +332,7 @@ def _map_specimen_type(val: typing.Optional[str]) -> typing.Optional[PPKt.Ontolo
         return None
 
 
-def _map_source_material_type(val: typing.Optional[str]) -> typing.Optional[PPKt.OntologyClass]:
+def _map_source_material_type(val: typing.Optional[str]) -> typing.Optional[OntologyTerm]:
     if val is not None:
         val = val.lower()
         if val == "blood derived normal":
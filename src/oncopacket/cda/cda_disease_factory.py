@@ -1,14 +1,16 @@
 import itertools
+import typing
 
 import pandas as pd
 import phenopackets as pp
 import re
 
 from .mapper.op_mapper import OpMapper
-from .mapper.op_disease_stage_mapper import OpDiseaseStageMapper
+from .mapper.op_disease_stage_mapper import STAGE_TERMS, OpDiseaseStageMapper
 from .mapper.op_uberon_mapper import OpUberonMapper
 from .cda_factory import CdaFactory
 from ._gdc import GdcService
+from .diagnostics import Diagnostics
 
 
 class CdaDiseaseFactory(CdaFactory):
@@ -26,13 +28,16 @@ class CdaDiseaseFactory(CdaFactory):
 
     :param disease_term_mapper: an :class:`OpMapper` for finding the disease term in the row fields.
     (called in mapper._configure.py)
+    :param diagnostics: the collector of the missing fields, unmapped stages, and unmapped primary sites,
+      a new collector is created if `None`.
     """
 
-    def __init__(self, disease_term_mapper: OpMapper):
+    def __init__(self, disease_term_mapper: OpMapper, diagnostics: typing.Optional[Diagnostics] = None):
         self._gdc_service = GdcService()
         self._disease_term_mapper = disease_term_mapper # called with OpDiagnosisMapper.multitissue_mapper() in _configure.py
+        self._diagnostics = Diagnostics() if diagnostics is None else diagnostics
         self._stage_mapper = OpDiseaseStageMapper()
-        self._uberon_mapper = OpUberonMapper()
+        self._uberon_mapper = OpUberonMapper(diagnostics=self._diagnostics)
 
         self._required_fields = tuple(set(itertools.chain(
             self._disease_term_mapper.get_fields(),
@@ -55,32 +60,25 @@ class CdaDiseaseFactory(CdaFactory):
         - 'primary_diagnosis'
         - 'age_at_diagnosis'
 
-        :param row: a :class:`pd.Series` with a row from the merged CDA table.
+        :param row: a :class:`pd.Series` or a `dict` with a row from the merged CDA table.
         """
-        if not isinstance(row, pd.Series):
-            raise ValueError(f"Invalid argument. Expected pandas Series but got {type(row)}")
-
-        if any(field not in row for field in self._required_fields):
-            #missing = row.index.difference(self._required_fields) # this gets items in row not in _required_fields but we want the opposite
-            missing = []
-            #print(row.index)
-            for i in self._required_fields:
-                print('i:', i)
-                if i not in row.index:
-                    print('not in row.index')
-                    missing.append(i)
+        self.check_row(row)
 
+        missing = [field for field in self._required_fields if field not in row]
+        if missing:
+            for field in missing:
+                self._diagnostics.record('missing_field', field)
             raise ValueError(f'Required field(s) are missing: {missing}')
             
         # This is the component we build here.
         disease = pp.Disease()
 
         # map the disease term to NCIT
-        term = self._disease_term_mapper.get_ontology_term(row=row)
+        term = self._disease_term_mapper.get_term(row=row)
         if term is None:
             # `term` is a required field.
             raise ValueError(f'Could not parse `term` from the row {row}')
-        disease.term.CopyFrom(term)
+        term.copy_into(disease.term)
 
         # We will interpret age_at_diagnosis as age of onset
         iso8601_age_of_onset = self.days_to_iso(str(row['age_at_diagnosis']))
@@ -111,15 +109,18 @@ class CdaDiseaseFactory(CdaFactory):
         #print("stage_str: " + stage_str)
 
         # map to ontology:
-        stage = self._stage_mapper.get_ontology_term(stage_str=row['stage']) # returns ontology_term = PPkt.OntologyClass()
+        stage_str = row['stage']
+        stage = self._stage_mapper.get_term(stage_str=stage_str)
+        if isinstance(stage_str, str) and stage_str and stage_str not in STAGE_TERMS:
+            self._diagnostics.record('unmapped_stage', stage_str, example=row.get('subject_id'))
         if stage is not None:
-            disease.disease_stage.append(stage) # list, so use append instead of CopyFrom
+            stage.copy_into(disease.disease_stage.add()) # list, so add a new element
         ###
         
         # map primary site to uberon        
-        primary_site = self._uberon_mapper.get_ontology_term(row)
+        primary_site = self._uberon_mapper.get_term(row)
         if primary_site is not None:
-            disease.primary_site.CopyFrom(primary_site)
+            primary_site.copy_into(disease.primary_site)
 
         # Deal with morphology - clinical_tnm_finding_list seems like the most
         # appropriate place to put this
@@ -127,3 +128,6 @@ class CdaDiseaseFactory(CdaFactory):
         # clinical_tnm_finding_list = None #self._parse_morphology_into_ontology_term(row)
 
         return disease
+
+    def get_diagnostics(self) -> Diagnostics:
+        return self._diagnostics
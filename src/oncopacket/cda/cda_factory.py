@@ -15,10 +15,13 @@ class CdaFactory(metaclass=abc.ABCMeta):
     """Superclass for the CDA Factory Classes
 
     Each subclass must implement the to_ga4gh method, which transforms a row of a table from CDA to a GA4GH Message.
+
+    A row is a :class:`pd.Series` or any other mapping from the column names to the values, e.g. a `dict`
+    from `df.to_dict('records')`. The factories only look the values up by the column name.
     """
 
     @abc.abstractmethod
-    def to_ga4gh(self, row: pd.Series):
+    def to_ga4gh(self, row: typing.Union[pd.Series, typing.Mapping[str, typing.Any]]):
         """Return a message from the GA4GH Phenopacket Schema that corresponds to this row.
 
         :param row: A row from the CDA
@@ -28,9 +31,34 @@ class CdaFactory(metaclass=abc.ABCMeta):
         """
         pass
 
+    def to_ga4gh_batch(self, df: pd.DataFrame) -> typing.List:
+        """Return a message from the GA4GH Phenopacket Schema for each row of the table.
+
+        The default implementation calls :func:`to_ga4gh` with a `dict` for each row, which avoids creating
+        a :class:`pd.Series` per row like `df.iterrows()` does. The subclasses may override the method
+        to process the table column-wise.
+
+        :param df: a :class:`pd.DataFrame` with the rows from the CDA
+        :returns: a list with a message for each row of `df`, in the same order
+        :raises ValueError: if unable to parse a row
+        """
+        if not isinstance(df, pd.DataFrame):
+            raise ValueError(f"Invalid argument. Expected pandas DataFrame but got {type(df)}")
+        return [self.to_ga4gh(record) for record in df.to_dict('records')]
+
+    @staticmethod
+    def check_row(row):
+        """
+        Check that the `row` is a :class:`pd.Series` or a mapping.
+
+        :raises ValueError: if the `row` is neither.
+        """
+        if not isinstance(row, (pd.Series, typing.Mapping)):
+            raise ValueError(f"Invalid argument. Expected pandas Series or a mapping but got {type(row)}")
+
     def get_item(self, row, column_name):
         if column_name not in row:
-            raise ValueError(f"Expecting to find {column_name} in row but did not. These are the columns: {row.columns}")
+            raise ValueError(f"Expecting to find {column_name} in row but did not. These are the columns: {list(row.keys())}")
         return row[column_name]
 
     def get_items_from_row(self, row, column_names):
@@ -52,6 +80,8 @@ class CdaFactory(metaclass=abc.ABCMeta):
 
         `None` is returned if the input `str` cannot be parsed into an integer.
 
+        Use :func:`oncopacket.cda.mapper.iso8601_mapper.days_to_iso8601` to convert a whole column at once.
+
         :param days: a `str` or `int` with a number of days of life.
         :raises ValueError: if `days` is not an `int` or a `str`.
         """
@@ -4,7 +4,15 @@ import phenopackets as PPkt
 import pandas as pd
 
 from  .mapper.op_cause_of_death_mapper import OpCauseOfDeathMapper
+from .mapper.term_registry import HOMO_SAPIENS
 from .cda_factory import CdaFactory
+from .diagnostics import Diagnostics
+
+# The columns of the CDA subject table used by the factory.
+SUBJECT_COLUMNS = ('subject_id', 'sex', 'days_to_birth')
+VITAL_STATUS_COLUMNS = ('vital_status', 'days_to_death', 'cause_of_death')
+# The `str` values of the missing values, e.g. `str(None)`.
+_MISSING_VALUES = frozenset(('', 'nan', 'None', '<NA>', 'NaN'))
 
 
 class CdaIndividualFactory(CdaFactory):
@@ -26,28 +34,31 @@ class CdaIndividualFactory(CdaFactory):
         - cause_of_death (*)
 
     (*) indicates a used field.
+
+    The values that cannot be parsed, e.g. an invalid `days_to_birth`, are skipped and counted
+    by the `diagnostics`, a new collector is created if `None`.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, diagnostics: typing.Optional[Diagnostics] = None) -> None:
+        self._diagnostics = Diagnostics() if diagnostics is None else diagnostics
         self._cause_of_death_mapper = OpCauseOfDeathMapper()
         self._male_sex = {'m', 'male'}
         self._female_sex = {'f', 'female'}
 
-    def _process_vital_status(self, row: pd.Series):
+    def _process_vital_status(self, vital_status: str, days_to_death: str,
+                              cause_of_death: str, subject_id: typing.Optional[str] = None) -> typing.Optional[PPkt.VitalStatus]:
         """
-        :param row: a row from the CDA subject table
-        :type row: pd.Series
+        :param vital_status: the `vital_status` of the CDA subject table, e.g. `Alive`
+        :param days_to_death: the `days_to_death` of the CDA subject table, as a `str`
+        :param cause_of_death: the `cause_of_death` of the CDA subject table
+        :param subject_id: the subject, as an example for the diagnostics
         :returns: A vital status object with information about cause of death if applicable.
         :rtype: PPkt.VitalStatus
         """
-        if not isinstance(row, pd.Series):
-            raise ValueError(f"'row' argument must be pandas Series but was {type(row)}")
-        vital_status = self.get_item(row, "vital_status")
-        days_to_death = self.get_item(row, "days_to_death")
-        if vital_status is None:
-            return None
         valid_status = {"Alive", "Dead"}
         if vital_status not in valid_status:
+            if vital_status not in _MISSING_VALUES:
+                self._diagnostics.record('unmapped_vital_status', vital_status, example=subject_id)
             return None
         vstatus = PPkt.VitalStatus()
         if vital_status == "Alive":
@@ -59,33 +70,71 @@ class CdaIndividualFactory(CdaFactory):
                 dtd = int(days_to_death)
                 vstatus.survival_time_in_days = dtd
             except:
-                # TODO: report?
-                pass
-        cause = self._cause_of_death_mapper.get_ontology_term(row)
+                if days_to_death not in _MISSING_VALUES:
+                    self._diagnostics.record('invalid_days_to_death', days_to_death, example=subject_id)
+        cause = self._cause_of_death_mapper.get_term({'cause_of_death': cause_of_death})
         if cause is not None:
-            vstatus.cause_of_death.CopyFrom(cause)
+            cause.copy_into(vstatus.cause_of_death)
         return vstatus
 
-    def to_ga4gh(self, row:pd.Series):
+    def to_ga4gh(self, row: typing.Union[pd.Series, typing.Mapping[str, typing.Any]],
+                 target: typing.Optional[PPkt.Individual] = None):
         """
         convert a row from the CDA subject table into an Individual message (GA4GH Phenopacket Schema)
 
         :param row: a row from the CDA subject table
         :type row: pd.Series
+        :param target: an empty Individual to populate in place, e.g. `phenopacket.subject`,
+          a new message is created if `None`.
         :returns: A GA4GH Phenopacket Schema Individual object that corresponds to the subject in this row.
         :rtype: PPkt.Individual
         :raises ValueError: if the input is unparsable.
         """
-        if not isinstance(row, pd.Series):
-            raise ValueError(f"Invalid argument. Expected pandas series but got {type(row)}")
-        row = row.astype(str)
-        subject_id = row['subject_id']
-        # subject_identifier = row['subject_identifier']
-        # species = row['species']
-        sex = row['sex']
-        # race = row['race']
-        # ethnicity = row['ethnicity']
-        days_to_birth = row['days_to_birth']
+        self.check_row(row)
+        # The values are processed as strings, like in `row.astype(str)`.
+        subject_id, sex, days_to_birth = (str(row[name]) for name in SUBJECT_COLUMNS)
+        if all(name in row for name in VITAL_STATUS_COLUMNS):
+            vital = tuple(str(row[name]) for name in VITAL_STATUS_COLUMNS)
+        else:
+            vital = None
+        return self._create_individual(subject_id, sex, days_to_birth, vital, target)
+
+    def to_ga4gh_batch(self, df: pd.DataFrame,
+                       targets: typing.Optional[typing.Sequence[PPkt.Individual]] = None) -> typing.List[PPkt.Individual]:
+        """
+        Convert all rows of the CDA subject table into Individual messages.
+
+        The result is the same as calling :func:`to_ga4gh` for each row, but the columns are validated
+        and converted to strings once, and the rows are read as plain tuples.
+
+        :param df: a :class:`pd.DataFrame` with the CDA subject table.
+        :param targets: an empty Individual for each row of `df` to populate in place,
+          e.g. the `subject` of the phenopackets, new messages are created if `None`.
+        :returns: a list with an Individual for each row of `df`, in the same order.
+        :raises ValueError: if `df` misses the `subject_id`, `sex`, or `days_to_birth` columns
+          or if `targets` do not match the rows.
+        """
+        if not isinstance(df, pd.DataFrame):
+            raise ValueError(f"Invalid argument. Expected pandas DataFrame but got {type(df)}")
+        if targets is None:
+            targets = [None] * len(df)
+        elif len(targets) != len(df):
+            raise ValueError(f'Expected {len(df)} targets but got {len(targets)}')
+        missing = [name for name in SUBJECT_COLUMNS if name not in df.columns]
+        if missing:
+            raise ValueError(f'Missing field(s): {missing}')
+
+        has_vital = all(name in df.columns for name in VITAL_STATUS_COLUMNS)
+        columns = list(SUBJECT_COLUMNS) + (list(VITAL_STATUS_COLUMNS) if has_vital else [])
+        individuals = []
+        for values, target in zip(df[columns].astype(str).itertuples(index=False, name=None), targets):
+            vital = values[3:] if has_vital else None
+            individuals.append(self._create_individual(values[0], values[1], values[2], vital, target))
+        return individuals
+
+    def _create_individual(self, subject_id: str, sex: str, days_to_birth: str,
+                           vital: typing.Optional[typing.Tuple[str, str, str]],
+                           individual: typing.Optional[PPkt.Individual] = None) -> PPkt.Individual:
         # a valid date looks like this: '-15987.0'
         if days_to_birth.startswith("-"):
             days_to_birth = days_to_birth[1:]
@@ -95,14 +144,18 @@ class CdaIndividualFactory(CdaFactory):
             # we need to parse '15987.0' first as a float and then transform to int
             d_to_b = int(float(days_to_birth))
             iso_age = self.days_to_iso(days=d_to_b)
-            vstat = self._process_vital_status(row)
-        except Exception:
-            # TODO: handle in a better way
-            pass
-        # subject_associated_project = row['subject_associated_project']
-
-
-        individual = PPkt.Individual()
+            if vital is not None:
+                vstat = self._process_vital_status(*vital, subject_id=subject_id)
+        except Exception as e:
+            if iso_age is None:
+                # A missing age is not a conversion issue, like a missing sex or vital status.
+                if days_to_birth not in _MISSING_VALUES:
+                    self._diagnostics.record('invalid_days_to_birth', days_to_birth, example=subject_id)
+            else:
+                self._diagnostics.record('vital_status_error', type(e).__name__, example=subject_id)
+
+        if individual is None:
+            individual = PPkt.Individual()
         individual.id = subject_id
 
         # time_at_last_encounter
@@ -120,9 +173,13 @@ class CdaIndividualFactory(CdaFactory):
             individual.sex = PPkt.FEMALE
         else:
             individual.sex = PPkt.UNKNOWN_SEX
+            if sex not in _MISSING_VALUES:
+                self._diagnostics.record('unmapped_sex', sex, example=subject_id)
 
         # taxonomy, always Homo here
-        individual.taxonomy.id = "NCBITaxon:9606"
-        individual.taxonomy.label = "Homo sapiens"
+        HOMO_SAPIENS.copy_into(individual.taxonomy)
 
         return individual
+
+    def get_diagnostics(self) -> Diagnostics:
+        return self._diagnostics
@@ -1,118 +1,170 @@
 import typing
+
+import numpy as np
 import pandas as pd
 import phenopackets as pp
 
-Progressive_Disease = pp.OntologyClass(id='NCIT:C142356', label='iRECIST Confirmed Progressive Disease')
-Complete_Response = pp.OntologyClass(id='NCIT:C142357', label='iRECIST Complete Response')
-Treatment_Ongoing = pp.OntologyClass(id='NCIT:C185657', label='Interim Response')
-NONE = pp.OntologyClass(id='NCIT:C142359', label='iRECIST Stable Disease')
-UNKNOWN = pp.OntologyClass(id='NCIT:C17998', label='Unknown')
+from .cda_resources import CdaResourceManager, default_resource_manager
+from .mapper.term_registry import OntologyTerm, ontology_term
+
+# The terms below are kept for the client code, the mappings are read from `cda_treatment_to_ncit.csv`.
+
+Progressive_Disease = ontology_term('NCIT:C142356', 'iRECIST Confirmed Progressive Disease')
+Complete_Response = ontology_term('NCIT:C142357', 'iRECIST Complete Response')
+Treatment_Ongoing = ontology_term('NCIT:C185657', 'Interim Response')
+NONE = ontology_term('NCIT:C142359', 'iRECIST Stable Disease')
+UNKNOWN = ontology_term('NCIT:C17998', 'Unknown')
+
+CARBOPLATIN = ontology_term('NCIT:C1282', 'Carboplatin')
+PACLITAXEL = ontology_term('NCIT:C1411', 'Paclitaxel')
+PEMETREXED = ontology_term('NCIT:C61614', 'Pemetrexed')
+AFATINIB = ontology_term('NCIT:C669409', 'Afatinib')
+CYCLOPHOSPHAMIDE = ontology_term('NCIT:C405', 'Cyclophosphamide')
+CISPLATIN = ontology_term('NCIT:C376', 'Cisplatin')
+DOXORUBICIN = ontology_term('NCIT:C456', 'Doxorubicin')
+BEVACIZUMAB = ontology_term('NCIT:C2039', 'Bevacizumab')
+IFOSFAMIDE = ontology_term('NCIT:C564', 'Ifosfamide')
+ETOPOSIDE = ontology_term('NCIT:C491', 'Etoposide')
+ZOLEDRONIC_ACID= ontology_term('NCIT:C1699', 'Zoledronic Acid')
+ERLOTINIB = ontology_term('NCIT:C65530', 'Erlotinib')
+PEMBROLIZUMAB = ontology_term('NCIT:C106432', 'Pembrolizumab')
+DOCETAXEL = ontology_term('NCIT:C1526', 'Docetaxel')
+VINCREISTINE = ontology_term('NCIT:C933', 'Vincristine')
+Not_Otherwise_Specified = ontology_term('NCIT:C19594', 'Not Otherwise Specified')
+UNKNOWN = ontology_term('NCIT:C17998', 'Unknown')
+
+
+# The columns of the CDA treatment table used for the medical actions.
+TREATMENT_COLUMNS = ('treatment_type', 'therapeutic_agent', 'treatment_outcome')
+
 
-CARBOPLATIN = pp.OntologyClass(id='NCIT:C1282', label='Carboplatin')
-PACLITAXEL = pp.OntologyClass(id='NCIT:C1411', label='Paclitaxel')
-PEMETREXED = pp.OntologyClass(id='NCIT:C61614', label='Pemetrexed')
-AFATINIB = pp.OntologyClass(id='NCIT:C669409', label='Afatinib')
-CYCLOPHOSPHAMIDE = pp.OntologyClass(id='NCIT:C405', label='Cyclophosphamide')
-CISPLATIN = pp.OntologyClass(id='NCIT:C376', label='Cisplatin')
-DOXORUBICIN = pp.OntologyClass(id='NCIT:C456', label='Doxorubicin')
-BEVACIZUMAB = pp.OntologyClass(id='NCIT:C2039', label='Bevacizumab')
-IFOSFAMIDE = pp.OntologyClass(id='NCIT:C564', label='Ifosfamide')
-ETOPOSIDE = pp.OntologyClass(id='NCIT:C491', label='Etoposide')
-ZOLEDRONIC_ACID= pp.OntologyClass(id='NCIT:C1699', label='Zoledronic Acid')
-ERLOTINIB = pp.OntologyClass(id='NCIT:C65530', label='Erlotinib')
-PEMBROLIZUMAB = pp.OntologyClass(id='NCIT:C106432', label='Pembrolizumab')
-DOCETAXEL = pp.OntologyClass(id='NCIT:C1526', label='Docetaxel')
-VINCREISTINE = pp.OntologyClass(id='NCIT:C933', label='Vincristine')
-Not_Otherwise_Specified = pp.OntologyClass(id='NCIT:C19594', label='Not Otherwise Specified')
-UNKNOWN = pp.OntologyClass(id='NCIT:C17998', label='Unknown')
+class TreatmentMappings(typing.NamedTuple):
+    """
+    The lookup tables from the lower-case values of the CDA treatment table to NCIt terms.
+    """
+    agents: typing.Mapping[str, OntologyTerm]
+    responses: typing.Mapping[str, OntologyTerm]
 
 
+# The column of the CDA treatment table for each lookup table.
+_MAPPING_COLUMNS = {'therapeutic_agent': 'agents', 'treatment_outcome': 'responses'}
 
 
+def read_treatment_mappings(path: str) -> TreatmentMappings:
+    """
+    Read the treatment mappings from a CSV file with the `cda_column`, `cda_value`, `ncit_id`, and `ncit_label`
+    columns, such as the bundled `cda_treatment_to_ncit.csv`.
+
+    :raises ValueError: if the file has an unknown `cda_column` or a duplicated value.
+    """
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    unknown = set(df['cda_column']).difference(_MAPPING_COLUMNS)
+    if unknown:
+        raise ValueError(f'Unknown column(s) {sorted(unknown)} in {path}. Use any of {list(_MAPPING_COLUMNS)}')
+    values = df['cda_column'] + ':' + df['cda_value'].str.strip().str.lower()
+    if values.duplicated().any():
+        raise ValueError(f'Duplicated value(s) {sorted(set(values[values.duplicated()]))} in {path}')
+    tables = {name: {} for name in _MAPPING_COLUMNS.values()}
+    for column, value, ncit_id, ncit_label in df[['cda_column', 'cda_value', 'ncit_id', 'ncit_label']].itertuples(index=False):
+        tables[_MAPPING_COLUMNS[column]][value.strip().lower()] = ontology_term(ncit_id, ncit_label)
+    return TreatmentMappings(**tables)
+
+
+def default_treatment_mappings(resources: typing.Optional[CdaResourceManager] = None) -> TreatmentMappings:
+    """
+    Get the mappings of the bundled `cda_treatment_to_ncit.csv`, read once per process.
+    """
+    resources = default_resource_manager() if resources is None else resources
+    return resources.get('treatment_to_ncit', parser=read_treatment_mappings)
+
+
+def _lookup(table: typing.Mapping[str, OntologyTerm], val) -> typing.Optional[OntologyTerm]:
+    # The missing values of the CDA tables are `None`, `NaN`, or `<NA>`.
+    if not isinstance(val, str):
+        return None
+    return table.get(val.lower())
+
 
-def make_cda_medicalaction(row: pd.Series) -> pp.MedicalAction:
+def _make_medical_action(treatment_type, therapeutic_agent, treatment_outcome,
+                         mappings: TreatmentMappings) -> pp.MedicalAction:
     medicalaction = pp.MedicalAction()
 
-    treatment_type = row["treatment_type"]
     if treatment_type == "Chemotherapy":
         # Use the GA4GHTreatment message
         # therapeutic_agent -> treatment agent
-        treatment_agent = _map_therapeutic_agent(row['therapeutic_agent'])
-        # radiation = _map_radiation(row['therapeutic_agent'])
+        treatment_agent = _lookup(mappings.agents, therapeutic_agent)
         if treatment_agent is not None:
-            treatment = pp.Treatment()
-            treatment.agent.CopyFrom(treatment_agent)
-            medicalaction.treatment.CopyFrom(treatment)
+            treatment_agent.copy_into(medicalaction.treatment.agent)
     elif "Radiation Therapy, NOS" == treatment_type:
         ## Use GA4GH RadiationTherapy object
         pass
 
-
     # treatment_outcome -> response_to_treatment
-    response_to_treatment = _map_response_to_treatment(row['treatment_outcome'])
+    response_to_treatment = _lookup(mappings.responses, treatment_outcome)
     if response_to_treatment is not None:
-        medicalaction.response_to_treatment.CopyFrom(response_to_treatment)
+        response_to_treatment.copy_into(medicalaction.response_to_treatment)
 
     return medicalaction
 
 
-def _map_response_to_treatment(val: typing.Optional[str]=None) -> typing.Optional[pp.OntologyClass]:
-    if val is not None:
-        val = val.lower()
-        if val == "progressive disease":
-            return Progressive_Disease
-        elif val == "complete response":
-            return Complete_Response
-        elif val == "treatment ongoing":
-            return Treatment_Ongoing
-        elif val == "none":
-            return NONE
-        elif val == "unknown":
-            return UNKNOWN
-        else:
-            return None
-    else:
-        return None
+def make_cda_medicalaction(row: pd.Series, mappings: typing.Optional[TreatmentMappings] = None) -> pp.MedicalAction:
+    """
+    Convert a row of the CDA treatment table into a MedicalAction message.
 
+    :param row: the row.
+    :param mappings: the agent and response mappings, :func:`default_treatment_mappings` by default.
+    """
+    mappings = default_treatment_mappings() if mappings is None else mappings
+    return _make_medical_action(row['treatment_type'], row['therapeutic_agent'], row['treatment_outcome'], mappings)
 
-def _map_therapeutic_agent(val: typing.Optional[str]=None) -> typing.Optional[pp.OntologyClass]:
-    if val is not None:
-        val = val.lower()
-        if val == "carboplatin":
-            return CARBOPLATIN
-        elif val == "paclitaxel":
-            return PACLITAXEL
-        elif val == "pemetrexed":
-            return PEMETREXED
-        elif val == "afatinib":
-            return AFATINIB
-        elif val == "cyclophosphamide":
-            return CYCLOPHOSPHAMIDE
-        elif val == "cisplatin":
-            return CISPLATIN
-        elif val == "doxorubicin":
-            return DOXORUBICIN
-        elif val == "bevacizumab":
-            return BEVACIZUMAB
-        elif val == "ifosfamide":
-            return IFOSFAMIDE
-        elif val == "etopside":
-            return ETOPOSIDE
-        elif val == "zoledronic acid":
-            return ZOLEDRONIC_ACID
-        elif val == "erlotinib":
-            return ERLOTINIB
-        elif val == "pembrolizumab":
-            return PEMBROLIZUMAB
-        elif val == "docetaxel":
-            return DOCETAXEL
-        elif val == "vincreistine":
-            return VINCREISTINE
-        elif val == "not otherwise specified":
-            return Not_Otherwise_Specified
-        elif val == "unknown":
-            return UNKNOWN
-        else:
-            return None
-    else:
-        return None
+
+def make_cda_medicalactions(df: pd.DataFrame,
+                            mappings: typing.Optional[TreatmentMappings] = None) -> typing.List[pp.MedicalAction]:
+    """
+    Convert all rows of the CDA treatment table into MedicalAction messages.
+
+    The result is the same as calling :func:`make_cda_medicalaction` for each row, but the rows are factorized
+    by the treatment columns and a message is built once per distinct combination and copied into the other rows.
+
+    :param df: the CDA treatment table.
+    :param mappings: the agent and response mappings, :func:`default_treatment_mappings` by default.
+    :returns: a list with a MedicalAction for each row of `df`, in the same order.
+    """
+    mappings = default_treatment_mappings() if mappings is None else mappings
+    columns = list(TREATMENT_COLUMNS)
+    if len(df) == 0:
+        return []
+    codes = df.groupby(columns, dropna=False, sort=False).ngroup().to_numpy()
+    # The first row of each group, in the order of the group codes.
+    _, firsts = np.unique(codes, return_index=True)
+    prototypes = [_make_medical_action(*values, mappings)
+                  for values in df[columns].iloc[firsts].itertuples(index=False)]
+
+    medical_actions = []
+    for code in codes.tolist():
+        medicalaction = pp.MedicalAction()
+        medicalaction.CopyFrom(prototypes[code])
+        medical_actions.append(medicalaction)
+    return medical_actions
+
+
+def group_medical_actions_by_subject(
+        df: pd.DataFrame,
+        mappings: typing.Optional[TreatmentMappings] = None,
+) -> typing.Dict[str, typing.List[pp.MedicalAction]]:
+    """
+    Convert the CDA treatment table into the MedicalAction messages of each subject (`subject_id` column),
+    in the order of the rows.
+    """
+    grouped = {}
+    for subject_id, medicalaction in zip(df['subject_id'].tolist(), make_cda_medicalactions(df, mappings)):
+        grouped.setdefault(subject_id, []).append(medicalaction)
+    return grouped
+
+
+def _map_response_to_treatment(val: typing.Optional[str]=None) -> typing.Optional[OntologyTerm]:
+    return _lookup(default_treatment_mappings().responses, val)
+
+
+def _map_therapeutic_agent(val: typing.Optional[str]=None) -> typing.Optional[OntologyTerm]:
+    return _lookup(default_treatment_mappings().agents, val)
@@ -1,10 +1,95 @@
+import hashlib
 import logging
+import math
 import typing
 
+import numpy as np
 import pandas as pd
 import phenopackets as pp
 
 from .cda_factory import CdaFactory
+from .cda_variant_cache import VariantDescriptorCache
+from .mapper.term_registry import NEOPLASM
+
+# Besides the variant coordinates, these columns determine the subject-independent part of the descriptor.
+PROTOTYPE_COLUMNS = ('Transcript_ID', 'HGVSc', 'ENSP', 'HGVSp_Short', 'Hugo_Symbol', 'Entrez_Gene_Id', 'dbSNP_RS')
+DEPTH_COLUMNS = ('t_depth', 't_ref_count', 't_alt_count', 'n_depth', 'n_ref_count', 'n_alt_count')
+
+
+def _is_present(value) -> bool:
+    # `None` and `NaN` are missing.
+    return value is not None and not (isinstance(value, float) and math.isnan(value))
+
+
+def _format_position(position) -> str:
+    try:
+        return str(int(round(float(position))))
+    except (TypeError, ValueError, OverflowError):
+        return ''
+
+
+def _digest(key: str) -> str:
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def variant_id(build, chrom, pos, ref, alt) -> str:
+    """
+    Get a stable ID of a variant.
+
+    The ID is the BLAKE2b digest of the genome build, contig, position, and the alleles. Unlike Python's `hash`,
+    which is salted per process, the ID is the same across runs and machines and it can be used as a cache key.
+
+    :returns: a hex string with 32 characters.
+    """
+    return _digest(':'.join((str(build), str(chrom), _format_position(pos), str(ref), str(alt))))
+
+
+def variant_ids(df: pd.DataFrame) -> np.ndarray:
+    """
+    Get the :func:`variant_id` of each row of the CDA mutation table.
+
+    The keys are built column-wise and each distinct key is hashed once.
+
+    :param df: a :class:`pd.DataFrame` with the `NCBI_Build`, `Chromosome`, `Start_Position`,
+      `Reference_Allele`, and `Tumor_Seq_Allele2` columns.
+    :returns: an array with the IDs, in the order of the `df` rows.
+    """
+    positions = pd.to_numeric(df['Start_Position'], errors='coerce').replace([np.inf, -np.inf], np.nan).round()
+    positions = positions.astype('Int64').astype(str).where(positions.notna(), '')
+    keys = df['NCBI_Build'].astype(str) + ':' + df['Chromosome'].astype(str) + ':' + positions \
+        + ':' + df['Reference_Allele'].astype(str) + ':' + df['Tumor_Seq_Allele2'].astype(str)
+    codes, uniques = pd.factorize(keys)
+    digests = np.array([_digest(key) for key in uniques], dtype=object)
+    return digests[codes]
+
+
+def add_variant_interpretations(phenopacket: pp.Phenopacket, interpretation_id: str, subject_id: str,
+                                variants: typing.Iterable[pp.VariantInterpretation]) -> pp.Interpretation:
+    """
+    Add an interpretation with the variants of a subject to the phenopacket.
+
+    The interpretation, the diagnosis, and the genomic interpretations are built in place, in the `interpretations`
+    of the phenopacket, hence each variant is copied once instead of once per nesting level.
+
+    :param phenopacket: the phenopacket of the subject.
+    :param interpretation_id: the ID of the new interpretation.
+    :param subject_id: the ID of the subject, e.g. `TCGA.TCGA-C5-A1MI`.
+    :param variants: the variants of the subject, e.g. from :func:`CdaMutationFactory.to_ga4gh_batch`.
+    :returns: the new interpretation.
+    """
+    interpretation = phenopacket.interpretations.add()
+    interpretation.id = interpretation_id
+    interpretation.progress_status = pp.Interpretation.ProgressStatus.IN_PROGRESS
+    diagnosis = interpretation.diagnosis
+    # TODO: improve/enhance diagnosis term annotations
+    NEOPLASM.copy_into(diagnosis.disease)
+    genomic_interpretations = diagnosis.genomic_interpretations
+    for variant in variants:
+        genomic_interpretation = genomic_interpretations.add()
+        genomic_interpretation.subject_or_biosample_id = subject_id
+        genomic_interpretation.interpretation_status = pp.GenomicInterpretation.InterpretationStatus.UNKNOWN_STATUS
+        genomic_interpretation.variant_interpretation.CopyFrom(variant)
+    return interpretation
 
 
 class CdaMutationFactory(CdaFactory):
@@ -50,7 +135,11 @@ class CdaMutationFactory(CdaFactory):
     - Match_Norm_Validation_Allele2
     """
 
-    def __init__(self):
+    def __init__(self, variant_cache: typing.Optional[VariantDescriptorCache] = None):
+        """
+        :param variant_cache: the cache of the variant descriptors shared by the subjects with the same variant,
+          a new cache is created if `None`.
+        """
         self._column_names = [
             'Entrez_Gene_Id', 'Hugo_Symbol',
             'NCBI_Build', 'Chromosome', 'Start_Position', 'End_Position', 'Reference_Allele', 'Tumor_Seq_Allele2',
@@ -60,43 +149,165 @@ class CdaMutationFactory(CdaFactory):
             't_depth', 't_ref_count', 't_alt_count',
             'n_depth', 'n_ref_count', 'n_alt_count',
         ]
+        self._variant_cache = VariantDescriptorCache() if variant_cache is None else variant_cache
         self._logger = logging.getLogger(__name__)
 
-    def to_ga4gh(self, row: pd.Series) -> pp.VariantInterpretation:
+    def get_column_names(self) -> typing.Sequence[str]:
+        """
+        Get the names of the mutation table columns used by the factory.
+        """
+        return tuple(self._column_names)
+
+    def get_variant_cache(self) -> VariantDescriptorCache:
+        return self._variant_cache
+
+    def to_ga4gh(self, row: pd.Series,
+                 target: typing.Optional[pp.VariantInterpretation] = None) -> pp.VariantInterpretation:
         """
         Convert a row from the CDA mutation table
         into a VariantInterpretation message (GA4GH Phenopacket Schema).
 
-        :param row: a :class:`pd.Series` with the row of the CDA mutation table.
+        The subject-independent part of the descriptor (ID, gene context, HGVS expressions, VCF record)
+        is built once per distinct variant, see :class:`VariantDescriptorCache`.
+
+        :param row: a :class:`pd.Series` or a `dict` with the row of the CDA mutation table.
+        :param target: an empty VariantInterpretation to populate in place,
+          e.g. `genomic_interpretation.variant_interpretation`, a new message is created if `None`.
         """
-        if not isinstance(row, pd.Series):
-            raise ValueError(f"Invalid argument. Expected pandas series but got {type(row)}")
+        self.check_row(row)
+
+        self._check_columns(row.keys())
 
-        if any(field not in row for field in self._column_names):
-            keys = set(row.index)
-            missing = keys.difference(self._column_names)
-            raise ValueError(f'Missing field(s): {missing}')
+        variant_key = (self._generate_id(row),) + tuple(
+            str(row[name]) if _is_present(row[name]) else None for name in PROTOTYPE_COLUMNS
+        )
+        prototype = self._variant_cache.get(variant_key, lambda: self._create_prototype(row))
 
+        vinterpretation = pp.VariantInterpretation() if target is None else target
+        vdescriptor = vinterpretation.variation_descriptor
+        vdescriptor.CopyFrom(prototype)
 
+        # Tumor/normal depths
+        for name in DEPTH_COLUMNS:
+            val = row[name]
+            ext = pp.Extension()
+            ext.name = name
+            # We expect an `int` or `None`.
+            ext.value = str(val)
+            vdescriptor.extensions.append(ext)
+
+        # Mutation status
+        ms = row['Mutation_Status']
+        if isinstance(ms, str) and len(ms) > 1:
+            ext = pp.Extension()
+            ext.name = 'Mutation_Status'
+            ext.value = ms
+            vdescriptor.extensions.append(ext)
+
+        return vinterpretation
+
+    def to_ga4gh_batch(self, df: pd.DataFrame,
+                       targets: typing.Optional[typing.Sequence[pp.VariantInterpretation]] = None) \
+            -> typing.List[pp.VariantInterpretation]:
+        """
+        Convert all rows of the CDA mutation table into VariantInterpretation messages.
+
+        The result is the same as calling :func:`to_ga4gh` for each row, but the columns are validated once,
+        and the IDs, HGVS expressions and extension values are computed column-wise before building the messages.
+
+        :param df: a :class:`pd.DataFrame` with the CDA mutation table.
+        :param targets: an empty VariantInterpretation for each row of `df` to populate in place,
+          new messages are created if `None`.
+        :returns: a list with a VariantInterpretation for each row of `df`, in the same order.
+        """
+        if not isinstance(df, pd.DataFrame):
+            raise ValueError(f"Invalid argument. Expected pandas DataFrame but got {type(df)}")
+        self._check_columns(df.columns)
+        if targets is not None and len(targets) != len(df):
+            raise ValueError(f'Expected {len(df)} targets but got {len(targets)}')
+
+        ids = variant_ids(df).tolist()
+        variant_keys = list(zip(ids, *(
+            df[name].astype(str).where(df[name].notna(), None).tolist() for name in PROTOTYPE_COLUMNS
+        )))
+
+        has_gene = (df['Hugo_Symbol'].notna() & df['Entrez_Gene_Id'].notna()).tolist()
+        gene_ids = ('NCBIGene:' + df['Entrez_Gene_Id'].astype(str)).tolist()
+        symbols = df['Hugo_Symbol'].tolist()
+
+        has_hgvs_c = (df['Transcript_ID'].notna() & df['HGVSc'].notna()).tolist()
+        hgvs_c = (df['Transcript_ID'].astype(str) + ':' + df['HGVSc'].astype(str)).tolist()
+        has_hgvs_p = (df['ENSP'].notna() & df['HGVSp_Short'].notna()).tolist()
+        hgvs_p = (df['ENSP'].astype(str) + ':' + df['HGVSp_Short'].astype(str)).tolist()
+
+        has_vcf = ((df['Reference_Allele'] != '-') & (df['Tumor_Seq_Allele2'] != '-')).tolist()
+        builds = df['NCBI_Build'].tolist()
+        chroms = df['Chromosome'].tolist()
+        positions = df['Start_Position'].tolist()
+        refs = df['Reference_Allele'].tolist()
+        alts = df['Tumor_Seq_Allele2'].tolist()
+        has_rs = df['dbSNP_RS'].notna().tolist()
+        rs_ids = df['dbSNP_RS'].tolist()
+
+        depths = [(name, df[name].astype(str).tolist()) for name in DEPTH_COLUMNS]
+        statuses = df['Mutation_Status'].tolist()
+
+        def create_prototype(i: int) -> pp.VariationDescriptor:
+            vdescriptor = pp.VariationDescriptor()
+            vdescriptor.id = ids[i]
+            if has_gene[i]:
+                vdescriptor.gene_context.value_id = gene_ids[i]
+                vdescriptor.gene_context.symbol = symbols[i]
+            if has_hgvs_c[i]:
+                vdescriptor.expressions.add(syntax='hgvs.c', value=hgvs_c[i])
+            if has_hgvs_p[i]:
+                vdescriptor.expressions.add(syntax='hgvs.p', value=hgvs_p[i])
+            if has_vcf[i]:
+                vcf_record = vdescriptor.vcf_record
+                vcf_record.genome_assembly = builds[i]
+                vcf_record.chrom = chroms[i]
+                if has_rs[i]:
+                    vcf_record.id = rs_ids[i]
+                vcf_record.pos = positions[i]
+                vcf_record.ref = refs[i]
+                vcf_record.alt = alts[i]
+            vdescriptor.molecule_context = pp.MoleculeContext.genomic
+            return vdescriptor
+
+        vinterpretations = []
+        for i in range(len(df)):
+            vinterpretation = pp.VariantInterpretation() if targets is None else targets[i]
+            vdescriptor = vinterpretation.variation_descriptor
+            vdescriptor.CopyFrom(self._variant_cache.get(variant_keys[i], lambda: create_prototype(i)))
+            for name, values in depths:
+                vdescriptor.extensions.add(name=name, value=values[i])
+            ms = statuses[i]
+            if isinstance(ms, str) and len(ms) > 1:
+                vdescriptor.extensions.add(name='Mutation_Status', value=ms)
+            vinterpretations.append(vinterpretation)
+
+        return vinterpretations
+
+    def _create_prototype(self, row: pd.Series) -> pp.VariationDescriptor:
         vdescriptor = pp.VariationDescriptor()
 
         vdescriptor.id = self._generate_id(row)
 
         # Gene context
-        if row['Hugo_Symbol'] is not None and row['Entrez_Gene_Id'] is not None:
+        if _is_present(row['Hugo_Symbol']) and _is_present(row['Entrez_Gene_Id']):
             vdescriptor.gene_context.value_id = f"NCBIGene:{row['Entrez_Gene_Id']}"
             vdescriptor.gene_context.symbol = row['Hugo_Symbol']
 
         # We may consider including an HGVS c expression for ALL transcripts,
         # using the `all_effects` field that looks like this:
         # SPRY3,missense_variant,p.G118A,ENST00000302805,NM_005840.2,c.353G>C,MODERATE,YES,deleterious(0),benign(0.001),1;SPRY3,missense_variant,p.G118A,ENST00000675360,NM_001304990.1,c.353G>C,MODERATE,,deleterious(0),benign(0.001),1
-        if row['Transcript_ID'] is not None and row['HGVSc'] is not None:
+        if _is_present(row['Transcript_ID']) and _is_present(row['HGVSc']):
             hgvs_expression = pp.Expression()
             hgvs_expression.syntax = "hgvs.c"
             hgvs_expression.value = f"{row['Transcript_ID']}:{row['HGVSc']}"
             vdescriptor.expressions.append(hgvs_expression)
 
-        if row['ENSP'] is not None and row['HGVSp_Short'] is not None:
+        if _is_present(row['ENSP']) and _is_present(row['HGVSp_Short']):
             hgvs_expression = pp.Expression()
             hgvs_expression.syntax = "hgvs.p"
             hgvs_expression.value = f"{row['ENSP']}:{row['HGVSp_Short']}"
@@ -108,29 +319,13 @@ class CdaMutationFactory(CdaFactory):
         if vcf_record is not None:
             vdescriptor.vcf_record.CopyFrom(vcf_record)
 
-        # Tumor/normal depths
-        for name in ('t_depth', 't_ref_count', 't_alt_count',
-                     'n_depth', 'n_ref_count', 'n_alt_count'):
-            val = row[name]
-            ext = pp.Extension()
-            ext.name = name
-            # We expect an `int` or `None`.
-            ext.value = str(val)
-            vdescriptor.extensions.append(ext)
-
-        # Mutation status
-        ms = row['Mutation_Status']
-        if ms is not None and len(ms) > 1:
-            ext = pp.Extension()
-            ext.name = 'Mutation_Status'
-            ext.value = ms
-            vdescriptor.extensions.append(ext)
-
         vdescriptor.molecule_context = pp.MoleculeContext.genomic
+        return vdescriptor
 
-        vinterpretation = pp.VariantInterpretation()
-        vinterpretation.variation_descriptor.CopyFrom(vdescriptor)
-        return vinterpretation
+    def _check_columns(self, columns: typing.Iterable[str]):
+        missing = set(self._column_names).difference(columns)
+        if missing:
+            raise ValueError(f'Missing field(s): {sorted(missing)}')
 
     def _create_vcf_record(self, row: pd.Series) -> typing.Optional[pp.VcfRecord]:
         ref = row['Reference_Allele']
@@ -145,7 +340,7 @@ class CdaMutationFactory(CdaFactory):
         vcf_record.genome_assembly = row['NCBI_Build']
         vcf_record.chrom = row['Chromosome']
         rs_id = row['dbSNP_RS']
-        if rs_id is not None:
+        if _is_present(rs_id):
             vcf_record.id = rs_id
         vcf_record.pos = row['Start_Position']
         vcf_record.ref = ref
@@ -154,4 +349,5 @@ class CdaMutationFactory(CdaFactory):
 
     @staticmethod
     def _generate_id(row: pd.Series) -> str:
-        return str(hash(''.join(str(x) for x in row.values)))
+        return variant_id(row['NCBI_Build'], row['Chromosome'], row['Start_Position'],
+                          row['Reference_Allele'], row['Tumor_Seq_Allele2'])
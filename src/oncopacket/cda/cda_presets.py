@@ -0,0 +1,37 @@
+import typing
+
+
+class CohortPreset(typing.NamedTuple):
+    """
+    A named CDA query for a cohort, e.g. all GDC subjects with a lung primary diagnosis site.
+
+    See `ncit_mapping_files/CDA_primary_diagnosis_site_to_uberon.csv` for a list of the `primary_diagnosis_site`
+    terms available in CDA.
+    """
+    cohort_name: str
+    query: typing.Mapping[str, typing.Any]
+
+
+def _gdc_site_query(*sites: str) -> typing.Mapping[str, typing.Any]:
+    return {'match_any': [f'primary_diagnosis_site = {site}' for site in sites],
+            'data_source': 'GDC'}
+
+
+# The tissue cohorts that used to be exported by the `scripts/run_<tissue>.py` scripts.
+TISSUE_PRESETS: typing.Mapping[str, CohortPreset] = {
+    # `*osseous*` does not exist in CDA.
+    'bone': CohortPreset('Bone', _gdc_site_query('*bone*', '*skeleton*')),
+    'brain': CohortPreset('Brain', _gdc_site_query('*brain*', '*cerebral*')),
+    'breast': CohortPreset('Breast', _gdc_site_query('*breast*')),
+    # `*cerv*` picks up `craniocervical region` from the head & neck cancers.
+    'cervix': CohortPreset('Cervix', _gdc_site_query('*uter*', '*cervix*')),
+    # `*rect*` covers rectum and rectosigmoid junction.
+    'colon': CohortPreset('Colon', _gdc_site_query('*colon*', '*rect*')),
+    'kidney': CohortPreset('Kidney', _gdc_site_query('*kidney*')),
+    'liver': CohortPreset('Liver', _gdc_site_query('*liver*', '*Hepato*')),
+    'lung': CohortPreset('Lung', _gdc_site_query('*lung*', '*pulmonary*')),
+    'pancreas': CohortPreset('Pancreas', _gdc_site_query('*pancreas*', '*pancreatic*')),
+    'skin': CohortPreset('Skin', _gdc_site_query('*skin*', '*cutaneous*')),
+    'stomach': CohortPreset('Stomach', _gdc_site_query('*stomach*')),
+    'thyroid': CohortPreset('Thyroid', _gdc_site_query('*thyroid*')),
+}
@@ -0,0 +1,331 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import types
+import typing
+import warnings
+from importlib.resources import files
+
+import pandas as pd
+import requests
+
+
+class ChecksumMismatchError(ValueError):
+    """
+    The downloaded file does not match the expected SHA-256 checksum of the resource.
+    """
+
+
+class CdaResource:
+    """
+    `CdaResource` describes a file needed by the mappers and services, such as a mapping table.
+
+    A resource is either bundled with the package, downloaded from a URL, or both. In the latter case,
+    the bundled copy is used as a fallback if the download is not possible (e.g. offline).
+
+    :param name: the name used to request the resource from :class:`CdaResourceManager`.
+    :param filename: the name of the file in the cache directory and in the `package`.
+    :param url: the URL to download the file from or `None` if the resource is only bundled.
+    :param package: the package with the bundled copy of the file or `None` if there is no bundled copy.
+    :param parser: the default function for parsing the file into the view returned by :func:`CdaResourceManager.get`.
+    :param sha256: the expected SHA-256 checksum of the downloaded file, if known.
+    """
+
+    def __init__(self, name: str,
+                 filename: str,
+                 url: typing.Optional[str] = None,
+                 package: typing.Optional[str] = None,
+                 parser: typing.Optional[typing.Callable[[str], typing.Any]] = None,
+                 sha256: typing.Optional[str] = None):
+        if url is None and package is None:
+            raise ValueError(f'Resource {name} must have a `url` or a `package`')
+        self.name = name
+        self.filename = filename
+        self.url = url
+        self.package = package
+        self.parser = parser
+        self.sha256 = sha256
+
+
+def _read_csv(path: str) -> pd.DataFrame:
+    return pd.read_csv(path)
+
+
+def _read_site_to_uberon(path: str) -> typing.Mapping[str, str]:
+    with open(path, 'r') as fh:
+        site_to_uberon = pd.read_csv(fh)
+    return dict(site_to_uberon.values)
+
+
+NCIT_MAPPING_FILES = 'oncopacket.ncit_mapping_files'
+
+DEFAULT_RESOURCES = (
+    CdaResource('neoplasm_core', 'Neoplasm_Core.csv', package=NCIT_MAPPING_FILES, parser=_read_csv),
+    CdaResource('treatment_to_ncit', 'cda_treatment_to_ncit.csv', package=NCIT_MAPPING_FILES, parser=_read_csv),
+    CdaResource('site_to_uberon', 'CDA_primary_diagnosis_site_to_uberon.csv', package=NCIT_MAPPING_FILES,
+                parser=_read_site_to_uberon),
+    CdaResource('icdo_to_ncit', 'ICD-O-3.1-NCIt_Morphology_Mapping.txt',
+                url='https://evs.nci.nih.gov/ftp1/NCI_Thesaurus/Mappings/ICD-O-3_Mappings/ICD-O-3.1-NCIt_Morphology_Mapping.txt'),
+)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stamp(path: str) -> typing.Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _freeze(view: typing.Any) -> typing.Any:
+    # The mappings are wrapped into read-only proxies, also inside the (named) tuples,
+    # e.g. the lookup tables of `TreatmentMappings`.
+    if isinstance(view, dict):
+        return types.MappingProxyType(view)
+    if isinstance(view, tuple):
+        frozen = [_freeze(item) for item in view]
+        return type(view)(*frozen) if hasattr(view, '_fields') else tuple(frozen)
+    return view
+
+
+def _share(view: typing.Any) -> typing.Any:
+    # The DataFrames cannot be made read-only, hence each caller gets a copy.
+    if isinstance(view, pd.DataFrame):
+        return view.copy()
+    return view
+
+
+class CdaResourceManager:
+    """
+    `CdaResourceManager` resolves the bundled and downloaded resources lazily and caches their parsed views.
+
+    Constructing the manager is free: no file is read and no directory is created until a resource is requested.
+
+    The downloaded files are stored in `local_dir` along with a `<filename>.meta.json` sidecar with the SHA-256
+    checksum and the HTTP validators (`ETag`, `Last-Modified`) of the download. The downloads are streamed
+    into a temporary file that is atomically renamed when complete, hence an interrupted download never leaves
+    a truncated file behind. A cached file is verified against its checksum once per process,
+    and it is downloaded again if the verification fails. With `refresh=True`, the manager sends a conditional
+    request and skips the download if the remote file has not changed.
+
+    :param local_dir: the cache directory, `~/.oncoexporter` by default.
+    :param resources: the resources to manage, :data:`DEFAULT_RESOURCES` by default.
+    :param timeout: the download timeout in seconds.
+    :param session: the HTTP client for the downloads, e.g. a :class:`requests.Session`
+      or a :class:`Cassette` to record or replay the downloads, :mod:`requests` if `None`.
+    """
+
+    def __init__(self, local_dir: typing.Optional[str] = None,
+                 resources: typing.Optional[typing.Iterable[CdaResource]] = None,
+                 timeout: int = 60,
+                 session: typing.Optional[typing.Any] = None):
+        self._local_dir = local_dir
+        self._resources = {r.name: r for r in (DEFAULT_RESOURCES if resources is None else resources)}
+        self._timeout = timeout
+        self._session = requests if session is None else session
+        # (path, mtime, size) of the files that matched their checksum
+        self._verified: typing.Set[typing.Tuple[str, int, int]] = set()
+        # (name, parser) -> ((path, mtime, size), view)
+        self._views: typing.Dict[tuple, typing.Tuple[tuple, typing.Any]] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def local_dir(self) -> str:
+        if self._local_dir is None:
+            self._local_dir = os.path.join(os.path.expanduser('~'), '.oncoexporter')
+        return self._local_dir
+
+    def register(self, resource: CdaResource):
+        """
+        Add a resource, replacing any resource with the same name.
+        """
+        with self._lock:
+            self._resources[resource.name] = resource
+            self._views = {key: value for key, value in self._views.items() if key[0] != resource.name}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._resources
+
+    def get_resource(self, name: str) -> CdaResource:
+        if name not in self._resources:
+            raise ValueError(f'Unknown resource {name}. Available resources: {sorted(self._resources)}')
+        return self._resources[name]
+
+    def get_path(self, name: str, refresh: bool = False, overwrite: bool = False) -> str:
+        """
+        Get a path to a local copy of the resource, downloading the file if necessary.
+
+        :param name: the resource name.
+        :param refresh: check if the remote file changed (conditional request) and download it if it did.
+        :param overwrite: download the file even if the cached copy is valid.
+        :returns: the path to the file.
+        :raises requests.RequestException: if the download fails and there is neither cached nor bundled copy.
+        :raises ChecksumMismatchError: if the downloaded file does not match the `sha256` of the resource
+          and there is neither cached nor bundled copy.
+        """
+        resource = self.get_resource(name)
+        if resource.url is None:
+            bundled = self._bundled_path(resource)
+            if bundled is None:
+                raise FileNotFoundError(f'Could not find {resource.filename} in {resource.package}')
+            return bundled
+
+        with self._lock:
+            path = os.path.join(self.local_dir, resource.filename)
+            meta = self._read_meta(path)
+            valid = meta is not None and self._is_verified(path, meta)
+            if valid and not refresh and not overwrite:
+                return path
+
+            try:
+                self._download(resource, path, meta if valid and not overwrite else None)
+                return path
+            except (requests.RequestException, OSError, ChecksumMismatchError) as e:
+                if valid:
+                    warnings.warn(f'Could not refresh {resource.url} ({e}), using the cached copy')
+                    return path
+                bundled = self._bundled_path(resource)
+                if bundled is not None:
+                    warnings.warn(f'Could not download {resource.url} ({e}), using the bundled copy')
+                    return bundled
+                raise
+
+    def get(self, name: str,
+            parser: typing.Optional[typing.Callable[[str], typing.Any]] = None,
+            refresh: bool = False) -> typing.Any:
+        """
+        Get the parsed view of the resource.
+
+        The view is computed once and cached until the underlying file changes. The cached view is shared
+        by all callers, hence it is protected against changes: a `dict` view (also inside a tuple or a named tuple)
+        is returned as a read-only :class:`types.MappingProxyType` and each caller gets a copy of a
+        :class:`pd.DataFrame` view. The views of other types are returned as they are and must not be modified.
+
+        :param name: the resource name.
+        :param parser: a function that parses the file, the resource's default parser is used if `None`.
+        :param refresh: check if the remote file changed, see :func:`get_path`.
+        :returns: the parsed view or the path if the resource has no parser.
+        """
+        parser = self.get_resource(name).parser if parser is None else parser
+        with self._lock:
+            path = self.get_path(name, refresh=refresh)
+            if parser is None:
+                return path
+            key = (name, parser)
+            stamp = (path,) + _stamp(path)
+            cached = self._views.get(key)
+            if cached is not None and cached[0] == stamp:
+                return _share(cached[1])
+            view = _freeze(parser(path))
+            self._views[key] = (stamp, view)
+            return _share(view)
+
+    def invalidate(self, name: typing.Optional[str] = None):
+        """
+        Drop the cached views of the resource `name` or of all resources if `name` is `None`.
+        """
+        with self._lock:
+            self._views = {key: value for key, value in self._views.items() if name is not None and key[0] != name}
+
+    @staticmethod
+    def _bundled_path(resource: CdaResource) -> typing.Optional[str]:
+        if resource.package is None:
+            return None
+        bundled = files(resource.package).joinpath(resource.filename)
+        return str(bundled) if bundled.is_file() else None
+
+    @staticmethod
+    def _read_meta(path: str) -> typing.Optional[dict]:
+        meta_path = f'{path}.meta.json'
+        if not os.path.isfile(path) or not os.path.isfile(meta_path):
+            return None
+        try:
+            with open(meta_path) as fh:
+                return json.load(fh)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _write_meta(path: str, meta: dict):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.meta-')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(meta, fh)
+        os.replace(tmp_path, f'{path}.meta.json')
+
+    def _is_verified(self, path: str, meta: dict) -> bool:
+        stamp = (path,) + _stamp(path)
+        if stamp in self._verified:
+            return True
+        if meta.get('sha256') == _sha256(path):
+            self._verified.add(stamp)
+            return True
+        return False
+
+    def _download(self, resource: CdaResource, path: str, meta: typing.Optional[dict]):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        print(f"[INFO] Downloading {resource.url}")
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.download-')
+        try:
+            digest = hashlib.sha256()
+            # The temporary file is opened first, hence its descriptor is closed even if the request fails.
+            with os.fdopen(fd, 'wb') as fh, \
+                    self._session.get(resource.url, headers=headers, stream=True, timeout=self._timeout) as response:
+                if response.status_code == 304:
+                    if meta is None:
+                        # `raise_for_status` accepts a 304, which would leave an empty file.
+                        raise requests.HTTPError(f'304 Not Modified for the unconditional request of {resource.url}',
+                                                 response=response)
+                    new_meta = None
+                else:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(chunk_size=1 << 20):
+                        digest.update(chunk)
+                        fh.write(chunk)
+                    new_meta = {
+                        'url': resource.url,
+                        'sha256': digest.hexdigest(),
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified'),
+                    }
+            if new_meta is None:
+                os.remove(tmp_path)
+                print(f"[INFO] {resource.url} has not changed")
+                return
+            if resource.sha256 is not None and new_meta['sha256'] != resource.sha256:
+                raise ChecksumMismatchError(f'Checksum mismatch for {resource.url}: '
+                                            f'expected {resource.sha256} but got {new_meta["sha256"]}')
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._write_meta(path, new_meta)
+        self._verified.add((path,) + _stamp(path))
+        print(f"[INFO] Downloaded {resource.url}")
+
+
+_DEFAULT_MANAGER: typing.Optional[CdaResourceManager] = None
+
+
+def default_resource_manager() -> CdaResourceManager:
+    """
+    Get the process-wide :class:`CdaResourceManager` that caches into `~/.oncoexporter`.
+    """
+    global _DEFAULT_MANAGER
+    if _DEFAULT_MANAGER is None:
+        _DEFAULT_MANAGER = CdaResourceManager()
+    return _DEFAULT_MANAGER
@@ -3,6 +3,7 @@ import typing
 import pandas as pd
 import pickle
 import re
+import warnings
 from datetime import datetime
 from tqdm import tqdm
 
@@ -11,12 +12,24 @@ import phenopackets as PPkt
 
 from .cda_disease_factory import CdaDiseaseFactory
 from .cda_importer import CdaImporter
-from .cda_factory import CdaFactory
 from .cda_individual_factory import CdaIndividualFactory
-from .cda_biosample_factory import CdaBiosampleFactory
-from .cda_mutation_factory import CdaMutationFactory
+from .cda_biosample_factory import CdaBiosampleFactory, _check_levels, add_biosamples, collapse_specimens
+from .cassette import Cassette
+from .cda_mutation_factory import CdaMutationFactory, add_variant_interpretations
 from ._gdc import GdcService
-from .cda_medicalaction_factory import make_cda_medicalaction
+from .cda_medicalaction_factory import group_medical_actions_by_subject
+from .diagnosis_catalog import diagnosis_combinations, merge_diagnosis_tables
+from .diagnostics import Diagnostics
+from .phenopacket_stages import PHENOPACKET_STAGES
+
+
+class MutationSource(typing.Protocol):
+    """
+    A source of the variants of a subject, e.g. :class:`GdcService` or :class:`MafMutationSource`.
+    """
+
+    def fetch_variants(self, subject_id: str) -> typing.Sequence[PPkt.VariantInterpretation]:
+        ...
 
 
 #class CdaTableImporter(CdaImporter[Q]):
@@ -33,6 +46,12 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
     :param cache_dir: a `str` with path to the folder to store the cache files
     :param use_cache: if True, cache/retrieve from cache
     :param page_size: Number of pages to retrieve at once. Defaults to `10000`
+    :param mutation_source: the source of the variants with a `fetch_variants(subject_id)` method,
+      such as :class:`MafMutationSource`. The variants are fetched from the GDC API if `None`.
+    :param collapse_specimen_levels: the specimen levels to leave out of the biosamples, e.g. `('aliquot', 'portion')`,
+      see :func:`collapse_specimens`. All specimens are included by default.
+    :param cassette: the :class:`Cassette` to record or replay the CDA tables and the GDC responses,
+      e.g. to run the benchmarks offline. The cache of `cache_dir` takes precedence if `use_cache` is set.
 
     New CDA:
     https://cda.readthedocs.io/en/latest/documentation/cdapython/code_update/#returning-a-matrix-of-results
@@ -60,15 +79,25 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
                  cache_dir: typing.Optional[str] = None,
                  #page_size: int = 10000,
                  gdc_timeout: int = 100000,
+                 mutation_source: typing.Optional[MutationSource] = None,
+                 collapse_specimen_levels: typing.Iterable[str] = (),
+                 cassette: typing.Optional[Cassette] = None,
                  ):
         self._use_cache = use_cache
+        self._cassette = cassette
         #self._page_size = page_size # not in new CDA
 
-        self._individual_factory = CdaIndividualFactory()
+        # The factories report the conversion issues to the collector of the disease factory.
+        self._diagnostics = disease_factory.get_diagnostics()
+        self._individual_factory = CdaIndividualFactory(diagnostics=self._diagnostics)
         self._disease_factory = disease_factory 
-        self._specimen_factory = CdaBiosampleFactory()
+        self._specimen_factory = CdaBiosampleFactory(diagnostics=self._diagnostics)
+        self._collapse_specimen_levels = tuple(_check_levels(collapse_specimen_levels))
         self._mutation_factory = CdaMutationFactory()
-        self._gdc_service = GdcService(timeout=gdc_timeout)
+        # With a cassette, the GDC responses and the download of the transcript to protein table are recorded.
+        self._gdc_service = GdcService(timeout=gdc_timeout, session=cassette,
+                                       resources=None if cassette is None else cassette.resource_manager())
+        self._mutation_source = self._gdc_service if mutation_source is None else mutation_source
 
         if cache_dir is None:
             self._cache_dir = os.path.join(os.getcwd(), '.oncoexporter_cache')
@@ -77,6 +106,12 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
         else:
             if not os.path.isdir(cache_dir) or not os.access(cache_dir, os.W_OK):
                 raise ValueError(f'`cache_dir` must be a writable directory: {cache_dir}')
+            self._cache_dir = cache_dir
+
+    def _fetch_rows(self, **kwargs) -> pd.DataFrame:
+        if self._cassette is None:
+            return fetch_rows(**kwargs)
+        return self._cassette.fetch_rows(fetch_rows, **kwargs)
 
     def _get_cda_df(self, callback_fxn, cache_name: str):
         fpath_cache = os.path.join(self._cache_dir, cache_name)
@@ -94,6 +129,29 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
                     pickle.dump(individual_df, f)
         return individual_df
 
+    def get_stage_dict(self) -> typing.Mapping[str, str]:
+        """
+        Get the mapping from the GDC case ID (e.g. `TCGA-4J-AA1J`) to the AJCC pathologic stage.
+
+        The mapping covers all GDC cases, regardless of the cohort, hence it is cached under the same name
+        for all cohorts if the cache is used.
+        """
+        return self._get_cda_df(self._gdc_service.fetch_stage_dict, 'gdc_stage_dict.pkl')
+
+    def prefetch_shared(self, stages: typing.Iterable[str] = PHENOPACKET_STAGES):
+        """
+        Fetch the data shared by all cohorts, to reuse them in several importers, e.g. in worker processes
+        that export different cohorts: the GDC stage mapping (only stored if the cache is used)
+        and the Ensembl transcript to protein table (only needed for the variants from the GDC API).
+
+        :param stages: the stages that will be run, see :func:`get_ga4gh_phenopackets`.
+        """
+        stages = frozenset(stages)
+        if 'diseases' in stages and self._use_cache:
+            self.get_stage_dict()
+        if 'variants' in stages and self._mutation_source is self._gdc_service:
+            self._gdc_service.prefetch()
+
     def get_subject_df(self, q: dict, cohort_name: str) -> pd.DataFrame:
         """
         Retrieve the subject dataframe from CDA
@@ -110,7 +168,7 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
         print("\nGetting subject df...")
 
         # Define the callable to fetch the subject rows
-        callable = lambda: fetch_rows(table='subject', **q, provenance=True)
+        callable = lambda: self._fetch_rows(table='subject', **q, provenance=True)
 
         # Get the subject DataFrame (or load from cache if available)
         subject_df = self._get_cda_df(callable, f"{cohort_name}_individual_df.pkl")
@@ -141,7 +199,7 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
         print("\nGetting researchsubject df...")
         # tried link_to_table='diagnosis' but it doesn't add any columns
         # research = fetch_rows(table='researchsubject', provenance=True)
-        rsub_callable = lambda: fetch_rows( table='researchsubject', **q , add_columns=['subject_id'])
+        rsub_callable = lambda: self._fetch_rows( table='researchsubject', **q , add_columns=['subject_id'])
         rsub_df = self._get_cda_df(rsub_callable, f"{cohort_name}_researchsubject_df.pkl")
         print("obtained researchsubject_df")
         #rsub_df.to_csv('rsub_df.txt', sep='\t')
@@ -152,13 +210,24 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
 
         print("\nGetting diagnosis df...")
         # diag = fetch_rows(table='diagnosis', add_columns=['researchsubject_id'])
-        diagnosis_callable = lambda: fetch_rows( table='diagnosis', **q , add_columns=['subject_id'])
+        diagnosis_callable = lambda: self._fetch_rows( table='diagnosis', **q , add_columns=['subject_id'])
         diagnosis_df = self._get_cda_df(diagnosis_callable, f"{cohort_name}_diagnosis_df.pkl")
         print("obtained diagnosis_df")
         #diagnosis_df.to_csv('diagnosis_df.txt', sep='\t')
 
         return diagnosis_df
 
+    def get_diagnosis_combinations(self, q: dict, cohort_name: str) -> pd.DataFrame:
+        """
+        Get the distinct `(primary_diagnosis, primary_diagnosis_condition, primary_diagnosis_site)` combinations
+        of the cohort with the counts, flagging the combinations missing from the NCIT mapping tables.
+
+        See :func:`oncopacket.cda.diagnosis_combinations` for the columns.
+        """
+        rsub_df = self.get_researchsubject_df(q, cohort_name)
+        diagnosis_df = self.get_diagnosis_df(q, cohort_name)
+        return diagnosis_combinations(merge_diagnosis_tables(rsub_df, diagnosis_df))
+
     def get_specimen_df(self, q: dict, cohort_name: str) -> pd.DataFrame:
         """Retrieve the subject dataframe from CDA
 
@@ -170,7 +239,7 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
         """
         print("\nGetting specimen df...")
         #specimen_callable = lambda: q.specimen.run(page_size=self._page_size).get_all().to_dataframe()
-        specimen_callable = lambda: fetch_rows( table='specimen', **q, add_columns=['subject_id'] )
+        specimen_callable = lambda: self._fetch_rows( table='specimen', **q, add_columns=['subject_id'] )
         specimen_df = self._get_cda_df(specimen_callable, f"{cohort_name}_specimen_df.pkl")
         #specimen_df.to_csv('specimen_df.txt', sep='\t')
         return specimen_df
@@ -178,7 +247,7 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
     def get_treatment_df(self, q: dict, cohort_name: str) -> pd.DataFrame:
         print("\nGetting treatment df...")
         #treatment_callable = lambda: q.treatment.run(page_size=self._page_size).get_all().to_dataframe()
-        treatment_callable = lambda: fetch_rows( table='treatment', **q, add_columns=['subject_id'] )
+        treatment_callable = lambda: self._fetch_rows( table='treatment', **q, add_columns=['subject_id'] )
         treatment_df = self._get_cda_df(treatment_callable, f"{cohort_name}_treatment_df.pkl")
         #treatment_df.to_csv('treatment_df.txt', sep='\t')
         return treatment_df
@@ -186,6 +255,12 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
     def get_ga4gh_phenopackets(self, source: dict, **kwargs) -> typing.List[PPkt.Phenopacket]:
         """Get a list of GA4GH phenopackets corresponding to the individuals returned by the query passed to the constructor.
 
+        The keyword arguments are `cohort_name`, the prefix of the phenopacket IDs, and `stages`, the parts of the phenopackets
+        to include, any of :data:`PHENOPACKET_STAGES` (all by default). The CDA tables and the GDC calls that are needed
+        only for the excluded stages are skipped, e.g. `stages=('diseases',)` skips the slow retrieval of the variants.
+
+        The conversion issues of the run, such as the unmapped primary sites, are reported by :func:`get_diagnostics`.
+
         :returns: A list of GA4GH phenopackets corresponding to the individuals selected by the query passed to the constructor.
         :rtype: typing.List[PPkt.Phenopacket]
 
@@ -199,6 +274,7 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
             ts = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
             cohort_name = f'cohort-{ts}'
 
+        self._diagnostics.clear()
         # Dictionary of phenopackets, keys are the phenopacket ids.
         ppackt_d = {}
 
@@ -206,11 +282,19 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
         # (MLS 6/18/24) rewriting this to get subject, researchsubject, diagnosis, specimen, and treatment dataframes,
         # then merge them here to avoid getting researchsubject and subject dataframes multiple times.
 
+        stages = frozenset(kwargs.get('stages', PHENOPACKET_STAGES))
+        unknown = stages.difference(PHENOPACKET_STAGES)
+        if unknown:
+            raise ValueError(f'Unknown stage(s) {sorted(unknown)}. Use any of {PHENOPACKET_STAGES}')
+
         subject_df = self.get_subject_df(source, cohort_name)
-        rsub_df = self.get_researchsubject_df(source, cohort_name)
-        diagnosis_df = self.get_diagnosis_df(source, cohort_name)
-        specimen_df = self.get_specimen_df(source, cohort_name)
-        treatment_df = self.get_treatment_df(source, cohort_name)
+        if 'diseases' in stages or 'variants' in stages:
+            rsub_df = self.get_researchsubject_df(source, cohort_name)
+            diagnosis_df = self.get_diagnosis_df(source, cohort_name)
+        if 'biosamples' in stages:
+            specimen_df = self.get_specimen_df(source, cohort_name)
+        if 'treatments' in stages:
+            treatment_df = self.get_treatment_df(source, cohort_name)
 
         # merge dfs:
         # can actually just make one merged df with subject_id, researchsubject_id, primary_diagnosis_condition,
@@ -219,11 +303,12 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
         #  - disease_factory
         #  - vital_status
         #  - variants
-        sub_rsub_diag_df = subject_df.merge(rsub_df, on='subject_id', how='outer')
-        sub_rsub_diag_df = sub_rsub_diag_df.merge(diagnosis_df, on='subject_id', how='outer')
+        if 'diseases' in stages or 'variants' in stages:
+            sub_rsub_diag_df = subject_df.merge(rsub_df, on='subject_id', how='outer')
+            sub_rsub_diag_df = sub_rsub_diag_df.merge(diagnosis_df, on='subject_id', how='outer')
 
-        #sub_rsub_diag_df.to_csv("sub_rsub_diag_df.txt", sep='\t') 
-        print("merged subject-researchsubject-diagnosis df")
+            #sub_rsub_diag_df.to_csv("sub_rsub_diag_df.txt", sep='\t') 
+            print("merged subject-researchsubject-diagnosis df")
         '''
         Have a problem with patients that have multiple researchsubject IDs with differing primary diagnosis sites
         
@@ -249,23 +334,39 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
         '''
 
         # Retrieve GA4GH Individual messages
-        for _, row in tqdm(subject_df.iterrows(), total=len(subject_df), desc= "individual dataframe"):
-            try:
-                individual_message = self._individual_factory.to_ga4gh(row=row)
-            except ValueError as e:
-                # TODO: decide how to handle depending on your paranoia
-                #
-                pass
-
-            individual_id = individual_message.id
-            ppackt = PPkt.Phenopacket()
+        # The subjects are populated in place, without copying the Individual messages into the phenopackets.
+        phenopackets = [PPkt.Phenopacket() for _ in range(len(subject_df))]
+        self._individual_factory.to_ga4gh_batch(subject_df, targets=[ppackt.subject for ppackt in phenopackets])
+        for ppackt in tqdm(phenopackets, desc="individual dataframe"):
+            individual_id = ppackt.subject.id
             ppackt.id = f'{cohort_name}-{individual_id}'
-            ppackt.subject.CopyFrom(individual_message)
             ppackt_d[individual_id] = ppackt
 
+        if 'diseases' in stages:
+            self._add_diseases(ppackt_d, sub_rsub_diag_df)
+        if 'variants' in stages:
+            self._add_variants(ppackt_d, sub_rsub_diag_df)
+        if 'biosamples' in stages:
+            self._add_biosamples(ppackt_d, specimen_df, subject_df)
+        if 'treatments' in stages:
+            self._add_medical_actions(ppackt_d, treatment_df)
+
+        print(self._diagnostics.summary())
+
+        # When we get here, we have constructed GA4GH Phenopackets with Individual, Disease, Biospecimen, MedicalAction, and GenomicInterpretations
+        return list(ppackt_d.values())
+
+    def get_diagnostics(self) -> Diagnostics:
+        """
+        Get the conversion issues of the last :func:`get_ga4gh_phenopackets` run, see :func:`Diagnostics.to_df`
+        for the report.
+        """
+        return self._diagnostics
+
+    def _add_diseases(self, ppackt_d: typing.Dict[str, PPkt.Phenopacket], sub_rsub_diag_df: pd.DataFrame):
         # get stage dictionary, map to subject ID
         print("Retrieving stage info from GDC...", end='')
-        stage_dict = self._gdc_service.fetch_stage_dict()
+        stage_dict = self.get_stage_dict()
         print("Done!")
         
         # remove initial data source label: TCGA.TCGA-4J-AA1J > TCGA-4J-AA1J
@@ -273,16 +374,15 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
         sub_rsub_diag_df['stage'] = sub_rsub_diag_df['subject_id_short'].map(stage_dict).fillna(sub_rsub_diag_df['stage'])
 
         sub_rsub_diag_df['primary_diagnosis'] = sub_rsub_diag_df['primary_diagnosis'].fillna('') # remove nans (not sure why they are there)
-        sub_rsub_diag_df.to_csv('sub_rsub_diag_df.txt', sep='\t')
+        #sub_rsub_diag_df.to_csv('sub_rsub_diag_df.txt', sep='\t')
 
 
 
         # Retrieve GA4GH Disease messages
-        for _, row in tqdm(sub_rsub_diag_df.iterrows(), total=len(sub_rsub_diag_df.index), desc="creating disease messsages"):
-
-            
-            disease_message = self._disease_factory.to_ga4gh(row)
-            pp = ppackt_d.get(row["subject_id"])
+        disease_messages = self._disease_factory.to_ga4gh_batch(sub_rsub_diag_df)
+        for subject_id, disease_message in tqdm(zip(sub_rsub_diag_df["subject_id"], disease_messages),
+                                                total=len(disease_messages), desc="creating disease messsages"):
+            pp = ppackt_d.get(subject_id)
 
             # Do not add the disease if it is already in the phenopacket.
             if not any(disease.term.id == disease_message.term.id for disease in pp.diseases):
@@ -297,12 +397,18 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
             # vital_status = self._gdc_service.fetch_vital_status(subj_id)
             # ppackt_d.get(individual_id).subject.vital_status.CopyFrom(vital_status)
 
+    def _add_variants(self, ppackt_d: typing.Dict[str, PPkt.Phenopacket], sub_rsub_diag_df: pd.DataFrame):
         # Get variant data 
-        # ->takes ~15-45 minutes due to API calls to GDC
+        # ->takes ~15-45 minutes due to API calls to GDC, use a `MafMutationSource` to read local MAF files instead
         # should sub_rsub_diag_df already be filtered to GDC?
         sub_rsub_diag_GDC_df = sub_rsub_diag_df[sub_rsub_diag_df['subject_data_source'] == 'GDC']
-        
-        for _, row in tqdm(sub_rsub_diag_GDC_df.iterrows(), total=len(sub_rsub_diag_df.index), desc="getting variants from GDC"):
+
+        # The recurrent variants are built once per cohort
+        variant_cache = getattr(self._mutation_source, 'get_variant_cache', lambda: None)()
+        if variant_cache is not None:
+            variant_cache.clear()
+
+        for _, row in tqdm(sub_rsub_diag_GDC_df.iterrows(), total=len(sub_rsub_diag_GDC_df.index), desc="getting variants"):
 
             individual_id = row["subject_id"]
             # have to strip off the leading name before first period
@@ -310,62 +416,49 @@ class CdaTableImporter(CdaImporter[fetch_rows]):
             subj_id = re.sub("^[^.]+\.", "", individual_id)
 
             # get variants
-            variant_interpretations = self._gdc_service.fetch_variants(subj_id) 
+            variant_interpretations = self._mutation_source.fetch_variants(subj_id)
             if len(variant_interpretations) == 0:
                 #print("No variants found")
                 continue
             #else:
                 #print("length variant_interpretations: {}".format(len(variant_interpretations)))
 
-            # TODO: improve/enhance diagnosis term annotations
-            diagnosis = PPkt.Diagnosis()
-            diagnosis.disease.id = "NCIT:C3262"
-            diagnosis.disease.label = "Neoplasm"
-
-            for variant in variant_interpretations:
-                genomic_interpretation = PPkt.GenomicInterpretation()
-                genomic_interpretation.subject_or_biosample_id = individual_id
-                genomic_interpretation.interpretation_status = PPkt.GenomicInterpretation.InterpretationStatus.UNKNOWN_STATUS
-                genomic_interpretation.variant_interpretation.CopyFrom(variant)
-
-                diagnosis.genomic_interpretations.append(genomic_interpretation)
-
-            interpretation = PPkt.Interpretation()
-            interpretation.id = f"{individual_id}-{row['researchsubject_id']}"
-            interpretation.progress_status = PPkt.Interpretation.ProgressStatus.IN_PROGRESS
-            interpretation.diagnosis.CopyFrom(diagnosis)
-
-            ppackt_d.get(individual_id).interpretations.append(interpretation)
-
-
-        # Retrieve GA4GH Biospecimen messages
-        for idx, row in tqdm(specimen_df.iterrows(),total=len(specimen_df.index), desc="specimen/biosample dataframe"):
-            biosample_message = self._specimen_factory.to_ga4gh(row)
-            individual_id = row["subject_id"]
-            if individual_id not in ppackt_d:
-                raise ValueError(f"Attempt to enter unknown individual ID from biosample factory: \"{individual_id}\"")
-
-            # convert CDA days_to_collection to PPKt time_of_collection
-            #         days_to_collection: number of days from index date to sample collection date
-            #         time_of_collection: Age of subject at time sample was collected
-            if not pd.isna(row['days_to_collection']):
-                days_to_coll_iso = CdaFactory.days_to_iso(int(row["days_to_collection"]))
-            
-            # TODO: fix the code below!
-            # this should work if both are pd.Timedelta:
-            # time_of_collection = ppackt_d[individual_id]["iso8601duration"] + days_to_coll_iso # should it be 'Age' or 'iso8601duration'?
-            # biosample_message["time_of_collection"] = time_of_collection
-
-            ppackt_d.get(individual_id).biosamples.append(biosample_message)
-
-        # treatment to medical action
-        for idx, row in tqdm(treatment_df.iterrows(), total=len(treatment_df.index), desc="Treatment DF"):
-            individual_id = row["subject_id"]
-            medical_action_message = make_cda_medicalaction(row)
-            if individual_id not in ppackt_d:
-                raise ValueError(f"Attempt to enter unknown individual ID from treatment factory: \"{individual_id}\"")
-            ppackt_d.get(individual_id).medical_actions.append(medical_action_message)
-
-        # When we get here, we have constructed GA4GH Phenopackets with Individual, Disease, Biospecimen, MedicalAction, and GenomicInterpretations
-        return list(ppackt_d.values())
-
+            add_variant_interpretations(ppackt_d.get(individual_id),
+                                        interpretation_id=f"{individual_id}-{row['researchsubject_id']}",
+                                        subject_id=individual_id,
+                                        variants=variant_interpretations)
+
+        if variant_cache is not None:
+            print(variant_cache.summary())
+
+    def _add_biosamples(self, ppackt_d: typing.Dict[str, PPkt.Phenopacket], specimen_df: pd.DataFrame,
+                        subject_df: pd.DataFrame):
+        # The specimens of the subjects outside of the cohort are skipped, with a single set operation.
+        known = specimen_df['subject_id'].isin(ppackt_d.keys())
+        if not known.all():
+            unknown = specimen_df.loc[~known, 'subject_id'].unique()
+            warnings.warn(f'Skipping {int((~known).sum())} specimens of {len(unknown)} unknown individual(s), '
+                          f'e.g. "{unknown[0]}"')
+            specimen_df = specimen_df[known]
+        if self._collapse_specimen_levels:
+            specimen_df = collapse_specimens(specimen_df, self._collapse_specimen_levels)
+
+        # CDA days_to_collection is the number of days from the index date to the sample collection date,
+        # hence the time_of_collection (age of the subject at the collection) is the age at the index date
+        # (-days_to_birth) plus days_to_collection.
+        days_to_birth = subject_df.set_index('subject_id')['days_to_birth']
+        print(f"Converting {len(specimen_df)} specimens to biosamples...")
+        add_biosamples(self._specimen_factory, ppackt_d, specimen_df, days_to_birth=days_to_birth)
+
+    def _add_medical_actions(self, ppackt_d: typing.Dict[str, PPkt.Phenopacket], treatment_df: pd.DataFrame):
+        # The treatments of the subjects outside of the cohort are skipped, with a single set operation.
+        known = treatment_df['subject_id'].isin(ppackt_d.keys())
+        if not known.all():
+            unknown = treatment_df.loc[~known, 'subject_id'].unique()
+            warnings.warn(f'Skipping {int((~known).sum())} treatments of {len(unknown)} unknown individual(s), '
+                          f'e.g. "{unknown[0]}"')
+            treatment_df = treatment_df[known]
+
+        print(f"Converting {len(treatment_df)} treatments to medical actions...")
+        for individual_id, medical_actions in group_medical_actions_by_subject(treatment_df).items():
+            ppackt_d[individual_id].medical_actions.extend(medical_actions)
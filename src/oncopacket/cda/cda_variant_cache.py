@@ -0,0 +1,63 @@
+import typing
+
+import phenopackets as pp
+
+
+class VariantDescriptorCache:
+    """
+    `VariantDescriptorCache` keeps one prototype `VariationDescriptor` per distinct variant.
+
+    Recurrent variants, such as KRAS G12D or IDH1 R132H, are found in many subjects of a cohort.
+    Instead of building the descriptor with the HGVS expressions and the VCF record for each subject,
+    we build it once, and the descriptor of each subject is copied from the prototype.
+
+    The key must determine the prototype completely, e.g. `(build, chrom, pos, ref, alt, transcripts)`.
+    The prototypes are shared and they must not be modified, use `CopyFrom` to get a copy.
+    """
+
+    def __init__(self):
+        self._prototypes: typing.Dict[typing.Hashable, pp.VariationDescriptor] = {}
+        self._n_reused = 0
+
+    def get(self, key: typing.Hashable,
+            build: typing.Callable[[], pp.VariationDescriptor]) -> pp.VariationDescriptor:
+        """
+        Get the prototype for the `key`, calling `build` to create the prototype if the key is new.
+        """
+        prototype = self._prototypes.get(key)
+        if prototype is None:
+            prototype = build()
+            self._prototypes[key] = prototype
+        else:
+            self._n_reused += 1
+        return prototype
+
+    def __len__(self) -> int:
+        return len(self._prototypes)
+
+    @property
+    def n_built(self) -> int:
+        """
+        The number of the descriptors that were built, i.e. the number of distinct variants.
+        """
+        return len(self._prototypes)
+
+    @property
+    def n_deduplicated(self) -> int:
+        """
+        The number of the descriptors that were copied from a prototype instead of being built.
+        """
+        return self._n_reused
+
+    def summary(self) -> str:
+        total = self.n_built + self.n_deduplicated
+        ratio = 0. if total == 0 else 100. * self.n_deduplicated / total
+        return f'Built {self.n_built} variant descriptors for {total} variants ' \
+               f'({self.n_deduplicated} deduplicated, {ratio:.1f}%)'
+
+    def clear(self):
+        """
+        Drop the prototypes and reset the counts.
+        """
+        self._prototypes.clear()
+        self._n_reused = 0
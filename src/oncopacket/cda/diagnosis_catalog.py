@@ -0,0 +1,188 @@
+import glob
+import os
+import pickle
+import typing
+import warnings
+
+import pandas as pd
+
+from .mapper.op_diagnosis_mapper import get_cda_key, read_tissue_mapping_tables
+
+COMBINATION_COLUMNS = ('primary_diagnosis', 'primary_diagnosis_condition', 'primary_diagnosis_site')
+
+# The incremental catalog of the cached cohorts, stored in the importer cache directory.
+CATALOG_FILENAME = 'diagnosis_combinations.pkl'
+# Bump when the columns of the counts change, to invalidate the stored catalogs.
+CATALOG_VERSION = 1
+
+_DIAGNOSIS_SUFFIX = '_diagnosis_df.pkl'
+_RESEARCHSUBJECT_SUFFIX = '_researchsubject_df.pkl'
+
+
+def merge_diagnosis_tables(rsub_df: pd.DataFrame, diagnosis_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merge the CDA `researchsubject` table, with the `primary_diagnosis_condition` and the `primary_diagnosis_site`,
+    and the `diagnosis` table, with the `primary_diagnosis`, like :class:`CdaTableImporter` does.
+    """
+    return rsub_df.merge(diagnosis_df, on='subject_id', how='outer', suffixes=('_rs', '_di'))
+
+
+def prepare_mapping_table(mapping_df: typing.Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Index the NCIT mapping table by the key of :func:`get_cda_key`, keeping the rows with an NCIT term,
+    like :func:`prepare_ncit_map` does.
+
+    :param mapping_df: the mapping table, the bundled `cda_to_ncit_map_<tissue>.csv` tables by default.
+    :returns: a DataFrame indexed by the key, with the `ncit_id`, `ncit_label`, and `tissue` columns.
+    """
+    if mapping_df is None:
+        mapping_df = read_tissue_mapping_tables()
+    mapping_df = mapping_df[mapping_df['ncit_id'].astype(str).str.startswith('NCIT')]
+    keys = [get_cda_key(*values) for values in mapping_df[list(COMBINATION_COLUMNS)].astype(str).itertuples(index=False)]
+    columns = [c for c in ('ncit_id', 'ncit_label', 'tissue') if c in mapping_df.columns]
+    table = mapping_df[columns].set_axis(pd.Index(keys, name='key'))
+    # The last row wins, like in `prepare_ncit_map`.
+    return table[~table.index.duplicated(keep='last')]
+
+
+def count_combinations(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Count the distinct `(primary_diagnosis, primary_diagnosis_condition, primary_diagnosis_site)` combinations
+    with a single grouped aggregation.
+
+    The missing values are treated as empty strings, like :class:`OpDiagnosisMapper` does.
+
+    :param df: a DataFrame with the combination columns, e.g. from :func:`merge_diagnosis_tables`.
+    :returns: a DataFrame with the combination columns, `n_rows`, and `n_subjects` if `df` has a `subject_id` column.
+    """
+    columns = list(COMBINATION_COLUMNS)
+    frame = df[columns].astype(object).where(df[columns].notna(), '').astype(str)
+    if 'subject_id' in df.columns:
+        frame['subject_id'] = df['subject_id'].to_numpy()
+        counts = frame.groupby(columns, sort=False).agg(n_rows=('subject_id', 'size'),
+                                                        n_subjects=('subject_id', 'nunique'))
+    else:
+        counts = frame.groupby(columns, sort=False).size().to_frame('n_rows')
+    return counts.reset_index()
+
+
+def flag_unmapped(counts: pd.DataFrame, mapping_table: typing.Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Add the key, the NCIT term, and the `mapped` flag to the combinations of :func:`count_combinations`.
+
+    :param counts: the combinations.
+    :param mapping_table: the table of :func:`prepare_mapping_table`, the bundled tables by default.
+    :returns: the combinations sorted by the decreasing `n_rows`, with the `key`, `ncit_id`, `ncit_label`,
+      `tissue`, and `mapped` columns. The combinations with `mapped=False` fall back to the generic neoplasm term.
+    """
+    if mapping_table is None:
+        mapping_table = prepare_mapping_table()
+    keys = [get_cda_key(*values) for values in counts[list(COMBINATION_COLUMNS)].itertuples(index=False)]
+    flagged = counts.assign(key=keys).join(mapping_table, on='key')
+    flagged['mapped'] = flagged['ncit_id'].notna()
+    return flagged.sort_values('n_rows', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def diagnosis_combinations(df: pd.DataFrame, mapping_table: typing.Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Get the diagnosis combinations of a cohort with the counts, flagging the combinations that are missing
+    from the `cda_to_ncit_map_<tissue>.csv` tables.
+
+    ```python
+    combinations = diagnosis_combinations(merge_diagnosis_tables(rsub_df, diagnosis_df))
+    unmapped = combinations[~combinations['mapped']]
+    ```
+
+    See :func:`count_combinations` and :func:`flag_unmapped` for the columns.
+    """
+    return flag_unmapped(count_combinations(df), mapping_table)
+
+
+def _stamp(path: str) -> typing.Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_pickle(path: str) -> pd.DataFrame:
+    with open(path, 'rb') as fh:
+        return pickle.load(fh)
+
+
+def _find_cached_cohorts(cache_dir: str) -> typing.Dict[str, typing.Tuple[str, str]]:
+    cohorts = {}
+    for diagnosis_path in sorted(glob.glob(os.path.join(glob.escape(cache_dir), f'*{_DIAGNOSIS_SUFFIX}'))):
+        cohort = os.path.basename(diagnosis_path)[:-len(_DIAGNOSIS_SUFFIX)]
+        rsub_path = os.path.join(cache_dir, f'{cohort}{_RESEARCHSUBJECT_SUFFIX}')
+        if os.path.isfile(rsub_path):
+            cohorts[cohort] = (rsub_path, diagnosis_path)
+    return cohorts
+
+
+def _load_catalog(path: str) -> typing.Dict[str, dict]:
+    try:
+        with open(path, 'rb') as fh:
+            catalog = pickle.load(fh)
+        if catalog.get('version') == CATALOG_VERSION:
+            return catalog['cohorts']
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+    return {}
+
+
+def _save_catalog(path: str, cohorts: typing.Mapping[str, dict]):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as fh:
+            pickle.dump({'version': CATALOG_VERSION, 'cohorts': dict(cohorts)}, fh)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        warnings.warn(f'Could not store the diagnosis combinations in {path}: {e}')
+
+
+def cached_diagnosis_combinations(cache_dir: str,
+                                  cohorts: typing.Optional[typing.Iterable[str]] = None,
+                                  mapping_table: typing.Optional[pd.DataFrame] = None,
+                                  update: bool = True) -> pd.DataFrame:
+    """
+    Get the diagnosis combinations of the cohorts cached by :class:`CdaTableImporter`,
+    i.e. the cohorts with the `<cohort>_researchsubject_df.pkl` and `<cohort>_diagnosis_df.pkl` files in `cache_dir`.
+
+    The counts are stored in `cache_dir` and updated incrementally: only the cohorts with new or changed tables
+    are counted again. The combinations are flagged against the current mapping tables on each call.
+
+    :param cache_dir: the importer cache directory, e.g. `.oncoexporter_cache`.
+    :param cohorts: the names of the cohorts to include, e.g. `['Lung', 'Brain']`, all cached cohorts by default.
+    :param mapping_table: the table of :func:`prepare_mapping_table`, the bundled tables by default.
+    :param update: `True` if the stored counts should be updated.
+    :returns: the combinations of :func:`diagnosis_combinations` with the `cohort` column.
+    """
+    sources = _find_cached_cohorts(cache_dir)
+    if cohorts is not None:
+        cohorts = list(cohorts)
+        missing = [c for c in cohorts if c not in sources]
+        if missing:
+            raise ValueError(f'No cached tables for cohort(s) {missing} in {cache_dir}')
+        sources = {c: sources[c] for c in cohorts}
+
+    catalog_path = os.path.join(cache_dir, CATALOG_FILENAME)
+    catalog = _load_catalog(catalog_path)
+    changed = False
+    frames = []
+    for cohort, (rsub_path, diagnosis_path) in sources.items():
+        stamps = (_stamp(rsub_path), _stamp(diagnosis_path))
+        entry = catalog.get(cohort)
+        if entry is None or entry['stamps'] != stamps:
+            merged = merge_diagnosis_tables(_read_pickle(rsub_path), _read_pickle(diagnosis_path))
+            entry = {'stamps': stamps, 'counts': count_combinations(merged)}
+            catalog[cohort] = entry
+            changed = True
+        frames.append(entry['counts'].assign(cohort=cohort))
+    if update and changed:
+        _save_catalog(catalog_path, catalog)
+
+    if frames:
+        counts = pd.concat(frames, ignore_index=True)
+    else:
+        counts = pd.DataFrame(columns=[*COMBINATION_COLUMNS, 'n_rows', 'n_subjects', 'cohort'])
+    flagged = flag_unmapped(counts, mapping_table).sort_values('cohort', kind='stable', ignore_index=True)
+    return flagged[['cohort'] + [c for c in flagged.columns if c != 'cohort']]
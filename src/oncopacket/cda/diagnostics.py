@@ -0,0 +1,110 @@
+import typing
+
+import pandas as pd
+
+DIAGNOSTICS_COLUMNS = ('category', 'key', 'count', 'examples')
+
+
+class Diagnostics:
+    """
+    `Diagnostics` collects the misses and the errors of the conversion, such as the unmapped primary sites
+    or the unparsable ages, instead of printing a line for each row.
+
+    The records are counted by the category (e.g. `unmapped_primary_site`) and the key (e.g. the site),
+    and the first `max_examples` examples (e.g. the subject IDs) are kept for each key.
+    Recording a known key is a dictionary update, hence the collector can be used in the conversion loops.
+
+    ```python
+    diagnostics = Diagnostics()
+    diagnostics.record('unmapped_primary_site', 'Bronchus and lung', example='TCGA.TCGA-05-4250')
+    report = diagnostics.to_df()
+    ```
+
+    :param max_examples: the number of examples to keep per category and key.
+    """
+
+    def __init__(self, max_examples: int = 3):
+        if max_examples < 0:
+            raise ValueError(f'`max_examples` must not be negative but was {max_examples}')
+        self._max_examples = max_examples
+        self._counts: typing.Dict[typing.Tuple[str, typing.Hashable], int] = {}
+        self._examples: typing.Dict[typing.Tuple[str, typing.Hashable], typing.List] = {}
+
+    def record(self, category: str, key: typing.Hashable = '', example: typing.Any = None, n: int = 1):
+        """
+        Count an occurrence of the `key` in the `category`.
+
+        :param category: the kind of the miss or error, e.g. `unmapped_primary_site`.
+        :param key: the value that could not be processed, e.g. the site.
+        :param example: an example of the affected records, e.g. the subject ID, ignored if `None`.
+        :param n: the number of the occurrences, e.g. the number of the rows with the value.
+        """
+        item = (category, key)
+        self._counts[item] = self._counts.get(item, 0) + n
+        if example is not None and self._max_examples > 0:
+            examples = self._examples.get(item)
+            if examples is None:
+                self._examples[item] = [example]
+            elif len(examples) < self._max_examples:
+                examples.append(example)
+
+    def count(self, category: typing.Optional[str] = None, key: typing.Optional[typing.Hashable] = None) -> int:
+        """
+        Get the number of the records in the `category` with the `key`, in all categories or with all keys if `None`.
+        """
+        return sum(count for (c, k), count in self._counts.items()
+                   if (category is None or c == category) and (key is None or k == key))
+
+    def categories(self) -> typing.List[str]:
+        """
+        Get the categories with at least one record, in the order of the first record.
+        """
+        return list(dict.fromkeys(category for category, _ in self._counts))
+
+    def update(self, other: 'Diagnostics'):
+        """
+        Add the records of the `other` collector, e.g. from a worker process.
+        """
+        for item, count in other._counts.items():
+            examples = self._examples.get(item, [])
+            for example in other._examples.get(item, ()):
+                if len(examples) >= self._max_examples:
+                    break
+                examples.append(example)
+            if examples:
+                self._examples[item] = examples
+            self._counts[item] = self._counts.get(item, 0) + count
+
+    def clear(self):
+        """
+        Drop all records.
+        """
+        self._counts.clear()
+        self._examples.clear()
+
+    def to_df(self) -> pd.DataFrame:
+        """
+        Get the report of the records.
+
+        :returns: a DataFrame with the `category`, `key`, `count`, and `examples` columns,
+          sorted by the category and the decreasing count.
+        """
+        rows = [(category, key, count, list(self._examples.get((category, key), ())))
+                for (category, key), count in self._counts.items()]
+        df = pd.DataFrame(rows, columns=list(DIAGNOSTICS_COLUMNS))
+        return df.sort_values(['category', 'count'], ascending=[True, False], kind='stable', ignore_index=True)
+
+    def summary(self) -> str:
+        if not self._counts:
+            return 'No conversion issues'
+        parts = []
+        for category in self.categories():
+            keys = [k for c, k in self._counts if c == category]
+            parts.append(f'{category}: {self.count(category)} ({len(keys)} distinct)')
+        return 'Conversion issues - ' + ', '.join(parts)
+
+    def __len__(self) -> int:
+        return sum(self._counts.values())
+
+    def __repr__(self) -> str:
+        return f'Diagnostics({self.summary()})'
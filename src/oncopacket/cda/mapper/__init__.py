@@ -1 +1,26 @@
-from .op_diagnosis_mapper import OpDiagnosisMapper
+import typing
+
+from ..._lazy import attach_lazy_loader
+
+if typing.TYPE_CHECKING:
+    from .map_rule_index import MapRuleIndex
+    from .op_diagnosis_mapper import OpDiagnosisMapper
+    from .op_icdo_mapper import OpICDOMapper
+    from .op_rule_table_mapper import OpRuleTableMapper
+
+__getattr__, __dir__ = attach_lazy_loader(
+    __name__,
+    {
+        'MapRuleIndex': '.map_rule_index',
+        'OpDiagnosisMapper': '.op_diagnosis_mapper',
+        'OpICDOMapper': '.op_icdo_mapper',
+        'OpRuleTableMapper': '.op_rule_table_mapper',
+    },
+)
+
+__all__ = [
+    'MapRuleIndex',
+    'OpDiagnosisMapper',
+    'OpICDOMapper',
+    'OpRuleTableMapper',
+]
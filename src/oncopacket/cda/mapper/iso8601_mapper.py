@@ -1,5 +1,163 @@
 import math
+import numbers
+import typing
 
+import numpy as np
+import pandas as pd
+
+DAYS_PER_YEAR = 365.25
+MONTHS_PER_YEAR = 12
+DAYS_PER_MONTH = DAYS_PER_YEAR / MONTHS_PER_YEAR
+
+# An ISO 8601 duration, e.g. `P55Y6M`, `P11355D`, or `P24106DT0H0M0S` (as written by `pd.Timedelta.isoformat`).
+_NUMBER = r'\d+(?:\.\d+)?'
+ISO8601_DURATION_PATTERN = (
+    rf'^(?P<sign>-)?P(?:(?P<years>{_NUMBER})Y)?(?:(?P<months>{_NUMBER})M)?(?:(?P<weeks>{_NUMBER})W)?'
+    rf'(?:(?P<days>{_NUMBER})D)?(?:T(?:(?P<hours>{_NUMBER})H)?(?:(?P<minutes>{_NUMBER})M)?(?:(?P<seconds>{_NUMBER})S)?)?$'
+)
+DURATION_COMPONENTS = ('years', 'months', 'weeks', 'days', 'hours', 'minutes', 'seconds')
+
+
+def parse_iso8601_durations(values: typing.Iterable[typing.Optional[str]]) -> pd.DataFrame:
+    """
+    Parse ISO 8601 durations into their components.
+
+    The durations are parsed with one vectorized regular expression, and each distinct value is parsed only once,
+    which matters because the ages of a cohort repeat a lot.
+
+    :param values: the durations, e.g. a column of a DataFrame. `None`, `NaN`, empty and invalid values are allowed.
+    :returns: a DataFrame with a float column for each of :data:`DURATION_COMPONENTS`, with the index of `values`
+      if it is a Series. The missing components of a valid duration are `0`, a missing or invalid duration is all `NaN`.
+      The components of a negative duration, such as `-P1Y`, are negative.
+    """
+    index = values.index if isinstance(values, pd.Series) else None
+    # The missing values get the code -1 (the default of all pandas versions).
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    parts = pd.Series(uniques, dtype=object).astype('string').str.extract(ISO8601_DURATION_PATTERN)
+    sign = np.where(parts.pop('sign').eq('-').fillna(False).to_numpy(dtype=bool), -1., 1.)
+    parts = parts.astype('float64')
+    # `P` and `PT` match the pattern but they are not valid durations.
+    valid = parts.notna().any(axis=1).to_numpy()
+    components = np.where(valid[:, None], parts.fillna(0.).to_numpy() * sign[:, None], np.nan)
+
+    out = np.full((len(codes), len(DURATION_COMPONENTS)), np.nan)
+    known = codes >= 0
+    out[known] = components[codes[known]]
+    return pd.DataFrame(out, columns=list(DURATION_COMPONENTS), index=index)
+
+
+def iso8601_to_years(values: typing.Iterable[typing.Optional[str]]) -> np.ndarray:
+    """
+    Convert ISO 8601 durations, such as the ages of the subjects, to (fractional) years.
+
+    A year has 365.25 days and 12 months, e.g. `P55Y6M` is `55.5` and `P11355D` is `31.09`.
+
+    :param values: the durations, see :func:`parse_iso8601_durations`.
+    :returns: a float array with the years, `NaN` for the missing or invalid durations.
+    """
+    parts = parse_iso8601_durations(values)
+    days = 7. * parts['weeks'] + parts['days'] + parts['hours'] / 24. + parts['minutes'] / 1440. \
+        + parts['seconds'] / 86400.
+    return (parts['years'] + parts['months'] / MONTHS_PER_YEAR + days / DAYS_PER_YEAR).to_numpy()
+
+
+def iso8601_to_days(values: typing.Iterable[typing.Optional[str]]) -> np.ndarray:
+    """
+    Convert ISO 8601 durations to (fractional) days, the inverse of :func:`days_to_iso8601`.
+
+    A year has 365.25 days and a month has 30.436875 days, e.g. `P1Y1M1D` is `396.686875`.
+
+    :param values: the durations, see :func:`parse_iso8601_durations`.
+    :returns: a float array with the days, `NaN` for the missing or invalid durations.
+    """
+    parts = parse_iso8601_durations(values)
+    return (parts['years'] * DAYS_PER_YEAR + parts['months'] * DAYS_PER_MONTH + 7. * parts['weeks'] + parts['days']
+            + parts['hours'] / 24. + parts['minutes'] / 1440. + parts['seconds'] / 86400.).to_numpy()
+
+
+def _days_array(days) -> np.ndarray:
+    # The whole number of days as floats with `NaN` for the missing values. The strings (e.g. `'73.0'`) are parsed,
+    # and the values that are not numbers (e.g. `'not reported'`) are missing. The days are rounded
+    # to the nearest whole day (the halves to the even day), like `round` in :func:`Iso8601Mapper.from_days`.
+    values = pd.to_numeric(pd.Series(days, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+    values[~np.isfinite(values)] = np.nan
+    return np.rint(values)
+
+
+def _split_days(days: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # The years, months, and days of a non-negative whole number of days.
+    years = np.floor(days / DAYS_PER_YEAR)
+    remainder = days - np.trunc(years * DAYS_PER_YEAR)
+    months = np.floor(remainder / DAYS_PER_MONTH)
+    remainder = remainder - np.trunc(months * DAYS_PER_MONTH)
+    return years, months, remainder
+
+
+def days_to_components(days) -> pd.DataFrame:
+    """
+    Split the numbers of days into years, months, and days, like :func:`Iso8601Mapper.from_days`.
+
+    The days are rounded to the nearest whole day. The components of a negative number of days are negative,
+    like those of a negative duration in :func:`parse_iso8601_durations`.
+
+    :param days: a sequence, a NumPy array, or a pandas Series of numbers or numeric strings,
+      with `None` or `NaN` for the missing values.
+    :returns: a DataFrame with the nullable integer columns `years`, `months`, and `days`,
+      with the index of `days` if it is a Series.
+    """
+    index = days.index if isinstance(days, pd.Series) else None
+    values = _days_array(days)
+    sign = np.where(values < 0, -1., 1.)
+    years, months, remainder = _split_days(np.abs(values))
+    return pd.DataFrame({
+        'years': pd.array(sign * years + 0., dtype='Int64'),
+        'months': pd.array(sign * months + 0., dtype='Int64'),
+        'days': pd.array(sign * remainder + 0., dtype='Int64'),
+    }, index=index)
+
+
+def _format_ymd(years: int, months: int, days: int, negative: bool = False) -> str:
+    components = ['-P' if negative else 'P']
+    if years > 0:
+        components.append(f'{years}Y')
+    if months > 0:
+        components.append(f'{months}M')
+    if days > 0 or (years == 0 and months == 0):
+        components.append(f'{days}D')
+    return ''.join(components)
+
+
+def days_to_iso8601(days, ymd: bool = False) -> pd.Series:
+    """
+    Convert the numbers of days, e.g. the `days_to_birth` column of a CDA table, into ISO 8601 durations.
+
+    With `ymd=False`, the durations use only the `D` designator, like :func:`CdaFactory.days_to_iso`,
+    e.g. `P10350D`. With `ymd=True`, the days are split into years, months, and days,
+    like :func:`Iso8601Mapper.from_days`, e.g. `P28Y4M2D`.
+
+    A negative number of days leads to a negative duration, e.g. `-P10350D`, hence :func:`iso8601_to_days`
+    is the inverse. Pass the absolute values to get the length of the durations, e.g. for the ages.
+
+    Each distinct number of days is formatted once, hence the ages of 100k subjects convert in milliseconds.
+
+    :param days: a sequence, a NumPy array, or a pandas Series of numbers or numeric strings,
+      with `None` or `NaN` for the missing values. The days are rounded to the nearest whole day.
+    :param ymd: `True` for the years, months, and days designators.
+    :returns: a Series with the durations, `None` for the missing values, with the index of `days` if it is a Series.
+    """
+    index = days.index if isinstance(days, pd.Series) else None
+    values = _days_array(days)
+    out = np.full(len(values), None, dtype=object)
+    known = ~np.isnan(values)
+    uniques, inverse = np.unique(values[known].astype(np.int64), return_inverse=True)
+    if ymd:
+        years, months, remainder = _split_days(np.abs(uniques).astype(np.float64))
+        formatted = [_format_ymd(int(y), int(m), int(d), negative=u < 0)
+                     for u, y, m, d in zip(uniques.tolist(), years.tolist(), months.tolist(), remainder.tolist())]
+    else:
+        formatted = [f'-P{-d}D' if d < 0 else f'P{d}D' for d in uniques.tolist()]
+    out[known] = np.asarray(formatted, dtype=object)[inverse] if len(formatted) > 0 else []
+    return pd.Series(out, index=index, dtype=object)
 
 
 class Iso8601Mapper:
@@ -20,24 +178,29 @@ class Iso8601Mapper:
         self._days = d
 
     def to_iso8601(self):
-        components = ["P"]
-        if self._years > 0:
-            components.append(f"{self._years}Y")
-        if self._months > 0:
-            components.append(f"{self._months}M")
-        if self._days > 0:
-            components.append(f"{self._days}D")
-        return "".join(components)
+        return _format_ymd(self._years, self._months, self._days)
 
 
     @staticmethod
     def from_days(days):
+        """
+        Convert a number of days into an ISO 8601 duration with the years, months, and days, e.g. `73` -> `P2M13D`.
+
+        A negative number of days leads to a negative duration, e.g. `-73` -> `-P2M13D`, like :func:`days_to_iso8601`.
+        Use :func:`days_to_iso8601` to convert many values at once.
+
+        :param days: an integer (including the NumPy integers), a finite number, or a `str` with a number,
+          e.g. `'73.0'`. The days are rounded to the nearest whole day, like :func:`days_to_iso8601`.
+        :raises ValueError: if `days` is not a number.
+        """
         if isinstance(days, str):
-            days = int(str)
-        if isinstance(days, float) and not math.isnan(days):
-            days = int(days) # this is because some values are like 73.0
-        if not isinstance(days, int):
+            days = float(days)
+        if isinstance(days, bool) or not isinstance(days, numbers.Real) or not math.isfinite(days):
             raise ValueError(f"days argument ({days}) must be int or str but was {type(days)}")
+        # `round` because some values are like 73.0
+        days = int(days) if isinstance(days, numbers.Integral) else round(float(days))
+        negative = days < 0
+        days = abs(days)
         # calculate number of years
         years = math.floor(days / 365.25)
         if years > 0:
@@ -46,4 +209,5 @@ class Iso8601Mapper:
         if months > 0:
             days = days - int(months * 30.436875)
         mapper =  Iso8601Mapper(y=years, m=months, d=days)
-        return mapper.to_iso8601()
+        iso8601 = mapper.to_iso8601()
+        return f'-{iso8601}' if negative else iso8601
@@ -46,3 +46,9 @@ class MapEntry:
         :returns: id and label of the GA4GH Ontology term that corresponds to the entry,
         """
         return self._id, self._label
+
+    def get_conditions(self):
+        """
+        :returns: dictionary with the column names (key) and the values that a row must have to match the entry
+        """
+        return self._d
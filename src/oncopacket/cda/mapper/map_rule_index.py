@@ -0,0 +1,157 @@
+import typing
+
+import numpy as np
+import pandas as pd
+
+from .map_entry import MapEntry
+
+_MISSING = object()
+
+
+class _RuleTable:
+    """
+    Hash table with the rules that check the same columns.
+
+    :param columns: the names of the checked columns.
+    """
+
+    def __init__(self, columns: typing.Tuple[str, ...]):
+        self.columns = columns
+        # the rule values -> the position of the first rule with these values
+        self.lookup: typing.Dict[tuple, int] = {}
+
+    def add(self, values: tuple, priority: int):
+        # Keep the first rule, the linear scan would never reach the duplicates.
+        self.lookup.setdefault(values, priority)
+
+    def match(self, row) -> typing.Optional[int]:
+        values = tuple(row.get(column, _MISSING) for column in self.columns)
+        try:
+            return self.lookup.get(values)
+        except TypeError:
+            # An unhashable value (e.g. a list) cannot be equal to a rule value.
+            return None
+
+    def match_frame(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        :returns: an array with the priority of the matching rule for each row of the `df` or `-1` if no rule matches.
+        """
+        if any(column not in df.columns for column in self.columns):
+            return np.full(len(df), -1, dtype=np.intp)
+        if len(self.columns) == 0:
+            # A rule without conditions matches any row.
+            return np.full(len(df), self.lookup[()], dtype=np.intp)
+
+        keys = list(self.lookup.keys())
+        priorities = np.fromiter(self.lookup.values(), dtype=np.intp, count=len(keys))
+        if len(self.columns) == 1:
+            rule_index = pd.Index([key[0] for key in keys], dtype=object)
+            positions = rule_index.get_indexer(df[self.columns[0]])
+        else:
+            rule_index = pd.MultiIndex.from_tuples(keys, names=self.columns)
+            positions = rule_index.get_indexer(pd.MultiIndex.from_frame(df[list(self.columns)]))
+        return np.where(positions >= 0, priorities[positions], -1)
+
+
+class MapRuleIndex:
+    """
+    `MapRuleIndex` compiles a list of :class:`MapEntry` rules into hash tables over the rule columns.
+
+    Checking a row against N entries with :func:`MapEntry.matches` is a linear scan. The index groups the rules
+    by the set of columns they check, and each group is a hash table keyed by the tuple of column values.
+    Matching a row needs one lookup per group, regardless of the number of rules.
+    In practice, all rules of a mapping table check the same columns, hence there is one group only.
+
+    The index keeps the semantics of the linear scan: if more than one rule matches a row, the rule that comes first
+    in the input list wins.
+
+    The index backs :class:`OpRuleTableMapper` and is not used by the importer.
+
+    :param entries: the rules in order of priority.
+    """
+
+    def __init__(self, entries: typing.Iterable[MapEntry]):
+        self._entries: typing.List[MapEntry] = []
+        tables: typing.Dict[typing.Tuple[str, ...], _RuleTable] = {}
+        for entry in entries:
+            conditions = entry.get_conditions()
+            columns = tuple(sorted(conditions))
+            values = tuple(conditions[column] for column in columns)
+            if any(pd.isna(v) for v in values):
+                # `row[k] != v` is always `True` for a NaN `v`, hence the rule can never match.
+                continue
+            if columns not in tables:
+                tables[columns] = _RuleTable(columns)
+            tables[columns].add(values, len(self._entries))
+            self._entries.append(entry)
+        self._tables = tuple(tables.values())
+
+    @staticmethod
+    def from_dataframe(df: pd.DataFrame, id_column: str = 'id', label_column: str = 'label') -> "MapRuleIndex":
+        """
+        Compile the rules from a mapping table with one rule per row.
+
+        The empty cells are not part of the rule condition, so a rule with an empty `primary_diagnosis_site`
+        matches a row with any site.
+
+        :param df: the mapping table.
+        :param id_column: the name of the column with the ontology term identifier.
+        :param label_column: the name of the column with the ontology term label.
+        """
+        condition_columns = [column for column in df.columns if column not in (id_column, label_column)]
+        entries = []
+        for record in df.to_dict('records'):
+            d = {column: record[column] for column in condition_columns if not pd.isna(record[column])}
+            d['id'] = record[id_column]
+            d['label'] = record[label_column]
+            entries.append(MapEntry(d))
+        return MapRuleIndex(entries)
+
+    def match(self, row) -> typing.Optional[MapEntry]:
+        """
+        Find the first entry that matches the `row`.
+
+        :param row: a :class:`pd.Series`, a `dict`, or any mapping with a `get` method.
+        :returns: the matching entry or `None` if no entry matches.
+        """
+        best = None
+        for table in self._tables:
+            priority = table.match(row)
+            if priority is not None and (best is None or priority < best):
+                best = priority
+        return None if best is None else self._entries[best]
+
+    def get_id_and_label(self, row) -> typing.Optional[typing.Tuple[str, str]]:
+        """
+        :returns: id and label of the first entry that matches the `row` or `None` if no entry matches.
+        """
+        entry = self.match(row)
+        return None if entry is None else entry.get_id_and_label()
+
+    def match_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Match all rows of the `df` at once.
+
+        :param df: the table to map.
+        :returns: a data frame with the same index as `df` and the `id` and `label` columns,
+          with `None` for the rows that do not match any rule.
+        """
+        best = np.full(len(df), -1, dtype=np.intp)
+        for table in self._tables:
+            priorities = table.match_frame(df)
+            update = (priorities >= 0) & ((best < 0) | (priorities < best))
+            best[update] = priorities[update]
+
+        ids = np.array([entry.get_id_and_label()[0] for entry in self._entries] + [None], dtype=object)
+        labels = np.array([entry.get_id_and_label()[1] for entry in self._entries] + [None], dtype=object)
+        # -1 indexes the trailing `None`.
+        return pd.DataFrame({'id': ids[best], 'label': labels[best]}, index=df.index)
+
+    def get_fields(self) -> typing.Sequence[str]:
+        """
+        :returns: the names of all columns checked by the rules.
+        """
+        return tuple(sorted({column for table in self._tables for column in table.columns}))
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -2,9 +2,13 @@ import typing
 
 import pandas as pd
 from .op_mapper import OpMapper
+from .term_registry import OntologyTerm, ontology_term, to_ontology_class
 import phenopackets as pp
 
 
+CANCER_RELATED_DEATH = ontology_term('NCIT:C156427', 'Cancer-Related Death')
+
+
 class OpCauseOfDeathMapper(OpMapper):
     """
     `OpCauseOfDeathMapper` checks if the `cause_of_death` field indicates cancer-related death
@@ -15,11 +19,11 @@ class OpCauseOfDeathMapper(OpMapper):
         super().__init__(('cause_of_death',))
 
     def get_ontology_term(self, row: pd.Series) -> typing.Optional[pp.OntologyClass]:
+        return to_ontology_class(self.get_term(row))
+
+    def get_term(self, row: pd.Series) -> typing.Optional[OntologyTerm]:
         cause_of_death = row["cause_of_death"]
         if cause_of_death == "Cancer Related":
-            oterm = pp.OntologyClass()
-            oterm.id = "NCIT:C156427"
-            oterm.label = "Cancer-Related Death"
-            return oterm
+            return CANCER_RELATED_DEATH
         else:
             return None
@@ -1,14 +1,14 @@
 import typing
 import warnings
-from collections import defaultdict
 from importlib.resources import open_text # deprecated
 from importlib.resources import files
-import pathlib
 
 import pandas as pd
 import phenopackets as pp
 
+from ..diagnostics import Diagnostics
 from .op_mapper import OpMapper
+from .term_registry import NEOPLASM, OntologyTerm, ontology_term, to_ontology_class
 
 
 def get_cda_key(primary_diagnosis: str,
@@ -24,7 +24,7 @@ def get_cda_key(primary_diagnosis: str,
     return key.replace(" ", "_")
 
 
-def prepare_ncit_map(ncit_map_df: pd.DataFrame) -> typing.Mapping[str, pp.OntologyClass]:
+def prepare_ncit_map(ncit_map_df: pd.DataFrame) -> typing.Mapping[str, OntologyTerm]:
     ncit_map = {}
     for _, row in ncit_map_df.iterrows():
         primary_diagnosis = row["primary_diagnosis"]
@@ -36,23 +36,18 @@ def prepare_ncit_map(ncit_map_df: pd.DataFrame) -> typing.Mapping[str, pp.Ontolo
             continue
 
         key = get_cda_key(primary_diagnosis, primary_diagnosis_condition, primary_diagnosis_site)
-        oterm = pp.OntologyClass()
-        oterm.id = NCIT_id
-        oterm.label = NCIT_label
-        ncit_map[key] = oterm
+        ncit_map[key] = ontology_term(NCIT_id, NCIT_label)
     return ncit_map
 
 
-def prepare_uberon(uberon_df: pd.DataFrame) -> typing.Mapping[str, pp.OntologyClass]:
+def prepare_uberon(uberon_df: pd.DataFrame) -> typing.Mapping[str, OntologyTerm]:
     uberon_map = {}
 
     for _, row in uberon_df.iterrows():
         uberon_label = str(row["uberon_label"]).lower()
         uberon_id = row["uberon_id"]
 
-        oterm = pp.OntologyClass()
-        oterm.id = row["NCIT_id"]
-        oterm.label = row["NCIT_label"]
+        oterm = ontology_term(row["NCIT_id"], row["NCIT_label"])
 
         uberon_map[uberon_label] = oterm
 
@@ -74,54 +69,45 @@ CONVERTERS = {
 }
 
 
+TISSUE_MAPPING_TABLES_MODULE = 'oncopacket.ncit_mapping_files.cda_to_ncit_tissue_wise_mappings'
+TISSUE_MAPPING_TABLES = (
+    'cda_to_ncit_map_bone.csv',
+    'cda_to_ncit_map_brain.csv',
+    'cda_to_ncit_map_breast.csv',
+    'cda_to_ncit_map_cervix.csv',
+    'cda_to_ncit_map_colon.csv',
+    'cda_to_ncit_map_heart.csv',
+    'cda_to_ncit_map_kidney.csv',
+    'cda_to_ncit_map_liver.csv',
+    'cda_to_ncit_map_lung.csv',
+    'cda_to_ncit_map_pancreas.csv',
+    'cda_to_ncit_map_skin.csv',
+    'cda_to_ncit_map_thyroid.csv',
+)
+
+
+def read_tissue_mapping_tables() -> pd.DataFrame:
+    """
+    Read the bundled `cda_to_ncit_map_<tissue>.csv` tables into a single DataFrame.
+
+    :returns: a DataFrame with the `primary_diagnosis`, `primary_diagnosis_condition`, `primary_diagnosis_site`,
+      `ncit_label`, and `ncit_id` columns of the tables and the `tissue` column, e.g. `lung`.
+    """
+    frames = []
+    for table in TISSUE_MAPPING_TABLES:
+        data_path = files(TISSUE_MAPPING_TABLES_MODULE).joinpath(table)
+        with open(data_path, 'r') as fh:
+            df = pd.read_csv(fh, converters=CONVERTERS)
+        df['tissue'] = table[len('cda_to_ncit_map_'):-len('.csv')]
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+
 class OpDiagnosisMapper(OpMapper):
 
     @staticmethod
-    def multitissue_mapper():
-        module_with_tissue_mapping_tables = 'oncopacket.ncit_mapping_files.cda_to_ncit_tissue_wise_mappings'
-        tissue_tables = (
-            'cda_to_ncit_map_bone.csv',
-            'cda_to_ncit_map_brain.csv',
-            'cda_to_ncit_map_breast.csv',
-            'cda_to_ncit_map_cervix.csv',
-            'cda_to_ncit_map_colon.csv',
-            'cda_to_ncit_map_heart.csv',
-            'cda_to_ncit_map_kidney.csv',
-            'cda_to_ncit_map_liver.csv',
-            'cda_to_ncit_map_lung.csv',
-            'cda_to_ncit_map_pancreas.csv',
-            'cda_to_ncit_map_skin.csv',
-            'cda_to_ncit_map_thyroid.csv',
-        )
-        frames = []
-        for tissue in tissue_tables:
-
-            '''
-            # open_text deprecated, need to switch to files()
-            # https://importlib-resources.readthedocs.io/en/latest/using.html#migrating-from-legacy
-            #eml = files('email.tests.data').joinpath('message.eml').read_text()
-            
-            from importlib.resources import files
-            import pathlib
-
-            # Assuming your package is named "my_package" and the file is "data.txt":
-            data_path = files("my_package").joinpath("data.txt")
-
-            with open(data_path, "r") as file_handle:
-                # Read the file contents
-                contents = file_handle.read()
-            '''
-            data_path = files(module_with_tissue_mapping_tables).joinpath(tissue)    
-            #with open_text(module_with_tissue_mapping_tables, tissue) as fh:
-            with open(data_path, 'r') as fh:
-                df = pd.read_csv(
-                    fh,
-                    converters=CONVERTERS,
-                )
-                frames.append(df)
-                
-        ncit_map_df = pd.concat(frames)
-        ncit_map = prepare_ncit_map(ncit_map_df)
+    def multitissue_mapper(diagnostics: typing.Optional[Diagnostics] = None):
+        ncit_map = prepare_ncit_map(read_tissue_mapping_tables())
 
         '''
         # uberon_map not used
@@ -132,7 +118,7 @@ class OpDiagnosisMapper(OpMapper):
         )
         '''
         
-        return OpDiagnosisMapper(ncit_map) # uberon_map
+        return OpDiagnosisMapper(ncit_map, diagnostics=diagnostics) # uberon_map
 
     @staticmethod
     def default_mapper():
@@ -162,7 +148,8 @@ class OpDiagnosisMapper(OpMapper):
             uberon_df = pd.read_csv(fh, sep='\t')
         return prepare_uberon(uberon_df)
 
-    def __init__(self, ncit_map: typing.Mapping[str, pp.OntologyClass]):
+    def __init__(self, ncit_map: typing.Mapping[str, OntologyTerm],
+                 diagnostics: typing.Optional[Diagnostics] = None):
         #uberon_map: typing.Mapping[str, pp.OntologyClass]
         
         """
@@ -173,15 +160,19 @@ class OpDiagnosisMapper(OpMapper):
         e.g., Uterine Neoplasm.
 
         NCIT:id	NCIT:label	Comment
+
+        The combinations that are not in the map are counted by `diagnostics`, see :func:`get_error_df`.
         """
         super().__init__(('primary_diagnosis', 'primary_diagnosis_condition', 'primary_diagnosis_site'))
 
         self._ncit_map = ncit_map
         #self._uberon_map = uberon_map
-        self._compound_key_warning_count = defaultdict(int)
-        self._primary_diagnosis_site_warning_count = defaultdict(int)
+        self._diagnostics = Diagnostics() if diagnostics is None else diagnostics
 
     def get_ontology_term(self, row: pd.Series) -> typing.Optional[pp.OntologyClass]:
+        return to_ontology_class(self.get_term(row))
+
+    def get_term(self, row: pd.Series) -> typing.Optional[OntologyTerm]:
 
         primary_diagnosis = replace_with_empty_str_if_none(row["primary_diagnosis"])
         primary_diagnosis_condition = replace_with_empty_str_if_none(row["primary_diagnosis_condition"])
@@ -193,8 +184,8 @@ class OpDiagnosisMapper(OpMapper):
         if key in self._ncit_map:
             return self._ncit_map.get(key)
         else:
-            error_key = f"{primary_diagnosis}---{primary_diagnosis_condition}---{primary_diagnosis_site}"
-            self._compound_key_warning_count[error_key] += 1
+            error_key = (primary_diagnosis, primary_diagnosis_condition, primary_diagnosis_site)
+            self._diagnostics.record('unmapped_diagnosis', error_key, example=row.get('subject_id'))
         '''
         # Next, lookup by the diagnosis site to provide at least a general neoplasm type.
         pds_lower = primary_diagnosis_site.lower()
@@ -204,32 +195,29 @@ class OpDiagnosisMapper(OpMapper):
             self._primary_diagnosis_site_warning_count[primary_diagnosis_site] += 1
         '''
         # Otherwise fall back to the most general NCIT neoplasm term.
-        oterm = pp.OntologyClass()
-        oterm.id = "NCIT:C3262"
-        oterm.label = "Neoplasm"
-        return oterm
+        return NEOPLASM
+
+    def get_diagnostics(self) -> Diagnostics:
+        return self._diagnostics
 
     def get_error_df(self):
+        """
+        Get the diagnosis combinations that are not in the map, with the number of rows.
+
+        See :func:`get_diagnostics` for the report with the examples.
+        """
         errors = []
-        for compound_key, count in self._compound_key_warning_count.items():
-            fields = compound_key.split("---")
-            if len(fields) != 3:
-                print(f"Malformed warning {compound_key}")
+        report = self._diagnostics.to_df()
+        report = report.loc[report['category'] == 'unmapped_diagnosis', ['key', 'count']]
+        for compound_key, count in report.itertuples(index=False):
             error = {
-                "primary_diagnosis": fields[0],
-                "primary_diagnosis_condition": fields[1],
-                "primary_diagnosis_site": fields[2],
+                "primary_diagnosis": compound_key[0],
+                "primary_diagnosis_condition": compound_key[1],
+                "primary_diagnosis_site": compound_key[2],
                 "count": count,
             }
             errors.append(error)
 
-        for primary_diagnosis_site, count in self._primary_diagnosis_site_warning_count.items():
-            error = {
-                'primary_diagnosis_site': primary_diagnosis_site,
-                'count': count,
-            }
-            errors.append(error)
-
         return pd.DataFrame(errors)
 
 
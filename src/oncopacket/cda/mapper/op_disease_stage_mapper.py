@@ -1,9 +1,80 @@
 from .op_mapper import OpMapper
+from .term_registry import OntologyTerm, ontology_term, to_ontology_class
 from typing import Optional
 import pandas as pd
 import phenopackets as PPkt
 
 
+NCIT_LABEL_TO_ID = {
+    'Stage I': 'NCIT:C27966',
+    'Stage IA':'NCIT:C27975',
+    'Stage IB': 'NCIT:C27976',
+    'Stage II':'NCIT:C28054',
+    'Stage IIA':'NCIT:C27967',
+    'Stage IIB':'NCIT:C27968',
+    'Stage III':'NCIT:C27970',
+    'Stage IIIA': 'NCIT:C27977',
+    'Stage IIIB': 'NCIT:C27978',
+    'Stage IIIC1': 'NCIT:C95179',
+    'Stage IIIC2': 'NCIT:C95180',
+    'Stage IV': 'NCIT:C27971',
+    'Stage IVA': 'NCIT:C27979',
+    'Stage IVB': 'NCIT:C27972',
+}
+
+# normalization of the stage strings found in CDA and GDC to the NCIT stage labels
+STAGE_LABELS = {
+    'Stage I': 'Stage I',
+    'Stage 1': 'Stage I',
+    'stage I': 'Stage I',
+    'stage 1': 'Stage I',
+    'IA':'Stage IA',
+    'Stage IA':'Stage IA',
+    'stage IA':'Stage IA',
+    'IB':'Stage IB',
+    'Stage IB':'Stage IB',
+    'stage IB':'Stage IB',
+    'Stage II':'Stage II',
+    'Stage 2':'Stage II',
+    'stage 2':'Stage II',
+    'stage II':'Stage II',
+    'IIA':'Stage IIA',
+    'Stage IIA':'Stage IIA',
+    'stage IIA':'Stage IIA',
+    'IIB':'Stage IIB',
+    'Stage IIB':'Stage IIB',
+    'stage IIB':'Stage IIB',
+    'Stage 3':'Stage III',
+    'stage 3':'Stage III',
+    'Stage III':'Stage III',
+    'stage III':'Stage III',
+    'IIIA':'Stage IIIA',
+    'Stage IIIA':'Stage IIIA',
+    'Stage 3A':'Stage IIIA',
+    'stage 3A':'Stage IIIA',
+    'IIIB':'Stage IIIB',
+    'Stage IIIB':'Stage IIIB',
+    'Stage 3B':'Stage IIIB',
+    'stage 3B':'Stage IIIB',
+    'Stage IIIC1': 'Stage IIIC1',
+    'Stage IIIC2': 'Stage IIIC2',
+    'IV':'Stage IV',
+    'Stage 4':'Stage IV',
+    'Stage IV':'Stage IV',
+    'stage IV':'Stage IV',
+    'Stage IVA': 'Stage IVA',
+    'Stage IVB': 'Stage IVB',
+}
+
+STAGE_UNKNOWN = ontology_term('NCIT:C92207', 'Stage Unknown')
+
+# The terms are interned once, at import time, and shared by all calls.
+STAGE_TERMS = {
+    stage_str: ontology_term(NCIT_LABEL_TO_ID[stage_label], stage_label)
+    for stage_str, stage_label in STAGE_LABELS.items()
+}
+
+
 class OpDiseaseStageMapper(OpMapper):
 
     def __init__(self):
@@ -13,6 +84,9 @@ class OpDiseaseStageMapper(OpMapper):
         super().__init__(('stage',))
 
     def get_ontology_term(self, stage_str) -> Optional[PPkt.OntologyClass]:
+        return to_ontology_class(self.get_term(stage_str))
+
+    def get_term(self, stage_str) -> Optional[OntologyTerm]:
         
         # changed passed variable from row (pandas series) to a string, because 
         # need to be able to submit a single term obtained from the GDC API, 
@@ -21,78 +95,8 @@ class OpDiseaseStageMapper(OpMapper):
         
         #stage_str = row["stage"]
 
-        ncit_label_to_id_d = {'Stage I': 'NCIT:C27966',
-                            'Stage IA':'NCIT:C27975',
-                            'Stage IB': 'NCIT:C27976',
-                            'Stage II':'NCIT:C28054',
-                            'Stage IIA':'NCIT:C27967',
-                            'Stage IIB':'NCIT:C27968',
-                            'Stage III':'NCIT:C27970',
-                            'Stage IIIA': 'NCIT:C27977',
-                            'Stage IIIB': 'NCIT:C27978',
-                            'Stage IIIC1': 'NCIT:C95179',
-                            'Stage IIIC2': 'NCIT:C95180',
-                            'Stage IV': 'NCIT:C27971',
-                            'Stage IVA': 'NCIT:C27979',
-                            'Stage IVB': 'NCIT:C27972'
-                            }
-        
-        stage_d = {'Stage I': 'Stage I',
-                'Stage 1': 'Stage I',
-                'stage I': 'Stage I',
-                'stage 1': 'Stage I',
-                'IA':'Stage IA',
-                'Stage IA':'Stage IA',
-                'stage IA':'Stage IA',
-                'IB':'Stage IB',
-                'Stage IB':'Stage IB',
-                'stage IB':'Stage IB',
-                'Stage II':'Stage II',
-                'Stage 2':'Stage II',
-                'stage 2':'Stage II',
-                'stage II':'Stage II',
-                'IIA':'Stage IIA',
-                'Stage IIA':'Stage IIA',
-                'stage IIA':'Stage IIA',
-                'IIB':'Stage IIB',
-                'Stage IIB':'Stage IIB',
-                'stage IIB':'Stage IIB',
-                'Stage 3':'Stage III',
-                'stage 3':'Stage III',
-                'Stage III':'Stage III',
-                'stage III':'Stage III',
-                'IIIA':'Stage IIIA',
-                'Stage IIIA':'Stage IIIA',
-                'Stage 3A':'Stage IIIA',
-                'stage 3A':'Stage IIIA',
-                'IIIB':'Stage IIIB',
-                'Stage IIIB':'Stage IIIB',
-                'Stage 3B':'Stage IIIB',
-                'stage 3B':'Stage IIIB',
-                'Stage IIIC1': 'Stage IIIC1',
-                'Stage IIIC2': 'Stage IIIC2',
-                'IV':'Stage IV',
-                'Stage 4':'Stage IV',
-                'Stage IV':'Stage IV',
-                'stage IV':'Stage IV',
-                'Stage IVA': 'Stage IVA',
-                'Stage IVB': 'Stage IVB'
-                }
-        
-        ontology_term = PPkt.OntologyClass()
-        
-        #print("stage_str: " + stage_str)
-        if stage_str in stage_d:
-            # get standard label and NCIT id
-            stage_label = stage_d.get(stage_str)
-            stage_id = ncit_label_to_id_d.get(stage_label)
-            ontology_term.id = stage_id
-            ontology_term.label = stage_label
-        else:
-            ontology_term.id ='NCIT:C92207'  # Stage unknown
-            ontology_term.label = 'Stage Unknown'
-            
-        return ontology_term
+        # get standard label and NCIT id, or `Stage Unknown` if the stage is not in the map
+        return STAGE_TERMS.get(stage_str, STAGE_UNKNOWN)
 
 '''
 All stages in CDA
@@ -1,91 +1,105 @@
-import csv
-import requests
 import typing
-import warnings
 
+import numpy as np
 import pandas as pd
 import phenopackets as pp
 
+from ..cda_resources import CdaResourceManager, default_resource_manager
 from .op_mapper import OpMapper
+from .term_registry import OntologyTerm, ontology_term, to_ontology_class
 
-icdo_to_ncit_map_url='https://evs.nci.nih.gov/ftp1/NCI_Thesaurus/Mappings/ICD-O-3_Mappings/ICD-O-3.1-NCIt_Morphology_Mapping.txt',
-key_column='ICD-O Code'
+KEY_COLUMN = 'ICD-O Code'
+TERM_TYPE_COLUMN = 'Term Type'
+NCIT_CODE_COLUMN = 'NCIt Code (if present)'
+NCIT_LABEL_COLUMN = 'NCIt PT string (Preferred term)'
+
+ICDO_TO_NCIT_RESOURCE = 'icdo_to_ncit'
+
+
+def load_icdo_to_ncit_tsv(path: str) -> typing.Mapping[str, OntologyTerm]:
+    """
+    Load the ICD-O-3.1 to NCIt morphology mapping file and index it by the ICD-O code.
+
+    The file has several rows per ICD-O code (the preferred term, synonyms, ...) and we index the row
+    with the preferred term (`PT`). The codes without an NCIt code are skipped.
+    Use :func:`CdaResourceManager.get` to get an index that is built once per file.
+
+    :param path: path to the mapping file.
+    :returns: a mapping from the ICD-O code (e.g. `8140/3`) to the NCIt term.
+    """
+    df = pd.read_csv(path, sep='\t', dtype=str, encoding='latin-1', keep_default_na=False)
+    for column in (KEY_COLUMN, NCIT_CODE_COLUMN, NCIT_LABEL_COLUMN):
+        if column not in df.columns:
+            raise ValueError(f"Couldn't find column {column} in fieldnames {list(df.columns)} of file at {path}")
+
+    df = df[df[NCIT_CODE_COLUMN].str.strip() != '']
+    if TERM_TYPE_COLUMN in df.columns:
+        # Move the preferred terms to the top, the stable sort keeps the file order otherwise.
+        df = df.iloc[np.argsort(df[TERM_TYPE_COLUMN].to_numpy() != 'PT', kind='stable')]
+    df = df.drop_duplicates(subset=KEY_COLUMN, keep='first')
+
+    icdo_to_ncit = {}
+    for code, ncit_code, ncit_label in zip(df[KEY_COLUMN], df[NCIT_CODE_COLUMN], df[NCIT_LABEL_COLUMN]):
+        ncit_code = ncit_code.strip()
+        curie = ncit_code if ncit_code.startswith('NCIT:') else f'NCIT:{ncit_code}'
+        icdo_to_ncit[code.strip()] = ontology_term(curie, ncit_label.strip())
+
+    return icdo_to_ncit
 
 
 class OpICDOMapper(OpMapper):
+    """
+    `OpICDOMapper` maps the ICD-O-3 morphology code of the `morphology` field (e.g. `8140/3`)
+    into an NCIt term, using the ICD-O-3.1 to NCIt morphology mapping provided by NCI EVS.
 
-    def __init__(self):
+    Use :func:`default_mapper` to create the mapper with the cached mapping file.
+    The file is not bundled with the package, hence the first run needs the network to download it.
+
+    :param icdo_to_ncit: a mapping from ICD-O code to the NCIt term, see :func:`load_icdo_to_ncit_tsv`.
+    """
+
+    @staticmethod
+    def default_mapper(resources: typing.Optional[CdaResourceManager] = None,
+                       refresh: bool = False) -> "OpICDOMapper":
         """
-        This is a simple map from the 'stage' field of the diagnosis row
+        Create the mapper with the mapping file from the local cache, downloading the file if necessary.
+
+        :raises requests.RequestException: if the file is not cached and cannot be downloaded.
+
+        :param resources: the resource manager, the process-wide manager is used if `None`.
+        :param refresh: check if a newer mapping file is available.
         """
-        super().__init__(())
-        self._icdo_to_ncit = {}
+        resources = default_resource_manager() if resources is None else resources
+        return OpICDOMapper(resources.get(ICDO_TO_NCIT_RESOURCE, parser=load_icdo_to_ncit_tsv, refresh=refresh))
+
+    def __init__(self, icdo_to_ncit: typing.Mapping[str, OntologyTerm]):
+        super().__init__(('morphology',))
+        self._icdo_to_ncit = icdo_to_ncit
 
     def get_ontology_term(self, row: pd.Series) -> typing.Optional[pp.OntologyClass]:
-        # TODO: implement!
-        raise NotImplementedError
+        return to_ontology_class(self.get_term(row))
 
+    def get_term(self, row: pd.Series) -> typing.Optional[OntologyTerm]:
+        morphology = row['morphology']
+        if not isinstance(morphology, str):
+            # e.g. NaN
+            return None
+        return self._icdo_to_ncit.get(morphology.strip())
 
-    def load_icdo_to_ncit_tsv(self, overwrite:bool=False, local_dir:str=None):
-        """
-        Download if necessary the NCIT ICD-O mapping file and store it in the package ncit_mapping_files folder
-        :param overwrite: whether to overwrite an existing file (otherwise we skip downloading)
-        :type overwrite: bool
-        :param local_dir: Path to a directory to write downloaded file
-
-        key_column = 'ICD-O Code'
-        # When we get here, either we have just downloaded the ICD-O file or it was already available locally.
-        # stream = pkg_resources.resource_stream("", icd_path)
-        icd_path = self._icdo_to_ncit_path
-        df = pd.read_csv(icd_path, encoding='latin-1')
-        result_dict = {}
-        if key_column not in df.columns:
-            raise ValueError(f"Couldn't find key_column {key_column} in fieldnames "
-                        f"{df.columns} of file at {icd_path}")
-        for idx, row in df.iterrows():
-            key = row[key_column]
-            if key:
-                result_dict[key] = row
-        print(f"Loaded ICD-O dictionary with {len(result_dict)} items")
-        return result_dict
+    def get_terms(self, df: pd.DataFrame) -> pd.Series:
         """
-        pass
+        Map the `morphology` column of the `df` at once.
 
-    def _download_and_icdo_to_ncit_tsv(self, url: str, key_column: str) -> dict:
-        """
-        Helper function to download a TSV file, parse it, and create a dict of dicts.
+        Each distinct code is looked up only once, which pays off since the cohorts have a few hundred
+        distinct morphologies at most.
+
+        :returns: a series with the same index as `df` with the canonical NCIt :class:`OntologyTerm` instances,
+          or `None` if the code is not mapped.
         """
-        response = requests.get(url)
-        response.raise_for_status()  # This will raise an error if the download failed
-
-        tsv_data = csv.DictReader(response.text.splitlines(), delimiter='\t')
-
-        result_dict = {}
-        if key_column not in tsv_data.fieldnames:
-            warnings.warn(f"Couldn't find key_column {key_column} in fieldnames "
-                            f"{tsv_data.fieldnames} of file downloaded from {url}")
-        for row in tsv_data:
-            key = row.pop(key_column, None)
-            if key:
-                result_dict[key] = row
-
-        return result_dict
-
-
-    def _parse_morphology_into_ontology_term(self, row) -> typing.Optional[typing.List[pp.OntologyClass]]:
-        if row['morphology'] in self._icdo_to_ncit:
-            ncit_record = self._icdo_to_ncit.get(row['morphology'])
-            ontology_term = pp.OntologyClass()
-            if 'NCIt Code (if present)' not in ncit_record:
-                warnings.warn(f"Couldn't find 'NCIt Code (if present)' entry in record for ICD-O code {row['morphology']}")
-                return None
-            elif ncit_record['NCIt Code (if present)'] == '':
-                warnings.warn(f"Found empty 'NCIt Code (if present)' entry in record for ICD-O code {row['morphology']}")
-                return None
-            else:
-                ontology_term.id = "NCIT:" + ncit_record['NCIt Code (if present)']
-            if 'NCIt PT string (Preferred term)' in ncit_record: # else maybe don't raise a fuss
-                ontology_term.label = ncit_record['NCIt PT string (Preferred term)']
-            return [ontology_term]
-        else:
-            return None
\ No newline at end of file
+        codes, uniques = pd.factorize(df['morphology'])
+        terms = np.empty(len(uniques) + 1, dtype=object)
+        for i, code in enumerate(uniques):
+            terms[i] = self._icdo_to_ncit.get(code.strip()) if isinstance(code, str) else None
+        # `factorize` codes the missing values as -1, which indexes the trailing `None`.
+        terms[-1] = None
+        return pd.Series(terms[codes], index=df.index, dtype=object)
@@ -4,6 +4,8 @@ import typing
 import pandas as pd
 import phenopackets as pp
 
+from .term_registry import OntologyTerm, ontology_term
+
 
 class OpMapper(metaclass=abc.ABCMeta):
     """
@@ -15,6 +17,10 @@ class OpMapper(metaclass=abc.ABCMeta):
     Implementing subclasses check one or more columns, and create ontology terms, if possible,
     based on this information. `None` is returned if a transformation is not possible.
 
+    The mappers that intern their terms (see :mod:`term_registry`) implement :func:`get_term` as well,
+    which returns the shared :class:`OntologyTerm` instead of a new message, for the factories
+    that copy the term into a message field anyway. :func:`get_ontology_term` returns a new message on each call.
+
     The mapper uses a subset of the row fields and advertises the names of the required fields through
     the :func:`get_fields` method. Absence of a required field will most likely raise an exception during parsing,
     or return of `None`.
@@ -33,6 +39,16 @@ class OpMapper(metaclass=abc.ABCMeta):
         """
         pass
 
+    def get_term(self, row: pd.Series) -> typing.Optional[OntologyTerm]:
+        """
+        Map the `row` into a canonical :class:`OntologyTerm`, e.g. to copy the term into a message field
+        with :func:`OntologyTerm.copy_into`.
+
+        :param row: a table row with information that we will transform into an ontology term.
+        """
+        term = self.get_ontology_term(row)
+        return None if term is None else ontology_term(term.id, term.label)
+
     def get_fields(self) -> typing.Sequence[str]:
         """
         Get a sequence of field names required by this mapper.
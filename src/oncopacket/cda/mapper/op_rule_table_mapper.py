@@ -0,0 +1,62 @@
+import typing
+
+import pandas as pd
+import phenopackets as pp
+
+from .map_entry import MapEntry
+from .map_rule_index import MapRuleIndex
+from .op_mapper import OpMapper
+from .term_registry import OntologyTerm, ontology_term, to_ontology_class
+
+
+class OpRuleTableMapper(OpMapper):
+    """
+    `OpRuleTableMapper` maps combinations of values in several columns to an ontology term
+    using a table of :class:`MapEntry` rules.
+
+    The rules are compiled into a :class:`MapRuleIndex`, so mapping a row costs the same
+    regardless of how many rules are loaded. Use :func:`get_term` to map a row
+    and :func:`get_terms` to map a whole table at once.
+
+    The mapper is opt-in library API, none of the mappers configured by the importer use it.
+    Unlike :class:`OpDiagnosisMapper`, it matches the values exactly, an empty rule cell matches any value,
+    and the unmatched rows map to `None` instead of a fallback term.
+
+    :param rules: a compiled :class:`MapRuleIndex` or the rules in order of priority. The first matching rule wins.
+    """
+
+    @staticmethod
+    def from_dataframe(df: pd.DataFrame, id_column: str = 'id', label_column: str = 'label') -> "OpRuleTableMapper":
+        """
+        Create the mapper from a mapping table with one rule per row, see :func:`MapRuleIndex.from_dataframe`.
+        """
+        return OpRuleTableMapper(MapRuleIndex.from_dataframe(df, id_column=id_column, label_column=label_column))
+
+    def __init__(self, rules: typing.Union[MapRuleIndex, typing.Iterable[MapEntry]]):
+        index = rules if isinstance(rules, MapRuleIndex) else MapRuleIndex(rules)
+        super().__init__(index.get_fields())
+        self._index = index
+
+    def get_ontology_term(self, row: pd.Series) -> typing.Optional[pp.OntologyClass]:
+        return to_ontology_class(self.get_term(row))
+
+    def get_term(self, row: pd.Series) -> typing.Optional[OntologyTerm]:
+        id_and_label = self._index.get_id_and_label(row)
+        if id_and_label is None:
+            return None
+        return ontology_term(*id_and_label)
+
+    def get_terms(self, df: pd.DataFrame) -> pd.Series:
+        """
+        Map all rows of the `df`.
+
+        :param df: the table to map.
+        :returns: a series with the same index as `df` with the canonical :class:`OntologyTerm` instances,
+          or `None` for the rows that do not match any rule.
+        """
+        matches = self._index.match_frame(df)
+        terms = [
+            None if curie is None else ontology_term(curie, label)
+            for curie, label in zip(matches['id'], matches['label'])
+        ]
+        return pd.Series(terms, index=df.index, dtype=object)
@@ -1,9 +1,11 @@
 from typing import Optional
 
+from ..cda_resources import default_resource_manager
+from ..diagnostics import Diagnostics
 from .op_mapper import OpMapper
+from .term_registry import OntologyTerm, ontology_term, to_ontology_class
 import pandas as pd
 import phenopackets as PPkt
-from importlib.resources import files
 
 
 class OpUberonMapper(OpMapper):
@@ -22,16 +24,18 @@ class OpUberonMapper(OpMapper):
 
     """
 
-    def __init__(self):
+    def __init__(self, diagnostics: Optional[Diagnostics] = None):
         """
         This is a simple map from the 'primary_diagnosis_site = row["primary_diagnosis_site"]' field of the diagnosis row
 
         Not sure how to deal with multiple sites that are listed in one entry
         
         1/29/25: _uberon_label_to_id and _site_to_uberon_label_d_orig are obsolete, leaving here for the moment...
-        
+
+        :param diagnostics: the collector of the unmapped sites, a new collector is created if `None`.
         """
         super().__init__(('primary_diagnosis_site',))
+        self._diagnostics = Diagnostics() if diagnostics is None else diagnostics
         self._uberon_label_to_id = {
             'lung': 'UBERON:0002048',
             'endocervix': "UBERON:0000458",
@@ -135,25 +139,25 @@ class OpUberonMapper(OpMapper):
             "Thyroid Gland, Unknown": "thyroid gland",
         }
         
-        # directly go from site to uberon code
-        module_with_tissue_mapping_tables = 'oncopacket.ncit_mapping_files'
-        data_path = files(module_with_tissue_mapping_tables).joinpath("CDA_primary_diagnosis_site_to_uberon.csv")    
-        with open(data_path, 'r') as fh:
-                site_to_uberon = pd.read_csv(fh)
-        self._site_to_uberon_code_d = dict(site_to_uberon.values)
+        # directly go from site to uberon code, the table is parsed once per process
+        self._site_to_uberon_code_d = default_resource_manager().get('site_to_uberon')
         
     def get_ontology_term(self, row: pd.Series) -> Optional[PPkt.OntologyClass]:
+        return to_ontology_class(self.get_term(row))
+
+    def get_term(self, row: pd.Series) -> Optional[OntologyTerm]:
         #print(row)
         primary_site = row["primary_diagnosis_site"]
 
         if primary_site in self._site_to_uberon_code_d:
             # get standard label and UBEROBN id
-            ontology_term = PPkt.OntologyClass()
-            ontology_term.id = self._site_to_uberon_code_d.get(primary_site)
-            ontology_term.label = primary_site
-            return ontology_term
+            return ontology_term(self._site_to_uberon_code_d.get(primary_site), primary_site)
         else:
             # TODO -- more robust error handling in final release, but for development fail early
             #raise ValueError(f"Could not find UBERON term for primary_site=\"{primary_site}\"")
-            print(f"Could not find UBERON term for primary_site=\"{primary_site}\"")
+            self._diagnostics.record('unmapped_primary_site', primary_site, example=row.get('subject_id'))
+            return None
+
+    def get_diagnostics(self) -> Diagnostics:
+        return self._diagnostics
 
@@ -0,0 +1,128 @@
+import typing
+
+import phenopackets as pp
+
+
+class OntologyTerm:
+    """
+    `OntologyTerm` is an immutable handle of a canonical ontology term of :class:`OntologyTermRegistry`.
+
+    The handle wraps a private :class:`pp.OntologyClass` prototype that is never handed out.
+    Use :func:`copy_into` to copy the term into a message field, e.g. `term.copy_into(disease.term)`,
+    or :func:`to_ontology_class` to get a new message.
+    """
+
+    __slots__ = ('_prototype',)
+
+    def __init__(self, curie: str, label: str):
+        object.__setattr__(self, '_prototype', pp.OntologyClass(id=curie, label=label))
+
+    @property
+    def id(self) -> str:
+        return self._prototype.id
+
+    @property
+    def label(self) -> str:
+        return self._prototype.label
+
+    def copy_into(self, target: pp.OntologyClass) -> pp.OntologyClass:
+        """
+        Copy the term into the `target`, e.g. `individual.taxonomy` or `disease.disease_stage.add()`.
+
+        :returns: the `target`.
+        """
+        target.CopyFrom(self._prototype)
+        return target
+
+    def to_ontology_class(self) -> pp.OntologyClass:
+        """
+        Get a new :class:`pp.OntologyClass` message with the term.
+        """
+        return self.copy_into(pp.OntologyClass())
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, OntologyTerm) and self.id == other.id and self.label == other.label
+
+    def __hash__(self) -> int:
+        return hash((self.id, self.label))
+
+    def __repr__(self) -> str:
+        return f'OntologyTerm(id={self.id!r}, label={self.label!r})'
+
+
+def to_ontology_class(term: typing.Optional[OntologyTerm]) -> typing.Optional[pp.OntologyClass]:
+    """
+    Get a new :class:`pp.OntologyClass` message with the `term` or `None` if the `term` is `None`.
+    """
+    return None if term is None else term.to_ontology_class()
+
+
+class OntologyTermRegistry:
+    """
+    `OntologyTermRegistry` interns the ontology terms used by the mappers and factories.
+
+    Mapping a CDA table creates the same handful of terms over and over again (e.g. `NCIT:C3262 Neoplasm`
+    or `NCBITaxon:9606 Homo sapiens`). The registry hands out one canonical :class:`OntologyTerm`
+    for each `(id, label)` pair, so that the mappers do not allocate a new message per row,
+    and the factories copy each term from a single prototype with :func:`OntologyTerm.copy_into`.
+
+    The label is part of the key, because some mappers use the same CURIE with different labels
+    (e.g. :class:`OpUberonMapper` uses the CDA site string as the label). Keying by the CURIE alone
+    would replace these labels by the label of the first interned term. Use :func:`get` to look a term up by the CURIE.
+    """
+
+    def __init__(self):
+        self._terms: typing.Dict[typing.Tuple[str, str], OntologyTerm] = {}
+        self._by_curie: typing.Dict[str, OntologyTerm] = {}
+
+    def intern(self, curie: str, label: str) -> OntologyTerm:
+        """
+        Get the canonical term for the `curie` and `label`, creating the term if this is the first request.
+
+        :param curie: term identifier, e.g. `NCIT:C3262`.
+        :param label: term label, e.g. `Neoplasm`.
+        :returns: the canonical (immutable) term.
+        """
+        key = (curie, label)
+        term = self._terms.get(key)
+        if term is None:
+            # `setdefault` is atomic, hence two threads interning the same term get the same instance.
+            term = self._terms.setdefault(key, OntologyTerm(curie, label))
+            self._by_curie.setdefault(curie, term)
+        return term
+
+    def get(self, curie: str) -> typing.Optional[OntologyTerm]:
+        """
+        Get the term that was interned first for the `curie` or `None` if the `curie` is unknown.
+        """
+        return self._by_curie.get(curie)
+
+    def __contains__(self, curie: str) -> bool:
+        return curie in self._by_curie
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+
+# The process-wide registry shared by the mappers and factories.
+TERM_REGISTRY = OntologyTermRegistry()
+
+
+def ontology_term(curie: str, label: str) -> OntologyTerm:
+    """
+    Get the canonical term for the `curie` and `label` from the process-wide :class:`OntologyTermRegistry`.
+
+    The terms are keyed by the CURIE and the label, see :class:`OntologyTermRegistry`.
+    """
+    return TERM_REGISTRY.intern(curie, label)
+
+
+# Terms used by several mappers and factories.
+HOMO_SAPIENS = ontology_term('NCBITaxon:9606', 'Homo sapiens')
+NEOPLASM = ontology_term('NCIT:C3262', 'Neoplasm')
@@ -0,0 +1,3 @@
+# The optional parts of the phenopackets. The subject is always included.
+# The module has no imports, hence the command line interface can use the stages without loading the importer.
+PHENOPACKET_STAGES = ('diseases', 'variants', 'biosamples', 'treatments')
@@ -0,0 +1,285 @@
+"""
+The `oncopacket` command line interface.
+
+Export the phenopackets of one or more tissue cohorts:
+
+    oncopacket export lung breast --format ndjson.gz --jobs 2
+    oncopacket export all --stages diseases,biosamples --cache --cache-dir .oncoexporter_cache
+    oncopacket export lung --record cassettes/lung      # later: --replay cassettes/lung, without network
+
+Check the NCIT mapping coverage of the diagnosis combinations of the cached cohorts:
+
+    oncopacket combinations --unmapped -o unmapped.csv
+"""
+import argparse
+import concurrent.futures
+import os
+import sys
+import typing
+
+from .cda.cda_presets import TISSUE_PRESETS, CohortPreset
+from .cda.phenopacket_stages import PHENOPACKET_STAGES as STAGES
+
+OUTPUT_FORMATS = ('json', 'pb', 'pb.gz', 'pb.zst', 'ndjson', 'ndjson.gz', 'ndjson.zst')
+
+
+class ExportResult(typing.NamedTuple):
+    tissue: str
+    n_phenopackets: int
+    path: str
+
+
+def _configure_importer(cache_dir: typing.Optional[str], use_cache: bool,
+                        maf_paths: typing.Optional[typing.Sequence[str]],
+                        cassette=None):
+    from .cda import configure_cda_table_importer
+    return configure_cda_table_importer(cache_dir=cache_dir, use_cache=use_cache, maf_paths=maf_paths,
+                                        cassette=cassette)
+
+
+def _open_cassette(cassette_dir: typing.Optional[str], cassette_mode: str, latency: typing.Union[float, str]):
+    if cassette_dir is None:
+        return None
+    from .cda import Cassette
+    return Cassette(cassette_dir, mode=cassette_mode, latency=latency)
+
+
+def export_cohort(tissue: str,
+                  preset: CohortPreset,
+                  out_dir: str,
+                  fmt: str = 'json',
+                  stages: typing.Sequence[str] = STAGES,
+                  cache_dir: typing.Optional[str] = None,
+                  use_cache: bool = False,
+                  maf_paths: typing.Optional[typing.Sequence[str]] = None,
+                  n_workers: typing.Optional[int] = None,
+                  shard_size: typing.Optional[int] = None,
+                  cassette_dir: typing.Optional[str] = None,
+                  cassette_mode: str = 'replay',
+                  latency: typing.Union[float, str] = 0.) -> ExportResult:
+    """
+    Export the phenopackets of a cohort.
+
+    The phenopackets are written into the `out_dir/<cohort name>` directory if `fmt` is `json`,
+    or into the `out_dir/<cohort name>.<fmt>` stream file otherwise. The conversion issues, such as the unmapped
+    primary sites, are reported in `out_dir/<cohort name>.diagnostics.csv`, if any.
+
+    The CDA tables and the GDC responses are recorded into or replayed from the `cassette_dir`
+    in the `cassette_mode`, if given, see :class:`oncopacket.cda.Cassette`.
+    """
+    cassette = _open_cassette(cassette_dir, cassette_mode, latency)
+    importer = _configure_importer(cache_dir, use_cache, maf_paths, cassette)
+    phenopackets = importer.get_ga4gh_phenopackets(dict(preset.query), cohort_name=preset.cohort_name,
+                                                   stages=stages)
+    if fmt == 'json':
+        from .export import ShardedPhenopacketWriter
+        path = os.path.abspath(os.path.join(out_dir, preset.cohort_name))
+        print(f'Writing {len(phenopackets)} phenopackets to {path}')
+        ShardedPhenopacketWriter(path, shard_size=shard_size, n_workers=n_workers).write(phenopackets)
+    else:
+        from .export import write_stream
+        path = os.path.abspath(os.path.join(out_dir, f'{preset.cohort_name}.{fmt}'))
+        print(f'Writing {len(phenopackets)} phenopackets to {path}')
+        write_stream(phenopackets, path)
+
+    diagnostics = importer.get_diagnostics()
+    if len(diagnostics) > 0:
+        report_path = os.path.abspath(os.path.join(out_dir, f'{preset.cohort_name}.diagnostics.csv'))
+        diagnostics.to_df().to_csv(report_path, index=False)
+        print(f'{diagnostics.summary()}, see {report_path}')
+    return ExportResult(tissue, len(phenopackets), path)
+
+
+def _parse_stages(value: str) -> typing.Tuple[str, ...]:
+    stages = tuple(s.strip() for s in value.split(',') if s.strip())
+    unknown = set(stages).difference(STAGES)
+    if unknown:
+        raise argparse.ArgumentTypeError(f'unknown stage(s) {sorted(unknown)}, use any of {",".join(STAGES)}')
+    return stages
+
+
+def _parse_positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'must be positive but was {number}')
+    return number
+
+
+def _parse_latency(value: str) -> typing.Union[float, str]:
+    if value == 'recorded':
+        return value
+    seconds = float(value)
+    if seconds < 0:
+        raise argparse.ArgumentTypeError(f'must not be negative but was {seconds}')
+    return seconds
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='oncopacket', description='Transform NCI data into GA4GH phenopackets.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export = subparsers.add_parser(
+        'export', help='export the phenopackets of tissue cohorts',
+        description='Export the phenopackets of tissue cohorts. '
+                    f'Available tissues: {", ".join(TISSUE_PRESETS)}, or `all`.')
+    export.add_argument('tissues', nargs='*', metavar='TISSUE', help='the tissue cohorts to export, or `all`')
+    export.add_argument('--list', action='store_true', help='list the tissue presets and exit')
+    export.add_argument('-o', '--out-dir', default='phenopackets', help='the output directory (default: %(default)s)')
+    export.add_argument('-f', '--format', default='json', choices=OUTPUT_FORMATS,
+                        help='`json` for one file per phenopacket, or a stream format (default: %(default)s)')
+    export.add_argument('-j', '--jobs', type=_parse_positive_int, default=1,
+                        help='the number of cohorts exported in parallel (default: %(default)s)')
+    export.add_argument('-w', '--workers', type=_parse_positive_int, default=None,
+                        help='the number of processes writing the JSON files of a cohort '
+                             '(default: all CPUs with one job, 1 otherwise)')
+    export.add_argument('--shard-size', type=_parse_positive_int, default=None,
+                        help='write the JSON files into shards of this size (default: no sharding)')
+    export.add_argument('--stages', type=_parse_stages, default=STAGES,
+                        help=f'the comma-separated parts of the phenopackets to include (default: {",".join(STAGES)})')
+    export.add_argument('--cache', action='store_true',
+                        help='reuse the CDA tables cached in the cache directory (default: always fetch the tables)')
+    export.add_argument('--cache-dir', default='.oncoexporter_cache',
+                        help='the directory for caching the CDA tables, shared by all cohorts (default: %(default)s)')
+    export.add_argument('--maf', action='append', default=None, metavar='PATH',
+                        help='read the variants from a MAF file or a directory of MAF files '
+                             'instead of the GDC API (may be repeated)')
+    cassette = export.add_mutually_exclusive_group()
+    cassette.add_argument('--record', default=None, metavar='DIR',
+                          help='record the CDA tables and the GDC responses into a cassette directory')
+    cassette.add_argument('--replay', default=None, metavar='DIR',
+                          help='replay the CDA tables and the GDC responses from a cassette directory, without network')
+    export.add_argument('--latency', type=_parse_latency, default=0., metavar='SECONDS',
+                        help='the delay of each replayed call, or `recorded` for the recorded durations '
+                             '(default: %(default)s)')
+
+    combinations = subparsers.add_parser(
+        'combinations', help='count the diagnosis combinations and check their NCIT mappings',
+        description='Count the distinct (primary_diagnosis, primary_diagnosis_condition, primary_diagnosis_site) '
+                    'combinations of tissue cohorts and flag the combinations missing from the NCIT mapping tables. '
+                    'Without tissues, all cohorts in the cache directory are counted, without querying CDA.')
+    combinations.add_argument('tissues', nargs='*', metavar='TISSUE',
+                              help='the tissue cohorts to query, or `all` (default: the cached cohorts)')
+    combinations.add_argument('-o', '--out', default=None, metavar='PATH',
+                              help='write the combinations into a CSV file (default: print them)')
+    combinations.add_argument('--unmapped', action='store_true', help='only report the unmapped combinations')
+    combinations.add_argument('--cache-dir', default='.oncoexporter_cache',
+                              help='the directory with the cached CDA tables (default: %(default)s)')
+    combinations.add_argument('--no-cache', action='store_true', help='always fetch the CDA tables')
+    return parser
+
+
+def _resolve_tissues(parser: argparse.ArgumentParser, tissues: typing.Sequence[str]) -> typing.List[str]:
+    if not tissues:
+        parser.error('no tissue given, use `all` or some of: ' + ', '.join(TISSUE_PRESETS))
+    if any(t.lower() == 'all' for t in tissues):
+        return list(TISSUE_PRESETS)
+    resolved = []
+    for tissue in tissues:
+        key = tissue.lower()
+        if key not in TISSUE_PRESETS:
+            parser.error(f'unknown tissue `{tissue}`, use `all` or some of: ' + ', '.join(TISSUE_PRESETS))
+        if key not in resolved:
+            resolved.append(key)
+    return resolved
+
+
+def _run_export(parser: argparse.ArgumentParser, args: argparse.Namespace) -> int:
+    if args.list:
+        for name, preset in TISSUE_PRESETS.items():
+            print(f'{name:<10}{preset.query["match_any"]}')
+        return 0
+    tissues = _resolve_tissues(parser, args.tissues)
+
+    # The cassette replaces the cache, otherwise the cached tables would not be recorded.
+    cassette_dir = args.record if args.record is not None else args.replay
+    use_cache = args.cache and cassette_dir is None
+    cache_dir = os.path.abspath(args.cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    os.makedirs(args.out_dir, exist_ok=True)
+    jobs = min(args.jobs, len(tissues))
+    n_workers = args.workers if args.workers is not None else (None if jobs == 1 else 1)
+    kwargs = dict(out_dir=args.out_dir, fmt=args.format, stages=args.stages, cache_dir=cache_dir,
+                  use_cache=use_cache, maf_paths=args.maf, n_workers=n_workers, shard_size=args.shard_size,
+                  cassette_dir=None if cassette_dir is None else os.path.abspath(cassette_dir),
+                  cassette_mode='record' if args.record is not None else 'replay', latency=args.latency)
+
+    results = []
+    failed = []
+    if jobs == 1:
+        for tissue in tissues:
+            try:
+                results.append(export_cohort(tissue, TISSUE_PRESETS[tissue], **kwargs))
+            except Exception as e:
+                print(f'[ERROR] Could not export {tissue}: {e}', file=sys.stderr)
+                failed.append(tissue)
+    else:
+        # Fetch the data shared by all cohorts once, instead of once per worker,
+        # through the cassette, if any, hence a replay does not use the network.
+        cassette = _open_cassette(kwargs['cassette_dir'], kwargs['cassette_mode'], args.latency)
+        _configure_importer(cache_dir, use_cache, args.maf, cassette).prefetch_shared(args.stages)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(export_cohort, tissue, TISSUE_PRESETS[tissue], **kwargs): tissue
+                       for tissue in tissues}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    print(f'[ERROR] Could not export {futures[future]}: {e}', file=sys.stderr)
+                    failed.append(futures[future])
+
+    for result in sorted(results):
+        print(f'[INFO] {result.tissue}: {result.n_phenopackets} phenopackets in {result.path}')
+    return 1 if failed else 0
+
+
+def _run_combinations(parser: argparse.ArgumentParser, args: argparse.Namespace) -> int:
+    import pandas as pd
+    from .cda.diagnosis_catalog import cached_diagnosis_combinations
+
+    cache_dir = os.path.abspath(args.cache_dir)
+    if args.tissues:
+        tissues = _resolve_tissues(parser, args.tissues)
+        os.makedirs(cache_dir, exist_ok=True)
+        importer = _configure_importer(cache_dir, not args.no_cache, None)
+        presets = [TISSUE_PRESETS[tissue] for tissue in tissues]
+        if args.no_cache:
+            combinations = pd.concat([importer.get_diagnosis_combinations(dict(p.query), p.cohort_name)
+                                     .assign(cohort=p.cohort_name) for p in presets], ignore_index=True)
+        else:
+            # Fill the cache, the counts of the unchanged cohorts are reused.
+            for preset in presets:
+                importer.get_researchsubject_df(dict(preset.query), preset.cohort_name)
+                importer.get_diagnosis_df(dict(preset.query), preset.cohort_name)
+            combinations = cached_diagnosis_combinations(cache_dir, cohorts=[p.cohort_name for p in presets])
+    else:
+        if not os.path.isdir(cache_dir):
+            parser.error(f'no tissue given and no cache directory {cache_dir}')
+        combinations = cached_diagnosis_combinations(cache_dir)
+
+    n_unmapped = int((~combinations['mapped']).sum())
+    print(f'[INFO] {len(combinations)} combinations in {combinations["cohort"].nunique()} cohort(s), '
+          f'{n_unmapped} unmapped', file=sys.stderr)
+    if args.unmapped:
+        combinations = combinations[~combinations['mapped']]
+    if args.out is not None:
+        combinations.to_csv(args.out, index=False)
+    else:
+        columns = ['cohort', 'primary_diagnosis', 'primary_diagnosis_condition', 'primary_diagnosis_site',
+                   'n_rows', 'ncit_id']
+        with pd.option_context('display.max_rows', None, 'display.max_colwidth', 40, 'display.width', 200):
+            print(combinations[columns].to_string(index=False))
+    return 0
+
+
+def main(argv: typing.Optional[typing.Sequence[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'export':
+        return _run_export(parser, args)
+    if args.command == 'combinations':
+        return _run_combinations(parser, args)
+    parser.error(f'unknown command {args.command}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,34 @@
+"""
+Compact, analysis-friendly representations of the phenopacket cohorts.
+"""
+import typing
+
+from .._lazy import attach_lazy_loader
+
+if typing.TYPE_CHECKING:
+    from .flatten import CohortFrames, flatten_cohort, load_cohort_frames
+    from .index import CohortIndex, SubjectSet, load_cohort_index
+    from .loader import Cohort, load_cohort
+    from .variant_store import CohortVariantStore
+
+__getattr__, __dir__ = attach_lazy_loader(
+    __name__,
+    {
+        'CohortFrames': '.flatten',
+        'flatten_cohort': '.flatten',
+        'load_cohort_frames': '.flatten',
+        'CohortIndex': '.index',
+        'SubjectSet': '.index',
+        'load_cohort_index': '.index',
+        'Cohort': '.loader',
+        'load_cohort': '.loader',
+        'CohortVariantStore': '.variant_store',
+    },
+)
+
+__all__ = [
+    'Cohort', 'load_cohort',
+    'CohortFrames', 'flatten_cohort', 'load_cohort_frames',
+    'CohortIndex', 'SubjectSet', 'load_cohort_index',
+    'CohortVariantStore',
+]
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import typing
+import warnings
+
+import numpy as np
+import pandas as pd
+import phenopackets as pp
+
+from ..cda.mapper.iso8601_mapper import iso8601_to_years
+from .loader import SIDECAR_DIRNAME, _list_sources, load_cohort
+
+# Bump when the columns change, to invalidate the cached Parquet files.
+FLATTEN_VERSION = 1
+
+SEX_CATEGORIES = tuple(pp.Sex.keys())
+VITAL_STATUS_CATEGORIES = tuple(pp.VitalStatus.Status.keys())
+
+
+class CohortFrames(typing.NamedTuple):
+    """
+    The flat representation of a cohort.
+
+    `subjects` has one row per phenopacket and `variants` has one row per variant of a subject.
+    The frames are joined by the `subject_id` column.
+    """
+    subjects: pd.DataFrame
+    variants: pd.DataFrame
+
+
+def flatten_cohort(phenopackets: typing.Iterable[pp.Phenopacket]) -> CohortFrames:
+    """
+    Flatten the phenopackets into typed DataFrames, e.g. for the survival analysis with `lifelines`,
+    in one pass over the cohort.
+
+    The `subjects` columns are:
+
+    * `phenopacket_id`, `subject_id` - strings
+    * `age_years` - the age at the last encounter in years, `NaN` if unknown
+    * `sex`, `vital_status` - categories with the names of the Phenopacket Schema enums, e.g. `FEMALE`, `DECEASED`
+    * `event` - `True` if the subject is deceased
+    * `survival_time_days` - a nullable integer, missing if the subject has no vital status
+    * `disease_id`, `disease`, `primary_site`, `stage` - the first disease, its primary site and the first stage
+    * `n_variants` - the number of variants
+
+    The `variants` columns are `subject_id`, `gene_symbol`, `gene_id`, `hgvs_c`, `hgvs_p`, `protein_change`
+    (e.g. `p.L858R`), `chrom`, `pos` (nullable integer), `ref`, and `alt`.
+
+    :param phenopackets: the phenopackets, e.g. a :class:`Cohort`.
+    :returns: the subjects and the variants.
+    """
+    subjects = {name: [] for name in ('phenopacket_id', 'subject_id', 'age', 'sex', 'vital_status',
+                                      'survival_time_days', 'disease_id', 'disease', 'primary_site', 'stage',
+                                      'n_variants')}
+    variants = {name: [] for name in ('subject_id', 'gene_symbol', 'gene_id', 'hgvs_c', 'hgvs_p',
+                                      'chrom', 'pos', 'ref', 'alt')}
+    for phenopacket in phenopackets:
+        subject = phenopacket.subject
+        subjects['phenopacket_id'].append(phenopacket.id)
+        subjects['subject_id'].append(subject.id)
+        subjects['age'].append(subject.time_at_last_encounter.age.iso8601duration)
+        subjects['sex'].append(subject.sex)
+        if subject.HasField('vital_status'):
+            subjects['vital_status'].append(subject.vital_status.status)
+            subjects['survival_time_days'].append(subject.vital_status.survival_time_in_days)
+        else:
+            subjects['vital_status'].append(-1)
+            subjects['survival_time_days'].append(None)
+
+        if len(phenopacket.diseases) > 0:
+            disease = phenopacket.diseases[0]
+            subjects['disease_id'].append(disease.term.id)
+            subjects['disease'].append(disease.term.label)
+            subjects['primary_site'].append(disease.primary_site.label if disease.HasField('primary_site') else None)
+            subjects['stage'].append(disease.disease_stage[0].label if len(disease.disease_stage) > 0 else None)
+        else:
+            for name in ('disease_id', 'disease', 'primary_site', 'stage'):
+                subjects[name].append(None)
+
+        n_variants = 0
+        for interpretation in phenopacket.interpretations:
+            for gi in interpretation.diagnosis.genomic_interpretations:
+                vd = gi.variant_interpretation.variation_descriptor
+                n_variants += 1
+                variants['subject_id'].append(subject.id)
+                variants['gene_symbol'].append(vd.gene_context.symbol if vd.HasField('gene_context') else None)
+                variants['gene_id'].append(vd.gene_context.value_id if vd.HasField('gene_context') else None)
+                hgvs_c = hgvs_p = None
+                for expression in vd.expressions:
+                    if expression.syntax == 'hgvs.c' and hgvs_c is None:
+                        hgvs_c = expression.value
+                    elif expression.syntax == 'hgvs.p' and hgvs_p is None:
+                        hgvs_p = expression.value
+                variants['hgvs_c'].append(hgvs_c)
+                variants['hgvs_p'].append(hgvs_p)
+                if vd.HasField('vcf_record'):
+                    vcf = vd.vcf_record
+                    variants['chrom'].append(vcf.chrom)
+                    variants['pos'].append(vcf.pos)
+                    variants['ref'].append(vcf.ref)
+                    variants['alt'].append(vcf.alt)
+                else:
+                    for name in ('chrom', 'pos', 'ref', 'alt'):
+                        variants[name].append(None)
+        subjects['n_variants'].append(n_variants)
+
+    return CohortFrames(_subjects_frame(subjects), _variants_frame(variants))
+
+
+def _enum_categories(codes: typing.Sequence[int], names: typing.Sequence[str]) -> pd.Categorical:
+    # The enum values of the Phenopacket Schema are 0, 1, 2, ..., and `-1` marks a missing value.
+    return pd.Categorical.from_codes(np.asarray(codes, dtype=np.int64), categories=list(names))
+
+
+def _subjects_frame(columns: typing.Mapping[str, list]) -> pd.DataFrame:
+    vital_status = _enum_categories(columns['vital_status'], VITAL_STATUS_CATEGORIES)
+    return pd.DataFrame({
+        'phenopacket_id': pd.array(columns['phenopacket_id'], dtype='string'),
+        'subject_id': pd.array(columns['subject_id'], dtype='string'),
+        'age_years': iso8601_to_years(columns['age']),
+        'sex': _enum_categories(columns['sex'], SEX_CATEGORIES),
+        'vital_status': vital_status,
+        'event': np.asarray(vital_status == 'DECEASED', dtype=bool),
+        'survival_time_days': pd.array(columns['survival_time_days'], dtype='Int64'),
+        'disease_id': pd.Categorical(columns['disease_id']),
+        'disease': pd.Categorical(columns['disease']),
+        'primary_site': pd.Categorical(columns['primary_site']),
+        'stage': pd.Categorical(columns['stage']),
+        'n_variants': np.asarray(columns['n_variants'], dtype=np.int32),
+    })
+
+
+def _variants_frame(columns: typing.Mapping[str, list]) -> pd.DataFrame:
+    hgvs_p = pd.array(columns['hgvs_p'], dtype='string')
+    return pd.DataFrame({
+        'subject_id': pd.Categorical(columns['subject_id']),
+        'gene_symbol': pd.Categorical(columns['gene_symbol']),
+        'gene_id': pd.Categorical(columns['gene_id']),
+        'hgvs_c': pd.array(columns['hgvs_c'], dtype='string'),
+        'hgvs_p': hgvs_p,
+        # `ENSP00000275493.2:p.L858R` -> `p.L858R`
+        'protein_change': pd.Categorical(pd.Series(hgvs_p).str.rpartition(':')[2] if len(hgvs_p) > 0 else []),
+        'chrom': pd.Categorical(columns['chrom']),
+        'pos': pd.array(columns['pos'], dtype='Int64'),
+        'ref': pd.Categorical(columns['ref']),
+        'alt': pd.Categorical(columns['alt']),
+    })
+
+
+def _signature(stamps: typing.Sequence[typing.Tuple[str, int, int]]) -> str:
+    payload = json.dumps({'version': FLATTEN_VERSION, 'sources': stamps}).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+
+def load_cohort_frames(path: str,
+                       use_cache: bool = True,
+                       cache_dir: typing.Optional[str] = None,
+                       n_workers: typing.Optional[int] = None) -> CohortFrames:
+    """
+    Load the flat representation of a cohort (see :func:`flatten_cohort`) from a directory or a bundle
+    (see :func:`load_cohort`).
+
+    The frames are cached as Parquet files in the `.oncopacket_cache` subdirectory of the cohort directory
+    (or next to the bundle) by default, and reused as long as the cohort files are unchanged.
+    The cache requires `pyarrow` (or `fastparquet`) and it is skipped with a warning if neither is installed.
+
+    :param path: the path to a directory with the phenopacket JSON files or to a bundle.
+    :param use_cache: `True` if the Parquet cache should be used and updated.
+    :param cache_dir: the directory for the Parquet files.
+    :param n_workers: the number of worker processes for loading the cohort, see :func:`load_cohort`.
+    """
+    path = os.path.abspath(path)
+    base_dir, stamps, _ = _list_sources(path)
+    if cache_dir is None:
+        cache_dir = os.path.join(base_dir, SIDECAR_DIRNAME)
+    prefix = 'cohort' if os.path.isdir(path) else os.path.basename(path)
+    paths = {name: os.path.join(cache_dir, f'{prefix}.{name}.parquet') for name in CohortFrames._fields}
+    signature_path = os.path.join(cache_dir, f'{prefix}.frames.json')
+    signature = _signature(stamps)
+
+    if use_cache:
+        frames = _read_cached_frames(paths, signature_path, signature)
+        if frames is not None:
+            return frames
+
+    # The frames use only these parts of the phenopackets.
+    cohort = load_cohort(path, fields=('subject', 'diseases', 'interpretations'), n_workers=n_workers,
+                         use_cache=use_cache, cache_dir=cache_dir)
+    frames = flatten_cohort(cohort)
+    if use_cache:
+        _write_cached_frames(frames, paths, signature_path, signature)
+    return frames
+
+
+def _read_cached_frames(paths: typing.Mapping[str, str], signature_path: str, signature: str) \
+        -> typing.Optional[CohortFrames]:
+    try:
+        with open(signature_path) as fh:
+            if json.load(fh).get('signature') != signature:
+                return None
+        return CohortFrames(**{name: pd.read_parquet(path) for name, path in paths.items()})
+    except (OSError, ValueError, ImportError):
+        return None
+
+
+def _write_cached_frames(frames: CohortFrames, paths: typing.Mapping[str, str], signature_path: str, signature: str):
+    try:
+        os.makedirs(os.path.dirname(signature_path), exist_ok=True)
+        if os.path.exists(signature_path):
+            os.remove(signature_path)
+        for name, path in paths.items():
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            getattr(frames, name).to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        # The signature is written last, hence it never points to incomplete frames.
+        with open(signature_path, 'w') as fh:
+            json.dump({'signature': signature}, fh)
+    except ImportError as e:
+        warnings.warn(f'Could not cache the cohort frames as Parquet: {e}')
+    except OSError as e:
+        warnings.warn(f'Could not write the cached cohort frames into {os.path.dirname(signature_path)}: {e}')
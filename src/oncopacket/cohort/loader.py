@@ -0,0 +1,321 @@
+import concurrent.futures
+import json
+import os
+import typing
+import warnings
+
+import phenopackets as pp
+from google.protobuf.json_format import ParseDict
+from google.protobuf.message import DecodeError
+
+from ..export.streams import COMPRESSIONS, STREAM_FORMATS, _loads, infer_format, open_stream, read_delimited, \
+    write_delimited
+
+SIDECAR_DIRNAME = '.oncopacket_cache'
+SIDECAR_VERSION = 1
+
+# The JSON files written next to the phenopackets, which are not phenopackets.
+_NON_PHENOPACKET_FILES = frozenset(('manifest.json',))
+# Parse the files in the current process if there are only a few.
+_MIN_FILES_FOR_POOL = 64
+_TASK_SIZE = 256
+
+
+class Cohort:
+    """
+    `Cohort` is a sequence of phenopackets loaded by :func:`load_cohort`.
+
+    If the cohort was loaded with a projection, the phenopackets have only the `id` and the projected `fields`.
+
+    :param name: the cohort name, e.g. `Lung`.
+    :param phenopackets: the phenopackets.
+    :param fields: the top-level phenopacket fields that were loaded, or `None` if all fields were loaded.
+    """
+
+    def __init__(self, name: str,
+                 phenopackets: typing.Sequence[pp.Phenopacket],
+                 fields: typing.Optional[typing.Sequence[str]] = None):
+        self._name = name
+        self._phenopackets = list(phenopackets)
+        self._fields = None if fields is None else tuple(fields)
+        self._by_id: typing.Optional[typing.Mapping[str, pp.Phenopacket]] = None
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def fields(self) -> typing.Optional[typing.Sequence[str]]:
+        return self._fields
+
+    @property
+    def phenopackets(self) -> typing.Sequence[pp.Phenopacket]:
+        return self._phenopackets
+
+    def __len__(self) -> int:
+        return len(self._phenopackets)
+
+    def __iter__(self) -> typing.Iterator[pp.Phenopacket]:
+        return iter(self._phenopackets)
+
+    def __getitem__(self, index: int) -> pp.Phenopacket:
+        return self._phenopackets[index]
+
+    def get(self, phenopacket_id: str) -> typing.Optional[pp.Phenopacket]:
+        """
+        Get the phenopacket with the ID, or `None` if the cohort has no such phenopacket.
+        """
+        if self._by_id is None:
+            self._by_id = {p.id: p for p in self._phenopackets}
+        return self._by_id.get(phenopacket_id)
+
+    def __repr__(self) -> str:
+        return f'Cohort(name={self._name!r}, n_phenopackets={len(self._phenopackets)}, fields={self._fields})'
+
+
+def _check_fields(fields: typing.Optional[typing.Iterable[str]]) -> typing.Optional[typing.Tuple[str, ...]]:
+    if fields is None:
+        return None
+    by_name = pp.Phenopacket.DESCRIPTOR.fields_by_name
+    fields = tuple(sorted(set(fields) | {'id'}))
+    unknown = [f for f in fields if f not in by_name]
+    if unknown:
+        raise ValueError(f'Unknown phenopacket field(s) {unknown}. Use any of {sorted(by_name)}')
+    return fields
+
+
+def _json_keys(fields: typing.Optional[typing.Sequence[str]]) -> typing.Optional[typing.FrozenSet[str]]:
+    # The JSON may use the original field names, as well as the lowerCamelCase names.
+    if fields is None:
+        return None
+    by_name = pp.Phenopacket.DESCRIPTOR.fields_by_name
+    return frozenset(key for f in fields for key in (f, by_name[f].json_name))
+
+
+def _parse_json(payload: bytes, keys: typing.Optional[typing.FrozenSet[str]]) -> pp.Phenopacket:
+    obj = _loads(payload)
+    if keys is not None:
+        # Dropping the keys before `ParseDict` skips the most expensive part, converting the unused messages.
+        obj = {key: value for key, value in obj.items() if key in keys}
+    return ParseDict(obj, pp.Phenopacket())
+
+
+def _parse_json_files(paths: typing.Sequence[str], keys: typing.Optional[typing.FrozenSet[str]]) -> typing.List[bytes]:
+    """
+    Parse the JSON phenopackets and return the serialized messages. Runs in a worker process.
+    """
+    out = []
+    for path in paths:
+        with open(path, 'rb') as fh:
+            out.append(_parse_json(fh.read(), keys).SerializeToString())
+    return out
+
+
+def _parse_json_lines(lines: typing.Sequence[bytes], keys: typing.Optional[typing.FrozenSet[str]]) -> typing.List[bytes]:
+    return [_parse_json(line, keys).SerializeToString() for line in lines]
+
+
+def _project(phenopacket: pp.Phenopacket, fields: typing.Optional[typing.Sequence[str]]) -> pp.Phenopacket:
+    if fields is not None:
+        for field in pp.Phenopacket.DESCRIPTOR.fields:
+            if field.name not in fields:
+                phenopacket.ClearField(field.name)
+    return phenopacket
+
+
+def _run_tasks(function, chunks: typing.List[typing.Sequence], keys, n_workers: int) -> typing.List[pp.Phenopacket]:
+    if n_workers == 1:
+        results = [function(chunk, keys) for chunk in chunks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(function, chunks, [keys] * len(chunks)))
+    return [pp.Phenopacket.FromString(serialized) for result in results for serialized in result]
+
+
+def _chunk(items: typing.Sequence, size: int) -> typing.List[typing.Sequence]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _is_bundle(path: str) -> bool:
+    try:
+        infer_format(path)
+        return True
+    except ValueError:
+        return False
+
+
+def _find_json_files(directory: str) -> typing.List[str]:
+    """
+    Find the JSON files in the directory and its subdirectories (e.g. the shards), sorted by the relative path.
+    """
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d != SIDECAR_DIRNAME)
+        for filename in files:
+            if filename.endswith('.json') and filename not in _NON_PHENOPACKET_FILES:
+                found.append(os.path.relpath(os.path.join(root, filename), directory))
+    return sorted(found)
+
+
+class _Sidecar:
+    """
+    The binary cache of the parsed phenopackets of a directory or a bundle.
+
+    The phenopackets are stored as a length-delimited protobuf stream and the index (a JSON file) records
+    the source files with their modification time, size, and the number of phenopackets.
+    A phenopacket is reused as long as its source file is unchanged.
+    """
+
+    def __init__(self, cache_dir: str, name: str, fields: typing.Optional[typing.Sequence[str]]):
+        key = 'all' if fields is None else '-'.join(fields)
+        self._data_path = os.path.join(cache_dir, f'{name}.{key}.pb')
+        self._index_path = os.path.join(cache_dir, f'{name}.{key}.json')
+        self._fields = None if fields is None else list(fields)
+
+    def load(self) -> typing.Dict[typing.Tuple[str, int, int], typing.List[pp.Phenopacket]]:
+        """
+        Get the cached phenopackets keyed by the `(relative path, mtime_ns, size)` of the source file.
+        """
+        try:
+            with open(self._index_path) as fh:
+                index = json.load(fh)
+            if index.get('version') != SIDECAR_VERSION or index.get('fields') != self._fields:
+                return {}
+            with open(self._data_path, 'rb') as fh:
+                phenopackets = list(read_delimited(fh))
+        except (OSError, ValueError, DecodeError) as e:
+            if os.path.exists(self._index_path):
+                warnings.warn(f'Ignoring the unreadable cache {self._index_path}: {e}')
+            return {}
+
+        cached = {}
+        start = 0
+        for relpath, mtime_ns, size, count in index['sources']:
+            cached[(relpath, mtime_ns, size)] = phenopackets[start:start + count]
+            start += count
+        return cached if start == len(phenopackets) else {}
+
+    def store(self, sources: typing.Sequence[typing.Tuple[typing.Tuple[str, int, int], typing.Sequence[pp.Phenopacket]]]):
+        try:
+            os.makedirs(os.path.dirname(self._data_path), exist_ok=True)
+            tmp_path = f'{self._data_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as fh:
+                write_delimited((p for _, phenopackets in sources for p in phenopackets), fh)
+            os.replace(tmp_path, self._data_path)
+            index = {
+                'version': SIDECAR_VERSION,
+                'fields': self._fields,
+                'sources': [[*stamp, len(phenopackets)] for stamp, phenopackets in sources],
+            }
+            tmp_path = f'{self._index_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as fh:
+                json.dump(index, fh)
+            os.replace(tmp_path, self._index_path)
+        except OSError as e:
+            warnings.warn(f'Could not write the cache {self._data_path}: {e}')
+
+
+def _stamp(path: str, relpath: str) -> typing.Tuple[str, int, int]:
+    stat = os.stat(path)
+    return relpath, stat.st_mtime_ns, stat.st_size
+
+
+def _list_sources(path: str) -> typing.Tuple[str, typing.List[typing.Tuple[str, int, int]], str]:
+    """
+    Find the source files of a cohort directory or bundle.
+
+    :returns: the base directory, the `(relative path, mtime_ns, size)` stamps of the source files,
+      and the default cohort name.
+    """
+    if os.path.isdir(path):
+        base_dir = path
+        relpaths = _find_json_files(path)
+        default_name = os.path.basename(path)
+    elif os.path.isfile(path) and _is_bundle(path):
+        base_dir = os.path.dirname(path)
+        relpaths = [os.path.basename(path)]
+        default_name = os.path.basename(path)
+        for suffix in (*COMPRESSIONS, *(f'.{fmt}' for fmt in STREAM_FORMATS)):
+            if default_name.endswith(suffix):
+                default_name = default_name[:-len(suffix)]
+    else:
+        raise ValueError(f'Expected a directory with phenopacket JSON files or a bundle '
+                         f'(one of {STREAM_FORMATS}, optionally {tuple(COMPRESSIONS)} compressed) but got {path}')
+    return base_dir, [_stamp(os.path.join(base_dir, relpath), relpath) for relpath in relpaths], default_name
+
+
+def load_cohort(path: str,
+                fields: typing.Optional[typing.Iterable[str]] = None,
+                n_workers: typing.Optional[int] = None,
+                use_cache: bool = True,
+                cache_dir: typing.Optional[str] = None,
+                name: typing.Optional[str] = None) -> Cohort:
+    """
+    Load a cohort of phenopackets from a directory of JSON files or from a bundle.
+
+    The directory is searched recursively, hence the sharded output of :class:`ShardedPhenopacketWriter` is supported.
+    A bundle is a stream file written by :func:`oncopacket.export.write_stream`, e.g. `Lung.pb` or `Lung.ndjson.gz`.
+    The JSON phenopackets are parsed in a pool of worker processes.
+
+    With `fields`, only the listed top-level phenopacket fields (and the `id`) are loaded,
+    e.g. `fields=('subject', 'diseases')` skips parsing the variants, biosamples, and medical actions.
+
+    The parsed phenopackets are cached in a binary sidecar, in the `.oncopacket_cache` subdirectory
+    of the cohort directory (or next to the bundle) by default. A cached phenopacket is reused as long as
+    the modification time and the size of its file are unchanged, so only the new and the updated files
+    are parsed again. There is one sidecar per projection.
+
+    :param path: the path to a directory with the phenopacket JSON files or to a bundle.
+    :param fields: the top-level phenopacket fields to load, or `None` to load all fields.
+    :param n_workers: the number of worker processes, all CPUs are used if `None`,
+      and the phenopackets are parsed in the current process if `1`.
+    :param use_cache: `True` if the sidecar cache should be used and updated.
+    :param cache_dir: the directory for the sidecar cache.
+    :param name: the cohort name, the directory name or the bundle name without the suffixes by default.
+    :returns: the cohort.
+    """
+    fields = _check_fields(fields)
+    n_workers = (os.cpu_count() or 1) if n_workers is None else max(n_workers, 1)
+    path = os.path.abspath(path)
+    base_dir, stamps, default_name = _list_sources(path)
+    name = default_name if name is None else name
+
+    sidecar = None
+    cached = {}
+    # A `pb` bundle is as fast to read as the sidecar.
+    if use_cache and not (os.path.isfile(path) and infer_format(path)[0] == 'pb'):
+        sidecar_name = 'cohort' if os.path.isdir(path) else os.path.basename(path)
+        sidecar = _Sidecar(os.path.join(base_dir, SIDECAR_DIRNAME) if cache_dir is None else cache_dir,
+                           sidecar_name, fields)
+        cached = sidecar.load()
+
+    missing = [stamp for stamp in stamps if stamp not in cached]
+    parsed: typing.Dict[typing.Tuple[str, int, int], typing.List[pp.Phenopacket]] = {}
+    if os.path.isdir(path):
+        if missing:
+            keys = _json_keys(fields)
+            paths = [os.path.join(base_dir, relpath) for relpath, _, _ in missing]
+            workers = 1 if len(paths) < _MIN_FILES_FOR_POOL else n_workers
+            chunk_size = max(1, min(_TASK_SIZE, -(-len(paths) // workers)))
+            for stamp, phenopacket in zip(missing, _run_tasks(_parse_json_files, _chunk(paths, chunk_size),
+                                                              keys, workers)):
+                parsed[stamp] = [phenopacket]
+    elif missing:
+        parsed[missing[0]] = _load_bundle(path, fields, n_workers)
+
+    sources = [(stamp, cached[stamp] if stamp in cached else parsed[stamp]) for stamp in stamps]
+    if sidecar is not None and (missing or len(cached) != len(stamps)):
+        sidecar.store(sources)
+    return Cohort(name, [p for _, phenopackets in sources for p in phenopackets], fields)
+
+
+def _load_bundle(path: str, fields: typing.Optional[typing.Sequence[str]], n_workers: int) -> typing.List[pp.Phenopacket]:
+    fmt, compression = infer_format(path)
+    with open_stream(path, 'rb', compression) as fh:
+        if fmt == 'pb':
+            # Parsing the binary messages is fast, there is nothing to gain from the workers.
+            return [_project(p, fields) for p in read_delimited(fh)]
+        lines = [line for line in fh if line.strip()]
+    workers = 1 if len(lines) < _MIN_FILES_FOR_POOL else n_workers
+    chunk_size = max(1, min(_TASK_SIZE, -(-len(lines) // workers)))
+    return _run_tasks(_parse_json_lines, _chunk(lines, chunk_size), _json_keys(fields), workers)
@@ -0,0 +1,318 @@
+import os
+import typing
+
+import numpy as np
+import pandas as pd
+import phenopackets as pp
+
+FORMAT_VERSION = 1
+
+# The arrays of the store, in the order of the file layout.
+_ARRAYS = (
+    # The string dictionary: the UTF-8 bytes of all distinct strings and their offsets.
+    'strings_data', 'strings_offsets',
+    # The subjects and the CSR index: the variants of subject `i` are the rows `subject_offsets[i]:subject_offsets[i+1]`.
+    'subjects', 'subject_offsets',
+    # One item per variant. The string columns are codes into the dictionary, `-1` if missing.
+    'subject_index', 'variant_id', 'gene_id', 'gene_symbol',
+    'has_vcf', 'build', 'chrom', 'vcf_id', 'pos', 'ref', 'alt', 'molecule_context',
+    # The HGVS (and other) expressions of variant `j` are the items `expression_offsets[j]:expression_offsets[j+1]`.
+    'expression_offsets', 'expression_syntax', 'expression_value',
+    # Same for the extensions, such as the read depths.
+    'extension_offsets', 'extension_name', 'extension_value',
+)
+
+
+class _StringDictionary:
+
+    def __init__(self):
+        self._codes: typing.Dict[str, int] = {}
+
+    def encode(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._codes)
+            self._codes[value] = code
+        return code
+
+    def to_arrays(self) -> typing.Tuple[np.ndarray, np.ndarray]:
+        encoded = [value.encode('utf-8') for value in self._codes]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return data, offsets
+
+
+class _VariantStoreBuilder:
+
+    def __init__(self):
+        self._strings = _StringDictionary()
+        self._subjects: typing.Dict[str, typing.List[pp.VariantInterpretation]] = {}
+
+    def add(self, subject_id: str, vi: pp.VariantInterpretation):
+        self._subjects.setdefault(subject_id, []).append(vi)
+
+    def build(self) -> "CohortVariantStore":
+        encode = self._strings.encode
+        columns = {name: [] for name in ('subject_index', 'variant_id', 'gene_id', 'gene_symbol', 'has_vcf',
+                                         'build', 'chrom', 'vcf_id', 'pos', 'ref', 'alt', 'molecule_context',
+                                         'expression_syntax', 'expression_value', 'extension_name', 'extension_value')}
+        subjects = []
+        subject_offsets = [0]
+        expression_offsets = [0]
+        extension_offsets = [0]
+        for subject_index, (subject_id, vis) in enumerate(self._subjects.items()):
+            subjects.append(encode(subject_id))
+            for vi in vis:
+                vd = vi.variation_descriptor
+                columns['subject_index'].append(subject_index)
+                columns['variant_id'].append(encode(vd.id))
+                if vd.HasField('gene_context'):
+                    columns['gene_id'].append(encode(vd.gene_context.value_id))
+                    columns['gene_symbol'].append(encode(vd.gene_context.symbol))
+                else:
+                    columns['gene_id'].append(-1)
+                    columns['gene_symbol'].append(-1)
+                has_vcf = vd.HasField('vcf_record')
+                columns['has_vcf'].append(has_vcf)
+                vcf = vd.vcf_record
+                for name, value in (('build', vcf.genome_assembly), ('chrom', vcf.chrom), ('vcf_id', vcf.id),
+                                    ('ref', vcf.ref), ('alt', vcf.alt)):
+                    columns[name].append(encode(value) if has_vcf else -1)
+                columns['pos'].append(vcf.pos)
+                columns['molecule_context'].append(vd.molecule_context)
+                for expression in vd.expressions:
+                    columns['expression_syntax'].append(encode(expression.syntax))
+                    columns['expression_value'].append(encode(expression.value))
+                expression_offsets.append(len(columns['expression_syntax']))
+                for extension in vd.extensions:
+                    columns['extension_name'].append(encode(extension.name))
+                    columns['extension_value'].append(encode(extension.value))
+                extension_offsets.append(len(columns['extension_name']))
+            subject_offsets.append(len(columns['subject_index']))
+
+        strings_data, strings_offsets = self._strings.to_arrays()
+        arrays = {
+            'strings_data': strings_data,
+            'strings_offsets': strings_offsets,
+            'subjects': np.array(subjects, dtype=np.int32),
+            'subject_offsets': np.array(subject_offsets, dtype=np.int64),
+            'expression_offsets': np.array(expression_offsets, dtype=np.int64),
+            'extension_offsets': np.array(extension_offsets, dtype=np.int64),
+            'has_vcf': np.array(columns.pop('has_vcf'), dtype=bool),
+            'pos': np.array(columns.pop('pos'), dtype=np.int64),
+            'molecule_context': np.array(columns.pop('molecule_context'), dtype=np.int8),
+        }
+        for name, values in columns.items():
+            arrays[name] = np.array(values, dtype=np.int32)
+        return CohortVariantStore(arrays)
+
+
+class CohortVariantStore:
+    """
+    `CohortVariantStore` keeps the variants of a cohort in a compact, columnar form.
+
+    The variants are stored as a structure of NumPy arrays with one item per variant (subject index,
+    gene, contig, position, alleles, ...). All strings are encoded as codes into a single dictionary of distinct
+    strings, hence the recurrent values (genes, contigs, alleles) are stored once. The expressions (HGVS)
+    and the extensions of the variants are stored as flat arrays with offsets. The variants are grouped
+    by the subject and the `subject_offsets` array is a CSR index from the subject to its variants.
+
+    The store can be saved into a `.npz` file or into a directory of `.npy` files that can be memory-mapped.
+    The `VariantInterpretation` messages are created only on request, e.g. by :func:`get_variant_interpretations`.
+    The store keeps the fields of the `VariationDescriptor` set by the oncopacket factories: ID, gene context,
+    expressions, VCF record, molecule context, and extensions.
+
+    Use :func:`from_phenopackets` or :func:`from_variants` to create the store.
+    """
+
+    @staticmethod
+    def from_phenopackets(phenopackets: typing.Iterable[pp.Phenopacket]) -> "CohortVariantStore":
+        """
+        Create the store from the variants of the genomic interpretations of the phenopackets.
+        The variants are attributed to the phenopacket subject.
+        """
+        builder = _VariantStoreBuilder()
+        for phenopacket in phenopackets:
+            for interpretation in phenopacket.interpretations:
+                for gi in interpretation.diagnosis.genomic_interpretations:
+                    if gi.HasField('variant_interpretation'):
+                        builder.add(phenopacket.subject.id, gi.variant_interpretation)
+        return builder.build()
+
+    @staticmethod
+    def from_variants(
+            variants: typing.Mapping[str, typing.Iterable[pp.VariantInterpretation]],
+    ) -> "CohortVariantStore":
+        """
+        Create the store from a mapping of the subject ID to the variants of the subject,
+        such as :func:`MafMutationSource.get_variants`.
+        """
+        builder = _VariantStoreBuilder()
+        for subject_id, vis in variants.items():
+            for vi in vis:
+                builder.add(subject_id, vi)
+        return builder.build()
+
+    @staticmethod
+    def load(path: str, mmap_mode: typing.Optional[str] = None) -> "CohortVariantStore":
+        """
+        Load the store saved by :func:`save`.
+
+        :param path: path to a `.npz` file or to a directory with `.npy` files.
+        :param mmap_mode: memory-map the arrays, e.g. `'r'`, only applicable to a directory.
+        """
+        if os.path.isdir(path):
+            arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+                      for name in _ARRAYS + ('format_version',)}
+        else:
+            if mmap_mode is not None:
+                raise ValueError('Only the stores saved into a directory can be memory-mapped')
+            with np.load(path, allow_pickle=False) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+        version = int(arrays.pop('format_version'))
+        if version != FORMAT_VERSION:
+            raise ValueError(f'Unsupported variant store format {version} in {path}, expected {FORMAT_VERSION}')
+        return CohortVariantStore(arrays)
+
+    def __init__(self, arrays: typing.Mapping[str, np.ndarray]):
+        missing = set(_ARRAYS).difference(arrays)
+        if missing:
+            raise ValueError(f'Missing array(s): {sorted(missing)}')
+        self._arrays = {name: arrays[name] for name in _ARRAYS}
+        self._strings: typing.Optional[typing.List[str]] = None
+        self._subject_to_index: typing.Optional[typing.Dict[str, int]] = None
+
+    def save(self, path: str, compressed: bool = False):
+        """
+        Save the store into a `.npz` file or, if `path` does not end with `.npz`, into a directory of `.npy` files
+        that can be memory-mapped by :func:`load`.
+        """
+        arrays = dict(self._arrays)
+        arrays['format_version'] = np.array(FORMAT_VERSION)
+        if path.endswith('.npz'):
+            (np.savez_compressed if compressed else np.savez)(path, **arrays)
+        else:
+            os.makedirs(path, exist_ok=True)
+            for name, array in arrays.items():
+                np.save(os.path.join(path, f'{name}.npy'), array, allow_pickle=False)
+
+    def __len__(self) -> int:
+        return len(self._arrays['subject_index'])
+
+    @property
+    def n_subjects(self) -> int:
+        return len(self._arrays['subjects'])
+
+    def get_array(self, name: str) -> np.ndarray:
+        """
+        Get one of the arrays of the store, e.g. `pos` or `subject_offsets`.
+        """
+        if name not in self._arrays:
+            raise ValueError(f'Unknown array {name}. Available arrays: {list(self._arrays)}')
+        return self._arrays[name]
+
+    def get_strings(self) -> typing.Sequence[str]:
+        """
+        Get the string dictionary, the string columns are codes into this sequence.
+        """
+        if self._strings is None:
+            data = self._arrays['strings_data'].tobytes()
+            offsets = self._arrays['strings_offsets'].tolist()
+            self._strings = [data[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+        return self._strings
+
+    def get_subject_ids(self) -> typing.Sequence[str]:
+        strings = self.get_strings()
+        return [strings[code] for code in self._arrays['subjects'].tolist()]
+
+    def get_rows(self, subject_id: str) -> range:
+        """
+        Get the rows with the variants of the subject, an empty range if the subject has no variants.
+        """
+        if self._subject_to_index is None:
+            self._subject_to_index = {subject_id: i for i, subject_id in enumerate(self.get_subject_ids())}
+        index = self._subject_to_index.get(subject_id)
+        if index is None:
+            return range(0)
+        offsets = self._arrays['subject_offsets']
+        return range(int(offsets[index]), int(offsets[index + 1]))
+
+    def to_variant_interpretation(self, row: int) -> pp.VariantInterpretation:
+        """
+        Create the `VariantInterpretation` message for the variant at `row`.
+        """
+        a = self._arrays
+        strings = self.get_strings()
+        vi = pp.VariantInterpretation()
+        vd = vi.variation_descriptor
+        vd.id = strings[a['variant_id'][row]]
+        if a['gene_id'][row] >= 0:
+            vd.gene_context.SetInParent()
+            vd.gene_context.value_id = strings[a['gene_id'][row]]
+            vd.gene_context.symbol = strings[a['gene_symbol'][row]]
+        for i in range(a['expression_offsets'][row], a['expression_offsets'][row + 1]):
+            vd.expressions.add(syntax=strings[a['expression_syntax'][i]], value=strings[a['expression_value'][i]])
+        if a['has_vcf'][row]:
+            vcf = vd.vcf_record
+            vcf.SetInParent()
+            vcf.genome_assembly = strings[a['build'][row]]
+            vcf.chrom = strings[a['chrom'][row]]
+            vcf.id = strings[a['vcf_id'][row]]
+            vcf.pos = int(a['pos'][row])
+            vcf.ref = strings[a['ref'][row]]
+            vcf.alt = strings[a['alt'][row]]
+        for i in range(a['extension_offsets'][row], a['extension_offsets'][row + 1]):
+            vd.extensions.add(name=strings[a['extension_name'][i]], value=strings[a['extension_value'][i]])
+        vd.molecule_context = int(a['molecule_context'][row])
+        return vi
+
+    def get_variant_interpretations(self, subject_id: str) -> typing.List[pp.VariantInterpretation]:
+        return [self.to_variant_interpretation(row) for row in self.get_rows(subject_id)]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Get a table with one row per variant, with categorical columns for the subject, gene, contig,
+        and alleles and with the first `hgvs.c` and `hgvs.p` expression of the variant.
+        """
+        a = self._arrays
+        columns = {
+            'subject_id': self._decode(a['subject_index'], a['subjects']),
+            'variant_id': self._decode(a['variant_id']),
+            'gene_symbol': self._decode(a['gene_symbol']),
+            'build': self._decode(a['build']),
+            'chrom': self._decode(a['chrom']),
+            'pos': np.where(a['has_vcf'], a['pos'], -1),
+            'ref': self._decode(a['ref']),
+            'alt': self._decode(a['alt']),
+            'hgvs_c': self._first_expression('hgvs.c'),
+            'hgvs_p': self._first_expression('hgvs.p'),
+        }
+        return pd.DataFrame(columns)
+
+    def _decode(self, codes: np.ndarray, lookup: typing.Optional[np.ndarray] = None) -> pd.Categorical:
+        codes = np.asarray(codes)
+        if lookup is not None:
+            # `codes` index into `lookup`, which holds the string codes.
+            codes = np.asarray(lookup)[codes] if len(codes) else codes
+        strings = self.get_strings()
+        uniques, inverse = np.unique(codes, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        categories = [strings[code] for code in uniques.tolist() if code >= 0]
+        if len(uniques) and uniques[0] < 0:
+            # The missing values (-1) sort first, `from_codes` maps -1 to NaN.
+            inverse = inverse - 1
+        return pd.Categorical.from_codes(inverse, categories=categories)
+
+    def _first_expression(self, syntax: str) -> pd.Categorical:
+        a = self._arrays
+        codes = np.full(len(self), -1, dtype=np.int64)
+        syntax_code = next((i for i, s in enumerate(self.get_strings()) if s == syntax), None)
+        if syntax_code is not None:
+            offsets = a['expression_offsets']
+            rows = np.repeat(np.arange(len(self)), np.diff(offsets))
+            matches = np.flatnonzero(np.asarray(a['expression_syntax']) == syntax_code)
+            # The first match of each row.
+            matched_rows, first = np.unique(rows[matches], return_index=True)
+            codes[matched_rows] = np.asarray(a['expression_value'])[matches[first]]
+        return self._decode(codes)
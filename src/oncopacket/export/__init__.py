@@ -0,0 +1,24 @@
+"""
+Writing the phenopackets to disk.
+"""
+import typing
+
+from .._lazy import attach_lazy_loader
+
+if typing.TYPE_CHECKING:
+    from .writer import ShardedPhenopacketWriter
+    from .streams import read_stream, write_stream
+
+__getattr__, __dir__ = attach_lazy_loader(
+    __name__,
+    {
+        'ShardedPhenopacketWriter': '.writer',
+        'read_stream': '.streams',
+        'write_stream': '.streams',
+    },
+)
+
+__all__ = [
+    'ShardedPhenopacketWriter',
+    'read_stream', 'write_stream',
+]
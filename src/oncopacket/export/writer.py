@@ -0,0 +1,201 @@
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+import typing
+
+import phenopackets as pp
+from google.protobuf.json_format import MessageToJson
+
+MANIFEST_FILENAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+def _encode_json(phenopacket: pp.Phenopacket) -> bytes:
+    return MessageToJson(phenopacket).encode('utf-8')
+
+
+# The per-file formats: name -> (file suffix, encoder).
+FILE_FORMATS: typing.Dict[str, typing.Tuple[str, typing.Callable[[pp.Phenopacket], bytes]]] = {
+    'json': ('.json', _encode_json),
+}
+
+
+def _safe_filename(phenopacket_id: str, index: int) -> str:
+    name = phenopacket_id.replace(os.sep, '_')
+    if os.altsep:
+        name = name.replace(os.altsep, '_')
+    return name if name not in ('', '.', '..') else f'phenopacket-{index}'
+
+
+def _fsync_directory(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        # e.g. Windows, where the directories cannot be opened.
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomically(path: str, payloads: typing.Sequence[typing.Tuple[str, bytes]], fsync_batch: int = 0):
+    """
+    Write the `(filename, payload)` pairs into the `path` directory.
+
+    Each payload is written into a hidden temporary file which is renamed to the final name when complete,
+    hence a reader never sees a partially written file. With `fsync_batch > 0`, the files are written
+    in batches of `fsync_batch`: all files of a batch are written, then flushed to the storage
+    with `fsync`, renamed, and the directory is synced once per batch.
+    """
+    batch_size = fsync_batch if fsync_batch > 0 else max(len(payloads), 1)
+    pid = os.getpid()
+    for start in range(0, len(payloads), batch_size):
+        batch = payloads[start:start + batch_size]
+        tmp_paths = []
+        for filename, payload in batch:
+            tmp_path = os.path.join(path, f'.{filename}.{pid}.tmp')
+            with open(tmp_path, 'wb') as fh:
+                fh.write(payload)
+                if fsync_batch > 0:
+                    fh.flush()
+                    os.fsync(fh.fileno())
+            tmp_paths.append(tmp_path)
+        for (filename, _), tmp_path in zip(batch, tmp_paths):
+            os.replace(tmp_path, os.path.join(path, filename))
+        if fsync_batch > 0:
+            _fsync_directory(path)
+
+
+def _write_task(out_dir: str, subdir: str, fmt: str,
+                items: typing.Sequence[typing.Tuple[str, bytes]], fsync_batch: int) -> typing.List[dict]:
+    """
+    Decode the serialized phenopackets, encode them in the `fmt`, and write them into `out_dir/subdir`.
+    Runs in a worker process.
+    """
+    suffix, encode = FILE_FORMATS[fmt]
+    directory = os.path.join(out_dir, subdir)
+    os.makedirs(directory, exist_ok=True)
+    payloads = []
+    entries = []
+    for stem, serialized in items:
+        phenopacket = pp.Phenopacket.FromString(serialized)
+        payload = encode(phenopacket)
+        filename = f'{stem}{suffix}'
+        payloads.append((filename, payload))
+        entries.append({
+            'id': phenopacket.id,
+            'path': filename if subdir == '' else f'{subdir}/{filename}',
+            'bytes': len(payload),
+            'sha256': hashlib.sha256(payload).hexdigest(),
+        })
+    write_atomically(directory, payloads, fsync_batch)
+    return entries
+
+
+class ShardedPhenopacketWriter:
+    """
+    `ShardedPhenopacketWriter` writes phenopackets into a directory, one file per phenopacket,
+    using a pool of worker processes for the encoding and writing.
+
+    The phenopackets are grouped into shards of `shard_size` phenopackets, each written into a subdirectory
+    (`shard-00000`, `shard-00001`, ...), which keeps the directories small for large cohorts. With `shard_size=None`,
+    all files are written directly into `out_dir`, like the `scripts/run_*.py` scripts did.
+
+    The files are written atomically (see :func:`write_atomically`) and a `manifest.json` with the list
+    of the shards and files is written when all phenopackets are written.
+
+    :param out_dir: the output directory, created if it does not exist.
+    :param shard_size: the number of phenopackets per shard or `None` for no sharding.
+    :param n_workers: the number of worker processes, all CPUs are used if `None`,
+      and the files are written in the current process if `1`.
+    :param fsync_batch: flush the files to the storage with `fsync` in batches of this size, `0` disables `fsync`.
+    :param fmt: the file format, one of :data:`FILE_FORMATS`.
+    :param task_size: the number of phenopackets per worker task if `shard_size` is `None`.
+    """
+
+    def __init__(self, out_dir: str,
+                 shard_size: typing.Optional[int] = 1000,
+                 n_workers: typing.Optional[int] = None,
+                 fsync_batch: int = 0,
+                 fmt: str = 'json',
+                 task_size: int = 500):
+        if shard_size is not None and shard_size < 1:
+            raise ValueError(f'`shard_size` must be positive but was {shard_size}')
+        if fmt not in FILE_FORMATS:
+            raise ValueError(f'Unknown format {fmt}. Available formats: {sorted(FILE_FORMATS)}')
+        if fsync_batch < 0:
+            raise ValueError(f'`fsync_batch` must not be negative but was {fsync_batch}')
+        self._out_dir = out_dir
+        self._shard_size = shard_size
+        self._n_workers = (os.cpu_count() or 1) if n_workers is None else max(n_workers, 1)
+        self._fsync_batch = fsync_batch
+        self._fmt = fmt
+        self._task_size = shard_size if shard_size is not None else max(task_size, 1)
+
+    def write(self, phenopackets: typing.Iterable[pp.Phenopacket]) -> dict:
+        """
+        Write the phenopackets and the manifest.
+
+        The phenopackets are consumed lazily, at most a few tasks are pending at any time.
+
+        :returns: the manifest.
+        """
+        os.makedirs(self._out_dir, exist_ok=True)
+        tasks = self._tasks(phenopackets)
+        if self._n_workers == 1:
+            results = [(subdir, _write_task(*args)) for subdir, args in tasks]
+        else:
+            results = self._write_in_pool(tasks)
+
+        shards = []
+        files = []
+        for subdir, entries in results:
+            files.extend(entries)
+            if self._shard_size is not None:
+                shards.append({'name': subdir, 'n_phenopackets': len(entries)})
+        manifest = {
+            'manifest_version': MANIFEST_VERSION,
+            'format': self._fmt,
+            'n_phenopackets': len(files),
+            'shard_size': self._shard_size,
+            'shards': shards,
+            'files': files,
+        }
+        write_atomically(self._out_dir, [(MANIFEST_FILENAME, json.dumps(manifest, indent=2).encode('utf-8'))],
+                         self._fsync_batch)
+        return manifest
+
+    def _tasks(self, phenopackets: typing.Iterable[pp.Phenopacket]):
+        items = []
+        task_index = 0
+        for index, phenopacket in enumerate(phenopackets):
+            # The serialized message is cheaper to send to a worker than the message itself.
+            items.append((_safe_filename(phenopacket.id, index), phenopacket.SerializeToString()))
+            if len(items) == self._task_size:
+                yield self._task(task_index, items)
+                items = []
+                task_index += 1
+        if items:
+            yield self._task(task_index, items)
+
+    def _task(self, task_index: int, items):
+        subdir = '' if self._shard_size is None else f'shard-{task_index:05d}'
+        return subdir, (self._out_dir, subdir, self._fmt, items, self._fsync_batch)
+
+    def _write_in_pool(self, tasks) -> typing.List[typing.Tuple[str, typing.List[dict]]]:
+        results = []
+        max_pending = 2 * self._n_workers
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self._n_workers) as pool:
+            pending = collections.deque()
+            for subdir, args in tasks:
+                pending.append((subdir, pool.submit(_write_task, *args)))
+                if len(pending) >= max_pending:
+                    subdir, future = pending.popleft()
+                    results.append((subdir, future.result()))
+            while pending:
+                subdir, future = pending.popleft()
+                results.append((subdir, future.result()))
+        return results
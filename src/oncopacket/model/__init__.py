@@ -1,13 +1,26 @@
+import typing
 
-from .op_disease import OpDisease
-from .op_Individual import OpIndividual
-from .op_message import OpMessage
-from .op_mutation import OpMutation
+from .._lazy import attach_lazy_loader
 
+if typing.TYPE_CHECKING:
+    from .op_disease import OpDisease
+    from .op_Individual import OpIndividual
+    from .op_message import OpMessage
+    from .op_mutation import OpMutation
 
-__all_ = [
+__getattr__, __dir__ = attach_lazy_loader(
+    __name__,
+    {
+        'OpDisease': '.op_disease',
+        'OpIndividual': '.op_Individual',
+        'OpMessage': '.op_message',
+        'OpMutation': '.op_mutation',
+    },
+)
+
+__all__ = [
     "OpDisease",
     "OpIndividual",
     "OpMessage",
     "OpMutation"
-]
\ No newline at end of file
+]
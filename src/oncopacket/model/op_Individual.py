@@ -1,5 +1,6 @@
 import phenopackets as PPkt
 from .op_message import OpMessage
+from ..cda.mapper.term_registry import HOMO_SAPIENS
 
 class OpIndividual(OpMessage):
     """
@@ -47,9 +48,7 @@ class OpIndividual(OpMessage):
         else:
             self._sex = PPkt.UNKNOWN_SEX
 
-        self._taxonomy = PPkt.OntologyClass()
-        self._taxonomy.id = "NCBITaxon:9606"
-        self._taxonomy.label = "Homo sapiens"
+        self._taxonomy = HOMO_SAPIENS
 
         self._vital_status = vital_status
 
@@ -65,7 +64,7 @@ class OpIndividual(OpMessage):
             individual.time_at_last_encounter.age.iso8601duration = self._iso8601duration
         individual.sex = self._sex
         if self._taxonomy is not None:
-            individual.taxonomy.CopyFrom(self._taxonomy)
+            self._taxonomy.copy_into(individual.taxonomy)
         if self._vital_status is not None:
             individual.vital_status.status = self._vital_status.status
         return individual
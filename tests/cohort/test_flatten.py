@@ -0,0 +1,131 @@
+import os
+
+import numpy as np
+import pandas as pd
+import phenopackets as pp
+import pytest
+
+from oncopacket.cda import CdaMutationFactory
+from oncopacket.cohort import flatten_cohort, load_cohort_frames
+from oncopacket.cohort import flatten
+from oncopacket.export import ShardedPhenopacketWriter
+
+TESTDATA_FILENAME = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'mutation_excerpt.tsv')
+
+
+@pytest.fixture
+def phenopackets():
+    df = pd.read_csv(TESTDATA_FILENAME, sep='\t')
+    vis = CdaMutationFactory().to_ga4gh_batch(df.iloc[:3])
+
+    first = pp.Phenopacket(id='Lung-TCGA.TCGA-XX-0001')
+    first.subject.id = 'TCGA.TCGA-XX-0001'
+    first.subject.sex = pp.Sex.FEMALE
+    first.subject.time_at_last_encounter.age.iso8601duration = 'P61Y6M'
+    first.subject.vital_status.status = pp.VitalStatus.DECEASED
+    first.subject.vital_status.survival_time_in_days = 420
+    disease = first.diseases.add()
+    disease.term.id = 'NCIT:C3512'
+    disease.term.label = 'Lung Adenocarcinoma'
+    disease.primary_site.label = 'lung'
+    disease.disease_stage.add(id='NCIT:C27966', label='Stage I')
+    gis = first.interpretations.add(id='i1').diagnosis.genomic_interpretations
+    for vi in vis[:2]:
+        gis.add().variant_interpretation.CopyFrom(vi)
+
+    second = pp.Phenopacket(id='Lung-TCGA.TCGA-XX-0002')
+    second.subject.id = 'TCGA.TCGA-XX-0002'
+    second.subject.sex = pp.Sex.MALE
+    second.subject.vital_status.status = pp.VitalStatus.ALIVE
+    second.interpretations.add(id='i2').diagnosis.genomic_interpretations.add().variant_interpretation.CopyFrom(vis[2])
+
+    third = pp.Phenopacket(id='Lung-TCGA.TCGA-XX-0003')
+    third.subject.id = 'TCGA.TCGA-XX-0003'
+    return [first, second, third]
+
+
+class TestFlattenCohort:
+
+    def test_subjects(self, phenopackets):
+        subjects = flatten_cohort(phenopackets).subjects
+
+        assert subjects['subject_id'].tolist() == [p.subject.id for p in phenopackets]
+        np.testing.assert_allclose(subjects['age_years'], [61.5, np.nan, np.nan])
+        assert subjects['sex'].tolist() == ['FEMALE', 'MALE', 'UNKNOWN_SEX']
+        assert subjects['vital_status'].tolist()[:2] == ['DECEASED', 'ALIVE']
+        assert pd.isna(subjects['vital_status'].iloc[2])
+        assert subjects['event'].tolist() == [True, False, False]
+        assert subjects['survival_time_days'].tolist()[:2] == [420, 0]
+        assert pd.isna(subjects['survival_time_days'].iloc[2])
+        assert subjects['disease'].tolist()[0] == 'Lung Adenocarcinoma'
+        assert subjects['stage'].tolist()[0] == 'Stage I'
+        assert pd.isna(subjects['disease'].iloc[1])
+        assert subjects['n_variants'].tolist() == [2, 1, 0]
+
+    def test_variants(self, phenopackets):
+        variants = flatten_cohort(phenopackets).variants
+
+        assert variants['subject_id'].tolist() == ['TCGA.TCGA-XX-0001'] * 2 + ['TCGA.TCGA-XX-0002']
+        vd = phenopackets[0].interpretations[0].diagnosis.genomic_interpretations[0] \
+            .variant_interpretation.variation_descriptor
+        row = variants.iloc[0]
+        assert row['gene_symbol'] == vd.gene_context.symbol
+        assert row['hgvs_p'] == next(e.value for e in vd.expressions if e.syntax == 'hgvs.p')
+        assert row['protein_change'].startswith('p.')
+        assert row['hgvs_p'].endswith(':' + row['protein_change'])
+        assert row['pos'] == vd.vcf_record.pos
+        assert str(variants['pos'].dtype) == 'Int64'
+
+    def test_empty_cohort(self):
+        frames = flatten_cohort([])
+
+        assert len(frames.subjects) == 0 and len(frames.variants) == 0
+        assert list(frames.subjects.columns)[:2] == ['phenopacket_id', 'subject_id']
+
+    def test_enum_categories_match_the_values(self):
+        assert [pp.Sex.Value(name) for name in flatten.SEX_CATEGORIES] == list(range(len(flatten.SEX_CATEGORIES)))
+        assert [pp.VitalStatus.Status.Value(name) for name in flatten.VITAL_STATUS_CATEGORIES] == \
+               list(range(len(flatten.VITAL_STATUS_CATEGORIES)))
+
+
+class TestLoadCohortFrames:
+
+    @pytest.fixture
+    def cohort_dir(self, tmp_path, phenopackets) -> str:
+        path = str(tmp_path / 'Lung')
+        ShardedPhenopacketWriter(path, shard_size=None, n_workers=1).write(phenopackets)
+        return path
+
+    def test_load(self, cohort_dir: str, phenopackets):
+        frames = load_cohort_frames(cohort_dir, use_cache=False, n_workers=1)
+
+        expected = flatten_cohort(phenopackets)
+        pd.testing.assert_frame_equal(frames.subjects, expected.subjects)
+        pd.testing.assert_frame_equal(frames.variants, expected.variants)
+
+    def test_parquet_cache(self, cohort_dir: str, monkeypatch):
+        pytest.importorskip('pyarrow')
+        frames = load_cohort_frames(cohort_dir, n_workers=1)
+        monkeypatch.setattr(flatten, 'load_cohort', lambda *args, **kwargs: pytest.fail('The cohort was loaded'))
+
+        cached = load_cohort_frames(cohort_dir, n_workers=1)
+
+        pd.testing.assert_frame_equal(cached.subjects, frames.subjects)
+        pd.testing.assert_frame_equal(cached.variants, frames.variants)
+
+    def test_parquet_cache_is_invalidated(self, cohort_dir: str, phenopackets):
+        pytest.importorskip('pyarrow')
+        load_cohort_frames(cohort_dir, n_workers=1)
+        os.remove(os.path.join(cohort_dir, f'{phenopackets[2].id}.json'))
+
+        assert len(load_cohort_frames(cohort_dir, n_workers=1).subjects) == 2
+
+    def test_without_parquet_engine(self, cohort_dir: str, monkeypatch):
+        def no_engine(*args, **kwargs):
+            raise ImportError('Unable to find a usable engine')
+        monkeypatch.setattr(pd.DataFrame, 'to_parquet', no_engine)
+
+        with pytest.warns(UserWarning):
+            frames = load_cohort_frames(cohort_dir, n_workers=1)
+
+        assert len(frames.subjects) == 3
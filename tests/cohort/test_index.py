@@ -0,0 +1,166 @@
+import os
+import timeit
+
+import numpy as np
+import phenopackets as pp
+import pytest
+
+from oncopacket.cohort import CohortIndex, flatten_cohort, load_cohort_index
+from oncopacket.cohort import index as cohort_index
+from oncopacket.export import ShardedPhenopacketWriter
+
+
+def _add_variant(phenopacket: pp.Phenopacket, symbol: str, protein_change: str, chrom: str, pos: int):
+    interpretation = phenopacket.interpretations[0] if len(phenopacket.interpretations) > 0 \
+        else phenopacket.interpretations.add(id=f'{phenopacket.id}-interpretation')
+    vd = interpretation.diagnosis.genomic_interpretations.add().variant_interpretation.variation_descriptor
+    vd.gene_context.symbol = symbol
+    vd.gene_context.value_id = f'HGNC:{symbol}'
+    vd.expressions.add(syntax='hgvs.p', value=f'ENSP00000275493.2:{protein_change}')
+    vd.vcf_record.chrom = chrom
+    vd.vcf_record.pos = pos
+
+
+def _phenopacket(subject_id: str, stage: str = None, status=None) -> pp.Phenopacket:
+    phenopacket = pp.Phenopacket(id=f'Lung-{subject_id}')
+    phenopacket.subject.id = subject_id
+    if status is not None:
+        phenopacket.subject.vital_status.status = status
+    if stage is not None:
+        phenopacket.diseases.add().disease_stage.add(label=stage)
+    return phenopacket
+
+
+@pytest.fixture
+def phenopackets():
+    a = _phenopacket('A', stage='Stage IV', status=pp.VitalStatus.DECEASED)
+    _add_variant(a, 'EGFR', 'p.L858R', 'chr7', 55191822)
+    _add_variant(a, 'TP53', 'p.R273H', 'chr17', 7673802)
+    b = _phenopacket('B', stage='Stage I', status=pp.VitalStatus.ALIVE)
+    _add_variant(b, 'EGFR', 'p.T790M', 'chr7', 55181378)
+    c = _phenopacket('C', stage='Stage IV')
+    _add_variant(c, 'EGFR', 'p.L858Q', 'chr7', 55191822)
+    _add_variant(c, 'EGFR', 'p.L858R', 'chr7', 55191822)
+    d = _phenopacket('D')
+    return [a, b, c, d]
+
+
+@pytest.fixture
+def index(phenopackets) -> CohortIndex:
+    return CohortIndex.from_phenopackets(phenopackets)
+
+
+class TestCohortIndex:
+
+    def test_lookups(self, index: CohortIndex):
+        assert index.subject_ids == ['A', 'B', 'C', 'D']
+        assert index.gene('EGFR').subject_ids == ['A', 'B', 'C']
+        assert index.mutation('EGFR', 'L858R').subject_ids == ['A', 'C']
+        assert index.mutation('EGFR', 'p.T790M').subject_ids == ['B']
+        assert index.protein_position('EGFR', 858).subject_ids == ['A', 'C']
+        assert index.position('chr7', 55191822).subject_ids == ['A', 'C']
+        assert index.get('stage', 'Stage IV').subject_ids == ['A', 'C']
+        assert index.get('vital_status', 'DECEASED').subject_ids == ['A']
+
+    def test_keys(self, index: CohortIndex):
+        assert index.keys('gene') == ['EGFR', 'TP53']
+        assert index.keys('mutation') == ['EGFR:p.L858Q', 'EGFR:p.L858R', 'EGFR:p.T790M', 'TP53:p.R273H']
+
+    def test_boolean_queries(self, index: CohortIndex):
+        egfr = index.mutation('EGFR', 'L858R') | index.mutation('EGFR', 'T790M')
+        assert egfr.subject_ids == ['A', 'B', 'C']
+        assert (index.gene('EGFR') & index.get('stage', 'Stage IV')).subject_ids == ['A', 'C']
+        assert (index.gene('EGFR') - index.gene('TP53')).subject_ids == ['B', 'C']
+        assert (~index.gene('EGFR')).subject_ids == ['D']
+        assert (index.gene('TP53') ^ index.get('stage', 'Stage IV')).subject_ids == ['C']
+        assert len(index.all()) == 4 and len(index.none()) == 0
+        assert 'A' in egfr and 'D' not in egfr
+
+    def test_unknown_key_is_empty(self, index: CohortIndex):
+        assert len(index.gene('KRAS')) == 0
+        assert len(index.mutation('EGFR', 'G12C')) == 0
+
+    def test_unknown_field(self, index: CohortIndex):
+        with pytest.raises(ValueError):
+            index.get('genes', 'EGFR')
+
+    def test_different_indices_cannot_be_combined(self, index: CohortIndex, phenopackets):
+        other = CohortIndex.from_phenopackets(phenopackets)
+
+        with pytest.raises(ValueError):
+            index.gene('EGFR') & other.gene('EGFR')
+
+    def test_mask_is_aligned_with_the_frames(self, phenopackets, index: CohortIndex):
+        subjects = flatten_cohort(phenopackets).subjects
+
+        selected = subjects[index.mutation('EGFR', 'L858R').mask]
+
+        assert selected['subject_id'].tolist() == ['A', 'C']
+
+    def test_empty_cohort(self):
+        index = CohortIndex.from_phenopackets([])
+
+        assert index.n_subjects == 0
+        assert len(index.gene('EGFR')) == 0
+
+    def test_save_and_load(self, index: CohortIndex, tmp_path):
+        path = str(tmp_path / 'index.npz')
+        index.save(path)
+
+        loaded = CohortIndex.load(path)
+
+        assert loaded.subject_ids == index.subject_ids
+        for field in cohort_index.FIELDS:
+            assert loaded.keys(field) == index.keys(field)
+        assert loaded.mutation('EGFR', 'L858R').subject_ids == ['A', 'C']
+
+    def test_queries_are_fast(self):
+        rng = np.random.default_rng(42)
+        phenopackets = []
+        for i in range(5_000):
+            phenopacket = _phenopacket(f'S{i}', stage=f'Stage {rng.integers(1, 5)}')
+            for gene in rng.choice(200, size=5, replace=False):
+                _add_variant(phenopacket, f'G{gene}', f'p.L{rng.integers(1, 50)}R', 'chr1', int(rng.integers(1e6)))
+            phenopackets.append(phenopacket)
+        index = CohortIndex.from_phenopackets(phenopackets)
+
+        def query():
+            return (index.gene('G1') & index.get('stage', 'Stage 4')) | index.mutation('G2', 'L10R')
+
+        assert timeit.timeit(query, number=100) / 100 < 1e-3
+
+
+class TestLoadCohortIndex:
+
+    @pytest.fixture
+    def cohort_dir(self, tmp_path, phenopackets) -> str:
+        path = str(tmp_path / 'Lung')
+        ShardedPhenopacketWriter(path, shard_size=None, n_workers=1).write(phenopackets)
+        return path
+
+    @pytest.mark.filterwarnings('ignore:Could not cache the cohort frames')
+    def test_cache(self, cohort_dir: str, monkeypatch):
+        index = load_cohort_index(cohort_dir, n_workers=1)
+        assert sorted(index.gene('EGFR').subject_ids) == ['A', 'B', 'C']
+        monkeypatch.setattr(cohort_index, 'load_cohort_frames',
+                            lambda *args, **kwargs: pytest.fail('The index was rebuilt'))
+
+        cached = load_cohort_index(cohort_dir, n_workers=1)
+
+        assert cached.subject_ids == index.subject_ids
+        assert cached.mutation('EGFR', 'L858R').subject_ids == index.mutation('EGFR', 'L858R').subject_ids
+
+    @pytest.mark.filterwarnings('ignore:Could not cache the cohort frames')
+    def test_cache_is_invalidated(self, cohort_dir: str, phenopackets):
+        load_cohort_index(cohort_dir, n_workers=1)
+        os.remove(os.path.join(cohort_dir, f'{phenopackets[0].id}.json'))
+
+        index = load_cohort_index(cohort_dir, n_workers=1)
+
+        assert index.mutation('EGFR', 'L858R').subject_ids == ['C']
+
+    def test_without_cache(self, cohort_dir: str):
+        index = load_cohort_index(cohort_dir, use_cache=False, n_workers=1)
+
+        assert not os.path.exists(os.path.join(cohort_dir, '.oncopacket_cache', 'cohort.index.npz'))
+        assert len(index.gene('TP53')) == 1
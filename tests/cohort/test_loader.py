@@ -0,0 +1,112 @@
+import os
+
+import phenopackets as pp
+import pytest
+from google.protobuf.json_format import MessageToJson
+
+from oncopacket.cohort import Cohort, load_cohort
+from oncopacket.cohort import loader
+from oncopacket.export import ShardedPhenopacketWriter, write_stream
+
+
+@pytest.fixture
+def phenopackets(make_phenopacket):
+    return [make_phenopacket(i) for i in range(6)]
+
+
+@pytest.fixture
+def cohort_dir(tmp_path, phenopackets) -> str:
+    path = str(tmp_path / 'Lung')
+    ShardedPhenopacketWriter(path, shard_size=4, n_workers=1).write(phenopackets)
+    return path
+
+
+class TestLoadCohort:
+
+    def test_load_directory(self, cohort_dir: str, phenopackets):
+        cohort = load_cohort(cohort_dir, n_workers=1)
+
+        assert isinstance(cohort, Cohort)
+        assert cohort.name == 'Lung'
+        assert cohort.fields is None
+        assert list(cohort) == phenopackets
+        assert cohort.get('Lung-TCGA.TCGA-XX-0003') == phenopackets[3]
+
+    def test_worker_pool(self, cohort_dir: str, phenopackets, monkeypatch):
+        monkeypatch.setattr(loader, '_MIN_FILES_FOR_POOL', 1)
+
+        cohort = load_cohort(cohort_dir, n_workers=2, use_cache=False)
+
+        assert list(cohort) == phenopackets
+
+    def test_projection(self, cohort_dir: str, phenopackets):
+        cohort = load_cohort(cohort_dir, fields=('subject', 'diseases'), n_workers=1)
+
+        assert cohort.fields == ('diseases', 'id', 'subject')
+        first = cohort[0]
+        assert first.id == phenopackets[0].id
+        assert first.subject == phenopackets[0].subject
+        assert list(first.diseases) == list(phenopackets[0].diseases)
+        assert len(first.interpretations) == 0 and len(first.biosamples) == 0
+
+    def test_unknown_field(self, cohort_dir: str):
+        with pytest.raises(ValueError):
+            load_cohort(cohort_dir, fields=('phenotypes',))
+
+    def test_sidecar_is_reused(self, cohort_dir: str, phenopackets, monkeypatch):
+        load_cohort(cohort_dir, n_workers=1)
+        assert os.path.isfile(os.path.join(cohort_dir, loader.SIDECAR_DIRNAME, 'cohort.all.pb'))
+        monkeypatch.setattr(loader, '_parse_json_files', lambda *args: pytest.fail('The files were parsed again'))
+
+        assert list(load_cohort(cohort_dir, n_workers=1)) == phenopackets
+
+    def test_sidecar_is_invalidated_by_modified_files(self, cohort_dir: str, phenopackets, make_phenopacket,
+                                                      monkeypatch):
+        load_cohort(cohort_dir, n_workers=1)
+        parsed = []
+        original = loader._parse_json_files
+        monkeypatch.setattr(loader, '_parse_json_files',
+                            lambda paths, keys: parsed.extend(paths) or original(paths, keys))
+
+        updated = make_phenopacket(1)
+        updated.subject.sex = pp.Sex.FEMALE
+        with open(os.path.join(cohort_dir, 'shard-00000', 'Lung-TCGA.TCGA-XX-0001.json'), 'w') as fh:
+            fh.write(MessageToJson(updated))
+        ShardedPhenopacketWriter(os.path.join(cohort_dir, 'shard-00002'), shard_size=None, n_workers=1) \
+            .write([make_phenopacket(9)])
+        os.remove(os.path.join(cohort_dir, 'shard-00001', 'Lung-TCGA.TCGA-XX-0005.json'))
+        cohort = load_cohort(cohort_dir, n_workers=1)
+
+        assert sorted(os.path.basename(p) for p in parsed) == ['Lung-TCGA.TCGA-XX-0001.json',
+                                                               'Lung-TCGA.TCGA-XX-0009.json']
+        assert [p.id for p in cohort] == [p.id for p in phenopackets[:5]] + ['Lung-TCGA.TCGA-XX-0009']
+        assert cohort[1] == updated
+
+    def test_corrupted_sidecar_is_ignored(self, cohort_dir: str, phenopackets):
+        load_cohort(cohort_dir, n_workers=1)
+        with open(os.path.join(cohort_dir, loader.SIDECAR_DIRNAME, 'cohort.all.pb'), 'r+b') as fh:
+            fh.truncate(10)
+
+        with pytest.warns(UserWarning):
+            cohort = load_cohort(cohort_dir, n_workers=1)
+
+        assert list(cohort) == phenopackets
+
+    @pytest.mark.parametrize('filename', ['Lung.pb', 'Lung.ndjson.gz'])
+    def test_load_bundle(self, tmp_path, phenopackets, filename: str):
+        path = str(tmp_path / filename)
+        write_stream(phenopackets, path)
+
+        cohort = load_cohort(path, fields=('subject',), n_workers=1)
+        again = load_cohort(path, fields=('subject',), n_workers=1)
+
+        assert cohort.name == 'Lung'
+        assert [p.subject for p in cohort] == [p.subject for p in phenopackets]
+        assert list(again) == list(cohort)
+        assert all(len(p.diseases) == 0 for p in cohort)
+
+    def test_invalid_path(self, tmp_path):
+        (tmp_path / 'cohort.txt').write_text('')
+
+        with pytest.raises(ValueError):
+            load_cohort(str(tmp_path / 'cohort.txt'))
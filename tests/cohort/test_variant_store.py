@@ -0,0 +1,129 @@
+import os
+
+import numpy as np
+import pandas as pd
+import phenopackets as pp
+import pytest
+
+from oncopacket.cda import CdaMutationFactory
+from oncopacket.cohort import CohortVariantStore
+
+TESTDATA_FILENAME = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'mutation_excerpt.tsv')
+
+
+def gdc_like_variant() -> pp.VariantInterpretation:
+    # Like the `GdcService` output: no extensions and an empty `hgvs.p` expression for the unmapped protein.
+    vi = pp.VariantInterpretation()
+    vd = vi.variation_descriptor
+    vd.id = 'edd1ae2c-3ca9-52bd-a124-b09ed304fcc2'
+    vd.gene_context.value_id = 'ENSG00000133703'
+    vd.gene_context.symbol = 'KRAS'
+    vd.expressions.add(syntax='hgvs.c', value='ENST00000256078:c.35G>A')
+    vd.expressions.add()
+    vd.molecule_context = pp.MoleculeContext.genomic
+    return vi
+
+
+@pytest.fixture
+def variants():
+    df = pd.read_csv(TESTDATA_FILENAME, sep='\t')
+    # The first subject has a second variant, without a VCF record.
+    df = pd.concat([df, df.iloc[[1]].assign(cda_subject_id=df.loc[0, 'cda_subject_id'], Reference_Allele='-')],
+                   ignore_index=True)
+    vis = CdaMutationFactory().to_ga4gh_batch(df)
+    variants = {}
+    for subject_id, vi in zip(df['cda_subject_id'], vis):
+        variants.setdefault(subject_id, []).append(vi)
+    variants['TCGA.TCGA-XX-0001'] = [gdc_like_variant()]
+    return variants
+
+
+class TestCohortVariantStore:
+
+    @pytest.fixture
+    def store(self, variants) -> CohortVariantStore:
+        return CohortVariantStore.from_variants(variants)
+
+    def test_round_trip(self, store: CohortVariantStore, variants):
+        assert len(store) == sum(len(vis) for vis in variants.values())
+        assert store.n_subjects == len(variants)
+        for subject_id, vis in variants.items():
+            assert store.get_variant_interpretations(subject_id) == vis
+
+    def test_csr_index(self, store: CohortVariantStore):
+        offsets = store.get_array('subject_offsets')
+        subject_index = store.get_array('subject_index')
+
+        assert offsets[0] == 0 and offsets[-1] == len(store)
+        assert np.all(np.diff(offsets) >= 1)
+        assert np.array_equal(subject_index, np.repeat(np.arange(store.n_subjects), np.diff(offsets)))
+        assert len(store.get_rows('TCGA.TCGA-C5-A1MI')) == 2
+        assert store.get_variant_interpretations('unknown') == []
+
+    def test_strings_are_stored_once(self, store: CohortVariantStore):
+        strings = store.get_strings()
+
+        assert len(strings) == len(set(strings))
+        assert strings.count('GRCh38') == 1
+
+    @pytest.mark.parametrize('filename', ['store.npz', 'store'])
+    def test_save_and_load(self, tmp_path, store: CohortVariantStore, variants, filename):
+        path = str(tmp_path / filename)
+        store.save(path)
+
+        loaded = CohortVariantStore.load(path)
+
+        for subject_id, vis in variants.items():
+            assert loaded.get_variant_interpretations(subject_id) == vis
+
+    def test_memory_map(self, tmp_path, store: CohortVariantStore, variants):
+        store.save(str(tmp_path / 'store'))
+
+        loaded = CohortVariantStore.load(str(tmp_path / 'store'), mmap_mode='r')
+
+        assert isinstance(loaded.get_array('pos'), np.memmap)
+        assert loaded.get_variant_interpretations('TCGA.TCGA-C5-A1MI') == variants['TCGA.TCGA-C5-A1MI']
+
+    def test_npz_cannot_be_memory_mapped(self, tmp_path, store: CohortVariantStore):
+        store.save(str(tmp_path / 'store.npz'))
+
+        with pytest.raises(ValueError):
+            CohortVariantStore.load(str(tmp_path / 'store.npz'), mmap_mode='r')
+
+    def test_from_phenopackets(self, variants):
+        phenopackets = []
+        for subject_id, vis in variants.items():
+            phenopacket = pp.Phenopacket(id=f'cohort-{subject_id}')
+            phenopacket.subject.id = subject_id
+            diagnosis = phenopacket.interpretations.add(id='i').diagnosis
+            for vi in vis:
+                diagnosis.genomic_interpretations.add(subject_or_biosample_id=subject_id).variant_interpretation.CopyFrom(vi)
+            phenopackets.append(phenopacket)
+
+        store = CohortVariantStore.from_phenopackets(phenopackets)
+
+        assert store.get_variant_interpretations('TCGA.TCGA-XX-0001') == variants['TCGA.TCGA-XX-0001']
+
+    def test_to_dataframe(self, store: CohortVariantStore):
+        df = store.to_dataframe()
+
+        assert len(df) == len(store)
+        first = df.iloc[0]
+        assert first['subject_id'] == 'TCGA.TCGA-C5-A1MI'
+        assert (first['chrom'], first['pos'], first['ref'], first['alt']) == ('chr11', 133921225, 'C', 'T')
+        assert first['hgvs_c'] == 'ENST00000321016:c.2500G>A'
+        # The variant without a VCF record.
+        assert pd.isna(df.iloc[1]['ref']) and df.iloc[1]['pos'] == -1
+        # The GDC-like variant has no VCF record and no `hgvs.p` expression with a value.
+        last = df.iloc[-1]
+        assert last['gene_symbol'] == 'KRAS'
+        assert pd.isna(last['hgvs_p'])
+
+    def test_empty_store(self, tmp_path):
+        store = CohortVariantStore.from_variants({})
+        store.save(str(tmp_path / 'empty.npz'))
+
+        loaded = CohortVariantStore.load(str(tmp_path / 'empty.npz'))
+
+        assert len(loaded) == 0 and loaded.n_subjects == 0
+        assert len(loaded.to_dataframe()) == 0
@@ -0,0 +1,39 @@
+import typing
+
+import phenopackets as pp
+import pytest
+
+
+def build_phenopacket(i: int, n_variants: int = 1, cohort: str = 'Lung') -> pp.Phenopacket:
+    """
+    Build a small phenopacket of the `i`-th subject of the `cohort`, e.g. `Lung-TCGA.TCGA-XX-0003`,
+    with a disease, a biosample, and `n_variants` variants.
+    """
+    subject_id = f'TCGA.TCGA-XX-{i:04d}'
+    phenopacket = pp.Phenopacket(id=f'{cohort}-{subject_id}')
+    phenopacket.subject.id = subject_id
+    phenopacket.subject.sex = pp.Sex.MALE
+    phenopacket.subject.time_at_last_encounter.age.iso8601duration = f'P{40 + i % 40}Y'
+    disease = phenopacket.diseases.add()
+    disease.term.id = 'NCIT:C3512'
+    disease.term.label = 'Lung Adenocarcinoma'
+    if n_variants > 0:
+        genomic_interpretations = phenopacket.interpretations.add(id=f'i{i}').diagnosis.genomic_interpretations
+        for j in range(n_variants):
+            vd = genomic_interpretations.add(subject_or_biosample_id=subject_id) \
+                .variant_interpretation.variation_descriptor
+            vd.id = f'variant-{i}-{j}'
+            vd.expressions.add(syntax='hgvs.c', value=f'ENST00000256078:c.{35 + j}G>A')
+            vd.vcf_record.chrom = 'chr12'
+            vd.vcf_record.pos = 25_245_350 + j
+    phenopacket.biosamples.add(id=f'sample-{i}')
+    phenopacket.meta_data.created_by = 'oncopacket'
+    return phenopacket
+
+
+@pytest.fixture
+def make_phenopacket() -> typing.Callable[..., pp.Phenopacket]:
+    """
+    Get the builder of the test phenopackets, see :func:`build_phenopacket`.
+    """
+    return build_phenopacket
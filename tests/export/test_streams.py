@@ -0,0 +1,74 @@
+import io
+
+import pytest
+
+from oncopacket.export import read_stream, write_stream
+from oncopacket.export import streams
+
+
+@pytest.fixture
+def phenopackets(make_phenopacket):
+    # Some messages are longer than 127 bytes, hence have a multibyte length prefix.
+    return [make_phenopacket(i, n_variants=i) for i in range(5)]
+
+
+class TestStreams:
+
+    @pytest.mark.parametrize('filename', ['cohort.pb', 'cohort.pb.gz', 'cohort.ndjson', 'cohort.ndjson.gz'])
+    def test_round_trip(self, tmp_path, phenopackets, filename: str):
+        path = str(tmp_path / filename)
+
+        assert write_stream(phenopackets, path) == len(phenopackets)
+
+        assert list(read_stream(path)) == phenopackets
+
+    def test_zstd_round_trip(self, tmp_path, phenopackets):
+        pytest.importorskip('zstandard')
+        path = str(tmp_path / 'cohort.ndjson.zst')
+
+        write_stream(phenopackets, path)
+
+        assert list(read_stream(path)) == phenopackets
+
+    def test_explicit_format(self, tmp_path, phenopackets):
+        path = str(tmp_path / 'cohort.bin')
+
+        write_stream(phenopackets, path, fmt='pb', compression='gzip')
+
+        assert list(read_stream(path, fmt='pb', compression='gzip')) == phenopackets
+
+    def test_ndjson_is_one_object_per_line(self, tmp_path, phenopackets):
+        path = tmp_path / 'cohort.ndjson'
+
+        write_stream(phenopackets, str(path))
+
+        lines = path.read_bytes().splitlines()
+        assert len(lines) == len(phenopackets)
+        assert lines[0].startswith(b'{"id":"Lung-TCGA.TCGA-XX-0000"')
+
+    def test_ndjson_without_orjson(self, tmp_path, phenopackets, monkeypatch):
+        monkeypatch.setattr(streams, '_orjson', None)
+        path = str(tmp_path / 'cohort.ndjson')
+
+        write_stream(phenopackets, path)
+
+        assert list(read_stream(path)) == phenopackets
+
+    @pytest.mark.parametrize('value', [0, 1, 127, 128, 300, 2 ** 32])
+    def test_varint(self, value: int):
+        fh = io.BytesIO(streams._encode_varint(value))
+
+        assert streams._read_varint(fh) == value
+        assert streams._read_varint(fh) is None
+
+    def test_truncated_message(self, phenopackets):
+        fh = io.BytesIO()
+        streams.write_delimited(phenopackets, fh)
+
+        with pytest.raises(ValueError):
+            list(streams.read_delimited(io.BytesIO(fh.getvalue()[:-3])))
+
+    @pytest.mark.parametrize('filename', ['cohort.json', 'cohort.gz', 'cohort.pb.bz2'])
+    def test_unknown_format(self, tmp_path, phenopackets, filename: str):
+        with pytest.raises(ValueError):
+            write_stream(phenopackets, str(tmp_path / filename))
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+
+import phenopackets as pp
+import pytest
+from google.protobuf.json_format import MessageToJson, Parse
+
+from oncopacket.export import ShardedPhenopacketWriter
+
+
+@pytest.fixture
+def phenopackets(make_phenopacket):
+    return [make_phenopacket(i) for i in range(7)]
+
+
+def list_files(path) -> set:
+    return {os.path.relpath(os.path.join(root, f), path) for root, _, files in os.walk(path) for f in files}
+
+
+class TestShardedPhenopacketWriter:
+
+    def test_sharded_layout(self, tmp_path, phenopackets):
+        writer = ShardedPhenopacketWriter(str(tmp_path), shard_size=3, n_workers=1)
+
+        manifest = writer.write(phenopackets)
+
+        assert [s['name'] for s in manifest['shards']] == ['shard-00000', 'shard-00001', 'shard-00002']
+        assert [s['n_phenopackets'] for s in manifest['shards']] == [3, 3, 1]
+        assert list_files(tmp_path) == {'manifest.json'} | {os.path.normpath(f['path']) for f in manifest['files']}
+        assert manifest['files'][3]['path'] == 'shard-00001/Lung-TCGA.TCGA-XX-0003.json'
+
+    def test_files_match_message_to_json(self, tmp_path, phenopackets):
+        manifest = ShardedPhenopacketWriter(str(tmp_path), shard_size=None, n_workers=1).write(phenopackets)
+
+        assert manifest['shards'] == []
+        for phenopacket, entry in zip(phenopackets, manifest['files']):
+            with open(tmp_path / entry['path'], 'rb') as fh:
+                payload = fh.read()
+            assert payload.decode('utf-8') == MessageToJson(phenopacket)
+            assert entry['id'] == phenopacket.id
+            assert entry['bytes'] == len(payload)
+            assert entry['sha256'] == hashlib.sha256(payload).hexdigest()
+
+    def test_manifest_is_written(self, tmp_path, phenopackets):
+        manifest = ShardedPhenopacketWriter(str(tmp_path), n_workers=1).write(iter(phenopackets))
+
+        with open(tmp_path / 'manifest.json') as fh:
+            assert json.load(fh) == manifest
+        assert manifest['n_phenopackets'] == len(phenopackets)
+
+    def test_worker_pool(self, tmp_path, phenopackets):
+        writer = ShardedPhenopacketWriter(str(tmp_path), shard_size=2, n_workers=2, fsync_batch=3)
+
+        manifest = writer.write(phenopackets)
+
+        assert [f['id'] for f in manifest['files']] == [p.id for p in phenopackets]
+        for phenopacket, entry in zip(phenopackets, manifest['files']):
+            with open(tmp_path / entry['path']) as fh:
+                assert Parse(fh.read(), pp.Phenopacket()) == phenopacket
+        assert not any(f.endswith('.tmp') for f in list_files(tmp_path))
+
+    def test_id_with_path_separator(self, tmp_path):
+        phenopacket = pp.Phenopacket(id=f'..{os.sep}escape')
+
+        manifest = ShardedPhenopacketWriter(str(tmp_path), shard_size=None, n_workers=1).write([phenopacket])
+
+        assert manifest['files'][0]['path'] == '.._escape.json'
+        assert (tmp_path / '.._escape.json').is_file()
+
+    @pytest.mark.parametrize('kwargs', [{'shard_size': 0}, {'fsync_batch': -1}, {'fmt': 'xml'}])
+    def test_invalid_arguments(self, tmp_path, kwargs):
+        with pytest.raises(ValueError):
+            ShardedPhenopacketWriter(str(tmp_path), **kwargs)
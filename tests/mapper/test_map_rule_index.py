@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from oncopacket.cda.mapper.map_entry import MapEntry
+from oncopacket.cda.mapper.map_rule_index import MapRuleIndex
+from oncopacket.cda.mapper.op_rule_table_mapper import OpRuleTableMapper
+
+
+def linear_scan(entries, row):
+    # The reference implementation that the index must agree with.
+    for entry in entries:
+        if entry.matches(row):
+            return entry.get_id_and_label()
+    return None
+
+
+def make_entries():
+    return [
+        MapEntry({'id': 'NCIT:C3512', 'label': 'Lung Adenocarcinoma',
+                  'primary_diagnosis': 'Adenocarcinoma, NOS', 'primary_diagnosis_site': 'Bronchus and lung'}),
+        MapEntry({'id': 'NCIT:C3493', 'label': 'Lung Squamous Cell Carcinoma',
+                  'primary_diagnosis': 'Squamous cell carcinoma, NOS', 'primary_diagnosis_site': 'Bronchus and lung'}),
+        # A duplicate of the first rule with a different term. The first rule must win.
+        MapEntry({'id': 'NCIT:C2852', 'label': 'Adenocarcinoma',
+                  'primary_diagnosis': 'Adenocarcinoma, NOS', 'primary_diagnosis_site': 'Bronchus and lung'}),
+        # A more general rule that checks one column only.
+        MapEntry({'id': 'NCIT:C3262', 'label': 'Neoplasm', 'primary_diagnosis_site': 'Bronchus and lung'}),
+        MapEntry({'id': 'NCIT:C4872', 'label': 'Breast Carcinoma', 'primary_diagnosis_site': 'Breast'}),
+    ]
+
+
+ROWS = [
+    {'primary_diagnosis': 'Adenocarcinoma, NOS', 'primary_diagnosis_site': 'Bronchus and lung'},
+    {'primary_diagnosis': 'Squamous cell carcinoma, NOS', 'primary_diagnosis_site': 'Bronchus and lung'},
+    {'primary_diagnosis': 'Small cell carcinoma, NOS', 'primary_diagnosis_site': 'Bronchus and lung'},
+    {'primary_diagnosis': 'Adenocarcinoma, NOS', 'primary_diagnosis_site': 'Breast'},
+    {'primary_diagnosis': 'Adenocarcinoma, NOS', 'primary_diagnosis_site': np.nan},
+    {'primary_diagnosis': 'Adenocarcinoma, NOS', 'primary_diagnosis_site': 'Colon'},
+]
+
+
+class TestMapRuleIndex:
+
+    @pytest.fixture
+    def index(self) -> MapRuleIndex:
+        return MapRuleIndex(make_entries())
+
+    @pytest.mark.parametrize('row', ROWS)
+    def test_match_agrees_with_linear_scan(self, index: MapRuleIndex, row: dict):
+        series = pd.Series(row)
+
+        assert index.get_id_and_label(series) == linear_scan(make_entries(), series)
+
+    def test_first_rule_wins(self, index: MapRuleIndex):
+        curie, label = index.get_id_and_label(pd.Series(ROWS[0]))
+
+        assert curie == 'NCIT:C3512'
+        assert label == 'Lung Adenocarcinoma'
+
+    def test_missing_column(self, index: MapRuleIndex):
+        assert index.match({'primary_diagnosis': 'Adenocarcinoma, NOS'}) is None
+
+    def test_match_frame_agrees_with_row_matching(self, index: MapRuleIndex):
+        df = pd.DataFrame(ROWS, index=[f'r{i}' for i in range(len(ROWS))])
+
+        actual = index.match_frame(df)
+
+        assert list(actual.index) == list(df.index)
+        for key, row in df.iterrows():
+            expected = linear_scan(make_entries(), row)
+            if expected is None:
+                assert actual.loc[key, 'id'] is None
+            else:
+                assert (actual.loc[key, 'id'], actual.loc[key, 'label']) == expected
+
+    def test_match_frame_without_rule_columns(self, index: MapRuleIndex):
+        df = pd.DataFrame({'stage': ['Stage I', 'Stage II']})
+
+        actual = index.match_frame(df)
+
+        assert actual['id'].isna().all()
+
+    def test_empty_index(self):
+        index = MapRuleIndex([])
+
+        assert len(index) == 0
+        assert index.match(pd.Series(ROWS[0])) is None
+        assert index.match_frame(pd.DataFrame(ROWS))['id'].isna().all()
+
+
+class TestOpRuleTableMapper:
+
+    @pytest.fixture
+    def mapper(self) -> OpRuleTableMapper:
+        df = pd.DataFrame({
+            'primary_diagnosis': ['Adenocarcinoma, NOS', 'Squamous cell carcinoma, NOS', None],
+            'primary_diagnosis_site': ['Bronchus and lung', 'Bronchus and lung', 'Breast'],
+            'ncit_id': ['NCIT:C3512', 'NCIT:C3493', 'NCIT:C4872'],
+            'ncit_label': ['Lung Adenocarcinoma', 'Lung Squamous Cell Carcinoma', 'Breast Carcinoma'],
+        })
+        return OpRuleTableMapper.from_dataframe(df, id_column='ncit_id', label_column='ncit_label')
+
+    def test_get_fields(self, mapper: OpRuleTableMapper):
+        assert set(mapper.get_fields()) == {'primary_diagnosis', 'primary_diagnosis_site'}
+
+    def test_empty_cell_is_a_wildcard(self, mapper: OpRuleTableMapper):
+        term = mapper.get_ontology_term(pd.Series({'primary_diagnosis': 'Lobular carcinoma, NOS',
+                                                   'primary_diagnosis_site': 'Breast'}))
+
+        assert term.id == 'NCIT:C4872'
+
+    def test_get_terms(self, mapper: OpRuleTableMapper):
+        df = pd.DataFrame(ROWS)
+
+        terms = mapper.get_terms(df)
+
+        assert [None if t is None else t.id for t in terms] == \
+               ['NCIT:C3512', 'NCIT:C3493', None, 'NCIT:C4872', None, None]
+        # The terms are interned.
+        assert terms[0] is mapper.get_term(df.iloc[0])
@@ -0,0 +1,83 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+from oncopacket.cda import cda_resources
+from oncopacket.cda.cda_resources import CdaResource, CdaResourceManager
+from oncopacket.cda.mapper.op_icdo_mapper import OpICDOMapper, load_icdo_to_ncit_tsv, ICDO_TO_NCIT_RESOURCE
+
+ICDO_EXCERPT = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'icdo_to_ncit_excerpt.tsv')
+
+
+class TestLoadIcdoToNcit:
+
+    def test_index_uses_preferred_term(self):
+        icdo_to_ncit = load_icdo_to_ncit_tsv(ICDO_EXCERPT)
+
+        term = icdo_to_ncit['8140/3']
+        assert term.id == 'NCIT:C2852'
+        assert term.label == 'Adenocarcinoma'
+
+    def test_codes_without_ncit_code_are_skipped(self):
+        icdo_to_ncit = load_icdo_to_ncit_tsv(ICDO_EXCERPT)
+
+        assert '8005/3' not in icdo_to_ncit
+        assert len(icdo_to_ncit) == 5
+
+    def test_default_mapper_indexes_once(self, tmp_path, monkeypatch):
+        shutil.copy(ICDO_EXCERPT, tmp_path / 'excerpt.tsv')
+        monkeypatch.setattr(cda_resources, 'files', lambda package: tmp_path)
+        resources = CdaResourceManager(resources=[
+            CdaResource(ICDO_TO_NCIT_RESOURCE, 'excerpt.tsv', package='bundle'),
+        ])
+
+        first = OpICDOMapper.default_mapper(resources)
+        second = OpICDOMapper.default_mapper(resources)
+
+        assert first._icdo_to_ncit is second._icdo_to_ncit
+
+    def test_default_mapper_needs_the_network_on_the_first_run(self, tmp_path, monkeypatch, recwarn):
+        def fail(*args, **kwargs):
+            raise requests.ConnectionError('offline')
+
+        monkeypatch.setattr(requests.sessions.Session, 'request', fail)
+
+        with pytest.raises(requests.ConnectionError):
+            OpICDOMapper.default_mapper(CdaResourceManager(local_dir=str(tmp_path)))
+        # There is no bundled copy to fall back to.
+        assert len(recwarn) == 0
+
+
+class TestOpICDOMapper:
+
+    @pytest.fixture
+    def mapper(self) -> OpICDOMapper:
+        return OpICDOMapper(load_icdo_to_ncit_tsv(ICDO_EXCERPT))
+
+    @pytest.mark.parametrize('morphology, expected_id', [
+        ('8140/3', 'NCIT:C2852'),
+        ('8070/3', 'NCIT:C2929'),
+        (' 8041/3', 'NCIT:C3915'),
+        ('9999/9', None),
+        (np.nan, None),
+    ])
+    def test_get_ontology_term(self, mapper: OpICDOMapper, morphology, expected_id):
+        term = mapper.get_ontology_term(pd.Series({'morphology': morphology}))
+
+        if expected_id is None:
+            assert term is None
+        else:
+            assert term.id == expected_id
+
+    def test_get_terms(self, mapper: OpICDOMapper):
+        df = pd.DataFrame({'morphology': ['8140/3', np.nan, '9999/9', '8140/3', '8500/3']}, index=list('abcde'))
+
+        terms = mapper.get_terms(df)
+
+        assert list(terms.index) == list('abcde')
+        assert [None if t is None else t.id for t in terms] == ['NCIT:C2852', None, None, 'NCIT:C2852', 'NCIT:C4194']
+        assert terms['a'] is terms['d']
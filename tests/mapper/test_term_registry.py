@@ -0,0 +1,116 @@
+import pandas as pd
+import phenopackets as pp
+import pytest
+
+from oncopacket.cda import CdaIndividualFactory
+from oncopacket.cda.mapper.op_cause_of_death_mapper import OpCauseOfDeathMapper
+from oncopacket.cda.mapper.op_diagnosis_mapper import OpDiagnosisMapper
+from oncopacket.cda.mapper.op_disease_stage_mapper import OpDiseaseStageMapper
+from oncopacket.cda.mapper.term_registry import HOMO_SAPIENS, OntologyTermRegistry, NEOPLASM, ontology_term
+
+
+class TestOntologyTermRegistry:
+
+    @pytest.fixture
+    def registry(self) -> OntologyTermRegistry:
+        return OntologyTermRegistry()
+
+    def test_intern_returns_canonical_instance(self, registry: OntologyTermRegistry):
+        first = registry.intern('NCIT:C3262', 'Neoplasm')
+        second = registry.intern('NCIT:C3262', 'Neoplasm')
+
+        assert first is second
+        assert first.id == 'NCIT:C3262'
+        assert first.label == 'Neoplasm'
+        assert len(registry) == 1
+
+    def test_label_is_part_of_the_key(self, registry: OntologyTermRegistry):
+        lung = registry.intern('UBERON:0002048', 'lung')
+        lung_upper = registry.intern('UBERON:0002048', 'Lung')
+
+        assert lung is not lung_upper
+        assert len(registry) == 2
+        # The first interned term is returned for the CURIE.
+        assert registry.get('UBERON:0002048') is lung
+
+    def test_get_unknown_curie(self, registry: OntologyTermRegistry):
+        assert registry.get('NCIT:C0') is None
+        assert 'NCIT:C0' not in registry
+
+    def test_terms_are_immutable(self, registry: OntologyTermRegistry):
+        term = registry.intern('NCIT:C3262', 'Neoplasm')
+
+        with pytest.raises(AttributeError):
+            term.label = 'X'
+
+        assert registry.intern('NCIT:C3262', 'Neoplasm').label == 'Neoplasm'
+
+    def test_copies_are_independent(self):
+        copy = NEOPLASM.to_ontology_class()
+        copy.label = 'X'
+        target = NEOPLASM.copy_into(pp.OntologyClass())
+        target.label = 'Y'
+
+        assert NEOPLASM.label == 'Neoplasm'
+        assert NEOPLASM.to_ontology_class() == pp.OntologyClass(id='NCIT:C3262', label='Neoplasm')
+
+
+class TestMappersReturnInternedTerms:
+
+    def test_diagnosis_fallback(self):
+        mapper = OpDiagnosisMapper.multitissue_mapper()
+        row = pd.Series({
+            'primary_diagnosis': 'Something', 'primary_diagnosis_condition': 'Unknown', 'primary_diagnosis_site': 'nowhere',
+        })
+
+        assert mapper.get_term(row) is NEOPLASM
+        assert mapper.get_term(row) is ontology_term('NCIT:C3262', 'Neoplasm')
+
+    def test_cause_of_death(self):
+        mapper = OpCauseOfDeathMapper()
+        row = pd.Series({'cause_of_death': 'Cancer Related'})
+
+        assert mapper.get_term(row) is mapper.get_term(row)
+
+    @pytest.mark.parametrize('stage_str, other', [('Stage I', 'stage 1'), ('IIIA', 'Stage 3A'), ('nonsense', 'M0')])
+    def test_stage(self, stage_str: str, other: str):
+        mapper = OpDiseaseStageMapper()
+
+        assert mapper.get_term(stage_str) is mapper.get_term(other)
+
+
+class TestMappersReturnCopies:
+
+    def test_modifying_a_mapped_term_does_not_change_the_registry(self):
+        mapper = OpDiagnosisMapper.multitissue_mapper()
+        row = pd.Series({
+            'primary_diagnosis': 'Something', 'primary_diagnosis_condition': 'Unknown', 'primary_diagnosis_site': 'nowhere',
+        })
+
+        term = mapper.get_ontology_term(row)
+        term.label = 'X'
+
+        assert isinstance(term, pp.OntologyClass)
+        assert mapper.get_ontology_term(row).label == 'Neoplasm'
+        assert NEOPLASM.label == 'Neoplasm'
+
+    def test_each_call_returns_a_new_message(self):
+        mapper = OpDiseaseStageMapper()
+
+        first, second = mapper.get_ontology_term('Stage I'), mapper.get_ontology_term('Stage I')
+
+        assert first == second
+        assert first is not second
+
+    def test_modifying_a_phenopacket_does_not_change_the_factory(self):
+        factory = CdaIndividualFactory()
+        row = pd.Series({'subject_id': 'TCGA.TCGA-XX-0001', 'sex': 'female', 'days_to_birth': -10_000,
+                         'vital_status': 'Dead', 'days_to_death': 100, 'cause_of_death': 'Cancer Related'})
+
+        individual = factory.to_ga4gh(row)
+        individual.taxonomy.label = 'x'
+        individual.vital_status.cause_of_death.label = 'x'
+
+        individual = factory.to_ga4gh(row)
+        assert individual.taxonomy.label == HOMO_SAPIENS.label == 'Homo sapiens'
+        assert individual.vital_status.cause_of_death.label == 'Cancer-Related Death'
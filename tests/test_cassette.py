@@ -0,0 +1,223 @@
+import gzip
+import json
+import shutil
+import time
+
+import pandas as pd
+import phenopackets as pp
+import pytest
+import requests
+
+from oncopacket.cda import Cassette, GdcService
+
+SURVIVAL_URL = 'https://api.gdc.cancer.gov/analysis/survival'
+CASES_URL = 'https://api.gdc.cancer.gov/cases'
+VARIANTS_URL = 'https://api.gdc.cancer.gov/ssms'
+TX_TO_PROT_URL = 'https://ftp.ensembl.org/pub/current_tsv/homo_sapiens/Homo_sapiens.GRCh38.114.ena.tsv.gz'
+TX_TO_PROT_TABLE = gzip.compress(b'transcript_stable_id\tprotein_stable_id\nENST00000256078\tENSP00000256078\n')
+KRAS_G12D = {
+    'id': 'edd1ae2c-3ca9-52bd-a124-b09ed304fcc2', 'ncbi_build': 'GRCh38', 'chromosome': 'chr12',
+    'start_position': 25245350, 'reference_allele': 'C', 'tumor_allele': 'T',
+    'consequence': [{'transcript': {'transcript_id': 'ENST00000256078', 'aa_change': 'G12D',
+                                    'annotation': {'hgvsc': 'c.35G>A'},
+                                    'gene': {'gene_id': 'ENSG00000133703', 'symbol': 'KRAS'}}}],
+}
+
+
+class FakeSession:
+    """
+    Answer the requests with the JSON payloads (or the bytes) of the `routes`, by URL.
+    """
+
+    def __init__(self, routes):
+        self.routes = {url: payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+                       for url, payload in routes.items()}
+        self.requests = []
+
+    def request(self, method, url, params=None, json=None, **kwargs):
+        self.requests.append((method, url, params, json))
+        # The resources have not changed since the first download.
+        not_modified = 'If-None-Match' in (kwargs.get('headers') or {})
+        response = requests.Response()
+        response.status_code = 304 if not_modified else 200
+        response.reason = 'Not Modified' if not_modified else 'OK'
+        response.url = url
+        response.encoding = 'utf-8'
+        response.headers['Content-Type'] = 'application/json'
+        response._content = b'' if not_modified else self.routes[url]
+        response._content_consumed = True
+        return response
+
+
+class FakeCda:
+
+    def __init__(self):
+        self.calls = []
+
+    def fetch_rows(self, **kwargs):
+        self.calls.append(kwargs)
+        return pd.DataFrame({
+            'subject_id': ['TCGA.TCGA-XX-0001', 'TCGA.TCGA-XX-0002'],
+            'days_to_birth': pd.array([-15987, None], dtype='Int64'),
+            'table': kwargs['table'],
+        })
+
+
+@pytest.fixture
+def session() -> FakeSession:
+    return FakeSession({
+        SURVIVAL_URL: {'results': [{'donors': [{'time': 512}]}]},
+        CASES_URL: {'data': {'hits': [{'demographic': {'vital_status': 'Dead'}}]}},
+        VARIANTS_URL: {'data': {'hits': [KRAS_G12D]}},
+        TX_TO_PROT_URL: TX_TO_PROT_TABLE,
+    })
+
+
+@pytest.fixture
+def no_network(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('The replay must not use the network')
+
+    monkeypatch.setattr(requests.sessions.Session, 'request', fail)
+
+
+class TestCassette:
+
+    def test_replay_table(self, tmp_path):
+        cda = FakeCda()
+        recorded = Cassette(str(tmp_path), mode='record').fetch_rows(cda.fetch_rows, table='subject',
+                                                                      match_any=['lung'], provenance=True)
+
+        # The order of the arguments does not matter.
+        replayed = Cassette(str(tmp_path)).fetch_rows(cda.fetch_rows, provenance=True, match_any=['lung'],
+                                                      table='subject')
+
+        assert len(cda.calls) == 1
+        pd.testing.assert_frame_equal(replayed, recorded)
+        assert replayed['days_to_birth'].dtype == 'Int64'
+
+    def test_replay_missing_table(self, tmp_path):
+        cda = FakeCda()
+        Cassette(str(tmp_path), mode='record').fetch_rows(cda.fetch_rows, table='subject')
+
+        with pytest.raises(ValueError, match='No recording'):
+            Cassette(str(tmp_path)).fetch_rows(cda.fetch_rows, table='specimen')
+        assert len(cda.calls) == 1
+
+    def test_replay_http(self, tmp_path, session: FakeSession):
+        params = {'filters': '{}', 'format': 'JSON'}
+        recorded = Cassette(str(tmp_path), mode='record', session=session).get(CASES_URL, params=params, timeout=5)
+
+        replayed = Cassette(str(tmp_path)).get(CASES_URL, params=params, timeout=30)
+
+        assert len(session.requests) == 1
+        assert replayed.status_code == 200
+        assert replayed.headers['Content-Type'] == 'application/json'
+        assert replayed.content == recorded.content
+        assert replayed.json() == recorded.json()
+
+    def test_requests_differ_by_body(self, tmp_path, session: FakeSession):
+        cassette = Cassette(str(tmp_path), mode='record', session=session)
+        cassette.post(CASES_URL, json={'size': 10})
+
+        with pytest.raises(ValueError, match='No recording'):
+            Cassette(str(tmp_path)).post(CASES_URL, json={'size': 20})
+
+    def test_gdc_service_replay(self, tmp_path, session: FakeSession):
+        subject_id = 'TCGA-XX-0001'
+        expected = GdcService(session=Cassette(str(tmp_path), mode='record', session=session)) \
+            .fetch_vital_status(subject_id)
+
+        vital_status = GdcService(session=Cassette(str(tmp_path))).fetch_vital_status(subject_id)
+
+        assert vital_status == expected
+        assert vital_status.status == pp.VitalStatus.Status.DECEASED
+        assert vital_status.survival_time_in_days == 512
+
+    def test_resource_download_replay(self, tmp_path, session: FakeSession, no_network):
+        name = 'Homo_sapiens.GRCh38.114.ena.tsv.gz'
+        cassette = Cassette(str(tmp_path), mode='record', session=session)
+        recorded = GdcService(session=cassette, resources=cassette.resource_manager()).prefetch()
+        with open(recorded, 'rb') as fh:
+            assert fh.read() == TX_TO_PROT_TABLE
+        # Without the cached copy, the download is replayed.
+        shutil.rmtree(tmp_path / 'resources')
+
+        resources = Cassette(str(tmp_path)).resource_manager()
+        # The service registers the table with the manager.
+        GdcService(resources=resources)
+
+        assert resources.get(name) == {'ENST00000256078': 'ENSP00000256078'}
+        assert [method for method, *_ in session.requests] == ['GET']
+
+    def test_conditional_request_does_not_replace_the_full_response(self, tmp_path, session: FakeSession):
+        cassette = Cassette(str(tmp_path), mode='record', session=session)
+        cassette.get(TX_TO_PROT_URL, headers={}, stream=True)
+        assert cassette.get(TX_TO_PROT_URL, headers={'If-None-Match': '"v1"'}, stream=True).status_code == 304
+
+        replay = Cassette(str(tmp_path))
+        full = replay.get(TX_TO_PROT_URL, headers={}, stream=True)
+        conditional = replay.get(TX_TO_PROT_URL, headers={'If-None-Match': '"v1"'})
+
+        assert (full.status_code, full.content) == (200, TX_TO_PROT_TABLE)
+        assert (conditional.status_code, conditional.content) == (304, b'')
+        with pytest.raises(ValueError, match='No recording'):
+            replay.get(TX_TO_PROT_URL, headers={'If-None-Match': '"v2"'})
+
+    def test_gdc_variants_replay(self, tmp_path, session: FakeSession, no_network):
+        cassette = Cassette(str(tmp_path), mode='record', session=session)
+        expected = GdcService(session=cassette, resources=cassette.resource_manager()).fetch_variants('TCGA-XX-0001')
+        shutil.rmtree(tmp_path / 'resources')
+
+        cassette = Cassette(str(tmp_path))
+        variants = GdcService(session=cassette, resources=cassette.resource_manager()).fetch_variants('TCGA-XX-0001')
+
+        assert variants == expected
+        assert [e.value for e in variants[0].variation_descriptor.expressions] == \
+               ['ENST00000256078:c.35G>A', 'ENSP00000256078:p.G12D']
+
+    def test_importer_variants_replay(self, tmp_path, session: FakeSession, no_network):
+        pytest.importorskip('cdapython')
+        from oncopacket.cda import configure_cda_table_importer
+        cassette = Cassette(str(tmp_path / 'cassette'), mode='record', session=session)
+        GdcService(session=cassette, resources=cassette.resource_manager()).fetch_variants('TCGA-XX-0001')
+        shutil.rmtree(tmp_path / 'cassette' / 'resources')
+        (tmp_path / 'cache').mkdir()
+
+        importer = configure_cda_table_importer(cache_dir=str(tmp_path / 'cache'),
+                                                cassette=Cassette(str(tmp_path / 'cassette')))
+        phenopacket = pp.Phenopacket(id='Lung-TCGA.TCGA-XX-0001')
+        importer._add_variants({'TCGA.TCGA-XX-0001': phenopacket}, pd.DataFrame({
+            'subject_id': ['TCGA.TCGA-XX-0001'], 'researchsubject_id': ['TCGA.TCGA-XX-0001.rs'],
+            'subject_data_source': ['GDC'],
+        }))
+
+        vd = phenopacket.interpretations[0].diagnosis.genomic_interpretations[0].variant_interpretation \
+            .variation_descriptor
+        assert vd.id == KRAS_G12D['id']
+        assert vd.expressions[1].value == 'ENSP00000256078:p.G12D'
+
+    def test_latency(self, tmp_path):
+        cda = FakeCda()
+        Cassette(str(tmp_path), mode='record').fetch_rows(cda.fetch_rows, table='subject')
+
+        start = time.perf_counter()
+        Cassette(str(tmp_path), latency=.05).fetch_rows(cda.fetch_rows, table='subject')
+
+        assert time.perf_counter() - start >= .05
+
+    def test_entries(self, tmp_path, session: FakeSession):
+        cassette = Cassette(str(tmp_path), mode='record', session=session)
+        cassette.fetch_rows(FakeCda().fetch_rows, table='subject')
+        cassette.get(SURVIVAL_URL)
+
+        entries = cassette.entries()
+
+        assert entries['kind'].tolist() == ['table', 'http']
+        assert entries['request'].tolist() == [{'table': 'subject'}, f'GET {SURVIVAL_URL}']
+        assert (entries['elapsed_s'] >= 0).all()
+
+    @pytest.mark.parametrize('kwargs', [{'mode': 'rewind'}, {'latency': -1}, {'latency': 'slow'}])
+    def test_invalid_arguments(self, tmp_path, kwargs):
+        with pytest.raises(ValueError):
+            Cassette(str(tmp_path), **kwargs)
@@ -84,6 +84,19 @@ class TestCdaDiseaseFactory:
         # assert disease.clinical_tnm_finding[0].id == 'NCIT:C9305'
         # assert disease.clinical_tnm_finding[0].id == 'Malignant Neoplasm'
 
+    def test_batch_matches_rows(self, factory: CdaDiseaseFactory,
+                                row: pd.Series):
+        df = pd.DataFrame([row, row.replace({'stage': 'Stage IV'})])
+
+        diseases = factory.to_ga4gh_batch(df)
+
+        assert diseases == [factory.to_ga4gh(r) for _, r in df.iterrows()]
+
+    def test_missing_field(self, factory: CdaDiseaseFactory,
+                           row: pd.Series):
+        with pytest.raises(ValueError):
+            factory.to_ga4gh(row.drop('stage').to_dict())
+
 
     class TestStage:
 
@@ -1,5 +1,6 @@
 import typing
 
+import pandas as pd
 import pytest
 
 from oncopacket.cda import CdaFactory
@@ -39,3 +40,28 @@ def test_days_to_iso_raises():
         CdaFactory.days_to_iso(True)
 
     assert e.value.args[0] == "days argument must be an int or a str but was <class 'bool'>"
+
+
+class EchoFactory(CdaFactory):
+
+    def to_ga4gh(self, row):
+        self.check_row(row)
+        return row['value']
+
+
+def test_to_ga4gh_batch_default():
+    df = pd.DataFrame({'value': ['a', 'b', None], 'other': [1, 2, 3]})
+
+    assert EchoFactory().to_ga4gh_batch(df) == ['a', 'b', None]
+
+
+def test_to_ga4gh_batch_requires_data_frame():
+    with pytest.raises(ValueError):
+        EchoFactory().to_ga4gh_batch([{'value': 'a'}])
+
+
+def test_check_row():
+    CdaFactory.check_row({'value': 'a'})
+    CdaFactory.check_row(pd.Series({'value': 'a'}))
+    with pytest.raises(ValueError):
+        CdaFactory.check_row(['a'])
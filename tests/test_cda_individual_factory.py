@@ -98,3 +98,49 @@ class TestCdaIndividualFactory:
         assert vs.cause_of_death.id == 'NCIT:C156427'
         assert vs.cause_of_death.label == 'Cancer-Related Death'
         assert vs.survival_time_in_days == 343
+
+    def test_dict_row(self, individual_factory: CdaIndividualFactory,
+                      deceased_row: pd.Series):
+        assert individual_factory.to_ga4gh(deceased_row.to_dict()) == individual_factory.to_ga4gh(deceased_row)
+
+    def test_batch_matches_rows(self, individual_factory: CdaIndividualFactory,
+                                alive_row: pd.Series, deceased_row: pd.Series):
+        df = pd.DataFrame([alive_row, deceased_row])
+        df = pd.concat([df, pd.DataFrame({
+            'subject_id': ['TCGA.A', 'TCGA.B', 'TCGA.C'],
+            'sex': ['male', None, 'F'],
+            'days_to_birth': [-20000.0, float('nan'), -100.4],
+            'vital_status': ['Dead', 'Dead', None],
+            'days_to_death': [12, 5, None],
+            'cause_of_death': ['Cancer Related', None, None],
+        })], ignore_index=True)
+
+        batch = individual_factory.to_ga4gh_batch(df)
+
+        assert batch == [individual_factory.to_ga4gh(row) for _, row in df.iterrows()]
+        assert [i.id for i in batch] == df['subject_id'].tolist()
+
+    def test_batch_populates_targets(self, individual_factory: CdaIndividualFactory,
+                                     alive_row: pd.Series, deceased_row: pd.Series):
+        df = pd.DataFrame([alive_row, deceased_row])
+        phenopackets = [PPkt.Phenopacket(), PPkt.Phenopacket()]
+
+        individual_factory.to_ga4gh_batch(df, targets=[p.subject for p in phenopackets])
+
+        assert [p.subject for p in phenopackets] == individual_factory.to_ga4gh_batch(df)
+        with pytest.raises(ValueError):
+            individual_factory.to_ga4gh_batch(df, targets=[phenopackets[0].subject])
+
+    def test_batch_without_vital_status(self, individual_factory: CdaIndividualFactory,
+                                        alive_row: pd.Series):
+        df = pd.DataFrame([alive_row]).drop(columns=['cause_of_death'])
+
+        individual, = individual_factory.to_ga4gh_batch(df)
+
+        assert not individual.HasField('vital_status')
+        assert individual.time_at_last_encounter.age.iso8601duration == 'P15987D'
+
+    def test_batch_missing_columns(self, individual_factory: CdaIndividualFactory,
+                                   alive_row: pd.Series):
+        with pytest.raises(ValueError):
+            individual_factory.to_ga4gh_batch(pd.DataFrame([alive_row]).drop(columns=['sex']))
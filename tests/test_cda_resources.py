@@ -0,0 +1,302 @@
+import json
+import os
+import shutil
+import warnings
+
+import pytest
+import requests
+
+from oncopacket.cda import cda_resources
+from oncopacket.cda.cda_resources import CdaResource, CdaResourceManager
+
+EXCERPT = os.path.join(os.path.dirname(__file__), 'data', 'icdo_to_ncit_excerpt.tsv')
+URL = 'https://example.org/mapping.tsv'
+
+
+class FakeServer:
+    """
+    Serve the `EXCERPT` with an `ETag` and answer the conditional requests with `304 Not Modified`.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.etag = '"v1"'
+
+    def get(self, url, headers=None, **kwargs):
+        headers = {} if headers is None else headers
+        self.requests.append(headers)
+        status = 304 if headers.get('If-None-Match') == self.etag else 200
+        return FakeResponse(status, {'ETag': self.etag, 'Last-Modified': 'Mon, 06 Jan 2025 00:00:00 GMT'})
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        with open(EXCERPT, 'rb') as fh:
+            yield fh.read()
+
+
+def count_lines(path):
+    with open(path, 'rb') as fh:
+        return sum(1 for _ in fh)
+
+
+def view_parser(path):
+    return {'lines': count_lines(path)}
+
+
+class TestCdaResourceManager:
+
+    @pytest.fixture
+    def server(self, monkeypatch) -> FakeServer:
+        server = FakeServer()
+        monkeypatch.setattr(cda_resources.requests, 'get', server.get)
+        return server
+
+    @pytest.fixture
+    def offline(self, monkeypatch):
+        def fail(*args, **kwargs):
+            raise requests.ConnectionError('offline')
+        monkeypatch.setattr(cda_resources.requests, 'get', fail)
+
+    @pytest.fixture
+    def bundle_dir(self, tmp_path, monkeypatch):
+        bundle_dir = tmp_path / 'bundle'
+        bundle_dir.mkdir()
+        monkeypatch.setattr(cda_resources, 'files', lambda package: bundle_dir)
+        return bundle_dir
+
+    @pytest.fixture
+    def manager(self, tmp_path) -> CdaResourceManager:
+        return CdaResourceManager(local_dir=str(tmp_path / 'cache'), resources=[
+            CdaResource('mapping', 'mapping.tsv', url=URL, package='bundle', parser=count_lines),
+        ])
+
+    def test_construction_is_free(self, tmp_path, server):
+        CdaResourceManager(local_dir=str(tmp_path / 'cache'))
+
+        assert not os.path.exists(tmp_path / 'cache')
+        assert server.requests == []
+
+    def test_download_writes_metadata(self, manager: CdaResourceManager, server: FakeServer):
+        path = manager.get_path('mapping')
+
+        assert len(server.requests) == 1
+        assert os.path.isfile(path)
+        assert os.path.isfile(f'{path}.meta.json')
+        assert [f for f in os.listdir(os.path.dirname(path)) if f.startswith('.')] == []
+
+    def test_verified_cache_is_reused(self, tmp_path, manager: CdaResourceManager, server: FakeServer):
+        manager.get_path('mapping')
+        manager.get_path('mapping')
+        # A new manager verifies the cached file against its checksum.
+        CdaResourceManager(local_dir=manager.local_dir, resources=[manager.get_resource('mapping')]).get_path('mapping')
+
+        assert len(server.requests) == 1
+
+    def test_corrupted_cache_is_downloaded_again(self, manager: CdaResourceManager, server: FakeServer):
+        path = manager.get_path('mapping')
+        with open(path, 'a') as fh:
+            fh.write('garbage\n')
+
+        manager.get_path('mapping')
+
+        assert len(server.requests) == 2
+
+    def test_refresh_sends_conditional_request(self, manager: CdaResourceManager, server: FakeServer):
+        path = manager.get_path('mapping')
+        mtime = os.stat(path).st_mtime_ns
+
+        manager.get_path('mapping', refresh=True)
+
+        assert server.requests[-1]['If-None-Match'] == '"v1"'
+        assert 'If-Modified-Since' in server.requests[-1]
+        assert os.stat(path).st_mtime_ns == mtime
+
+    def test_refresh_downloads_changed_file(self, manager: CdaResourceManager, server: FakeServer):
+        manager.get_path('mapping')
+        server.etag = '"v2"'
+
+        path = manager.get_path('mapping', refresh=True)
+
+        with open(f'{path}.meta.json') as fh:
+            assert json.load(fh)['etag'] == '"v2"'
+
+    def test_overwrite_sends_unconditional_request(self, manager: CdaResourceManager, server: FakeServer):
+        manager.get_path('mapping')
+
+        manager.get_path('mapping', overwrite=True)
+
+        assert server.requests[-1] == {}
+
+    def test_checksum_mismatch(self, tmp_path, server: FakeServer):
+        manager = CdaResourceManager(local_dir=str(tmp_path), resources=[
+            CdaResource('mapping', 'mapping.tsv', url=URL, sha256='0' * 64),
+        ])
+
+        with pytest.raises(ValueError):
+            manager.get_path('mapping')
+        assert os.listdir(tmp_path) == []
+
+    def test_checksum_mismatch_falls_back_to_the_cached_copy(self, tmp_path, server: FakeServer):
+        manager = CdaResourceManager(local_dir=str(tmp_path), resources=[
+            CdaResource('mapping', 'mapping.tsv', url=URL),
+        ])
+        path = manager.get_path('mapping')
+        # The remote file changed, e.g. it was truncated.
+        manager.register(CdaResource('mapping', 'mapping.tsv', url=URL, sha256='0' * 64))
+
+        with pytest.warns(UserWarning):
+            assert manager.get_path('mapping', overwrite=True) == path
+        assert count_lines(path) == count_lines(EXCERPT)
+
+    @pytest.mark.parametrize('error', [requests.ConnectionError('offline'), requests.HTTPError('404 Not Found')])
+    def test_failed_download_closes_the_temporary_file(self, manager: CdaResourceManager, bundle_dir, monkeypatch,
+                                                        error):
+        descriptors = []
+        mkstemp = cda_resources.tempfile.mkstemp
+
+        def record_mkstemp(*args, **kwargs):
+            fd, path = mkstemp(*args, **kwargs)
+            descriptors.append(fd)
+            return fd, path
+
+        def fail(*args, **kwargs):
+            raise error
+        monkeypatch.setattr(cda_resources.tempfile, 'mkstemp', record_mkstemp)
+        monkeypatch.setattr(cda_resources.requests, 'get', fail)
+
+        with pytest.raises(type(error)):
+            manager.get_path('mapping')
+
+        fd, = descriptors
+        with pytest.raises(OSError):
+            os.fstat(fd)
+        assert os.listdir(manager.local_dir) == []
+
+    def test_not_modified_for_unconditional_request(self, manager: CdaResourceManager, bundle_dir, monkeypatch):
+        monkeypatch.setattr(cda_resources.requests, 'get', lambda *args, **kwargs: FakeResponse(304, {}))
+
+        with pytest.raises(requests.HTTPError):
+            manager.get_path('mapping')
+        assert os.listdir(manager.local_dir) == []
+
+    def test_view_is_cached(self, manager: CdaResourceManager, server: FakeServer):
+        calls = []
+
+        def parse(path):
+            calls.append(path)
+            return count_lines(path)
+
+        first = manager.get('mapping', parser=parse)
+        second = manager.get('mapping', parser=parse)
+
+        assert first == second == count_lines(EXCERPT)
+        assert len(calls) == 1
+        assert manager.get('mapping') == first
+
+    def test_mapping_views_are_read_only(self, manager: CdaResourceManager, server: FakeServer):
+        view = manager.get('mapping', parser=view_parser)
+
+        with pytest.raises(TypeError):
+            view['lines'] = 0
+
+        assert manager.get('mapping', parser=view_parser) == view_parser(EXCERPT)
+
+    def test_dataframe_views_are_copied(self):
+        manager = CdaResourceManager()
+        site_to_uberon = manager.get('site_to_uberon')
+        treatments = manager.get('treatment_to_ncit')
+
+        treatments.loc[0, 'ncit_id'] = 'NCIT:C0'
+        with pytest.raises(TypeError):
+            site_to_uberon['lung'] = 'UBERON:0000000'
+
+        assert manager.get('treatment_to_ncit').loc[0, 'ncit_id'] != 'NCIT:C0'
+        assert manager.get('site_to_uberon')['lung'] != 'UBERON:0000000'
+
+    def test_view_is_rebuilt_when_file_changes(self, manager: CdaResourceManager, server: FakeServer):
+        path = manager.get_path('mapping')
+        assert manager.get('mapping') == count_lines(EXCERPT)
+
+        with open(path, 'ab') as fh:
+            fh.write(b'x\n')
+        # Keep the checksum in sync with the edit, the file is downloaded again otherwise.
+        with open(f'{path}.meta.json') as fh:
+            meta = json.load(fh)
+        meta['sha256'] = cda_resources._sha256(path)
+        with open(f'{path}.meta.json', 'w') as fh:
+            json.dump(meta, fh)
+
+        assert manager.get('mapping') == count_lines(EXCERPT) + 1
+        assert len(server.requests) == 1
+
+    def test_cached_copy_is_used_offline(self, manager: CdaResourceManager, server: FakeServer, monkeypatch):
+        path = manager.get_path('mapping')
+
+        def fail(*args, **kwargs):
+            raise requests.ConnectionError('offline')
+        monkeypatch.setattr(cda_resources.requests, 'get', fail)
+
+        with pytest.warns(UserWarning):
+            assert manager.get_path('mapping', refresh=True) == path
+
+    def test_bundled_copy_is_used_offline(self, manager: CdaResourceManager, offline, bundle_dir):
+        shutil.copy(EXCERPT, bundle_dir / 'mapping.tsv')
+
+        with pytest.warns(UserWarning):
+            path = manager.get_path('mapping')
+
+        assert path == str(bundle_dir / 'mapping.tsv')
+
+    def test_unverified_cache_without_network_fails(self, manager: CdaResourceManager, offline, bundle_dir):
+        os.makedirs(manager.local_dir)
+        shutil.copy(EXCERPT, os.path.join(manager.local_dir, 'mapping.tsv'))
+
+        with pytest.raises(requests.ConnectionError):
+            manager.get_path('mapping')
+
+    def test_unknown_resource(self, manager: CdaResourceManager):
+        with pytest.raises(ValueError):
+            manager.get_path('unknown')
+
+    def test_bundled_resources(self):
+        manager = CdaResourceManager()
+
+        assert 'Preferred Term' in manager.get('neoplasm_core').columns
+        assert manager.get('site_to_uberon')['lung'].startswith('UBERON:')
+
+
+class TestCdaDownloader:
+
+    def test_is_deprecated(self):
+        from oncopacket.cda.cda_downloader import CdaDownloader
+
+        with pytest.warns(DeprecationWarning):
+            CdaDownloader()
+
+    def test_delegates_to_the_manager(self, tmp_path, monkeypatch):
+        from oncopacket.cda.cda_downloader import CdaDownloader
+        server = FakeServer()
+        monkeypatch.setattr(cda_resources.requests, 'get', server.get)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            downloader = CdaDownloader(CdaResourceManager(local_dir=str(tmp_path)))
+        downloader.download_if_needed(overwrite_downloads=False)
+
+        assert downloader.get_icdo_to_ncit_path() == str(tmp_path / 'ICD-O-3.1-NCIt_Morphology_Mapping.txt')
+        assert len(server.requests) == 1
@@ -0,0 +1,205 @@
+import concurrent.futures
+import json
+import os
+import pickle
+
+import pandas as pd
+import phenopackets as pp
+import pytest
+
+from oncopacket import cli
+from oncopacket.cda import Diagnostics
+from oncopacket.cda.cda_presets import TISSUE_PRESETS
+from oncopacket.export import read_stream
+
+
+class FakeImporter:
+
+    def __init__(self):
+        self.calls = []
+        self.diagnostics = Diagnostics()
+
+    def get_ga4gh_phenopackets(self, source: dict, **kwargs):
+        self.calls.append((source, kwargs))
+        cohort_name = kwargs['cohort_name']
+        return [pp.Phenopacket(id=f'{cohort_name}-TCGA.TCGA-XX-000{i}') for i in range(3)]
+
+    def get_diagnostics(self) -> Diagnostics:
+        return self.diagnostics
+
+    def prefetch_shared(self, stages):
+        self.calls.append(('prefetch', {'stages': stages}))
+
+    def get_diagnosis_combinations(self, q: dict, cohort_name: str):
+        self.calls.append((q, {'cohort_name': cohort_name}))
+        from oncopacket.cda import diagnosis_combinations
+        return diagnosis_combinations(pd.DataFrame({
+            'subject_id': ['s1', 's2'],
+            'primary_diagnosis': ['Adenocarcinoma, NOS', 'Something new'],
+            'primary_diagnosis_condition': ['Adenomas and Adenocarcinomas', 'Unknown'],
+            'primary_diagnosis_site': ['Bronchus and lung', 'Bronchus and lung'],
+        }))
+
+
+@pytest.fixture
+def importer(monkeypatch) -> FakeImporter:
+    importer = FakeImporter()
+    monkeypatch.setattr(cli, '_configure_importer', lambda cache_dir, use_cache, maf_paths, cassette=None: importer)
+    return importer
+
+
+class TestExportCommand:
+
+    def test_json_export(self, tmp_path, importer: FakeImporter):
+        out_dir = tmp_path / 'phenopackets'
+
+        code = cli.main(['export', 'Lung', '-o', str(out_dir), '--cache-dir', str(tmp_path / 'cache')])
+
+        assert code == 0
+        source, kwargs = importer.calls[0]
+        assert source == TISSUE_PRESETS['lung'].query
+        assert kwargs == {'cohort_name': 'Lung', 'stages': cli.STAGES}
+        with open(out_dir / 'Lung' / 'manifest.json') as fh:
+            assert json.load(fh)['n_phenopackets'] == 3
+        assert (out_dir / 'Lung' / 'Lung-TCGA.TCGA-XX-0000.json').is_file()
+
+    def test_stream_export_and_stages(self, tmp_path, importer: FakeImporter):
+        out_dir = tmp_path / 'phenopackets'
+
+        code = cli.main(['export', 'breast', 'kidney', '-o', str(out_dir), '-f', 'ndjson.gz',
+                         '--stages', 'diseases,biosamples', '--cache-dir', str(tmp_path / 'cache')])
+
+        assert code == 0
+        assert [kwargs['stages'] for _, kwargs in importer.calls] == [('diseases', 'biosamples')] * 2
+        assert len(list(read_stream(str(out_dir / 'Kidney.ndjson.gz')))) == 3
+        assert sorted(os.listdir(out_dir)) == ['Breast.ndjson.gz', 'Kidney.ndjson.gz']
+
+    def test_all(self, tmp_path, importer: FakeImporter):
+        cli.main(['export', 'all', '-o', str(tmp_path), '-f', 'pb', '--cache-dir', str(tmp_path / 'cache')])
+
+        assert [kwargs['cohort_name'] for _, kwargs in importer.calls] == \
+               [preset.cohort_name for preset in TISSUE_PRESETS.values()]
+
+    def test_failed_cohort_sets_exit_code(self, tmp_path, importer: FakeImporter, monkeypatch):
+        def fail(*args, **kwargs):
+            raise ValueError('No subject rows returned')
+        monkeypatch.setattr(importer, 'get_ga4gh_phenopackets', fail)
+
+        assert cli.main(['export', 'lung', '-o', str(tmp_path), '--cache-dir', str(tmp_path / 'cache')]) == 1
+
+    def test_diagnostics_report(self, tmp_path, importer: FakeImporter):
+        importer.diagnostics.record('unmapped_primary_site', 'Bronchus and lung', example='TCGA.TCGA-XX-0000')
+        importer.diagnostics.record('unmapped_primary_site', 'Bronchus and lung')
+
+        assert cli.main(['export', 'lung', '-o', str(tmp_path), '-f', 'pb', '--cache-dir', str(tmp_path / 'cache')]) == 0
+
+        report = pd.read_csv(tmp_path / 'Lung.diagnostics.csv')
+        assert report[['category', 'key', 'count']].values.tolist() == \
+               [['unmapped_primary_site', 'Bronchus and lung', 2]]
+
+    def test_replay_cassette(self, tmp_path, importer: FakeImporter, monkeypatch):
+        configured = []
+        monkeypatch.setattr(cli, '_configure_importer',
+                            lambda cache_dir, use_cache, maf_paths, cassette=None:
+                            configured.append((use_cache, cassette)) or importer)
+        cassette_dir = tmp_path / 'cassette'
+
+        assert cli.main(['export', 'lung', '-o', str(tmp_path), '-f', 'pb', '--cache-dir', str(tmp_path / 'cache'),
+                         '--replay', str(cassette_dir), '--latency', 'recorded']) == 0
+
+        # The cassette replaces the cache.
+        (use_cache, cassette), = configured
+        assert not use_cache
+        assert (cassette.path, cassette.mode) == (str(cassette_dir), 'replay')
+        assert (cassette_dir / 'tables').is_dir()
+
+    def test_prefetch_uses_the_cassette(self, tmp_path, importer: FakeImporter, monkeypatch):
+        # Threads instead of processes, to keep the fake importer.
+        monkeypatch.setattr(concurrent.futures, 'ProcessPoolExecutor', concurrent.futures.ThreadPoolExecutor)
+        configured = []
+        monkeypatch.setattr(cli, '_configure_importer',
+                            lambda cache_dir, use_cache, maf_paths, cassette=None:
+                            configured.append(cassette) or importer)
+        cassette_dir = tmp_path / 'cassette'
+
+        assert cli.main(['export', 'lung', 'breast', '-o', str(tmp_path), '-f', 'pb', '--jobs', '2',
+                         '--cache-dir', str(tmp_path / 'cache'), '--replay', str(cassette_dir)]) == 0
+
+        assert importer.calls[0] == ('prefetch', {'stages': cli.STAGES})
+        assert len(configured) == 3
+        assert all((cassette.path, cassette.mode) == (str(cassette_dir), 'replay') for cassette in configured)
+
+    def test_list(self, capsys):
+        assert cli.main(['export', '--list']) == 0
+
+        assert 'thyroid' in capsys.readouterr().out
+
+    @pytest.mark.parametrize('argv', [
+        ['export'],
+        ['export', 'spleen'],
+        ['export', 'lung', '--stages', 'diseases,phenotypes'],
+        ['export', 'lung', '--format', 'xml'],
+        ['export', 'lung', '--jobs', '0'],
+        ['export', 'lung', '--record', 'a', '--replay', 'b'],
+        ['export', 'lung', '--latency', '-1'],
+    ])
+    def test_invalid_arguments(self, argv):
+        with pytest.raises(SystemExit) as e:
+            cli.main(argv)
+
+        assert e.value.code == 2
+
+    def test_stages_match_the_importer(self):
+        pytest.importorskip('cdapython')
+        from oncopacket.cda.cda_table_importer import PHENOPACKET_STAGES
+
+        assert cli.STAGES == PHENOPACKET_STAGES
+
+    @pytest.mark.parametrize('argv, expected', [([], False), (['--cache'], True)])
+    def test_cache_is_opt_in(self, tmp_path, importer: FakeImporter, monkeypatch, argv, expected: bool):
+        configured = []
+        monkeypatch.setattr(cli, '_configure_importer',
+                            lambda cache_dir, use_cache, maf_paths, cassette=None:
+                            configured.append(use_cache) or importer)
+
+        assert cli.main(['export', 'lung', '-o', str(tmp_path), '-f', 'pb',
+                         '--cache-dir', str(tmp_path / 'cache')] + argv) == 0
+
+        assert configured == [expected]
+
+
+class TestCombinationsCommand:
+
+    def test_cached_cohorts(self, tmp_path, capsys):
+        cache_dir = tmp_path / 'cache'
+        cache_dir.mkdir()
+        tables = {
+            'researchsubject': pd.DataFrame({'subject_id': ['s1'], 'primary_diagnosis_condition': ['Unknown'],
+                                             'primary_diagnosis_site': ['Bronchus and lung']}),
+            'diagnosis': pd.DataFrame({'subject_id': ['s1'], 'primary_diagnosis': ['Something new']}),
+        }
+        for name, df in tables.items():
+            with open(cache_dir / f'Lung_{name}_df.pkl', 'wb') as fh:
+                pickle.dump(df, fh)
+        out = tmp_path / 'unmapped.csv'
+
+        code = cli.main(['combinations', '--cache-dir', str(cache_dir), '--unmapped', '-o', str(out)])
+
+        assert code == 0
+        unmapped = pd.read_csv(out)
+        assert unmapped[['cohort', 'primary_diagnosis']].values.tolist() == [['Lung', 'Something new']]
+        assert '1 unmapped' in capsys.readouterr().err
+
+    def test_query_without_cache(self, tmp_path, importer: FakeImporter, capsys):
+        code = cli.main(['combinations', 'lung', '--no-cache', '--cache-dir', str(tmp_path)])
+
+        assert code == 0
+        assert importer.calls == [(TISSUE_PRESETS['lung'].query, {'cohort_name': 'Lung'})]
+        out = capsys.readouterr().out
+        assert 'Adenocarcinoma, NOS' in out and 'NCIT:C3512' in out
+
+    def test_missing_cache_dir(self, tmp_path):
+        with pytest.raises(SystemExit) as e:
+            cli.main(['combinations', '--cache-dir', str(tmp_path / 'missing')])
+
+        assert e.value.code == 2
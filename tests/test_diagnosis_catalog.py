@@ -0,0 +1,115 @@
+import os
+import pickle
+
+import pandas as pd
+import pytest
+
+from oncopacket.cda import cached_diagnosis_combinations, diagnosis_combinations
+from oncopacket.cda import diagnosis_catalog
+from oncopacket.cda.diagnosis_catalog import count_combinations, merge_diagnosis_tables, prepare_mapping_table
+
+
+def _rsub_df() -> pd.DataFrame:
+    return pd.DataFrame({
+        'researchsubject_id': ['rs1', 'rs2', 'rs3', 'rs4'],
+        'subject_id': ['s1', 's2', 's3', 's4'],
+        'primary_diagnosis_condition': ['Adenomas and Adenocarcinomas', 'Adenomas and Adenocarcinomas',
+                                        'Squamous Cell Neoplasms', None],
+        'primary_diagnosis_site': ['Bronchus and lung', 'Bronchus and lung', 'Bronchus and lung', 'Lung, NOS'],
+    })
+
+
+def _diagnosis_df() -> pd.DataFrame:
+    return pd.DataFrame({
+        'diagnosis_id': ['d1', 'd2', 'd2b', 'd3', 'd4'],
+        'subject_id': ['s1', 's2', 's2', 's3', 's4'],
+        'primary_diagnosis': ['Adenocarcinoma, NOS', 'Adenocarcinoma, NOS', 'Adenocarcinoma, NOS',
+                              'Squamous cell carcinoma, NOS', 'Something new'],
+    })
+
+
+def _write_cache(cache_dir: str, cohort: str, rsub_df: pd.DataFrame, diagnosis_df: pd.DataFrame):
+    for name, df in (('researchsubject', rsub_df), ('diagnosis', diagnosis_df)):
+        with open(os.path.join(cache_dir, f'{cohort}_{name}_df.pkl'), 'wb') as fh:
+            pickle.dump(df, fh)
+
+
+class TestDiagnosisCombinations:
+
+    def test_counts(self):
+        counts = count_combinations(merge_diagnosis_tables(_rsub_df(), _diagnosis_df()))
+
+        assert len(counts) == 3
+        adenocarcinoma = counts[counts['primary_diagnosis'] == 'Adenocarcinoma, NOS'].iloc[0]
+        assert (adenocarcinoma['n_rows'], adenocarcinoma['n_subjects']) == (3, 2)
+        # The missing values are empty strings, like in `OpDiagnosisMapper`.
+        assert counts[counts['primary_diagnosis'] == 'Something new'].iloc[0]['primary_diagnosis_condition'] == ''
+
+    def test_flags_unmapped(self):
+        combinations = diagnosis_combinations(merge_diagnosis_tables(_rsub_df(), _diagnosis_df()))
+
+        assert combinations['n_rows'].tolist() == [3, 1, 1]
+        mapped = combinations.set_index('primary_diagnosis')
+        assert mapped.loc['Adenocarcinoma, NOS', 'ncit_id'] == 'NCIT:C3512'
+        assert mapped.loc['Adenocarcinoma, NOS', 'tissue'] == 'lung'
+        assert mapped.loc['Squamous cell carcinoma, NOS', 'mapped']
+        assert not mapped.loc['Something new', 'mapped']
+
+    def test_custom_mapping_table(self):
+        mapping_df = pd.DataFrame({
+            'primary_diagnosis': ['Something new'],
+            'primary_diagnosis_condition': [''],
+            'primary_diagnosis_site': ['Lung, NOS'],
+            'ncit_id': ['NCIT:C0000'],
+            'ncit_label': ['New'],
+        })
+
+        combinations = diagnosis_combinations(merge_diagnosis_tables(_rsub_df(), _diagnosis_df()),
+                                              mapping_table=prepare_mapping_table(mapping_df))
+
+        assert combinations.loc[combinations['mapped'], 'primary_diagnosis'].tolist() == ['Something new']
+
+    def test_mapping_table_matches_the_mapper(self):
+        from oncopacket.cda.mapper import OpDiagnosisMapper
+        mapper = OpDiagnosisMapper.multitissue_mapper()
+
+        table = prepare_mapping_table()
+
+        assert set(table.index) == set(mapper._ncit_map)
+
+
+class TestCachedDiagnosisCombinations:
+
+    def test_incremental_update(self, tmp_path, monkeypatch):
+        cache_dir = str(tmp_path)
+        _write_cache(cache_dir, 'Lung', _rsub_df(), _diagnosis_df())
+        _write_cache(cache_dir, 'Brain', _rsub_df().iloc[:1], _diagnosis_df().iloc[:1])
+
+        combinations = cached_diagnosis_combinations(cache_dir)
+
+        assert combinations['cohort'].tolist() == ['Brain', 'Lung', 'Lung', 'Lung']
+        assert os.path.isfile(os.path.join(cache_dir, diagnosis_catalog.CATALOG_FILENAME))
+
+        counted = []
+        count = diagnosis_catalog.count_combinations
+        monkeypatch.setattr(diagnosis_catalog, 'count_combinations', lambda df: counted.append(df) or count(df))
+        _write_cache(cache_dir, 'Brain', _rsub_df().iloc[:2], _diagnosis_df().iloc[:3])
+
+        combinations = cached_diagnosis_combinations(cache_dir)
+
+        assert len(counted) == 1
+        brain = combinations[combinations['cohort'] == 'Brain']
+        assert brain['n_rows'].tolist() == [3]
+
+    def test_selected_cohorts(self, tmp_path):
+        _write_cache(str(tmp_path), 'Lung', _rsub_df(), _diagnosis_df())
+
+        assert len(cached_diagnosis_combinations(str(tmp_path), cohorts=['Lung'])) == 3
+        with pytest.raises(ValueError):
+            cached_diagnosis_combinations(str(tmp_path), cohorts=['Brain'])
+
+    def test_empty_cache(self, tmp_path):
+        combinations = cached_diagnosis_combinations(str(tmp_path))
+
+        assert len(combinations) == 0
+        assert 'mapped' in combinations.columns
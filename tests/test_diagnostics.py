@@ -0,0 +1,125 @@
+import pandas as pd
+import pytest
+
+from oncopacket.cda import CdaDiseaseFactory, CdaIndividualFactory, Diagnostics
+from oncopacket.cda.mapper import OpDiagnosisMapper
+
+
+class TestDiagnostics:
+
+    @pytest.fixture
+    def diagnostics(self) -> Diagnostics:
+        diagnostics = Diagnostics(max_examples=2)
+        for subject_id in ('s1', 's2', 's3'):
+            diagnostics.record('unmapped_primary_site', 'Bronchus and lung', example=subject_id)
+        diagnostics.record('unmapped_stage', 'T2N0M0')
+        diagnostics.record('unmapped_primary_site', 'Kidney', n=2)
+        return diagnostics
+
+    def test_counts(self, diagnostics: Diagnostics):
+        assert len(diagnostics) == 6
+        assert diagnostics.count('unmapped_primary_site') == 5
+        assert diagnostics.count('unmapped_primary_site', 'Kidney') == 2
+        assert diagnostics.count(key='T2N0M0') == 1
+        assert diagnostics.categories() == ['unmapped_primary_site', 'unmapped_stage']
+
+    def test_report(self, diagnostics: Diagnostics):
+        report = diagnostics.to_df()
+
+        assert report.columns.tolist() == ['category', 'key', 'count', 'examples']
+        assert report[['category', 'key', 'count']].values.tolist() == [
+            ['unmapped_primary_site', 'Bronchus and lung', 3],
+            ['unmapped_primary_site', 'Kidney', 2],
+            ['unmapped_stage', 'T2N0M0', 1],
+        ]
+        # Only the first examples are kept.
+        assert report['examples'].tolist() == [['s1', 's2'], [], []]
+
+    def test_empty_report(self):
+        diagnostics = Diagnostics()
+
+        assert diagnostics.to_df().empty
+        assert diagnostics.summary() == 'No conversion issues'
+
+    def test_update_and_clear(self, diagnostics: Diagnostics):
+        other = Diagnostics()
+        other.record('unmapped_stage', 'T2N0M0', example='s9')
+
+        diagnostics.update(other)
+
+        assert diagnostics.count('unmapped_stage') == 2
+        assert diagnostics.to_df()['examples'].tolist()[-1] == ['s9']
+        diagnostics.clear()
+        assert len(diagnostics) == 0
+
+    def test_summary(self, diagnostics: Diagnostics):
+        assert diagnostics.summary() == \
+               'Conversion issues - unmapped_primary_site: 5 (2 distinct), unmapped_stage: 1 (1 distinct)'
+
+    def test_invalid_max_examples(self):
+        with pytest.raises(ValueError):
+            Diagnostics(max_examples=-1)
+
+
+class TestFactoryDiagnostics:
+
+    @pytest.fixture
+    def diagnostics(self) -> Diagnostics:
+        return Diagnostics()
+
+    def test_disease_factory(self, diagnostics: Diagnostics):
+        factory = CdaDiseaseFactory(OpDiagnosisMapper.multitissue_mapper(diagnostics=diagnostics),
+                                    diagnostics=diagnostics)
+        row = {
+            'subject_id': 'TCGA.TCGA-XX-0001',
+            'primary_diagnosis': 'Something new',
+            'primary_diagnosis_condition': 'Unknown',
+            'primary_diagnosis_site': 'Not a site',
+            'age_at_diagnosis': 100.,
+            'stage': 'T2N0M0',
+        }
+
+        factory.to_ga4gh(row)
+
+        assert diagnostics.count('unmapped_primary_site', 'Not a site') == 1
+        assert diagnostics.count('unmapped_stage', 'T2N0M0') == 1
+        assert diagnostics.count('unmapped_diagnosis', ('Something new', 'Unknown', 'Not a site')) == 1
+        assert diagnostics.to_df()['examples'].tolist() == [['TCGA.TCGA-XX-0001']] * 3
+
+        with pytest.raises(ValueError):
+            factory.to_ga4gh({k: v for k, v in row.items() if k != 'stage'})
+        assert diagnostics.count('missing_field', 'stage') == 1
+
+    def test_individual_factory(self, diagnostics: Diagnostics):
+        factory = CdaIndividualFactory(diagnostics=diagnostics)
+        df = pd.DataFrame({
+            'subject_id': ['s1', 's2', 's3'],
+            'sex': ['female', 'intersex', None],
+            'days_to_birth': [-100., None, 'unknown'],
+            'vital_status': ['Dead', 'Alive', 'Alive'],
+            'days_to_death': ['12.5', None, None],
+            'cause_of_death': [None, None, None],
+        })
+
+        factory.to_ga4gh_batch(df)
+
+        assert diagnostics.count('invalid_days_to_birth') == 1
+        assert diagnostics.count('invalid_days_to_birth', 'unknown') == 1
+        assert diagnostics.count('invalid_days_to_death', '12.5') == 1
+        assert diagnostics.count('unmapped_sex') == 1
+        assert len(diagnostics) == 3
+
+    @pytest.mark.parametrize('missing', [None, float('nan'), pd.NA, ''])
+    def test_missing_days_to_birth_is_not_reported(self, diagnostics: Diagnostics, missing):
+        factory = CdaIndividualFactory(diagnostics=diagnostics)
+        df = pd.DataFrame({
+            'subject_id': ['s1', 's2'],
+            'sex': ['female', 'male'],
+            'days_to_birth': pd.Series([missing, -10000], dtype=object),
+        })
+
+        individuals = factory.to_ga4gh_batch(df)
+
+        assert len(diagnostics) == 0
+        assert not individuals[0].HasField('time_at_last_encounter')
+        assert individuals[1].time_at_last_encounter.age.iso8601duration != ''
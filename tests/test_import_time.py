@@ -0,0 +1,57 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+# Modules that are expensive to import and must not be loaded by the package `__init__` modules.
+HEAVY_MODULES = ('pandas', 'numpy', 'phenopackets', 'google.protobuf', 'cdapython', 'tqdm', 'requests')
+
+# Wall clock budget (seconds) for importing the package in a fresh interpreter.
+# The lazy `__init__` modules import in a few milliseconds, so the budget is generous to tolerate slow CI runners.
+IMPORT_BUDGET = 0.25
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def _probe_import(module: str) -> dict:
+    # Run in a fresh interpreter, the modules may have already been imported by other tests.
+    out = subprocess.run(
+        [sys.executable, '-c', PROBE.format(module=module)],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(out.stdout)
+
+
+@pytest.mark.parametrize('module', ['oncopacket', 'oncopacket.cda', 'oncopacket.cohort', 'oncopacket.export',
+                                    'oncopacket.model', 'oncopacket.cda.mapper', 'oncopacket.cli'])
+class TestImportTime:
+
+    def test_heavy_modules_are_not_imported(self, module: str):
+        result = _probe_import(module)
+
+        loaded = [name for name in HEAVY_MODULES if name in result['modules']]
+        assert loaded == [], f'`import {module}` eagerly imported {loaded}'
+
+    def test_import_is_within_budget(self, module: str):
+        result = _probe_import(module)
+
+        assert result['elapsed'] < IMPORT_BUDGET, \
+            f'`import {module}` took {result["elapsed"]:.3f}s, the budget is {IMPORT_BUDGET}s'
+
+
+def test_lazy_attribute_access():
+    import oncopacket
+    import oncopacket.cda
+
+    assert oncopacket.CdaIndividualFactory is oncopacket.cda.CdaIndividualFactory
+    assert 'CdaIndividualFactory' in dir(oncopacket)
+
+    with pytest.raises(AttributeError):
+        getattr(oncopacket.cda, 'NoSuchFactory')
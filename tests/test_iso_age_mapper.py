@@ -1,7 +1,12 @@
 
 
 import unittest
-from oncopacket.cda.mapper.iso8601_mapper import Iso8601Mapper
+
+import numpy as np
+import pandas as pd
+
+from oncopacket.cda.mapper.iso8601_mapper import Iso8601Mapper, days_to_components, days_to_iso8601, \
+    iso8601_to_days, iso8601_to_years, parse_iso8601_durations
 
 
 class TestIsoAgeMapper(unittest.TestCase):
@@ -14,3 +19,93 @@ class TestIsoAgeMapper(unittest.TestCase):
         iso8601 = self.age_mapper.from_days(73.0)
         self.assertEqual("P2M13D", iso8601)
 
+
+class TestIso8601Durations(unittest.TestCase):
+
+    def test_years(self):
+        years = iso8601_to_years(['P55Y6M', 'P11355D', 'P24106DT0H0M0S', 'P2M13D', '-P1Y'])
+
+        np.testing.assert_allclose(years, [55.5, 11355 / 365.25, 24106 / 365.25, 2 / 12 + 13 / 365.25, -1.])
+
+    def test_missing_and_invalid_values_are_nan(self):
+        years = iso8601_to_years([None, np.nan, '', 'P', 'PT', '55 years'])
+
+        self.assertTrue(np.isnan(years).all())
+
+    def test_components_keep_the_index(self):
+        values = pd.Series(['P1Y2M3W4DT5H6M7S', None], index=['a', 'b'])
+
+        parts = parse_iso8601_durations(values)
+
+        self.assertEqual(['a', 'b'], list(parts.index))
+        self.assertEqual([1., 2., 3., 4., 5., 6., 7.], parts.loc['a'].tolist())
+        self.assertTrue(parts.loc['b'].isna().all())
+
+    def test_round_trip_with_from_days(self):
+        days = [73, 365, 10350, 30000]
+
+        years = iso8601_to_years([Iso8601Mapper.from_days(d) for d in days])
+
+        np.testing.assert_allclose(years, np.asarray(days) / 365.25, atol=1.5 / 365.25)
+
+
+class TestDaysToIso8601(unittest.TestCase):
+
+    def test_from_days_accepts_strings(self):
+        self.assertEqual('P2M13D', Iso8601Mapper.from_days('73'))
+        self.assertEqual('P2M13D', Iso8601Mapper.from_days('73.0'))
+
+    def test_from_days_zero_and_negative(self):
+        self.assertEqual('P0D', Iso8601Mapper.from_days(0))
+        self.assertEqual('-P2M13D', Iso8601Mapper.from_days(-73))
+
+    def test_from_days_accepts_numpy_numbers(self):
+        self.assertEqual('P2M13D', Iso8601Mapper.from_days(np.int64(73)))
+        self.assertEqual('P2M13D', Iso8601Mapper.from_days(np.float32(73.)))
+        with self.assertRaises(ValueError):
+            Iso8601Mapper.from_days(True)
+
+    def test_fractional_days_are_rounded(self):
+        days = [73.4, 73.6, 73.5, 74.5, -73.6, '73.6']
+
+        durations = days_to_iso8601(days, ymd=True)
+
+        self.assertEqual([Iso8601Mapper.from_days(d) for d in days], durations.tolist())
+        self.assertEqual(['P73D', 'P74D', 'P74D', 'P74D', '-P74D', 'P74D'], days_to_iso8601(days).tolist())
+
+    def test_days_designator(self):
+        durations = days_to_iso8601([73, 73.4, '73.0', -10350, 0])
+
+        self.assertEqual(['P73D', 'P73D', 'P73D', '-P10350D', 'P0D'], durations.tolist())
+
+    def test_ymd_matches_from_days(self):
+        days = np.arange(-40000, 40000, 7)
+
+        durations = days_to_iso8601(days, ymd=True)
+
+        self.assertEqual([Iso8601Mapper.from_days(int(d)) for d in days], durations.tolist())
+
+    def test_missing_and_invalid_values_are_none(self):
+        durations = days_to_iso8601(pd.Series([None, np.nan, 'not reported', np.inf, 73], index=list('abcde')))
+
+        self.assertEqual(list('abcde'), list(durations.index))
+        self.assertEqual([None, None, None, None, 'P73D'], durations.tolist())
+
+    def test_empty(self):
+        self.assertEqual([], days_to_iso8601([]).tolist())
+
+    def test_components(self):
+        parts = days_to_components([10350, None, -73])
+
+        self.assertEqual([28, 4, 2], parts.iloc[0].tolist())
+        self.assertTrue(parts.iloc[1].isna().all())
+        self.assertEqual([0, -2, -13], parts.iloc[2].tolist())
+
+    def test_round_trip(self):
+        days = np.array([0., 73., 365., 10350., 30000., -73., -10350.])
+
+        np.testing.assert_array_equal(days, iso8601_to_days(days_to_iso8601(days)))
+        np.testing.assert_allclose(days, iso8601_to_days(days_to_iso8601(days, ymd=True)), atol=1.)
+
+    def test_inverse_of_missing_is_nan(self):
+        self.assertTrue(np.isnan(iso8601_to_days([None, 'P'])).all())
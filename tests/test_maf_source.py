@@ -0,0 +1,119 @@
+import gzip
+import os
+
+import pandas as pd
+import pytest
+
+from oncopacket.cda import CdaMutationFactory, MafMutationSource
+
+TESTDATA_FILENAME = os.path.join(os.path.dirname(__file__), 'data', 'mutation_excerpt.tsv')
+MAF_HEADER = '#version gdc-1.0.0\n#annotation.spec gdc-1.0.1-public\n'
+
+
+def write_maf(df: pd.DataFrame, path, compress: bool = False):
+    opener = gzip.open if compress else open
+    with opener(path, 'wt') as fh:
+        fh.write(MAF_HEADER)
+        df.to_csv(fh, sep='\t', index=False)
+    return str(path)
+
+
+class TestMafMutationSource:
+
+    @pytest.fixture
+    def df(self) -> pd.DataFrame:
+        return pd.read_csv(TESTDATA_FILENAME, sep='\t', index_col=0)
+
+    @pytest.fixture
+    def maf_path(self, tmp_path, df: pd.DataFrame) -> str:
+        return write_maf(df, tmp_path / 'TCGA-CESC.maf')
+
+    def test_variants_match_the_factory(self, maf_path: str, df: pd.DataFrame):
+        source = MafMutationSource(maf_path, chunksize=4)
+
+        factory = CdaMutationFactory()
+        for _, row in df.iterrows():
+            variants = source.fetch_variants(row['case_barcode'])
+            assert len(variants) == 1
+            assert variants[0].variation_descriptor.id == factory.to_ga4gh(row).variation_descriptor.id
+            assert variants[0].variation_descriptor.vcf_record.pos == row['Start_Position']
+
+    def test_only_needed_columns_are_read(self, maf_path: str):
+        source = MafMutationSource(maf_path)
+
+        columns = set().union(*(chunk.columns for chunk in source.iter_chunks()))
+
+        assert columns == set(CdaMutationFactory().get_column_names()) | {'subject_id'}
+
+    def test_cda_subject_id_prefix_is_removed(self, maf_path: str):
+        source = MafMutationSource(maf_path)
+
+        assert 'TCGA-C5-A1MI' in source.get_variants()
+        assert source.fetch_variants('TCGA.TCGA-C5-A1MI') == []
+
+    def test_barcode_is_trimmed(self, tmp_path, df: pd.DataFrame):
+        df = df.drop(columns=['cda_subject_id', 'case_barcode'])
+        path = write_maf(df, tmp_path / 'barcodes.maf.gz', compress=True)
+
+        source = MafMutationSource(path)
+
+        assert len(source.fetch_variants('TCGA-C5-A1MI')) == 1
+
+    def test_directory_and_subject_filter(self, tmp_path, df: pd.DataFrame):
+        write_maf(df.iloc[:5], tmp_path / 'first.maf')
+        write_maf(df.iloc[5:], tmp_path / 'second.maf.gz', compress=True)
+
+        source = MafMutationSource(str(tmp_path), subject_ids=['TCGA-C5-A1MI', 'TCGA-BK-A0CC'])
+
+        assert len(source.get_maf_files()) == 2
+        assert set(source.get_variants()) == {'TCGA-C5-A1MI', 'TCGA-BK-A0CC'}
+
+    def test_files_are_read_once(self, maf_path: str, monkeypatch):
+        source = MafMutationSource(maf_path)
+        source.fetch_variants('TCGA-C5-A1MI')
+        monkeypatch.setattr(source, 'iter_chunks', lambda: pytest.fail('The files were read again'))
+
+        assert len(source.fetch_variants('TCGA-EA-A3HQ')) == 1
+
+    def test_variants_are_built_per_subject(self, maf_path: str, monkeypatch):
+        source = MafMutationSource(maf_path)
+        variants = source.get_variants()
+        built = []
+        to_ga4gh_batch = CdaMutationFactory.to_ga4gh_batch
+        monkeypatch.setattr(CdaMutationFactory, 'to_ga4gh_batch',
+                            lambda self, df: built.append(len(df)) or to_ga4gh_batch(self, df))
+
+        assert 'TCGA-C5-A1MI' in variants
+        assert built == []
+        assert len(variants['TCGA-C5-A1MI']) == 1
+        assert built == [1]
+        with pytest.raises(KeyError):
+            variants['TCGA-XX-0000']
+        assert tuple(variants) == source.get_subject_ids()
+
+    def test_rows_with_invalid_position_are_skipped(self, tmp_path, df: pd.DataFrame):
+        df = df.astype({'Start_Position': object, 'End_Position': object})
+        df.loc[df['case_barcode'] == 'TCGA-C5-A1MI', 'Start_Position'] = None
+        df.loc[df['case_barcode'] == 'TCGA-EA-A3HQ', 'Start_Position'] = 'unknown'
+        df.loc[df['case_barcode'] == 'TCGA-BK-A0CC', 'End_Position'] = None
+        path = write_maf(df, tmp_path / 'blanks.maf')
+
+        source = MafMutationSource(path, chunksize=4)
+
+        assert source.fetch_variants('TCGA-C5-A1MI') == []
+        assert source.fetch_variants('TCGA-EA-A3HQ') == []
+        assert len(source.fetch_variants('TCGA-BK-A0CC')) == 1
+        assert len(source.get_subject_ids()) == len(df) - 2
+        diagnostics = source.get_diagnostics()
+        assert diagnostics.count('invalid_maf_position') == 2
+        assert diagnostics.count('invalid_maf_position', 'unknown') == 1
+
+    def test_missing_column(self, tmp_path, df: pd.DataFrame):
+        path = write_maf(df.drop(columns=['HGVSc']), tmp_path / 'broken.maf')
+
+        with pytest.raises(ValueError):
+            MafMutationSource(path).get_variants()
+
+    def test_missing_path(self, tmp_path):
+        with pytest.raises(ValueError):
+            MafMutationSource(str(tmp_path / 'nope.maf'))
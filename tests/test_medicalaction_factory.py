@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from oncopacket.cda import make_cda_medicalaction, make_cda_medicalactions
+from oncopacket.cda.cda_medicalaction_factory import default_treatment_mappings, group_medical_actions_by_subject, \
+    read_treatment_mappings
+
+
+@pytest.fixture
+def treatment_df() -> pd.DataFrame:
+    return pd.DataFrame({
+        'subject_id': ['TCGA.TCGA-XX-0001', 'TCGA.TCGA-XX-0001', 'TCGA.TCGA-XX-0002', 'TCGA.TCGA-XX-0003'],
+        'treatment_type': ['Chemotherapy', 'Chemotherapy', 'Radiation Therapy, NOS', None],
+        'therapeutic_agent': ['Carboplatin', 'Paclitaxel', np.nan, None],
+        'treatment_outcome': ['Complete Response', 'Progressive Disease', 'Unknown', np.nan],
+    })
+
+
+class TestMedicalActions:
+
+    def test_row(self, treatment_df: pd.DataFrame):
+        medical_action = make_cda_medicalaction(treatment_df.iloc[0])
+
+        assert medical_action.treatment.agent.id == 'NCIT:C1282'
+        assert medical_action.response_to_treatment.label == 'iRECIST Complete Response'
+
+    def test_missing_values(self, treatment_df: pd.DataFrame):
+        medical_action = make_cda_medicalaction(treatment_df.iloc[3])
+
+        assert not medical_action.HasField('treatment')
+        assert not medical_action.HasField('response_to_treatment')
+
+    def test_batch_is_same_as_rows(self, treatment_df: pd.DataFrame):
+        df = pd.concat([treatment_df] * 3, ignore_index=True)
+
+        medical_actions = make_cda_medicalactions(df)
+
+        assert medical_actions == [make_cda_medicalaction(row) for _, row in df.iterrows()]
+        # The messages are copies, not shared prototypes.
+        assert medical_actions[0] is not medical_actions[4]
+
+    def test_empty(self, treatment_df: pd.DataFrame):
+        assert make_cda_medicalactions(treatment_df.iloc[:0]) == []
+
+    def test_group_by_subject(self, treatment_df: pd.DataFrame):
+        grouped = group_medical_actions_by_subject(treatment_df)
+
+        assert list(grouped) == ['TCGA.TCGA-XX-0001', 'TCGA.TCGA-XX-0002', 'TCGA.TCGA-XX-0003']
+        assert [ma.treatment.agent.label for ma in grouped['TCGA.TCGA-XX-0001']] == ['Carboplatin', 'Paclitaxel']
+
+    def test_default_mappings_are_read_once(self):
+        assert default_treatment_mappings() is default_treatment_mappings()
+        # The misspelled values of the former if/elif chains are still mapped.
+        assert default_treatment_mappings().agents['etopside'].id == 'NCIT:C491'
+
+    def test_default_mappings_are_read_only(self):
+        mappings = default_treatment_mappings()
+
+        with pytest.raises(TypeError):
+            mappings.agents['carboplatin'] = mappings.agents['paclitaxel']
+
+        assert default_treatment_mappings().agents['carboplatin'].label == 'Carboplatin'
+
+
+class TestReadTreatmentMappings:
+
+    def test_custom_table(self, tmp_path, treatment_df: pd.DataFrame):
+        path = tmp_path / 'treatments.csv'
+        path.write_text('cda_column,cda_value,ncit_id,ncit_label\n'
+                        'therapeutic_agent,Osimertinib,NCIT:C116377,Osimertinib\n')
+
+        mappings = read_treatment_mappings(str(path))
+        row = pd.Series({'treatment_type': 'Chemotherapy', 'therapeutic_agent': 'osimertinib',
+                         'treatment_outcome': None})
+
+        assert make_cda_medicalaction(row, mappings).treatment.agent.id == 'NCIT:C116377'
+        assert mappings.responses == {}
+
+    @pytest.mark.parametrize('content', [
+        'cda_column,cda_value,ncit_id,ncit_label\ntherapy,x,NCIT:C1,X\n',
+        'cda_column,cda_value,ncit_id,ncit_label\ntherapeutic_agent,X,NCIT:C1,X\ntherapeutic_agent,x,NCIT:C2,Y\n',
+    ])
+    def test_invalid_table(self, tmp_path, content: str):
+        path = tmp_path / 'treatments.csv'
+        path.write_text(content)
+
+        with pytest.raises(ValueError):
+            read_treatment_mappings(str(path))
@@ -1,8 +1,10 @@
 import unittest
 
 import pandas as pd
+import phenopackets as PPKt
 
 from oncopacket.cda import CdaBiosampleFactory
+from oncopacket.cda.cda_biosample_factory import add_biosamples, collapse_specimens, specimen_lineage
 
 cols = ['specimen_id', 'specimen_associated_project',
        'days_to_collection', 'primary_disease_type', 'anatomical_site',
@@ -46,3 +48,108 @@ class TestMakeBiosample(unittest.TestCase):
         self.assertEqual(biosample.individual_id, "Academia Sinica LUAD - 100.P067")
 
         self.assertEqual(biosample.derived_from_id, "PDC000220.P067.P067-2")
+
+
+class TestBiosampleBatch(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.factory = CdaBiosampleFactory()
+        # A GDC-like lineage: sample -> portion -> analyte -> aliquots, and a slide of the portion.
+        self.df = pd.DataFrame({
+            'specimen_id': ['S', 'P', 'A', 'L1', 'L2', 'SL'],
+            'specimen_associated_project': ['TCGA-LUAD'] * 6,
+            'days_to_collection': [10., None, 10., 10., 12., 0.],
+            'primary_disease_type': ['Lung Adenocarcinoma'] * 6,
+            'anatomical_site': ['Lung', None, None, None, None, None],
+            'source_material_type': ['Primary Tumor'] * 6,
+            'specimen_type': ['sample', 'portion', 'analyte', 'aliquot', 'aliquot', 'slide'],
+            'derived_from_specimen': ['initial specimen', 'S', 'P', 'A', 'A', 'P'],
+            'derived_from_subject': ['TCGA.TCGA-XX-0001'] * 6,
+            'subject_id': ['TCGA.TCGA-XX-0001'] * 6,
+            'researchsubject_id': ['TCGA-LUAD.TCGA-XX-0001'] * 6,
+        })
+
+    def test_same_as_to_ga4gh(self):
+        biosamples = self.factory.to_ga4gh_batch(self.df)
+
+        for (_, row), biosample in zip(self.df.iterrows(), biosamples):
+            row = row.astype(object).where(row.notna(), None)
+            self.assertEqual(self.factory.to_ga4gh(row), biosample)
+
+    def test_populate_targets(self):
+        phenopacket = PPKt.Phenopacket()
+        targets = [phenopacket.biosamples.add() for _ in range(len(self.df))]
+
+        biosamples = self.factory.to_ga4gh_batch(self.df, targets=targets)
+
+        self.assertEqual(self.factory.to_ga4gh_batch(self.df), list(phenopacket.biosamples))
+        self.assertTrue(all(b is t for b, t in zip(biosamples, targets)))
+        with self.assertRaises(ValueError):
+            self.factory.to_ga4gh_batch(self.df, targets=targets[:1])
+
+    def test_add_biosamples(self):
+        phenopacket = PPKt.Phenopacket()
+        phenopacket.biosamples.add().id = 'existing'
+
+        biosamples = add_biosamples(self.factory, {'TCGA.TCGA-XX-0001': phenopacket}, self.df)
+
+        self.assertEqual(7, len(phenopacket.biosamples))
+        self.assertEqual(self.factory.to_ga4gh_batch(self.df), list(phenopacket.biosamples[1:]))
+        self.assertTrue(all(b is t for b, t in zip(biosamples, phenopacket.biosamples[1:])))
+
+    def test_failed_add_biosamples_leaves_the_phenopackets_unchanged(self):
+        phenopacket = PPKt.Phenopacket()
+        phenopacket.biosamples.add().id = 'existing'
+        expected = PPKt.Phenopacket()
+        expected.CopyFrom(phenopacket)
+        # The fourth specimen has an invalid subject, the conversion fails after three biosamples were populated.
+        df = self.df.astype({'derived_from_subject': object})
+        df.loc[3, 'derived_from_subject'] = 5
+
+        with self.assertRaises(TypeError):
+            add_biosamples(self.factory, {'TCGA.TCGA-XX-0001': phenopacket}, df)
+
+        self.assertEqual(expected, phenopacket)
+
+    def test_time_of_collection(self):
+        biosamples = self.factory.to_ga4gh_batch(self.df, days_to_birth={'TCGA.TCGA-XX-0001': -20000.})
+
+        self.assertEqual('P20010D', biosamples[0].time_of_collection.age.iso8601duration)
+        self.assertFalse(biosamples[1].HasField('time_of_collection'))
+        self.assertEqual('P20012D', biosamples[4].time_of_collection.age.iso8601duration)
+
+    def test_unknown_subject_has_no_time_of_collection(self):
+        biosamples = self.factory.to_ga4gh_batch(self.df, days_to_birth={'other': -20000.})
+
+        self.assertFalse(any(b.HasField('time_of_collection') for b in biosamples))
+
+    def test_unmapped_values_are_counted(self):
+        df = self.df.assign(source_material_type=['Metastatic'] * 2 + ['Primary Tumor'] * 4)
+
+        self.factory.to_ga4gh_batch(df)
+
+        diagnostics = self.factory.get_diagnostics()
+        self.assertEqual(2, diagnostics.count('unmapped_source_material_type', 'Metastatic'))
+        # The missing values are not counted.
+        self.assertEqual(2, len(diagnostics))
+
+    def test_lineage(self):
+        lineage = specimen_lineage(self.df)
+
+        self.assertIsNone(lineage['S'])
+        self.assertEqual('A', lineage['L1'])
+        self.assertEqual('P', lineage['SL'])
+
+    def test_collapse_aliquots_and_portions(self):
+        collapsed = collapse_specimens(self.df, ('aliquot', 'portion'))
+
+        self.assertEqual(['S', 'A', 'SL'], collapsed['specimen_id'].tolist())
+        self.assertEqual(['initial specimen', 'S', 'S'], collapsed['derived_from_specimen'].tolist())
+        # The input is not modified.
+        self.assertEqual('P', self.df.loc[2, 'derived_from_specimen'])
+
+    def test_collapse_invalid_levels(self):
+        with self.assertRaises(ValueError):
+            collapse_specimens(self.df, ('sample',))
+        with self.assertRaises(ValueError):
+            collapse_specimens(self.df, ('aliquots',))
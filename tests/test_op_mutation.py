@@ -1,3 +1,4 @@
+import hashlib
 import os
 
 import pandas as pd
@@ -5,6 +6,7 @@ import phenopackets as PPkt
 import pytest
 
 from oncopacket.cda import CdaMutationFactory
+from oncopacket.cda.cda_mutation_factory import add_variant_interpretations, variant_id, variant_ids
 
 TESTDATA_FILENAME = os.path.join(os.path.dirname(__file__), 'data', 'mutation_excerpt.tsv')
 
@@ -81,3 +83,85 @@ class TestOpMutation:
 
         assert vinterpretation.variation_descriptor.expressions[1].syntax == "hgvs.p"
         assert vinterpretation.variation_descriptor.expressions[1].value == "ENSP00000369497:p.Tyr1842Ter"
+
+
+class TestMutationBatch:
+
+    @pytest.fixture
+    def mutation_factory(self) -> CdaMutationFactory:
+        return CdaMutationFactory()
+
+    @pytest.fixture
+    def df(self) -> pd.DataFrame:
+        return pd.read_csv(TESTDATA_FILENAME, sep="\t")
+
+    def test_batch_agrees_with_row_conversion(self, mutation_factory: CdaMutationFactory, df: pd.DataFrame):
+        expected = [mutation_factory.to_ga4gh(row) for _, row in df.iterrows()]
+
+        actual = mutation_factory.to_ga4gh_batch(df)
+
+        assert actual == expected
+
+    def test_batch_populates_targets(self, mutation_factory: CdaMutationFactory, df: pd.DataFrame):
+        expected = CdaMutationFactory().to_ga4gh_batch(df)
+        diagnosis = PPkt.Diagnosis()
+        targets = [diagnosis.genomic_interpretations.add().variant_interpretation for _ in range(len(df))]
+
+        actual = mutation_factory.to_ga4gh_batch(df, targets=targets)
+
+        assert actual == expected
+        assert [gi.variant_interpretation for gi in diagnosis.genomic_interpretations] == expected
+        with pytest.raises(ValueError):
+            mutation_factory.to_ga4gh_batch(df, targets=targets[:1])
+
+    def test_row_populates_target(self, mutation_factory: CdaMutationFactory, df: pd.DataFrame):
+        genomic_interpretation = PPkt.GenomicInterpretation()
+
+        mutation_factory.to_ga4gh(df.iloc[0], target=genomic_interpretation.variant_interpretation)
+
+        assert genomic_interpretation.variant_interpretation == mutation_factory.to_ga4gh(df.iloc[0])
+
+    def test_add_variant_interpretations(self, mutation_factory: CdaMutationFactory, df: pd.DataFrame):
+        variants = mutation_factory.to_ga4gh_batch(df)
+        phenopacket = PPkt.Phenopacket()
+
+        interpretation = add_variant_interpretations(phenopacket, 'TCGA.TCGA-C5-A1MI-RS', 'TCGA.TCGA-C5-A1MI', variants)
+
+        assert list(phenopacket.interpretations) == [interpretation]
+        assert interpretation.id == 'TCGA.TCGA-C5-A1MI-RS'
+        assert interpretation.progress_status == PPkt.Interpretation.ProgressStatus.IN_PROGRESS
+        assert interpretation.diagnosis.disease.id == 'NCIT:C3262'
+        genomic_interpretations = interpretation.diagnosis.genomic_interpretations
+        assert [gi.variant_interpretation for gi in genomic_interpretations] == variants
+        assert all(gi.subject_or_biosample_id == 'TCGA.TCGA-C5-A1MI' for gi in genomic_interpretations)
+
+    def test_batch_of_empty_table(self, mutation_factory: CdaMutationFactory, df: pd.DataFrame):
+        assert mutation_factory.to_ga4gh_batch(df.iloc[:0]) == []
+
+    def test_batch_missing_column(self, mutation_factory: CdaMutationFactory, df: pd.DataFrame):
+        with pytest.raises(ValueError):
+            mutation_factory.to_ga4gh_batch(df.drop(columns=['HGVSc']))
+
+    def test_id_is_content_hash(self, mutation_factory: CdaMutationFactory, df: pd.DataFrame):
+        vinterpretation = mutation_factory.to_ga4gh(df.iloc[0])
+
+        # chr11:133921225 C>T on GRCh38, the ID must not change across runs.
+        expected = hashlib.blake2b(b'GRCh38:chr11:133921225:C:T', digest_size=16).hexdigest()
+        assert vinterpretation.variation_descriptor.id == expected
+
+    def test_same_variant_same_id(self, df: pd.DataFrame):
+        df = pd.concat([df, df.iloc[[0]]], ignore_index=True)
+        # The same variant in another subject.
+        df.loc[len(df) - 1, 'cda_subject_id'] = 'TCGA.TCGA-XX-0000'
+
+        ids = variant_ids(df)
+
+        assert ids[0] == ids[-1]
+        assert len(set(ids[:-1])) == len(ids) - 1
+
+    def test_float_position(self, df: pd.DataFrame):
+        row = df.iloc[0]
+
+        assert variant_id('GRCh38', 'chr11', 133921225.0, 'C', 'T') == variant_ids(df)[0]
+        assert variant_id(row['NCBI_Build'], row['Chromosome'], str(row['Start_Position']),
+                          row['Reference_Allele'], row['Tumor_Seq_Allele2']) == variant_ids(df)[0]
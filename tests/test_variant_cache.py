@@ -0,0 +1,135 @@
+import os
+
+import pandas as pd
+import phenopackets as pp
+import pytest
+
+from oncopacket.cda import CdaMutationFactory, GdcService, VariantDescriptorCache
+
+TESTDATA_FILENAME = os.path.join(os.path.dirname(__file__), 'data', 'mutation_excerpt.tsv')
+
+
+def kras_g12d(mutation_id: str = 'edd1ae2c-3ca9-52bd-a124-b09ed304fcc2'):
+    return {
+        'id': mutation_id,
+        'ncbi_build': 'GRCh38',
+        'chromosome': 'chr12',
+        'start_position': 25245350,
+        'reference_allele': 'C',
+        'tumor_allele': 'T',
+        'consequence': [
+            {'transcript': {'transcript_id': 'ENST00000256078', 'aa_change': 'G12D',
+                            'annotation': {'hgvsc': 'c.35G>A'},
+                            'gene': {'gene_id': 'ENSG00000133703', 'symbol': 'KRAS'}}},
+        ],
+    }
+
+
+class TestVariantDescriptorCache:
+
+    def test_get(self):
+        cache = VariantDescriptorCache()
+        built = []
+
+        def build():
+            built.append(1)
+            return pp.VariationDescriptor(id='a')
+
+        first = cache.get('a', build)
+        second = cache.get('a', build)
+        cache.get('b', build)
+
+        assert first is second
+        assert len(built) == 2
+        assert cache.n_built == 2
+        assert cache.n_deduplicated == 1
+        assert '1 deduplicated' in cache.summary()
+
+    def test_clear(self):
+        cache = VariantDescriptorCache()
+        cache.get('a', pp.VariationDescriptor)
+        cache.get('a', pp.VariationDescriptor)
+
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.n_deduplicated == 0
+
+
+class TestMutationFactoryDeduplication:
+
+    @pytest.fixture
+    def df(self) -> pd.DataFrame:
+        df = pd.read_csv(TESTDATA_FILENAME, sep='\t')
+        # The first variant recurs in two more subjects with different read depths.
+        recurrent = pd.concat([df.iloc[[0]]] * 2, ignore_index=True)
+        recurrent['cda_subject_id'] = ['TCGA.TCGA-XX-0001', 'TCGA.TCGA-XX-0002']
+        recurrent['t_depth'] = [10, 20]
+        return pd.concat([df, recurrent], ignore_index=True)
+
+    def test_batch(self, df: pd.DataFrame):
+        factory = CdaMutationFactory()
+
+        vis = factory.to_ga4gh_batch(df)
+
+        assert factory.get_variant_cache().n_built == len(df) - 2
+        assert factory.get_variant_cache().n_deduplicated == 2
+        # The subject-specific extensions are not shared.
+        depths = [[e.value for e in vi.variation_descriptor.extensions if e.name == 't_depth'][0]
+                  for vi in (vis[0], vis[-2], vis[-1])]
+        assert depths == ['64', '10', '20']
+        assert vis[0].variation_descriptor.expressions == vis[-1].variation_descriptor.expressions
+
+    def test_batch_agrees_with_uncached_rows(self, df: pd.DataFrame):
+        expected = [CdaMutationFactory().to_ga4gh(row) for _, row in df.iterrows()]
+
+        assert CdaMutationFactory().to_ga4gh_batch(df) == expected
+
+    def test_row_path_is_cached(self, df: pd.DataFrame):
+        factory = CdaMutationFactory()
+
+        for _, row in df.iterrows():
+            factory.to_ga4gh(row)
+
+        assert factory.get_variant_cache().n_deduplicated == 2
+
+    def test_different_annotation_is_not_shared(self, df: pd.DataFrame):
+        factory = CdaMutationFactory()
+        row = df.iloc[0].copy()
+        first = factory.to_ga4gh(row)
+        row['HGVSc'] = 'c.1A>G'
+
+        second = factory.to_ga4gh(row)
+
+        assert first.variation_descriptor.expressions[0].value != second.variation_descriptor.expressions[0].value
+        assert factory.get_variant_cache().n_deduplicated == 0
+
+    def test_prototype_is_not_modified(self, df: pd.DataFrame):
+        factory = CdaMutationFactory()
+        factory.to_ga4gh_batch(df)
+
+        for vi in factory.to_ga4gh_batch(df):
+            vi.variation_descriptor.expressions.add(syntax='hgvs.g', value='x')
+
+        assert factory.to_ga4gh_batch(df) == CdaMutationFactory().to_ga4gh_batch(df)
+
+
+class TestGdcServiceDeduplication:
+
+    @pytest.fixture
+    def gdc_service(self) -> GdcService:
+        service = GdcService()
+        # Avoid downloading the Ensembl transcript to protein table.
+        service._tx_to_prot = {'ENST00000256078': 'ENSP00000256078'}
+        return service
+
+    def test_recurrent_variant(self, gdc_service: GdcService):
+        first = gdc_service._map_mutation_to_variant_interpretation(kras_g12d())
+        second = gdc_service._map_mutation_to_variant_interpretation(kras_g12d())
+        gdc_service._map_mutation_to_variant_interpretation(kras_g12d('another-id'))
+
+        assert first == second
+        assert first is not second
+        assert first.variation_descriptor.expressions[1].value == 'ENSP00000256078:p.G12D'
+        assert gdc_service.get_variant_cache().n_built == 2
+        assert gdc_service.get_variant_cache().n_deduplicated == 1